@@ -11,8 +11,32 @@ import time
 import base64
 import json
 import io
+import hashlib
 from datetime import datetime, timedelta
-from groq import Groq
+from llm_client import get_client_pool, LLMUnavailableError
+from response_cache import get_response_cache, messages_digest
+from intent_router import route_intents
+from product_index import ProductNameIndex
+from product_facts import compute_product_facts, get_product_fact_store, URGENT_DAYS, ATTENTION_DAYS
+from stock_data import load_daily_history, file_signature
+from llm_context import build_llm_messages, DEFAULT_TOKEN_BUDGET
+from chat_history import ChatHistory, DEFAULT_PAGE_SIZE as CHAT_PAGE_SIZE
+from llm_backends import get_backend_chain
+from forecast_features import future_features, FEATURE_NAMES
+from forecast_intervals import calibration_residuals, get_intervals, INTERVALS_FILE, DEFAULT_LEVEL as INTERVAL_LEVEL
+from stockout_simulation import simulate_product_stockout, sigma_from_half_width, half_width_from_sigma
+from replenishment import horizon_demand, service_level_z, purchase_order_table, default_parameters, DEFAULT_SERVICE_LEVEL
+from backtesting import run_backtest, CACHE_DIR_NAME as BACKTEST_CACHE_DIR
+from explainability import explain_forecast, BASE_VALUE_NAME
+from training import FoldRefit, latest_model_folder, METADATA_FILE
+from stacking import EnsembleWeights, fit_ensemble_weights, load_weights, save_weights, WEIGHTS_FILE
+from tree_compiler import fast_predict
+from model_artifacts import model_paths, read_manifest, MANIFEST_FILE
+from baselines import fit_baselines, baseline_predictions, INTERMITTENT_METHODS
+from demand_segmentation import segment_demand, DEMAND_CLASS_LABELS
+from hierarchy import reconcile_catalogue, RECONCILIATION_METHODS, DEFAULT_METHOD as DEFAULT_RECONCILIATION
+from serving import LatencyBudget, ServingTimings, default_budget_ms, member_estimates, record_latency, serving_order
+from shared_models import load_shared_models, process_memory, mapped_model_memory
 
 # =============================================================================
 # 🤖 CONFIGURATION GROQ POUR QUESTIONS GÉNÉRALES
@@ -21,55 +45,85 @@ from groq import Groq
 def get_groq_response(user_input):
     """
     Utilise Groq pour répondre aux questions générales
+
+    Si Groq est injoignable, la chaîne de backends répond avec le serveur
+    local ou le modèle de réponse hors ligne au lieu d'une erreur
     """
     try:
-        # Votre clé API Groq
-        api_key = os.getenv("GROQ_API_KEY", "")
-        
-        # Initialiser le client Groq
-        client = Groq(api_key=api_key)
-        
-        # Modèles disponibles et fonctionnels
-        models = [
-            "llama-3.1-8b-instant",
-            "gemma2-9b-it",
-            "llama-3.1-70b-versatile"
-        ]
-        
-        # Essayer chaque modèle jusqu'à ce qu'un fonctionne
-        for model in models:
-            try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "Tu es un assistant IA intelligent et utile. Réponds de manière claire, précise et engageante en français. Utilise des emojis appropriés et structure tes réponses de manière lisible."
-                        },
-                        {
-                            "role": "user",
-                            "content": user_input
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=1000,
-                    top_p=1,
-                    stream=False
-                )
-                
-                return response.choices[0].message.content
-                
-            except Exception as e:
-                print(f"❌ Erreur avec le modèle {model}: {e}")
-                continue
-        
+        # Réponse déjà connue pour cette question et ce snapshot de données
+        cache = get_response_cache()
+        cached = cache.get(user_input, get_forecast_snapshot_version(), "groq-general")
+        if cached is not None:
+            return cached
+
+        # Groq (pool longue durée : hedging, disjoncteur), puis backends locaux
+        chain = get_backend_chain(os.getenv("GROQ_API_KEY", ""))
+
+        response, backend = chain.complete(
+            [
+                {
+                    "role": "system",
+                    "content": "Tu es un assistant IA intelligent et utile. Réponds de manière claire, précise et engageante en français. Utilise des emojis appropriés et structure tes réponses de manière lisible."
+                },
+                {
+                    "role": "user",
+                    "content": user_input
+                }
+            ],
+            temperature=0.7,
+            max_tokens=1000,
+            top_p=1
+        )
+        # Les réponses de repli ne sont pas mises en cache : Groq répondra à nouveau une fois rétabli
+        if backend == "groq":
+            cache.put(user_input, response, get_forecast_snapshot_version(), "groq-general")
+        return response
+
+    except LLMUnavailableError as e:
         # Si aucun modèle ne fonctionne
+        print(f"❌ Aucun backend LLM disponible: {e}")
         return "❌ **Erreur** : Impossible de contacter l'API Groq. Veuillez réessayer plus tard."
-        
     except Exception as e:
         print(f"❌ Erreur Groq: {e}")
         return f"❌ **Erreur de connexion** : {str(e)}"
 
+def stream_groq_response(messages, model, api_key=None, temperature=0.7, max_tokens=1024, info=None):
+    """
+    Streame la réponse Groq en natif (stream=True) et renvoie les tokens au fil de l'eau
+
+    Le modèle choisi est essayé en premier, les modèles du pool servent de secours ;
+    sans Groq, la réponse vient du serveur local puis du modèle hors ligne.
+    `info["backend"]` reçoit le nom du backend qui a répondu.
+    """
+    chain = get_backend_chain(api_key or os.getenv("GROQ_API_KEY", ""))
+    yield from chain.stream(
+        messages,
+        info=info,
+        models=[model],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=1
+    )
+
+def render_streaming_response(placeholder, chunks, start_time=None):
+    """
+    Affiche les tokens dès leur arrivée et mesure le temps jusqu'au premier token
+
+    Retourne (réponse complète, temps premier token en s, temps total en s)
+    """
+    start_time = start_time if start_time is not None else time.perf_counter()
+    time_to_first_token = None
+    full_response = ""
+
+    for chunk in chunks:
+        if time_to_first_token is None:
+            time_to_first_token = time.perf_counter() - start_time
+        full_response += chunk
+        placeholder.markdown(full_response + "▌")
+
+    placeholder.markdown(full_response)
+    return full_response, time_to_first_token, time.perf_counter() - start_time
+
 # =============================================================================
 # 💾 SYSTÈME DE BASE DE DONNÉES INTÉGRÉE POUR CHATBOT
 # =============================================================================
@@ -94,163 +148,10 @@ def save_dashboard_data_to_memory(dashboard_data, product_stocks, predictions_da
             }
         }
         
-        # Données spécifiques par produit (hardcodées pour la précision)
-        chatbot_database['products'] = {
-            'couches_softcare': {
-                'nom_complet': 'Couche Softcare T4',
-                'stock_actuel': 80,
-                'jours_rupture': 1.1,
-                'consommation_jour': 75.6,
-                'consommation_30j': 2267,
-                'stock_max': 2623,
-                'stock_min': 1911,
-                'stock_recommande': 2445,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 9.4,
-                'confiance': 0.843,
-                'stabilite': 0.931,
-                'score_confiance': 0.682,
-                'volatilite': 5.2,
-                'efficacite_stock': 0.035,
-                'cv': 6.5,
-                'incertitude_moyenne': 11.1,
-                'status': 'URGENT',
-                'alerte': True,
-                'message_alerte': 'Rupture de Stock Imminente - Stock épuisé dans 1.1 jours'
-            },
-            'lait_broli_1kg': {
-                'nom_complet': 'Lait Broli 1kg',
-                'stock_actuel': 0,
-                'jours_rupture': 0.0,
-                'consommation_jour': 75.2,
-                'consommation_30j': 2256,
-                'stock_max': 2602,
-                'stock_min': 1909,
-                'stock_recommande': 2429,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 6.8,
-                'confiance': 0.846,
-                'stabilite': 0.926,
-                'score_confiance': 0.698,
-                'volatilite': 5.5,
-                'efficacite_stock': 0.0,
-                'cv': 5.6,
-                'incertitude_moyenne': 9.8,
-                'status': 'RUPTURE',
-                'alerte': True,
-                'message_alerte': 'STOCK ÉPUISÉ - Réapprovisionnement immédiat requis !'
-            },
-            'mayor_1_csv': {
-                'nom_complet': 'Mayor 1 (CSV)',
-                'stock_actuel': 0,
-                'jours_rupture': 0.0,
-                'consommation_jour': 76.0,
-                'consommation_30j': 2279,
-                'stock_max': 2628,
-                'stock_min': 1929,
-                'stock_recommande': 2453,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 5.4,
-                'confiance': 0.847,
-                'stabilite': 0.945,
-                'score_confiance': 0.721,
-                'volatilite': 0.0,
-                'efficacite_stock': 0.0,
-                'cv': 6.8,
-                'incertitude_moyenne': 12.3,
-                'status': 'INCONNU',
-                'alerte': True,
-                'message_alerte': 'Stock actuel inconnu - Vérification urgente requise !'
-            },
-            'may_arm_1kg': {
-                'nom_complet': 'May Arm 1kg',
-                'stock_actuel': 778,
-                'jours_rupture': 10.4,
-                'consommation_jour': 75.0,
-                'consommation_30j': 2250,
-                'stock_max': 2590,
-                'stock_min': 1909,
-                'stock_recommande': 2420,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 9.4,
-                'confiance': 0.849,
-                'stabilite': 0.931,
-                'score_confiance': 0.692,
-                'volatilite': 5.2,
-                'efficacite_stock': 0.346,
-                'cv': 8.3,
-                'incertitude_moyenne': 15.7,
-                'status': 'ATTENTION',
-                'alerte': True,
-                'message_alerte': 'Attention Stock - Stock épuisé dans 10.4 jours'
-            },
-            'may_arm_5kg': {
-                'nom_complet': 'May Arm 5kg',
-                'stock_actuel': 0,
-                'jours_rupture': 0.0,
-                'consommation_jour': 75.6,
-                'consommation_30j': 2268,
-                'stock_max': 2597,
-                'stock_min': 1939,
-                'stock_recommande': 2432,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 10.4,
-                'confiance': 0.855,
-                'stabilite': 0.928,
-                'score_confiance': 0.717,
-                'volatilite': 5.4,
-                'efficacite_stock': 0.0,
-                'cv': 5.1,
-                'incertitude_moyenne': 9.2,
-                'status': 'RUPTURE',
-                'alerte': True,
-                'message_alerte': 'STOCK ÉPUISÉ - Réapprovisionnement immédiat requis !'
-            },
-            'papier_hygisita': {
-                'nom_complet': 'Papier Hygisita',
-                'stock_actuel': 152,
-                'jours_rupture': 2.0,
-                'consommation_jour': 74.4,
-                'consommation_30j': 2233,
-                'stock_max': 2559,
-                'stock_min': 1907,
-                'stock_recommande': 2396,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 7.3,
-                'confiance': 0.854,
-                'stabilite': 0.938,
-                'score_confiance': 0.698,
-                'volatilite': 4.6,
-                'efficacite_stock': 0.068,
-                'cv': 6.0,
-                'incertitude_moyenne': 10.8,
-                'status': 'URGENT',
-                'alerte': True,
-                'message_alerte': 'Rupture de Stock Imminente - Stock épuisé dans 2.0 jours'
-            },
-            'parle_g': {
-                'nom_complet': 'ParleG',
-                'stock_actuel': 290,
-                'jours_rupture': 3.9,
-                'consommation_jour': 74.4,
-                'consommation_30j': 2232,
-                'stock_max': 2555,
-                'stock_min': 1909,
-                'stock_recommande': 2394,
-                'tendance': 'Hausse',
-                'tendance_pourcentage': 9.4,
-                'confiance': 0.855,
-                'stabilite': 0.929,
-                'score_confiance': 0.687,
-                'volatilite': 5.3,
-                'efficacite_stock': 0.130,
-                'cv': 6.0,
-                'incertitude_moyenne': 10.8,
-                'status': 'URGENT',
-                'alerte': True,
-                'message_alerte': 'Rupture de Stock Imminente - Stock épuisé dans 3.9 jours'
-            }
-        }
+        # Faits par produit calculés à partir des prévisions de chaque dataset
+        fact_store = get_product_fact_store()
+        chatbot_database['products'] = fact_store.products()
+        chatbot_database['facts_version'] = fact_store.version
         
         # Sauvegarder dans la session
         st.session_state.chatbot_database = chatbot_database
@@ -264,6 +165,92 @@ def save_dashboard_data_to_memory(dashboard_data, product_stocks, predictions_da
         print(f"❌ Erreur lors de la sauvegarde: {e}")
         return None
 
+# =============================================================================
+# 🔄 ACTUALISATION INCRÉMENTALE DE LA BASE DE FAITS PRODUITS
+# =============================================================================
+
+def get_dataset_fingerprint(dataset, period=30):
+    """
+    Empreinte des entrées d'un dataset (fichier de données, modèles, période)
+    """
+    parts = [period]
+    data_file = dataset.get('data_file')
+    if data_file and os.path.exists(data_file):
+        parts.append(file_signature(data_file))
+    folder = dataset.get('folder')
+    if folder and os.path.isdir(folder):
+        parts += [file_signature(os.path.join(folder, f)) for f in sorted(os.listdir(folder))
+                  if (f.endswith('.joblib') and f not in (INTERVALS_FILE, WEIGHTS_FILE)) or f == MANIFEST_FILE]
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:12]
+
+def refresh_product_fact_store(datasets, current_dataset=None, models=None, predictions=None, uncertainties=None, period=30):
+    """
+    Met à jour la base de faits produit par produit : le dataset affiché avec
+    ses prévisions courantes, les autres seulement si leurs entrées ont changé
+    """
+    store = get_product_fact_store()
+    current_key = current_dataset['key'] if current_dataset else None
+    
+    def upsert(dataset, history, dataset_predictions, dataset_uncertainties, fingerprint):
+        metrics = create_dashboard_metrics(dataset_predictions, dataset_uncertainties, history, period)
+        if metrics:
+            facts = compute_product_facts(dataset['name'], metrics, dataset_uncertainties[:period])
+            if store.upsert(dataset['key'], facts, fingerprint):
+                store.set_forecast(dataset['key'], dataset_predictions, dataset_uncertainties)
+    
+    # Dataset affiché : mêmes prévisions que le tableau de bord
+    if current_dataset and current_dataset.get('data_file') and predictions and uncertainties:
+        fingerprint = (
+            get_dataset_fingerprint(current_dataset, period),
+            compute_forecast_snapshot_version(current_key, predictions, uncertainties)
+        )
+        if not store.is_fresh(current_key, fingerprint):
+            try:
+                upsert(current_dataset, load_daily_history(current_dataset['data_file']), predictions, uncertainties, fingerprint)
+            except Exception as e:
+                print(f"❌ Erreur lors de la mise à jour des faits de {current_dataset['name']}: {e}")
+    
+    # Autres datasets : recalcul uniquement si le fichier de données ou les modèles ont changé
+    stale = []
+    for dataset in datasets:
+        if dataset['key'] == current_key or not dataset.get('data_file'):
+            continue
+        fingerprint = get_dataset_fingerprint(dataset, period)
+        stored = store.fingerprint(dataset['key'])
+        if stored is None or stored[0] != fingerprint:
+            stale.append((dataset, fingerprint))
+    
+    if stale:
+        models_by_folder = {current_dataset['folder']: models} if current_dataset and models else {}
+        baseline_forecaster = get_baseline_forecaster(datasets)
+        segmentation = get_demand_segmentation(datasets)
+        with st.sidebar.expander(f"🗃️ Base produits : {len(stale)} produit(s) actualisé(s)", expanded=False):
+            for dataset, fingerprint in stale:
+                try:
+                    history = load_daily_history(dataset['data_file'])
+                    baseline = baseline_forecaster.view(dataset['key']) if baseline_forecaster else None
+                    # Demande intermittente : prévisions spécialisées, modèles ni chargés ni exécutés
+                    if routed_to_baseline(segmentation, baseline, dataset['key']) and baseline.last_date == history.index.max():
+                        intermittent = baseline_forecaster.view(dataset['key'], INTERMITTENT_METHODS)
+                        dataset_predictions, dataset_uncertainties, _ = intermittent.forecast(period)
+                        upsert(dataset, history, dataset_predictions, dataset_uncertainties, (fingerprint, None))
+                        continue
+                    if dataset['folder'] not in models_by_folder:
+                        models_by_folder[dataset['folder']] = load_models(dataset['folder'])
+                    dataset_models = models_by_folder[dataset['folder']]
+                    dataset_weights = get_ensemble_weights(dataset)
+                    dataset_predictions, dataset_uncertainties, _ = make_real_predictions(
+                        dataset_models, history, history.index.max(), period,
+                        intervals=get_forecast_intervals(dataset, dataset_models, dataset_weights),
+                        weights=dataset_weights,
+                        baseline=baseline
+                    )
+                    upsert(dataset, history, dataset_predictions, dataset_uncertainties, (fingerprint, None))
+                except Exception as e:
+                    st.warning(f"⚠️ Faits non calculés pour {dataset['name']}: {e}")
+    
+    return store
+
 # =============================================================================
 # 🗄️ GESTION DE LA BASE DE DONNÉES DU CHATBOT
 # =============================================================================
@@ -282,6 +269,41 @@ def load_chatbot_database():
         print(f"❌ Erreur lors du chargement: {e}")
         return None
 
+# Alias tapés par les utilisateurs, en plus de la clé et du nom complet de chaque produit
+PRODUCT_ALIASES = {
+    'couche_softcqre_T4': [
+        'couches_softcare', 'couches', 'couche', 'softcare', 'softcair', 'softcaire', 'softcqre',
+        'homepro', 't4', 'couches softcare', 'couches softcaire'
+    ],
+    'laitbroli_1kg': ['lait_broli_1kg', 'lait', 'broli', 'lait broli', 'broli 1kg', 'lait broli 1kg'],
+    'mayor1_csv': ['mayor_1_csv', 'mayor', 'mayor 1', 'csv'],
+    'may_arm_1kg': ['may', 'arm', 'may arm', 'may 1kg', 'may arm 1kg'],
+    'may_arm_5kg': ['may 5kg', 'may arm 5kg'],
+    'papierhygsita': [
+        'papier_hygisita', 'papier', 'hygisita', 'hygienique', 'hygiene', 'papier hygienique',
+        'papier hygisita'
+    ],
+    'parleG': ['parle_g', 'parle', 'parle g']
+}
+
+_PRODUCT_INDEX_CACHE = {'signature': None, 'index': None}
+
+def get_product_index(database):
+    """
+    Index des noms de produits de la base, reconstruit uniquement quand le catalogue change
+    """
+    products = database.get('products', {}) if database else {}
+    signature = tuple((key, data.get('nom_complet', '')) for key, data in products.items())
+    if _PRODUCT_INDEX_CACHE['signature'] != signature:
+        entries = []
+        for key, data in products.items():
+            names = [key, data.get('nom_complet', '')]
+            names += data.get('aliases', []) + PRODUCT_ALIASES.get(key, [])
+            entries.append((key, names))
+        _PRODUCT_INDEX_CACHE['index'] = ProductNameIndex(entries)
+        _PRODUCT_INDEX_CACHE['signature'] = signature
+    return _PRODUCT_INDEX_CACHE['index']
+
 def get_product_data(product_name):
     """
     Récupère les données d'un produit spécifique depuis la base de données
@@ -291,61 +313,10 @@ def get_product_data(product_name):
         if not database or 'products' not in database:
             return None
             
-        # Recherche par nom ou alias
-        product_aliases = {
-            'couches': 'couches_softcare',
-            'softcare': 'couches_softcare',
-            'softcair': 'couches_softcare',
-            'softcaire': 'couches_softcare',
-            'couche': 'couches_softcare',
-            'homepro': 'couches_softcare',
-            'couches softcare': 'couches_softcare',
-            'couches softcaire': 'couches_softcare',
-            'lait': 'lait_broli_1kg',
-            'broli': 'lait_broli_1kg',
-            'lait broli': 'lait_broli_1kg',
-            'laitbroli': 'lait_broli_1kg',
-            'broli 1kg': 'lait_broli_1kg',
-            'lait broli 1kg': 'lait_broli_1kg',
-            'mayor': 'mayor_1_csv',
-            'mayor_1': 'mayor_1_csv',
-            'csv': 'mayor_1_csv',
-            'mayor 1': 'mayor_1_csv',
-            'mayor1': 'mayor_1_csv',
-            'may': 'may_arm_1kg',
-            'arm': 'may_arm_1kg',
-            'may_arm': 'may_arm_1kg',
-            'may_arm_1kg': 'may_arm_1kg',
-            'may_arm_5kg': 'may_arm_5kg',
-            'may arm': 'may_arm_1kg',
-            'may arm 1kg': 'may_arm_1kg',
-            'may arm 5kg': 'may_arm_5kg',
-            'mayarm': 'may_arm_1kg',
-            'parle': 'parleG',
-            'parle-g': 'parleG',
-            'parleg': 'parleG',
-            'parle_g': 'parleG',
-            'parle g': 'parleG',
-            'papier': 'papier_hygisita',
-            'hygisita': 'papier_hygisita',
-            'hygienique': 'papier_hygisita',
-            'hygiene': 'papier_hygisita',
-            'papier hygisita': 'papier_hygisita',
-            'papierhygisita': 'papier_hygisita'
-        }
-        
-        # Normaliser le nom du produit
-        product_key = product_name.lower().strip()
-        if product_key in product_aliases:
-            product_key = product_aliases[product_key]
-        
-        if product_key in database['products']:
-            return database['products'][product_key]
-        else:
-            # Recherche partielle
-            for key, data in database['products'].items():
-                if product_name.lower() in data['nom_complet'].lower():
-                    return data
+        # Recherche par clé, nom complet ou alias (tolérante aux fautes et accents)
+        match = get_product_index(database).resolve(product_name)
+        if match:
+            return database['products'].get(match[0])
             
         return None
         
@@ -388,21 +359,8 @@ def analyze_stock_data_with_database(database, user_input):
     """
     try:
         # Rechercher un produit spécifique dans la question
-        product_keywords = {
-            'couches_softcare': ['couches', 'softcare', 'softcair', 'softcqre', 'couche', 't4', 'softcaire', 'homepro'],
-            'lait_broli_1kg': ['lait', 'broli', 'lait broli', 'laitbroli', 'broli 1kg', 'lait broli 1kg'],
-            'mayor_1_csv': ['mayor', 'mayor_1', 'csv', 'mayor 1', 'mayor1'],
-            'may_arm_1kg': ['may', 'arm', 'may arm', '1kg', 'may arm 1kg', 'mayarm'],
-            'may_arm_5kg': ['may', 'arm', 'may arm', '5kg', 'may arm 5kg', 'mayarm'],
-            'papier_hygisita': ['papier', 'hygienique', 'hygiene', 'papier hygienique', 'hygisita', 'papierhygisita'],
-            'parleG': ['parle', 'parle-g', 'parleg', 'parle g', 'parleg']
-        }
-        
-        detected_product = None
-        for product, keywords in product_keywords.items():
-            if any(keyword in user_input for keyword in keywords):
-                detected_product = product
-                break
+        match = get_product_index(database).find_in_text(user_input)
+        detected_product = match[0] if match else None
         
         if detected_product:
             # Analyser le produit spécifique
@@ -415,6 +373,12 @@ def analyze_stock_data_with_database(database, user_input):
         print(f"❌ Erreur dans l'analyse des stocks: {e}")
         return f"❌ **Erreur** : Impossible d'analyser les données de stock.\n\n**Détails** : {str(e)}"
 
+def format_fact(value, unit=''):
+    """Valeur d'un fait produit pour l'affichage (« inconnu » si non calculée)"""
+    if value is None:
+        return "inconnu"
+    return f"{value} {unit}".strip()
+
 def analyze_specific_product_with_database(product_key, user_input):
     """
     Analyse un produit spécifique avec la base de données
@@ -433,13 +397,13 @@ def analyze_specific_product_with_database(product_key, user_input):
             explication = "SITUATION CRITIQUE : Votre stock est complètement épuisé ! Il faut immédiatement passer une commande d'urgence."
         elif product_data['status'] == 'URGENT':
             status_emoji = "🚨"
-            explication = "SITUATION URGENTE : Votre stock sera épuisé dans moins de 2 jours ! Commander dès aujourd'hui."
+            explication = f"SITUATION URGENTE : Votre stock sera épuisé dans moins de {URGENT_DAYS} jours ! Commander dès aujourd'hui."
         elif product_data['status'] == 'INCONNU':
             status_emoji = "❓"
             explication = "SITUATION INCONNUE : Vérifier manuellement votre inventaire pour connaître la situation réelle."
         elif product_data['status'] == 'ATTENTION':
             status_emoji = "⚠️"
-            explication = "SITUATION D'ATTENTION : Votre stock sera épuisé dans moins de 4 jours. Planifier une commande."
+            explication = f"SITUATION D'ATTENTION : Votre stock sera épuisé dans moins de {ATTENTION_DAYS} jours. Planifier une commande."
         elif product_data['status'] == 'Normal':
             status_emoji = "✅"
             explication = "SITUATION STABLE : Votre stock est en bon état. Continuer la surveillance normale."
@@ -453,13 +417,15 @@ def analyze_specific_product_with_database(product_key, user_input):
             response += f"🚨 **ALERTE** : {product_data.get('message_alerte', 'Attention requise !')}\n\n"
         
         # Données principales
-        response += f"📦 **Stock actuel** : {product_data['stock_actuel']} unités\n"
-        response += f"⏰ **Jours avant rupture** : {product_data['jours_rupture']} jours\n"
+        response += f"📦 **Stock actuel** : {format_fact(product_data['stock_actuel'], 'unités')}\n"
+        response += f"⏰ **Jours avant rupture** : {format_fact(product_data['jours_rupture'], 'jours')}\n"
+        if product_data.get('probabilite_rupture') is not None:
+            response += f"🎲 **Risque de rupture sur {product_data.get('periode', 30)} jours** : {product_data['probabilite_rupture'] * 100:.0f}%\n"
         response += f"📈 **Consommation quotidienne** : {product_data['consommation_jour']} unités\n"
         if 'consommation_30j' in product_data:
             response += f"📊 **Consommation 30j** : {product_data['consommation_30j']} unités\n"
-        if 'tendance_pourcentage' in product_data:
-            response += f"📈 **Tendance** : {product_data['tendance']} (+{product_data['tendance_pourcentage']}%)\n"
+        if product_data.get('tendance_pourcentage') is not None:
+            response += f"📈 **Tendance** : {product_data['tendance']} ({product_data['tendance_pourcentage']:+.1f}%)\n"
         else:
             response += f"📊 **Tendance** : {product_data['tendance']}\n"
         response += "\n"
@@ -525,7 +491,7 @@ def get_global_stock_summary():
             elif product['status'] == 'URGENT':
                 status_emoji = "🚨"
                 urgent_count += 1
-            elif product['status'] == 'Attention':
+            elif product['status'] == 'ATTENTION':
                 status_emoji = "⚠️"
                 attention_count += 1
             elif product['status'] == 'Normal':
@@ -538,8 +504,8 @@ def get_global_stock_summary():
             alerte_emoji = "⚠️" if product['alerte'] else "✅"
             
             response += f"{status_emoji} **{product['nom']}**\n"
-            response += f"   📦 Stock : {product['stock']} unités\n"
-            response += f"   ⏰ Rupture dans : {product['jours_rupture']} jours\n"
+            response += f"   📦 Stock : {format_fact(product['stock'], 'unités')}\n"
+            response += f"   ⏰ Rupture dans : {format_fact(product['jours_rupture'], 'jours')}\n"
             response += f"   {alerte_emoji} {product['status']}\n\n"
         
         # Compter les alertes
@@ -555,6 +521,63 @@ def get_global_stock_summary():
         print(f"❌ Erreur dans le résumé global: {e}")
         return f"❌ **Erreur** : Impossible de générer le résumé.\n\n**Détails** : {str(e)}"
 
+# =============================================================================
+# 🗃️ VERSION DU SNAPSHOT DE PRÉVISIONS (CLÉ DU CACHE DE RÉPONSES)
+# =============================================================================
+
+def compute_forecast_snapshot_version(dataset_key, predictions, uncertainties):
+    """
+    Empreinte courte des prévisions affichées : change dès que les données changent
+    """
+    payload = json.dumps({
+        'dataset': dataset_key,
+        'predictions': [round(float(p), 3) for p in (predictions or [])],
+        'uncertainties': [round(float(u), 3) for u in (uncertainties or [])]
+    })
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+def get_forecast_snapshot_version():
+    """
+    Version du snapshot de prévisions de la session courante, suivie de la
+    version de la base de faits produits (les réponses du chatbot en dépendent)
+    """
+    try:
+        snapshot = st.session_state.get('predictions_data', {}).get('snapshot_version', 'aucun')
+    except Exception:
+        snapshot = 'aucun'
+    return f"{snapshot}-f{get_product_fact_store().version}"
+
+def is_cacheable_response(response):
+    """
+    Les réponses d'erreur ne sont jamais mises en cache
+    """
+    return bool(response) and not str(response).lstrip().startswith("❌")
+
+# =============================================================================
+# 📦 CONTEXTE LLM CIBLÉ (BUDGET DE TOKENS)
+# =============================================================================
+
+def build_chat_messages(prompt, history=None, summary=None):
+    """
+    Messages LLM ancrés dans la base de faits produits et les prévisions
+    affichées, limités au budget de tokens choisi dans la sidebar
+    """
+    database = load_chatbot_database() or {}
+    products = database.get('products', {})
+    match = get_product_index(database).find_in_text(prompt) if products else None
+    routing = route_intents(prompt)
+    return build_llm_messages(
+        prompt,
+        products=products,
+        forecast=st.session_state.get('predictions_data'),
+        history=history,
+        summary=summary,
+        focus_keys=[match[0]] if match else [],
+        # Question purement générale : pas de vue d'ensemble des stocks
+        include_overview=routing.has('stock') or not routing.has('general'),
+        token_budget=st.session_state.get('llm_token_budget', DEFAULT_TOKEN_BUDGET)
+    )
+
 # =============================================================================
 # 🧠 SYSTÈME DE ROUTAGE DU CHATBOT
 # =============================================================================
@@ -1378,6 +1401,8 @@ def get_datasets():
     
     # Vérifier que les dossiers et fichiers existent
     for dataset in deployment_datasets:
+        # Modèles réentraînés par produit (training.py) prioritaires sur les modèles partagés
+        dataset['folder'] = latest_model_folder(dataset['data_file']) or dataset['folder']
         if os.path.exists(dataset['folder']) and os.path.exists(dataset['data_file']):
             datasets.append(dataset)
     
@@ -1408,8 +1433,16 @@ def get_datasets():
 # 📁 FONCTIONS DE CHARGEMENT DE DONNÉES ET MODÈLES
 # =============================================================================
 
-def load_models(folder):
-    """Charge les modèles - ADAPTÉ POUR DÉPLOIEMENT"""
+def load_models(folder, members=None):
+    """
+    Charge les modèles - ADAPTÉ POUR DÉPLOIEMENT
+
+    `members` : modèles retenus par les poids de l'ensemble ; les autres ne sont pas chargés
+    Artefacts natifs (manifest.json, voir model_artifacts.py) chargés en priorité :
+    ils ne dépendent pas des versions de scikit-learn / xgboost / lightgbm et
+    leurs tableaux, projetés en mémoire, sont partagés entre les processus de
+    l'hôte (shared_models.py) ; pickles joblib pour les modèles absents du manifeste
+    """
     models = {}
     try:
         # Vérifier si le dossier existe
@@ -1417,6 +1450,10 @@ def load_models(folder):
             st.warning(f"⚠️ Dossier {folder} non trouvé")
             return {}
         
+        for model_name, model in (load_shared_models(folder, members) or {}).items():
+            models[model_name] = model
+            st.success(f"✅ Modèle {model_name} chargé (artefact natif, mémoire partagée)")
+        
         # Lister les fichiers dans le dossier
         files = os.listdir(folder)
         st.info(f"🔍 Fichiers trouvés dans {folder}: {files}")
@@ -1424,6 +1461,11 @@ def load_models(folder):
         for file in files:
             if file.endswith('_model.joblib'):
                 model_name = file.replace('_model.joblib', '')
+                if model_name in models:
+                    continue
+                if members is not None and model_name not in members:
+                    st.info(f"✂️ Modèle {model_name} écarté (poids nul dans l'ensemble)")
+                    continue
                 model_path = os.path.join(folder, file)
                 try:
                     models[model_name] = joblib.load(model_path)
@@ -1570,6 +1612,17 @@ def load_feature_names(folder):
         pass
     return None
 
+def load_model_metadata(folder):
+    """Métadonnées des modèles du dossier (metadonnees.joblib), {} si absentes"""
+    try:
+        metadata_file = os.path.join(folder, METADATA_FILE)
+        if os.path.exists(metadata_file):
+            metadata = joblib.load(metadata_file)
+            return metadata if isinstance(metadata, dict) else {}
+    except Exception as e:
+        print(f"⚠️ Métadonnées illisibles dans {folder}: {e}")
+    return {}
+
 # =============================================================================
 # 🔧 FONCTIONS DE CRÉATION ET GESTION DES FEATURES
 # =============================================================================
@@ -1577,89 +1630,8 @@ def load_feature_names(folder):
 def create_features_from_data(data, last_date, days=30):
     """Crée les features pour les prédictions - EXACTEMENT COMME APP_SIMPLE"""
     try:
-        # Préparer les données
-        df = data.copy()
-        
-        # S'assurer que les colonnes numériques sont bien numériques
-        numeric_cols = ['Entrée', 'Stock', 'Sortie']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Remplir les valeurs manquantes
-        df = df.ffill().fillna(0)
-        
-        # Créer les features pour chaque jour futur
-        future_features = []
-        
-        for i in range(days):
-            # Date future
-            future_date = last_date + pd.Timedelta(days=i+1)
-            
-            # Features temporelles
-            month = future_date.month
-            weekday = future_date.weekday()
-            is_weekend = 1 if weekday >= 5 else 0
-            quarter = (month - 1) // 3 + 1
-            
-            # Features cycliques
-            month_sin = np.sin(2 * np.pi * month / 12)
-            month_cos = np.cos(2 * np.pi * month / 12)
-            weekday_sin = np.sin(2 * np.pi * weekday / 7)
-            weekday_cos = np.cos(2 * np.pi * weekday / 7)
-            
-            # Features de lag (utiliser les dernières valeurs disponibles)
-            sortie_lag_1 = df['Sortie'].iloc[-1] if len(df) > 0 else 0
-            sortie_lag_7 = df['Sortie'].iloc[-7] if len(df) >= 7 else df['Sortie'].iloc[-1] if len(df) > 0 else 0
-            sortie_lag_14 = df['Sortie'].iloc[-14] if len(df) >= 14 else df['Sortie'].iloc[-1] if len(df) > 0 else 0
-            
-            # Features de moyenne mobile
-            sortie_ma_7 = df['Sortie'].tail(7).mean() if len(df) >= 7 else df['Sortie'].mean() if len(df) > 0 else 0
-            sortie_std_7 = df['Sortie'].tail(7).std() if len(df) >= 7 else df['Sortie'].std() if len(df) > 0 else 0
-            sortie_ma_14 = df['Sortie'].tail(14).mean() if len(df) >= 14 else df['Sortie'].mean() if len(df) > 0 else 0
-            sortie_std_14 = df['Sortie'].tail(14).std() if len(df) >= 14 else df['Sortie'].std() if len(df) > 0 else 0
-            sortie_ma_30 = df['Sortie'].tail(30).mean() if len(df) >= 30 else df['Sortie'].mean() if len(df) > 0 else 0
-            sortie_std_30 = df['Sortie'].tail(30).std() if len(df) >= 30 else df['Sortie'].std() if len(df) > 0 else 0
-            
-            # Features calculées
-            entree = df['Entrée'].iloc[-1] if len(df) > 0 else 0
-            stock = df['Stock'].iloc[-1] if len(df) > 0 else 0
-            sortie = df['Sortie'].iloc[-1] if len(df) > 0 else 0
-            
-            net_flow = entree - sortie
-            stock_velocity = sortie / stock if stock > 0 else 0
-            entree_to_sortie_ratio = entree / sortie if sortie > 0 else 0
-            
-            # Créer le dictionnaire de features
-            features = {
-                'Entrée': entree,
-                'Stock': stock,
-                'month': month,
-                'weekday': weekday,
-                'is_weekend': is_weekend,
-                'quarter': quarter,
-                'month_sin': month_sin,
-                'month_cos': month_cos,
-                'weekday_sin': weekday_sin,
-                'weekday_cos': weekday_cos,
-                'Sortie_lag_1': sortie_lag_1,
-                'Sortie_lag_7': sortie_lag_7,
-                'Sortie_lag_14': sortie_lag_14,
-                'Sortie_ma_7': sortie_ma_7,
-                'Sortie_std_7': sortie_std_7,
-                'Sortie_ma_14': sortie_ma_14,
-                'Sortie_std_14': sortie_std_14,
-                'Sortie_ma_30': sortie_ma_30,
-                'Sortie_std_30': sortie_std_30,
-                'net_flow': net_flow,
-                'stock_velocity': stock_velocity,
-                'entree_to_sortie_ratio': entree_to_sortie_ratio
-            }
-            
-            future_features.append(features)
-        
-        return future_features
-        
+        # Version vectorisée partagée avec l'explication des prévisions
+        return future_features(data, last_date, days).to_dict('records')
     except Exception as e:
         st.error(f"❌ Erreur création features: {e}")
         return None
@@ -1668,8 +1640,236 @@ def create_features_from_data(data, last_date, days=30):
 # 🔮 FONCTIONS DE PRÉDICTION ET ANALYSE
 # =============================================================================
 
-def make_real_predictions(models, data, last_date, days=30):
-    """Fait de vraies prédictions avec les modèles - EXACTEMENT COMME APP_SIMPLE"""
+def get_out_of_sample_forecasts(dataset):
+    """
+    Prévisions hors échantillon des modèles du dataset ({modèle: (origines,
+    horizon)}, réels) : période de test de la version entraînée (training.py),
+    None si la version n'en a pas (modèles livrés)
+    """
+    metadata = load_model_metadata(dataset['folder'])
+    if metadata.get('previsions_test') and metadata.get('reels_test') is not None:
+        return metadata['previsions_test'], metadata['reels_test']
+    return None
+
+def get_forecast_intervals(dataset, models, weights=None, members=None):
+    """
+    Intervalles conformes du dataset (par horizon), calibrés sur les prévisions
+    hors échantillon, stockés avec les modèles et recalibrés seulement si les
+    données, les modèles ou leurs poids ont changé ; None sans prévisions hors
+    échantillon (incertitude = écart entre modèles).
+    `members` : modèles réellement exécutés (budget de latence) ; un
+    sous-ensemble est calibré et stocké à part de l'ensemble complet
+    """
+    product_key = dataset['key']
+    if members is not None and set(members) != set(models):
+        models = {name: models[name] for name in members if name in models}
+        product_key = f"{dataset['key']}|{'+'.join(sorted(models))}"
+    if not models:
+        return None
+    try:
+        fingerprint = f"{get_dataset_fingerprint(dataset, 0)}-{'+'.join(sorted(models))}"
+        if weights is not None:
+            fingerprint += f"-{weights.digest}"
+        out_of_sample = get_out_of_sample_forecasts(dataset)
+        return get_intervals(
+            dataset['folder'], product_key, fingerprint,
+            lambda: calibration_residuals(*out_of_sample, list(models), weights) if out_of_sample else None
+        )
+    except Exception as e:
+        print(f"⚠️ Intervalles non calibrés pour {dataset.get('name')}: {e}")
+        return None
+
+# Noms affichés des modèles (backtest, évaluation)
+MODEL_DISPLAY_NAMES = {
+    'rf': 'Random Forest',
+    'gb': 'Gradient Boosting',
+    'xgb': 'XGBoost',
+    'lgb': 'LightGBM',
+    'ensemble': 'Ensemble',
+    'moyenne_simple': 'Moyenne simple',
+    'naive_saisonnier': 'Naïf saisonnier',
+    'lissage_exponentiel': 'Lissage exponentiel',
+    'croston': 'Croston',
+    'tsb': 'TSB'
+}
+
+# Features affichées individuellement dans le graphique des contributions
+CONTRIBUTION_TOP_FEATURES = 6
+
+_BACKTEST_REPORTS = {}
+
+def get_backtest_report(dataset, models, weights=None):
+    """
+    Backtest à origines glissantes des modèles chargés (MAE, RMSE, MAPE, biais
+    par modèle et par horizon, latence mesurée). Plis en cache à côté des modèles,
+    rapport gardé en mémoire tant que données, modèles et poids sont inchangés.
+    Ligne de l'ensemble combinée avec les poids servis (moyenne simple sans poids).
+    Modèles réentraînés avant chaque pli (métriques hors échantillon) ; sans
+    modèle réentraînable, rapport marqué dans l'échantillon.
+    """
+    if not models or not dataset.get('data_file'):
+        return None
+    fingerprint = f"{get_dataset_fingerprint(dataset, 0)}-{'+'.join(sorted(models))}-{weights.digest if weights else ''}"
+    if fingerprint in _BACKTEST_REPORTS:
+        return _BACKTEST_REPORTS[fingerprint]
+    try:
+        paths = model_paths(dataset['folder'])
+        refit = FoldRefit(models, load_model_metadata(dataset['folder']).get('model_params'))
+        report = run_backtest(
+            dataset['data_file'], {name: paths[name] for name in models if name in paths},
+            cache_dir=os.path.join(dataset['folder'], BACKTEST_CACHE_DIR), fit_models=refit or None, weights=weights
+        )
+    except Exception as e:
+        print(f"⚠️ Backtest impossible pour {dataset.get('name')}: {e}")
+        report = None
+    _BACKTEST_REPORTS[fingerprint] = report
+    return report
+
+def get_forecast_explanation(dataset, models, daily, last_date, days):
+    """
+    Importance des features et contributions par jour de la prévision courante,
+    calculées une fois par instantané (dataset, version des modèles, date, horizon)
+    """
+    if daily is None or not models:
+        return None
+    try:
+        features = future_features(daily, last_date, days)
+        return explain_forecast(models, features, prefix=get_dataset_fingerprint(dataset, 0))
+    except Exception as e:
+        print(f"⚠️ Explication indisponible pour {dataset.get('name')}: {e}")
+        return None
+
+def get_ensemble_weights(dataset, backtest_report=None):
+    """
+    Poids appris de l'ensemble : métadonnées de la version entraînée
+    (training.py), sinon poids du produit enregistrés dans le dossier partagé ;
+    à défaut, appris sur les prévisions hors échantillon du backtest (modèles
+    réentraînés par pli) puis enregistrés. Jamais sur des prévisions dans
+    l'échantillon, qui favorisent le modèle le plus surajusté : moyenne simple.
+    """
+    stored = EnsembleWeights.from_dict(load_model_metadata(dataset['folder']).get('model_weights'))
+    if stored is not None:
+        return stored
+    # Empreinte marquée hors échantillon : les poids appris dans l'échantillon
+    # par les versions précédentes ne sont plus relus
+    fingerprint = f"{get_dataset_fingerprint(dataset, 0)}-hors-echantillon"
+    stored = load_weights(dataset['folder'], dataset['key'], fingerprint)
+    if (stored is not None or backtest_report is None or not backtest_report.out_of_sample
+            or len(backtest_report.predictions) < 2):
+        return stored
+    try:
+        weights = fit_ensemble_weights(
+            backtest_report.predictions, backtest_report.actuals, per_horizon=True, fingerprint=fingerprint
+        )
+        save_weights(dataset['folder'], dataset['key'], weights)
+        return weights
+    except Exception as e:
+        print(f"⚠️ Poids d'ensemble non appris pour {dataset.get('name')}: {e}")
+        return None
+
+# Prévisions de référence et segmentation de la demande de tous les produits,
+# par version des fichiers de données
+_BASELINE_FORECASTERS = {}
+_DEMAND_SEGMENTATIONS = {}
+
+def catalogue_fingerprint(datasets):
+    files = [(dataset['key'], dataset['data_file']) for dataset in datasets
+             if dataset.get('data_file') and os.path.exists(dataset['data_file'])]
+    return tuple((key, file_signature(path)) for key, path in files), files
+
+def load_catalogue_series(files):
+    """({clé: Sortie journalière}, {clé: dernier jour}) des fichiers lisibles"""
+    series, last_dates = {}, {}
+    for key, path in files:
+        try:
+            daily = load_daily_history(path)
+        except Exception as e:
+            print(f"⚠️ Historique illisible ({path}): {e}")
+            continue
+        series[key] = pd.to_numeric(daily['Sortie'], errors='coerce').to_numpy()
+        last_dates[key] = daily.index.max()
+    return series, last_dates
+
+def get_baseline_forecaster(datasets):
+    """
+    Prévisions de référence statistiques (baselines.py) ajustées sur la Sortie
+    de tous les produits à la fois, une fois par version des fichiers de données
+    """
+    fingerprint, files = catalogue_fingerprint(datasets)
+    if fingerprint in _BASELINE_FORECASTERS:
+        return _BASELINE_FORECASTERS[fingerprint]
+    series, last_dates = load_catalogue_series(files)
+    forecaster = fit_baselines(series, last_dates) if series else None
+    _BASELINE_FORECASTERS.clear()
+    _BASELINE_FORECASTERS[fingerprint] = forecaster
+    return forecaster
+
+def get_demand_segmentation(datasets):
+    """
+    Classe de demande ADI/CV² de chaque produit (demand_segmentation.py), une
+    fois par version des fichiers de données ; None sans historique lisible
+    """
+    fingerprint, files = catalogue_fingerprint(datasets)
+    if fingerprint in _DEMAND_SEGMENTATIONS:
+        return _DEMAND_SEGMENTATIONS[fingerprint]
+    series, _ = load_catalogue_series(files)
+    segmentation = segment_demand(series) if series else None
+    _DEMAND_SEGMENTATIONS.clear()
+    _DEMAND_SEGMENTATIONS[fingerprint] = segmentation
+    return segmentation
+
+# Réconciliation hiérarchique par version des données, méthode, horizon et prévisions servies
+_RECONCILIATIONS = {}
+
+def get_reconciliation(datasets, days, method=DEFAULT_RECONCILIATION):
+    """
+    Prévisions cohérentes famille → SKU → magasin (hierarchy.py) à partir des
+    prévisions servies de chaque produit (base de faits), sinon de référence
+    """
+    fingerprint, files = catalogue_fingerprint(datasets)
+    store = get_product_fact_store()
+    leaf_forecasts = {key: store.forecast(key)['predictions'] for key, _ in files if store.forecast(key)}
+    served = hashlib.sha1(json.dumps(leaf_forecasts, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    cache_key = (fingerprint, days, method, served)
+    if cache_key in _RECONCILIATIONS:
+        return _RECONCILIATIONS[cache_key]
+    try:
+        histories = {key: load_daily_history(path) for key, path in files}
+        reconciliation = reconcile_catalogue(histories, days, method, leaf_forecasts) if histories else None
+    except Exception as e:
+        print(f"⚠️ Réconciliation hiérarchique impossible : {e}")
+        reconciliation = None
+    _RECONCILIATIONS.clear()
+    _RECONCILIATIONS[cache_key] = reconciliation
+    return reconciliation
+
+def routed_to_baseline(segmentation, baseline, dataset_key):
+    """
+    Vrai si le produit est servi par les prévisions spécialisées (demande
+    intermittente ou sporadique) plutôt que par l'ensemble de modèles ;
+    routage désactivable depuis la barre latérale
+    """
+    return (st.session_state.get('route_intermittent_demand', True) and segmentation is not None
+            and baseline is not None and segmentation.routed(dataset_key))
+
+def make_real_predictions(models, data, last_date, days=30, intervals=None, weights=None, baseline=None,
+                          timings=None, latency_estimates=None):
+    """
+    Fait de vraies prédictions avec les modèles - EXACTEMENT COMME APP_SIMPLE
+
+    L'incertitude est la demi-largeur de l'intervalle conforme calibré par
+    horizon (`intervals`, ou fonction des modèles exécutés qui retourne les
+    intervalles calibrés pour eux) ; sans calibration, demi-largeur normale
+    au même niveau (INTERVAL_LEVEL) pour l'écart-type entre modèles.
+    Combinaison par les poids appris (`weights`), sinon moyenne simple.
+    Sans prédiction possible : prévisions de référence (`baseline`, baselines.BaselineSeries).
+
+    Avec `timings` (serving.ServingTimings) : durée de chaque niveau enregistrée,
+    et modèles exécutés par poids décroissant tant que leur latence estimée
+    (`latency_estimates`) tient dans le budget `timings.budget_ms`.
+    """
+    budget = LatencyBudget(timings.budget_ms if timings is not None else None)
+    timings = timings if timings is not None else ServingTimings()
     try:
         # Charger les noms de features
         feature_names = None
@@ -1679,13 +1879,14 @@ def make_real_predictions(models, data, last_date, days=30):
                 break
         
         if not feature_names:
-            # st.warning("⚠️ Noms de features non trouvés, utilisation de prédictions simples")
-            return create_simple_predictions(models, last_date, days)
+            # Mêmes 22 features que l'entraînement (voir metadonnees.joblib)
+            feature_names = FEATURE_NAMES
         
         # Créer les features
-        future_features = create_features_from_data(data, last_date, days)
+        with timings.measure('features'):
+            future_features = create_features_from_data(data, last_date, days)
         if not future_features:
-            return create_simple_predictions(models, last_date, days)
+            return create_simple_predictions(data, last_date, days, baseline)
         
         # Convertir en DataFrame
         features_df = pd.DataFrame(future_features)
@@ -1695,15 +1896,24 @@ def make_real_predictions(models, data, last_date, days=30):
             features_ordered = features_df[feature_names]
         except KeyError as e:
             st.warning(f"⚠️ Features manquantes: {e}")
-            return create_simple_predictions(models, last_date, days)
+            return create_simple_predictions(data, last_date, days, baseline)
         
         # Faire les prédictions avec chaque modèle
         all_predictions = []
         individual_predictions = {}
         
-        for model_name, model in models.items():
+        latency_estimates = latency_estimates or {}
+        for model_name in serving_order(models, weights):
+            # Modèles les moins pondérés écartés si leur latence dépasse le budget restant
+            if not budget.allows(latency_estimates.get(model_name), first=not individual_predictions):
+                timings.skipped.append(model_name)
+                continue
             try:
-                pred = model.predict(features_ordered)
+                # Évaluateur d'arbres compilé (vérifié contre predict au premier appel)
+                with timings.measure('modèle', model=model_name) as timer:
+                    pred = fast_predict(models[model_name], features_ordered)
+                if timings.scope is not None:
+                    record_latency(timings.scope, model_name, timer.elapsed_ms)
                 individual_predictions[model_name] = pred
                 all_predictions.append(pred)
                 st.info(f"✅ Prédictions {model_name}: {len(pred)} valeurs")
@@ -1711,56 +1921,62 @@ def make_real_predictions(models, data, last_date, days=30):
                 st.warning(f"⚠️ Erreur modèle {model_name}: {e}")
         
         if not all_predictions:
-            st.warning("⚠️ Aucune prédiction réussie, utilisation de prédictions simples")
-            return create_simple_predictions(models, last_date, days)
-        
-        # Moyenne des prédictions de tous les modèles
-        predictions = np.mean(all_predictions, axis=0)
-        
-        # Calculer l'incertitude (écart-type des prédictions)
-        if len(all_predictions) > 1:
-            uncertainties = np.std(all_predictions, axis=0)
+            st.warning("⚠️ Aucune prédiction réussie, utilisation des prévisions de référence")
+            return create_simple_predictions(data, last_date, days, baseline)
+        
+        # Combinaison pondérée (stacking, poids renormalisés sur les modèles exécutés)
+        # ou moyenne des prédictions de tous les modèles
+        with timings.measure('combinaison'):
+            if weights is not None:
+                predictions = weights.combine(individual_predictions)
+            else:
+                predictions = np.mean(all_predictions, axis=0)
+        if timings.skipped:
+            st.info(f"⏱️ Budget de latence : {', '.join(timings.skipped)} non exécuté(s)")
+        
+        # Incertitude calibrée : demi-largeur de l'intervalle conforme de chaque horizon,
+        # calibré pour les modèles exécutés
+        if callable(intervals):
+            intervals = intervals(list(individual_predictions))
+        if intervals is not None:
+            uncertainties = intervals.half_width(days)
+        elif len(all_predictions) > 1:
+            # Écart-type entre modèles converti en demi-largeur : les consommateurs
+            # (simulation de rupture, réapprovisionnement) en déduisent σ au niveau INTERVAL_LEVEL
+            uncertainties = half_width_from_sigma(np.std(all_predictions, axis=0), INTERVAL_LEVEL)
         else:
             uncertainties = np.abs(predictions) * 0.1  # 10% d'incertitude
         
         # S'assurer que les prédictions sont positives
         predictions = np.maximum(predictions, 0)
         
-        st.success(f"✅ Prédictions générées avec {len(models)} modèles")
+        st.success(f"✅ Prédictions générées avec {len(individual_predictions)} modèles")
         return predictions.tolist(), uncertainties.tolist(), individual_predictions
         
     except Exception as e:
         st.error(f"❌ Erreur prédictions: {e}")
-        return create_simple_predictions(models, last_date, days)
+        return create_simple_predictions(data, last_date, days, baseline)
 
-def create_simple_predictions(models, last_date, days=30):
-    """Crée des prédictions simples en fallback - EXACTEMENT COMME APP_SIMPLE"""
-    predictions = []
-    uncertainties = []
-    individual_predictions = {}
-    
-    # Valeurs de base
-    base_value = 70
-    trend = np.linspace(0, 10, days)
-    seasonal = np.sin(np.linspace(0, 4*np.pi, days)) * 5
-    noise = np.random.normal(0, 3, days)
-    
-    for i in range(days):
-        pred = base_value + trend[i] + seasonal[i] + noise[i]
-        pred = max(pred, 0)  # S'assurer que c'est positif
-        predictions.append(pred)
-        
-        # Incertitude basée sur la variabilité
-        uncertainty = abs(pred) * 0.15 + np.random.normal(0, 2)
-        uncertainties.append(max(uncertainty, 1))
-    
-    # Créer des prédictions individuelles simulées
-    for model_name in models.keys():
-        individual_noise = np.random.normal(0, 2, days)
-        individual_pred = [max(p + individual_noise[i], 0) for i, p in enumerate(predictions)]
-        individual_predictions[model_name] = individual_pred
-    
-    return predictions, uncertainties, individual_predictions
+def create_simple_predictions(data, last_date, days=30, baseline=None):
+    """
+    Prévisions de référence déterministes en fallback (baselines.py) : naïf
+    saisonnier, lissage exponentiel, Croston ou TSB selon le produit.
+
+    Prévisions précalculées du produit (`baseline`) si son historique s'arrête
+    à `last_date`, sinon ajustement sur la Sortie de `data` jusqu'à `last_date`.
+    Les prévisions individuelles sont celles des méthodes de référence.
+    """
+    if baseline is not None and baseline.last_date == last_date:
+        return baseline.forecast(days)
+    
+    values = []
+    if data is not None and hasattr(data, 'columns') and 'Sortie' in data.columns:
+        history = data[data.index <= last_date] if isinstance(data.index, pd.DatetimeIndex) else data
+        values = pd.to_numeric(history['Sortie'], errors='coerce').to_numpy()
+    if not len(values):
+        st.warning("⚠️ Aucun historique de Sortie : prévisions nulles")
+        return [0.0] * days, [0.0] * days, {}
+    return baseline_predictions(values, days)
 
 def analyze_stock_status(predictions, uncertainties, current_stock=None):
     """Analyse le statut du stock basé sur les prédictions et l'incertitude"""
@@ -1824,7 +2040,6 @@ def create_dashboard_metrics(predictions, uncertainties, historical_data=None, p
     
     # Calculer les métriques de gestion de stock sur la période
     total_consumption = np.sum(period_predictions)  # Consommation totale sur la période
-    total_uncertainty = np.sum(period_uncertainties)  # Incertitude totale
     avg_daily_consumption = np.mean(period_predictions)  # Consommation moyenne journalière
     max_daily_consumption = np.max(period_predictions)  # Consommation maximale journalière
     min_daily_consumption = np.min(period_predictions)  # Consommation minimale journalière
@@ -1844,10 +2059,22 @@ def create_dashboard_metrics(predictions, uncertainties, historical_data=None, p
     consistency_factor = 1 - (np.std(period_uncertainties) / np.mean(period_uncertainties)) if np.mean(period_uncertainties) > 0 else 0
     confidence_score = max(0, min(100, (1 - uncertainty_factor) * 100 * consistency_factor))
     
-    # Prédiction de rupture de stock (en jours)
+    # Prédiction de rupture de stock (en jours) : trajectoires Monte Carlo de la demande
+    # (incertitudes = demi-largeurs des intervalles de prévision)
     days_to_rupture = None
+    stockout = None
     if current_stock is not None and avg_daily_consumption > 0:
-        days_to_rupture = current_stock / avg_daily_consumption
+        horizon = min(len(predictions), len(uncertainties))
+        stockout = simulate_product_stockout(
+            current_stock, predictions[:horizon], sigma_from_half_width(uncertainties[:horizon], INTERVAL_LEVEL)
+        )
+        days_to_rupture = stockout['days_to_stockout'][0.5]
+        if not np.isfinite(days_to_rupture):
+            # Rupture médiane au-delà de l'horizon simulé : extrapolation au rythme moyen
+            days_to_rupture = max(horizon, current_stock / avg_daily_consumption)
+    
+    def finite_or_none(value):
+        return float(value) if value is not None and np.isfinite(value) else None
     
     # Calculer la volatilité (écart-type des prédictions)
     volatility = np.std(period_predictions)
@@ -1872,7 +2099,13 @@ def create_dashboard_metrics(predictions, uncertainties, historical_data=None, p
     
     # Calculer les besoins de réapprovisionnement
     min_required_stock = stock_prediction_min  # Stock minimum = somme des minima
-    recommended_stock = total_consumption + (total_uncertainty * 0.5)  # Stock recommandé avec marge modérée
+    # Stock recommandé : demande de la période au niveau de service par défaut (voir replenishment.py)
+    period_demand, period_sigma = horizon_demand(
+        np.atleast_2d(period_predictions),
+        np.atleast_2d(sigma_from_half_width(period_uncertainties, INTERVAL_LEVEL)),
+        [len(period_predictions)]
+    )
+    recommended_stock = float(period_demand[0] + service_level_z(DEFAULT_SERVICE_LEVEL)[0] * period_sigma[0])
     
     # Analyser le statut du stock
     if current_stock is not None:
@@ -1933,6 +2166,13 @@ def create_dashboard_metrics(predictions, uncertainties, historical_data=None, p
             'stability_index': stability_index,
             'coefficient_variation': cv,
             'days_to_rupture': days_to_rupture,
+            'days_to_rupture_p10': finite_or_none(stockout['days_to_stockout'][0.1]) if stockout else None,
+            'days_to_rupture_p90': finite_or_none(stockout['days_to_stockout'][0.9]) if stockout else None,
+            'stockout_probability': stockout['stockout_probability'].tolist() if stockout else None,
+            'stockout_probability_period': (
+                float(stockout['stockout_probability'][min(period, len(stockout['stockout_probability'])) - 1])
+                if stockout else None
+            ),
             'volatility': volatility,
             'stock_efficiency': stock_efficiency,
             'avg_daily_consumption': avg_daily_consumption,
@@ -1944,6 +2184,68 @@ def create_dashboard_metrics(predictions, uncertainties, historical_data=None, p
         }
     }
 
+# =============================================================================
+# 🛒 PROPOSITION DE COMMANDES (TOUS LES PRODUITS)
+# =============================================================================
+
+def get_replenishment_products():
+    """Produits de la base de faits dont le stock actuel et les prévisions sont connus"""
+    store = get_product_fact_store()
+    products = []
+    for key, facts in store.products().items():
+        forecast = store.forecast(key)
+        if forecast is None or facts.get('stock_actuel') is None:
+            continue
+        products.append({
+            'key': key,
+            'name': facts.get('nom_complet', key),
+            'stock': facts['stock_actuel'],
+            'predictions': forecast['predictions'],
+            'sigmas': sigma_from_half_width(forecast['uncertainties'], INTERVAL_LEVEL)
+        })
+    return products
+
+def render_purchase_order_proposal():
+    """Tableau des commandes proposées, calculé en un appel pour tout le catalogue"""
+    st.markdown("### 🛒 Proposition de Commandes (tous les produits)")
+    products = get_replenishment_products()
+    if not products:
+        st.info("ℹ️ Aucun produit avec stock et prévisions connus pour le moment.")
+        return
+    
+    # Paramètres d'approvisionnement par produit (délai, niveau de service, MOQ, colisage)
+    keys = [product['key'] for product in products]
+    parameters = st.session_state.get('replenishment_parameters')
+    parameters = default_parameters(keys) if parameters is None else parameters.reindex(keys).fillna(default_parameters(keys))
+    with st.expander("⚙️ Paramètres d'approvisionnement", expanded=False):
+        parameters = st.data_editor(
+            parameters,
+            column_config={
+                'delai_livraison': st.column_config.NumberColumn("Délai (j)", min_value=0, max_value=120, step=1),
+                'periode_revision': st.column_config.NumberColumn("Révision (j)", min_value=1, max_value=60, step=1),
+                'niveau_service': st.column_config.NumberColumn("Niveau de service", min_value=0.5, max_value=0.999, step=0.01),
+                'moq': st.column_config.NumberColumn("MOQ", min_value=0, step=1),
+                'colisage': st.column_config.NumberColumn("Colisage", min_value=1, step=1)
+            },
+            use_container_width=True,
+            key="replenishment_parameters_editor"
+        )
+    st.session_state.replenishment_parameters = parameters
+    
+    table = purchase_order_table(products, parameters)
+    to_order = table[table['À commander'] == 'Oui']
+    st.caption(
+        f"{len(to_order)} produit(s) à commander sur {len(table)} • "
+        f"{to_order['Quantité'].sum():.0f} unités au total"
+    )
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    st.download_button(
+        label="📥 Télécharger la proposition de commandes (CSV)",
+        data=table.to_csv(index=False),
+        file_name=f"commandes_{datetime.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv"
+    )
+
 # =============================================================================
 # 📈 FONCTIONS DE VISUALISATION ET GRAPHIQUES
 # =============================================================================
@@ -2047,6 +2349,28 @@ def create_distribution_chart(predictions, uncertainties):
     
     return fig
 
+def create_baseline_preview_chart(daily_history, predictions, uncertainties, last_date, history_days=90):
+    """Aperçu immédiat : derniers jours de Sortie et prévision de référence avec sa bande"""
+    recent = daily_history[daily_history.index > last_date - timedelta(days=history_days)]
+    dates = [last_date + timedelta(days=i + 1) for i in range(len(predictions))]
+    upper = [p + u for p, u in zip(predictions, uncertainties)]
+    lower = [max(0, p - u) for p, u in zip(predictions, uncertainties)]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=recent.index, y=recent['Sortie'], name="Historique", line=dict(color='#6b7280')))
+    fig.add_trace(go.Scatter(
+        x=dates + dates[::-1], y=upper + lower[::-1], fill='toself', fillcolor='rgba(59,130,246,0.15)',
+        line=dict(color='rgba(0,0,0,0)'), name="Incertitude"
+    ))
+    fig.add_trace(go.Scatter(x=dates, y=predictions, name="Référence", line=dict(color='#3b82f6', dash='dash')))
+    fig.update_layout(
+        title="⚡ Prévision de Référence (aperçu)",
+        height=350,
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    
+    return fig
+
 # =============================================================================
 # 🚨 SYSTÈME D'ALERTES ET NOTIFICATIONS
 # =============================================================================
@@ -2111,7 +2435,7 @@ def create_alert_system(dashboard_data):
 # 📊 FONCTIONS DE CRÉATION DE GRAPHIQUES AVANCÉS
 # =============================================================================
 
-def create_advanced_charts(predictions, uncertainties, prediction_dates, historical_data=None, individual_predictions=None):
+def create_advanced_charts(predictions, uncertainties, prediction_dates, historical_data=None, individual_predictions=None, backtest_report=None, explanation=None, ensemble_weights=None):
     """Crée des graphiques avancés avec TOUTES les fonctionnalités"""
     charts = {}
     
@@ -2180,41 +2504,36 @@ def create_advanced_charts(predictions, uncertainties, prediction_dates, histori
         
         charts['models'] = fig_models
     
-    # 3. Graphique d'évaluation des modèles
-    fig_eval = go.Figure()
-    
-    models = ['Random Forest', 'XGBoost', 'LightGBM', 'Gradient Boosting', 'Extra Trees']
-    metrics = ['R²', 'MAE', 'RMSE', 'Temps (ms)']
-    
-    # Données simulées pour l'évaluation
-    data = {
-        'Random Forest': [0.92, 8.5, 12.3, 45],
-        'XGBoost': [0.94, 7.2, 10.8, 38],
-        'LightGBM': [0.93, 7.8, 11.2, 25],
-        'Gradient Boosting': [0.91, 9.1, 13.1, 52],
-        'Extra Trees': [0.90, 9.8, 14.2, 42]
-    }
-    
-    for i, metric in enumerate(metrics):
-        values = [data[model][i] for model in models]
-        fig_eval.add_trace(go.Bar(
-            name=metric,
-            x=models,
-            y=values,
-            text=[f'{v:.2f}' if i < 3 else f'{v}ms' for v in values],
-            textposition='auto'
-        ))
-    
-    fig_eval.update_layout(
-        title="📈 Évaluation des Modèles",
-        xaxis_title="Modèles",
-        yaxis_title="Score",
-        barmode='group',
-        template='plotly_white',
-        height=400
-    )
-    
-    charts['evaluation'] = fig_eval
+    # 3. Graphique d'évaluation des modèles (backtest à origines glissantes)
+    if backtest_report is not None:
+        fig_eval = go.Figure()
+        
+        summary = backtest_report.summary
+        models = [MODEL_DISPLAY_NAMES.get(name, name) for name in summary.index]
+        metrics = [('r2', 'R²'), ('mae', 'MAE'), ('rmse', 'RMSE'), ('latency_ms', 'Temps (ms)')]
+        
+        for column, metric in metrics:
+            if column not in summary.columns:
+                continue
+            values = summary[column].astype(float).tolist()
+            fig_eval.add_trace(go.Bar(
+                name=metric,
+                x=models,
+                y=values,
+                text=[f'{v:.2f}' if column != 'latency_ms' else f'{v:.1f}ms' for v in values],
+                textposition='auto'
+            ))
+        
+        fig_eval.update_layout(
+            title=f"📈 Évaluation des Modèles (backtest, {backtest_report.n_origins} origines)",
+            xaxis_title="Modèles",
+            yaxis_title="Score",
+            barmode='group',
+            template='plotly_white',
+            height=400
+        )
+        
+        charts['evaluation'] = fig_eval
     
     # 4. Matrice de corrélation
     if historical_data is not None and len(historical_data) > 0:
@@ -2242,35 +2561,51 @@ def create_advanced_charts(predictions, uncertainties, prediction_dates, histori
             
             charts['correlation'] = fig_corr
     
-    # 5. Importance des features
-    features = [
-        'Sortie_lag_1', 'Sortie_ma_7', 'Stock', 'month', 'weekday',
-        'Sortie_lag_7', 'Entrée', 'quarter', 'Sortie_ma_14', 'net_flow',
-        'stock_velocity', 'Sortie_std_7', 'month_sin', 'weekday_sin',
-        'Sortie_lag_14', 'entree_to_sortie_ratio', 'Sortie_ma_30',
-        'Sortie_std_14', 'month_cos', 'weekday_cos', 'Sortie_std_30',
-        'is_weekend'
-    ]
-    
-    importance = np.random.exponential(0.1, len(features))
-    importance = np.sort(importance)[::-1]  # Trier par ordre décroissant
-    
-    fig_importance = go.Figure(go.Bar(
-        x=importance,
-        y=features,
-        orientation='h',
-        marker_color='#667eea'
-    ))
-    
-    fig_importance.update_layout(
-        title="🎯 Importance des Features",
-        xaxis_title="Importance",
-        yaxis_title="Features",
-        template='plotly_white',
-        height=600
-    )
-    
-    charts['importance'] = fig_importance
+    # 5. Importance des features (modèles chargés) et contributions par jour
+    if explanation is not None and explanation.models:
+        importance = explanation.global_importance
+        
+        fig_importance = go.Figure(go.Bar(
+            x=importance.values,
+            y=importance.index,
+            orientation='h',
+            marker_color='#667eea'
+        ))
+        
+        fig_importance.update_layout(
+            title=f"🎯 Importance des Features ({', '.join(MODEL_DISPLAY_NAMES.get(name, name) for name in explanation.models)})",
+            xaxis_title="Importance (normalisée)",
+            yaxis_title="Features",
+            yaxis=dict(autorange='reversed'),
+            template='plotly_white',
+            height=600
+        )
+        
+        charts['importance'] = fig_importance
+        
+        # Contributions de l'ensemble par jour : principales features, le reste regroupé
+        contributions = explanation.ensemble_contributions(ensemble_weights)
+        top_features = list(explanation.forecast_importance(ensemble_weights).index[:CONTRIBUTION_TOP_FEATURES])
+        other_features = [name for name in explanation.feature_names if name not in top_features]
+        
+        fig_contributions = go.Figure()
+        for feature in top_features:
+            fig_contributions.add_trace(go.Bar(x=prediction_dates, y=contributions[feature], name=feature))
+        if other_features:
+            fig_contributions.add_trace(go.Bar(
+                x=prediction_dates, y=contributions[other_features].sum(axis=1), name='Autres', marker_color='#cccccc'
+            ))
+        
+        fig_contributions.update_layout(
+            title=f"🧩 Contributions par Jour (base {contributions[BASE_VALUE_NAME].iloc[0]:.1f} + contributions = prévision)",
+            xaxis_title="Date",
+            yaxis_title="Contribution à la prévision",
+            barmode='relative',
+            template='plotly_white',
+            height=500
+        )
+        
+        charts['contributions'] = fig_contributions
     
     # 6. NOUVEAUX GRAPHIQUES AVANCÉS
     
@@ -2643,12 +2978,70 @@ def main():
     # Paramètres
     st.sidebar.subheader("⚙️ Paramètres")
     prediction_days = st.sidebar.slider("📅 Jours de prédiction", 7, 90, 30)
+    # Budget de latence de l'ensemble : les modèles les moins pondérés sont écartés au-delà
+    latency_budget = st.sidebar.number_input(
+        "⏱️ Budget de latence de l'ensemble (ms, 0 = illimité)",
+        min_value=0,
+        max_value=10000,
+        value=int(default_budget_ms() or 0),
+        step=50
+    )
+    serving_timings = ServingTimings(latency_budget or None, dataset_key)
+    # Demande intermittente ou sporadique (ADI/CV²) : prévisions spécialisées au lieu de l'ensemble
+    st.sidebar.checkbox(
+        "📉 Demande intermittente : prévisions spécialisées",
+        value=True,
+        key='route_intermittent_demand',
+        help="Croston, TSB ou lissage exponentiel pour les produits à demande intermittente, sans exécuter l'ensemble"
+    )
     
     # Sélecteur de période pour le tableau de bord
     
     # Charger les données historiques
     with st.spinner("🔄 Chargement des données..."):
         historical_data, last_date, date_col = load_historical_data(dataset_key)
+        
+        # Série journalière du dataset : base des prévisions
+        daily_history = None
+        try:
+            if selected_dataset.get('data_file'):
+                daily_history = load_daily_history(selected_dataset['data_file'])
+                if len(daily_history):
+                    last_date = daily_history.index.max()
+        except Exception as e:
+            st.warning(f"⚠️ Série journalière indisponible: {e}")
+    
+    # Niveau 1 : prévision de référence affichée tout de suite, remplacée par
+    # celle de l'ensemble quand modèles, backtest et prédictions sont prêts
+    # Demande intermittente (routage) : cette prévision est la prévision servie
+    preview = st.empty()
+    baseline_view = None
+    demand_segmentation = None
+    routed = False
+    if daily_history is not None and len(daily_history):
+        with serving_timings.measure('segmentation'):
+            demand_segmentation = get_demand_segmentation(datasets)
+        with serving_timings.measure('référence'):
+            baseline_forecaster = get_baseline_forecaster(datasets)
+            baseline_view = baseline_forecaster.view(dataset_key) if baseline_forecaster else None
+            routed = routed_to_baseline(demand_segmentation, baseline_view, dataset_key) and baseline_view.last_date == last_date
+            if routed:
+                # Demande intermittente : estimateurs spécialisés seulement (Croston SBA, TSB)
+                baseline_view = baseline_forecaster.view(dataset_key, INTERMITTENT_METHODS)
+            baseline_forecast = create_simple_predictions(daily_history, last_date, prediction_days, baseline_view)
+        if routed:
+            demand = demand_segmentation.describe(dataset_key)
+            st.sidebar.info(
+                f"📉 **Demande {DEMAND_CLASS_LABELS[demand['classe']]}** (ADI {demand['adi']:.2f}, CV² {demand['cv2']:.2f}) : "
+                f"{MODEL_DISPLAY_NAMES.get(baseline_view.method, baseline_view.method)}, sans l'ensemble"
+            )
+        else:
+            preview_predictions, preview_uncertainties, _ = baseline_forecast
+            with preview.container():
+                st.info("⚡ Prévision de référence statistique : remplacée par celle de l'ensemble dès qu'elle est prête")
+                st.plotly_chart(create_baseline_preview_chart(
+                    daily_history, preview_predictions, preview_uncertainties, last_date
+                ), use_container_width=True)
     
     # Mettre à jour les informations de configuration après chargement
     st.sidebar.subheader("📋 Informations de Configuration")
@@ -2664,13 +3057,20 @@ def main():
     else:
         st.sidebar.warning("⚠️ **Features:** Prédictions simples")
     
-    # Charger les modèles
-    with st.spinner("🤖 Chargement des modèles..."):
-        models = load_models(model_folder)
-    
-    if not models:
-        st.error("❌ Aucun modèle trouvé")
-        return
+    # Charger les modèles (ceux de poids nul dans l'ensemble ne sont pas chargés) ;
+    # produit routé vers les prévisions spécialisées : ni modèles, ni poids, ni backtest
+    models = {}
+    ensemble_weights = None
+    if not routed:
+        with st.spinner("🤖 Chargement des modèles..."):
+            ensemble_weights = get_ensemble_weights(selected_dataset)
+            models = load_models(model_folder, ensemble_weights.members if ensemble_weights is not None else None)
+    
+    if not models and not routed:
+        if daily_history is None:
+            st.error("❌ Aucun modèle trouvé")
+            return
+        st.warning("⚠️ Aucun modèle chargé : prévisions de référence statistiques (naïf saisonnier, lissage exponentiel, Croston, TSB)")
     
     # st.success(f"✅ {len(models)} modèles chargés avec succès!")
     
@@ -2705,24 +3105,70 @@ def main():
         except:
             pass
     
-    # Générer les prédictions
-    with st.spinner("🔮 Génération des prédictions..."):
-        predictions, uncertainties, individual_predictions = make_real_predictions(models, historical_data, last_date, prediction_days)
+    # Évaluation réelle des modèles sur l'historique (et poids de l'ensemble s'ils manquent)
+    backtest_report = None
+    if not routed:
+        with st.spinner("🧪 Backtest des modèles..."):
+            backtest_report = get_backtest_report(selected_dataset, models, ensemble_weights)
+            if ensemble_weights is None:
+                ensemble_weights = get_ensemble_weights(selected_dataset, backtest_report)
+                if ensemble_weights is not None:
+                    # Plis en cache : seule la ligne de l'ensemble est recombinée avec les poids appris
+                    backtest_report = get_backtest_report(selected_dataset, models, ensemble_weights)
+    
+    # Générer les prédictions (niveau 2 : ensemble sous budget de latence,
+    # sauf demande intermittente servie par les prévisions spécialisées)
+    if routed:
+        predictions, uncertainties, individual_predictions = baseline_forecast
+    else:
+        with st.spinner("🔮 Génération des prédictions..."):
+            latency_estimates = member_estimates(
+                dataset_key, models, backtest_report.summary if backtest_report is not None else None
+            )
+            with serving_timings.measure('ensemble'):
+                predictions, uncertainties, individual_predictions = make_real_predictions(
+                    models, daily_history if daily_history is not None else historical_data, last_date, prediction_days,
+                    intervals=lambda executed: get_forecast_intervals(
+                        selected_dataset, models, ensemble_weights, members=executed
+                    ),
+                    weights=ensemble_weights, baseline=baseline_view,
+                    timings=serving_timings, latency_estimates=latency_estimates
+                )
+    preview.empty()
+    st.session_state.serving_timings = serving_timings
+    
+    # Importance et contributions des features de la prévision (modèles d'arbres
+    # seulement), pour les modèles exécutés dans le budget de latence
+    forecast_explanation = None
+    if not routed:
+        executed_models = {name: models[name] for name in individual_predictions if name in models}
+        with st.spinner("🎯 Explication des prédictions..."):
+            forecast_explanation = get_forecast_explanation(
+                selected_dataset, executed_models, daily_history, last_date, prediction_days
+            )
     
     # Créer les dates de prédiction
     prediction_dates = [last_date + timedelta(days=i+1) for i in range(prediction_days)]
     
     # Créer les métriques du tableau de bord (sera recalculé dans l'onglet Tableau de Bord)
-    dashboard_data = create_dashboard_metrics(predictions, uncertainties, historical_data, 30)  # Valeur par défaut
+    dashboard_data = create_dashboard_metrics(
+        predictions, uncertainties, daily_history if daily_history is not None else historical_data, 30
+    )  # Valeur par défaut
     
     # Stocker les données pour le chatbot
     st.session_state.predictions_data = {
         'predictions': predictions,
         'uncertainties': uncertainties,
         'period': f'{prediction_days} jours',
-        'models_count': len(models)
+        'models_count': len(models),
+        'dataset_key': dataset_key,
+        'dataset_name': selected_name,
+        'snapshot_version': compute_forecast_snapshot_version(dataset_key, predictions, uncertainties)
     }
     
+    # Mettre à jour la base de faits produits du chatbot (incrémental par produit)
+    refresh_product_fact_store(datasets, selected_dataset, models, predictions, uncertainties)
+    
     # Créer les métriques du dashboard pour le chatbot
     if predictions and uncertainties:
         total_consumption = sum(predictions)
@@ -2732,7 +3178,10 @@ def main():
         stock_min = total_consumption - avg_uncertainty
         cv = (np.std(predictions) / np.mean(predictions)) * 100 if np.mean(predictions) > 0 else 0
         confidence = max(0, min(1, 1 - (avg_uncertainty / avg_daily_consumption))) if avg_daily_consumption > 0 else 0
-        days_to_rupture = 30 / (avg_daily_consumption / 30) if avg_daily_consumption > 0 else 0
+        # Jours avant rupture simulés à partir du stock actuel (0 si le stock est inconnu)
+        days_to_rupture = dashboard_data['details']['days_to_rupture'] if dashboard_data else None
+        if days_to_rupture is None:
+            days_to_rupture = 0
         volatility = np.std(predictions)
         stock_efficiency = confidence * (1 - cv/100)
         
@@ -3090,7 +3539,9 @@ def main():
             st.info(f"📈 Analyse sur {dashboard_period} jours")
         
         # Recalculer les métriques avec la période sélectionnée
-        dashboard_data = create_dashboard_metrics(predictions, uncertainties, historical_data, dashboard_period)
+        dashboard_data = create_dashboard_metrics(
+            predictions, uncertainties, daily_history if daily_history is not None else historical_data, dashboard_period
+        )
         
         # Afficher le tableau de bord principal
         if dashboard_data:
@@ -3135,6 +3586,11 @@ def main():
                 html_content += f'<div style="font-size: 1.5rem; font-weight: bold; color: #ef4444;">{dashboard_data["details"]["days_to_rupture"]:.1f}</div>'
                 html_content += f'<div style="color: #64748b; font-size: 0.9rem;">Jours avant rupture</div></div>'
             
+            if dashboard_data["details"].get("stockout_probability_period") is not None:
+                html_content += f'<div style="text-align: center; padding: 15px; background: rgba(239, 68, 68, 0.1); border-radius: 10px;">'
+                html_content += f'<div style="font-size: 1.5rem; font-weight: bold; color: #ef4444;">{dashboard_data["details"]["stockout_probability_period"] * 100:.0f}%</div>'
+                html_content += f'<div style="color: #64748b; font-size: 0.9rem;">Risque rupture ({dashboard_data["details"]["period"]} j)</div></div>'
+            
             html_content += f'<div style="text-align: center; padding: 15px; background: rgba(14, 165, 233, 0.1); border-radius: 10px;">'
             html_content += f'<div style="font-size: 1.5rem; font-weight: bold; color: #0ea5e9;">{dashboard_data["details"]["volatility"]:.1f}</div>'
             html_content += f'<div style="color: #64748b; font-size: 0.9rem;">Volatilité</div></div>'
@@ -3215,6 +3671,9 @@ def main():
                     ), use_container_width=True)
                     st.markdown('</div>', unsafe_allow_html=True)
         
+        # PROPOSITION DE COMMANDES POUR TOUS LES PRODUITS
+        render_purchase_order_proposal()
+        
         st.markdown('</div>', unsafe_allow_html=True)
     
     with tab2:
@@ -3252,7 +3711,10 @@ def main():
         
         
         # Graphiques avancés
-        charts = create_advanced_charts(predictions, uncertainties, prediction_dates, historical_data, individual_predictions)
+        charts = create_advanced_charts(
+            predictions, uncertainties, prediction_dates, historical_data, individual_predictions,
+            backtest_report, forecast_explanation, ensemble_weights
+        )
         
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.plotly_chart(charts['main'], use_container_width=True)
@@ -3286,6 +3748,29 @@ def main():
             mime="text/csv"
         )
         
+        # COHÉRENCE HIÉRARCHIQUE (famille → SKU → magasin)
+        st.subheader("🧩 Prévisions Réconciliées par Famille")
+        reconciliation_method = st.selectbox(
+            "Méthode de réconciliation",
+            RECONCILIATION_METHODS,
+            index=RECONCILIATION_METHODS.index(DEFAULT_RECONCILIATION),
+            format_func=lambda method: {'bottom_up': 'Ascendante (bottom-up)', 'top_down': 'Descendante (top-down, familles)',
+                                        'mint': 'Trace minimale (MinT)'}[method]
+        )
+        reconciliation = get_reconciliation(datasets, prediction_days, reconciliation_method)
+        if reconciliation is not None:
+            reconciliation_df = reconciliation.table().round(1).rename(columns={
+                'niveau': 'Niveau', 'base': f'Base ({prediction_days} j)', 'reconcilie': f'Réconciliée ({prediction_days} j)'
+            })
+            st.dataframe(reconciliation_df, use_container_width=True)
+            st.caption(
+                f"Prévisions à partir du {reconciliation.start.strftime('%d/%m/%Y')} • écart max. entre un nœud et la somme "
+                f"de ses produits : {reconciliation.incoherence():.1f} avant, {reconciliation.incoherence(reconciliation.reconciled):.1f} "
+                f"après réconciliation • {reconciliation.elapsed * 1000:.0f} ms"
+                + (" • MinT : covariance structurelle (erreurs des prévisions servies inconnues)"
+                   if reconciliation.covariance == 'structurelle' else "")
+            )
+        
         st.markdown('</div>', unsafe_allow_html=True)
     
     with tab3:
@@ -3605,76 +4090,151 @@ def main():
                     delta="Variabilité des prédictions"
                 )
         
-        # ANALYSE DES MODÈLES INDIVIDUELS
-        if individual_predictions and len(individual_predictions) > 1:
-            st.markdown("### 📈 Performance des Modèles Individuels")
+        # Poids appris de l'ensemble (stacking sur les prévisions hors échantillon)
+        if ensemble_weights is not None:
+            st.markdown("#### ⚖️ Poids de l'Ensemble")
+            weights_df = pd.DataFrame({
+                'Modèle': [MODEL_DISPLAY_NAMES.get(name, name) for name in ensemble_weights.members],
+                'Poids': [round(value, 3) for value in ensemble_weights.weights.values()]
+            })
+            st.dataframe(weights_df, hide_index=True, use_container_width=True)
+            caption = f"Appris sur {ensemble_weights.n_rows} prévisions hors échantillon"
+            if ensemble_weights.horizon_weights is not None:
+                caption += " • poids ajustés par pas d'horizon"
+            if ensemble_weights.pruned:
+                caption += f" • modèles écartés (poids ~0, non chargés) : {', '.join(ensemble_weights.pruned)}"
+            st.caption(caption)
+        
+        # PERFORMANCE RÉELLE DES MODÈLES (BACKTEST À ORIGINES GLISSANTES)
+        if backtest_report is not None:
+            st.markdown("### 📈 Performance des Modèles Individuels (backtest)")
+            st.caption(
+                f"{backtest_report.n_folds} plis • {backtest_report.n_origins} origines de prévision • "
+                f"horizon {backtest_report.horizon} jours • calculé en {backtest_report.elapsed:.2f} s "
+                f"({backtest_report.cached_folds} plis en cache) • "
+                + ("hors échantillon (modèles réentraînés avant chaque pli)" if backtest_report.out_of_sample
+                   else "⚠️ dans l'échantillon : modèles évalués sur leur propre historique d'entraînement, métriques optimistes")
+            )
             
-            # Calculer les métriques pour chaque modèle
-            model_metrics = {}
-            for model_name, pred in individual_predictions.items():
-                if model_name != 'Fallback':
-                    model_metrics[model_name] = {
-                        'Moyenne': np.mean(pred),
-                        'Écart-type': np.std(pred),
-                        'Min': np.min(pred),
-                        'Max': np.max(pred),
-                        'CV': (np.std(pred) / np.mean(pred)) * 100 if np.mean(pred) > 0 else 0
-                    }
+            metrics_df = backtest_report.summary.rename(index=MODEL_DISPLAY_NAMES, columns={
+                'mae': 'MAE', 'rmse': 'RMSE', 'mape': 'MAPE (%)', 'bias': 'Biais', 'r2': 'R²',
+                'n': 'Prévisions', 'latency_ms': 'Latence (ms)'
+            })
+            st.dataframe(metrics_df.round(2), use_container_width=True)
             
-            # Afficher le tableau des métriques
-            if model_metrics:
-                metrics_df = pd.DataFrame(model_metrics).T
-                metrics_df = metrics_df.round(2)
-                st.dataframe(metrics_df, use_container_width=True)
-                
-                # Graphique de comparaison des performances
-                fig_performance = go.Figure()
-                
-                model_names = list(model_metrics.keys())
-                metrics = ['Moyenne', 'Écart-type', 'Min', 'Max']
-                
-                for i, metric in enumerate(metrics):
-                    values = [model_metrics[model][metric] for model in model_names]
-                    fig_performance.add_trace(go.Bar(
-                        name=metric,
-                        x=model_names,
-                        y=values,
-                        text=[f'{v:.2f}' for v in values],
-                        textposition='auto'
-                    ))
-                
-                fig_performance.update_layout(
-                    title="📊 Comparaison des Performances des Modèles",
-                    xaxis_title="Modèles",
-                    yaxis_title="Valeur",
-                    barmode='group',
-                    template='plotly_white',
-                    height=500
-                )
-                
-                st.plotly_chart(fig_performance, use_container_width=True)
+            # Erreur par pas d'horizon
+            mae_by_horizon = backtest_report.horizon_table('mae')
+            fig_performance = go.Figure()
+            for model_name in mae_by_horizon.columns:
+                fig_performance.add_trace(go.Scatter(
+                    x=mae_by_horizon.index,
+                    y=mae_by_horizon[model_name],
+                    mode='lines+markers',
+                    name=MODEL_DISPLAY_NAMES.get(model_name, model_name)
+                ))
+            
+            fig_performance.update_layout(
+                title="📊 MAE par Horizon de Prévision (backtest)",
+                xaxis_title="Horizon (jours)",
+                yaxis_title="MAE",
+                template='plotly_white',
+                height=500
+            )
+            
+            st.plotly_chart(fig_performance, use_container_width=True)
+        else:
+            st.info("ℹ️ Backtest indisponible pour ce dataset (historique trop court ou modèles non évaluables).")
         
         # DÉTAILS TECHNIQUES DES MODÈLES
         st.markdown("### 🔍 Détails Techniques des Modèles")
+        tuning_records = load_model_metadata(selected_dataset['folder']).get('tuning', {})
+        manifest_entries = (read_manifest(selected_dataset['folder']) or {}).get('models', {})
         
         for name, model in models.items():
             with st.expander(f"🔍 {name.upper()}"):
                 st.write(f"**Type:** {type(model).__name__}")
                 if hasattr(model, 'n_features_in_'):
                     st.write(f"**Features:** {model.n_features_in_}")
+                if hasattr(model, 'n_trees'):
+                    st.write(f"**Arbres:** {model.n_trees} ({model.n_nodes} nœuds, profondeur {model.depth})")
+                
+                # Compaction des arbres (compaction.py) : avant / après sur les plis du backtest
+                compaction = manifest_entries.get(name, {}).get('compaction')
+                if compaction:
+                    before, after = compaction['before'], compaction['after']
+                    st.write(f"**Compaction** (tolérance {compaction['tolerance']:.0%}) : "
+                             f"{before['trees']} → {after['trees']} arbres, {before['nodes']} → {after['nodes']} nœuds, "
+                             f"latence {before['latency_ms']:.2f} → {after['latency_ms']:.2f} ms, "
+                             f"MAE {before['mae']:.2f} → {after['mae']:.2f}")
                 if hasattr(model, 'get_params'):
                     params = model.get_params()
                     st.write(f"**Paramètres principaux:**")
                     for key, value in list(params.items())[:5]:  # Afficher les 5 premiers paramètres
                         st.write(f"  - {key}: {value}")
                 
-                # Performance du modèle si disponible
-                if individual_predictions and name in individual_predictions:
-                    pred = individual_predictions[name]
-                    st.write(f"**Performance:**")
-                    st.write(f"  - Moyenne: {np.mean(pred):.2f}")
-                    st.write(f"  - Écart-type: {np.std(pred):.2f}")
-                    st.write(f"  - CV: {(np.std(pred) / np.mean(pred)) * 100:.2f}%")
+                # Hyperparamètres retenus par la recherche (tuning.py)
+                if name in tuning_records:
+                    record = tuning_records[name]
+                    if record.get('mae') is None:
+                        st.write("**Paramètres par défaut** (budget de recherche épuisé avant la première évaluation) :")
+                    else:
+                        st.write(f"**Paramètres réglés** (MAE {record['mae']:.2f} sur les plis du backtest, "
+                                 f"{record['evaluations']} évaluations) :")
+                    for key, value in record['params'].items():
+                        st.write(f"  - {key}: {value}")
+                
+                # Performance mesurée en backtest si disponible
+                if backtest_report is not None and name in backtest_report.summary.index:
+                    model_summary = backtest_report.summary.loc[name]
+                    st.write(f"**Performance (backtest):**")
+                    st.write(f"  - MAE: {model_summary['mae']:.2f}")
+                    st.write(f"  - RMSE: {model_summary['rmse']:.2f}")
+                    st.write(f"  - Biais: {model_summary['bias']:+.2f}")
+                    if 'latency_ms' in model_summary:
+                        st.write(f"  - Latence: {model_summary['latency_ms']:.1f} ms")
+        
+        # MÉMOIRE DU PROCESSUS (poids projetés partagés entre processus)
+        memory = process_memory()
+        if memory is not None:
+            st.markdown("#### 🧠 Mémoire du Processus")
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("RSS", f"{memory['rss']:.0f} Mo")
+            col2.metric("PSS", f"{memory['pss']:.0f} Mo", delta="part réelle du processus", delta_color="off")
+            col3.metric("Partagée", f"{memory['shared']:.0f} Mo")
+            col4.metric("Privée", f"{memory['private']:.0f} Mo")
+            mapped = mapped_model_memory()
+            if mapped:
+                mapped_df = pd.DataFrame([
+                    {'Fichier': os.path.relpath(path), 'Taille (Mo)': values['size'], 'Résidente (Mo)': values['rss'],
+                     'Partagée (Mo)': values['shared'], 'PSS (Mo)': values['pss']}
+                    for path, values in mapped.items()
+                ])
+                st.dataframe(mapped_df.round(2), hide_index=True, use_container_width=True)
+                st.caption("Poids des modèles projetés en mémoire : une seule copie physique pour tous les processus de l'hôte")
+        
+        # TEMPS DE SERVICE PAR NIVEAU (référence immédiate, puis ensemble sous budget)
+        if serving_timings.tiers:
+            st.markdown("#### ⏱️ Temps de Service par Niveau")
+            timings_df = serving_timings.table().rename(columns={'tier': 'Niveau', 'model': 'Modèle', 'ms': 'Durée (ms)'})
+            if 'Modèle' in timings_df:
+                timings_df['Modèle'] = timings_df['Modèle'].map(lambda name: MODEL_DISPLAY_NAMES.get(name, name), na_action='ignore')
+            st.dataframe(timings_df.round(2), hide_index=True, use_container_width=True)
+            budget_text = f"{serving_timings.budget_ms:.0f} ms" if serving_timings.budget_ms else "illimité"
+            skipped_text = ", ".join(MODEL_DISPLAY_NAMES.get(name, name) for name in serving_timings.skipped) or "aucun"
+            st.caption(f"Budget de latence de l'ensemble : {budget_text} • modèles écartés : {skipped_text}")
+        
+        # SEGMENTATION DE LA DEMANDE (routage des produits intermittents)
+        if demand_segmentation is not None:
+            st.markdown("#### 📉 Segmentation de la Demande (ADI / CV²)")
+            names = {dataset['key']: dataset['name'] for dataset in datasets}
+            segmentation_df = demand_segmentation.table()
+            segmentation_df.index = [names.get(key, key) for key in segmentation_df.index]
+            segmentation_df['classe'] = segmentation_df['classe'].map(DEMAND_CLASS_LABELS)
+            segmentation_df['routage'] = segmentation_df['routage'].map({True: 'Prévisions spécialisées', False: 'Ensemble'})
+            st.dataframe(segmentation_df.round(2).rename(columns={
+                'classe': 'Classe', 'adi': 'ADI', 'cv2': 'CV²', 'jours_sans_demande': 'Jours sans demande', 'routage': 'Routage'
+            }), use_container_width=True)
+            st.caption("Seuils de Syntetos-Boylan : ADI ≥ 1.32 (intermittente), CV² ≥ 0.49 (erratique / sporadique)")
         
         # ANALYSE DE L'ENSEMBLE
         if individual_predictions and len(individual_predictions) > 1:
@@ -3801,6 +4361,14 @@ def main():
             st.plotly_chart(charts['importance'], use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
+        # Contributions des features à chaque jour prévu
+        if 'contributions' in charts:
+            st.markdown("#### 🧩 Contributions des Features par Jour")
+            st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+            st.plotly_chart(charts['contributions'], use_container_width=True)
+            st.caption(f"Valeurs de Shapley calculées en {forecast_explanation.elapsed * 1000:.0f} ms (en cache pour cette prévision)")
+            st.markdown('</div>', unsafe_allow_html=True)
+        
         # ANALYSE AVANCÉE DES MODÈLES
         st.markdown("### 🔥 Analyses Avancées des Modèles")
         
@@ -4020,15 +4588,16 @@ def main():
             
             # Validation de la clé API
             if groq_api_key and groq_api_key.strip():
-                # Tester la clé API
+                # Tester la clé API une seule fois par clé (pas à chaque rerun)
                 try:
-                    client = Groq(api_key=groq_api_key)
-                    # Test simple pour valider la clé
-                    test_response = client.chat.completions.create(
-                        messages=[{"role": "user", "content": "Test"}],
-                        model=st.session_state.get('groq_model', 'llama-3.3-70b-versatile'),
-                        max_tokens=1
-                    )
+                    if st.session_state.get('groq_validated_key') != groq_api_key:
+                        # Test simple pour valider la clé, via le client longue durée
+                        get_client_pool(groq_api_key).complete(
+                            [{"role": "user", "content": "Test"}],
+                            models=[st.session_state.get('groq_model', 'llama-3.3-70b-versatile')],
+                            max_tokens=1
+                        )
+                        st.session_state.groq_validated_key = groq_api_key
                     st.success("✅ Clé API GROQ valide ! Le chatbot est prêt à répondre à toutes vos questions.")
                 except Exception as e:
                     st.error(f"❌ Clé API GROQ invalide : {str(e)}")
@@ -4053,12 +4622,43 @@ def main():
             )
             st.session_state.groq_model = groq_model
             
+            # Budget de contexte envoyé au modèle (latence et coût)
+            st.session_state.llm_token_budget = st.slider(
+                "📦 Budget de contexte (tokens)",
+                min_value=300,
+                max_value=4000,
+                value=st.session_state.get('llm_token_budget', DEFAULT_TOKEN_BUDGET),
+                step=100,
+                key="llm_token_budget_slider"
+            )
+            
             st.markdown("""
             **Obtenez votre clé API gratuite sur :**
             [GROQ Console](https://console.groq.com/keys)
             """)
             
             
+            # Statistiques du cache de réponses
+            cache_stats = get_response_cache().stats()
+            st.markdown("### 🗃️ Cache des réponses")
+            st.caption(
+                f"Taux de succès : {cache_stats['hit_rate'] * 100:.1f}% "
+                f"({cache_stats['hits']} hits / {cache_stats['misses']} miss) • "
+                f"{cache_stats['size']}/{cache_stats['max_entries']} entrées"
+            )
+            
+            # Backends LLM dans l'ordre de repli (Groq, serveur local, modèle hors ligne)
+            backend_chain = get_backend_chain(groq_api_key)
+            st.markdown("### 🔌 Backends LLM")
+            for backend in backend_chain.backends:
+                backend_stats = backend_chain.stats()[backend.name]
+                latency = backend_stats['avg_latency']
+                st.caption(
+                    f"{'🟢' if backend.available() else '⚪'} {backend.name} • "
+                    f"{backend_stats['success']} réponses, {backend_stats['failure']} échecs"
+                    + (f" • {latency * 1000:.0f} ms" if latency is not None else "")
+                )
+            
             # Informations sur l'assistant
             st.markdown("### 🤖 À propos")
             st.info("""
@@ -4069,9 +4669,15 @@ def main():
             Il peut analyser vos données, fournir des recommandations et répondre à toutes vos questions.
             """)
 
-        # Initialiser les messages de l'assistant IA
+        # Initialiser les messages de l'assistant IA (fenêtre bornée + archive + résumé)
         if 'ai_messages' not in st.session_state:
-            st.session_state.ai_messages = []
+            st.session_state.ai_messages = ChatHistory.from_environment()
+        elif isinstance(st.session_state.ai_messages, list):
+            # Sessions ouvertes avant l'historique borné
+            legacy_messages = st.session_state.ai_messages
+            st.session_state.ai_messages = ChatHistory.from_environment()
+            for message in legacy_messages:
+                st.session_state.ai_messages.append(message)
 
         # Vérifier s'il y a un nouveau message utilisateur à traiter
         if st.session_state.ai_messages and len(st.session_state.ai_messages) > 0:
@@ -4124,7 +4730,25 @@ def main():
             </div>
             """, unsafe_allow_html=True)
             
-            for i, msg in enumerate(st.session_state.ai_messages):
+            # Seule une page de messages est rendue à chaque rerun ; les plus anciennes à la demande
+            chat_history = st.session_state.ai_messages
+            page_count = chat_history.page_count(CHAT_PAGE_SIZE)
+            page_index = 0
+            if page_count > 1:
+                page_index = st.number_input(
+                    f"📜 Page de l'historique (0 = plus récente, {page_count - 1} = plus ancienne)",
+                    min_value=0,
+                    max_value=page_count - 1,
+                    value=0,
+                    step=1,
+                    key="chat_history_page"
+                )
+            st.caption(
+                f"💬 {chat_history.total_count} messages • {len(chat_history)} en mémoire • "
+                f"{chat_history.archived_count} résumés{' et archivés' if chat_history.archive_path else ''}"
+            )
+            
+            for msg in chat_history.page(int(page_index), CHAT_PAGE_SIZE):
                 if msg["role"] == "user":
                     with st.chat_message("user", avatar="👤"):
                         st.write(msg["content"])
@@ -4218,7 +4842,7 @@ def main():
                 if st.button("🗑️ Effacer l'historique", key="clear_history", 
                             help="Supprimer tous les messages de la conversation",
                             type="secondary"):
-                    st.session_state.ai_messages = []
+                    st.session_state.ai_messages.clear()
                     st.rerun()
 
         # Interface de chat professionnelle
@@ -4305,92 +4929,75 @@ def main():
             with st.chat_message("assistant", avatar="🧠"):
                 try:
                     with st.spinner("🧠 Vision IA analyse votre demande..."):
-                        # Construire le contexte intelligent avec les données de l'application
-                        context = f"""Vous êtes un assistant IA spécialisé dans l'analyse de données de stock et la gestion d'inventaire.
-Vous avez accès aux données en temps réel de l'application Vision Stock Pro.
-
-RÉPONDEZ UNIQUEMENT EN FRANÇAIS et de manière professionnelle et utile.
-
-DONNÉES DISPONIBLES :"""
-
-                        # Ajouter les données du dashboard si disponibles
-                        dashboard_data = st.session_state.get('dashboard_data', None)
-                        if dashboard_data:
-                            context += f"""
-
-📊 DONNÉES DU DASHBOARD :
-• Consommation totale : {dashboard_data.get('total_consumption', 'N/A')} unités
-• Consommation moyenne quotidienne : {dashboard_data.get('avg_daily_consumption', 'N/A')} unités/jour
-• Jours jusqu'à rupture : {dashboard_data.get('days_to_rupture', 'N/A')} jours
-• Score de confiance : {dashboard_data.get('confidence', 'N/A')}
-• Stock maximum recommandé : {dashboard_data.get('stock_max', 'N/A')} unités
-• Stock minimum recommandé : {dashboard_data.get('stock_min', 'N/A')} unités
-• Tendance : {dashboard_data.get('trend', 'N/A')}
-• Alerte niveau : {dashboard_data.get('alert_level', 'N/A')}"""
-
-                        # Ajouter les données de prédictions si disponibles
-                        predictions_data = st.session_state.get('predictions_data', None)
-                        if predictions_data:
-                            context += f"""
-
-🔮 DONNÉES DE PRÉDICTIONS :
-• Période de prédiction : {predictions_data.get('period', 'N/A')}
-• Prédictions disponibles : {len(predictions_data.get('predictions', []))} points
-• Incertitude moyenne : {predictions_data.get('uncertainties', 'N/A')}
-• Modèles utilisés : {predictions_data.get('models_used', 'N/A')}"""
-
-                        # Ajouter l'historique de conversation
-                        if st.session_state.ai_messages and len(st.session_state.ai_messages) > 0:
-                            context += "\n\n💬 HISTORIQUE DE CONVERSATION :"
-                            for msg in st.session_state.ai_messages[-3:]:  # Derniers 3 messages
-                                role = "Utilisateur" if msg["role"] == "user" else "Assistant"
-                                context += f"\n{role}: {msg['content']}"
-
-                        context += f"""
-
-QUESTION DE L'UTILISATEUR : {prompt}
-
-INSTRUCTIONS :
-1. Si la question concerne la gestion de stock, utilisez les données fournies
-2. Si la question est générale, répondez normalement
-3. Répondez de manière précise et professionnelle
-4. Proposez des recommandations concrètes quand c'est pertinent
-5. Restez dans le contexte de la gestion de stock et d'inventaire
-
-RÉPONSE :"""
-                        
-                        # Utiliser le chatbot GROQ pour la réponse
-                        try:
-                            if st.session_state.get('groq_api_key'):
-                                client = Groq(api_key=st.session_state.get('groq_api_key', ''))
-                                response = client.chat.completions.create(
-                                    messages=[{"role": "user", "content": context}],
-                                    model=st.session_state.get('groq_model', 'llama-3.3-70b-versatile'),
-                                    temperature=0.7,
-                                    max_tokens=1024
-                                ).choices[0].message.content
-                            else:
-                                # Réponse intelligente sans API
-                                response = generate_smart_response(prompt, st.session_state)
-                        except Exception as e:
-                            # Fallback vers une réponse intelligente
-                            response = generate_smart_response(prompt, st.session_state)
+                        # Contexte ciblé : produits pertinents et prévisions résumées, sous budget de tokens
+                        # (résumé des échanges anciens + fenêtre récente, sans la question qui vient d'être ajoutée)
+                        llm_messages, context_report = build_chat_messages(
+                            prompt,
+                            history=st.session_state.ai_messages.llm_history()[:-1],
+                            summary=st.session_state.ai_messages.llm_summary()
+                        )
                         
-                        # Affichage progressif
-                        message_placeholder = st.empty()
-                        full_response = ""
-                        for chunk in response.split():
-                            full_response += chunk + " "
-                            message_placeholder.markdown(full_response + "▌")
-                            time.sleep(0.03)
+                    # Utiliser le chatbot GROQ en streaming natif (hors spinner pour voir les tokens arriver)
+                    message_placeholder = st.empty()
+                    request_start = time.perf_counter()
+                    time_to_first_token = None
+                    backend_info = {}
+                    cache = get_response_cache()
+                    groq_model = st.session_state.get('groq_model', 'llama-3.3-70b-versatile')
+                    # La réponse dépend de l'historique envoyé : empreinte des messages dans la clé
+                    cache_model = f"{groq_model}:historique:{messages_digest(llm_messages)}"
+                    cached_response = cache.get(prompt, get_forecast_snapshot_version(), cache_model) if st.session_state.get('groq_api_key') else None
+                    try:
+                        if cached_response is not None:
+                            # Question déjà posée sur ce snapshot : réponse instantanée, sans appel API
+                            full_response = cached_response
+                            message_placeholder.markdown(full_response)
+                            total_time = time.perf_counter() - request_start
+                        elif st.session_state.get('groq_api_key'):
+                            full_response, time_to_first_token, total_time = render_streaming_response(
+                                message_placeholder,
+                                stream_groq_response(
+                                    llm_messages,
+                                    model=groq_model,
+                                    api_key=st.session_state.get('groq_api_key', ''),
+                                    info=backend_info
+                                ),
+                                request_start
+                            )
+                            if backend_info.get('backend') == 'groq' and is_cacheable_response(full_response):
+                                cache.put(prompt, full_response, get_forecast_snapshot_version(), cache_model)
+                        else:
+                            # Réponse intelligente sans API
+                            full_response = generate_smart_response(prompt, st.session_state)
+                            message_placeholder.markdown(full_response)
+                            total_time = time.perf_counter() - request_start
+                    except Exception as e:
+                        # Fallback vers une réponse intelligente
+                        print(f"❌ Erreur streaming Groq: {e}")
+                        time_to_first_token = None
+                        full_response = generate_smart_response(prompt, st.session_state)
                         message_placeholder.markdown(full_response)
-                        
-                        # Sauvegarde de la réponse
-                        st.session_state.ai_messages.append({
-                            "role": "assistant",
-                            "content": full_response
-                        })
-                        
+                        total_time = time.perf_counter() - request_start
+
+                    if time_to_first_token is not None:
+                        st.caption(
+                            f"⚡ Premier token : {time_to_first_token * 1000:.0f} ms • Réponse complète : {total_time:.2f} s • "
+                            f"📦 Contexte : {context_report.tokens}/{context_report.token_budget} tokens, "
+                            f"{len(context_report.products)} produit(s) • 🔌 {backend_info.get('backend', 'groq')}"
+                        )
+                    elif cached_response is not None:
+                        st.caption(f"🗃️ Réponse servie depuis le cache en {total_time * 1e6:.0f} µs")
+                    else:
+                        st.caption(f"⚡ Réponse générée en {total_time * 1000:.0f} ms")
+
+                    # Sauvegarde de la réponse
+                    st.session_state.ai_messages.append({
+                        "role": "assistant",
+                        "content": full_response,
+                        "time_to_first_token": time_to_first_token,
+                        "response_time": total_time
+                    })
+
                 except Exception as e:
                     st.error(f"Erreur lors de la génération: {str(e)}")
                     st.info("Vérifiez votre configuration API dans l'onglet Configuration.")
@@ -4474,14 +5081,21 @@ RÉPONSE :"""
 
 def generate_smart_response(prompt, session_state):
     """Génère une réponse intelligente basée sur le contexte avec accès complet aux données"""
-    prompt_lower = prompt.lower()
+    # Intentions détectées en une seule passe (routeur compilé à l'import)
+    routing = route_intents(prompt)
     
     # Questions sur les prédictions et stock - utiliser l'analyse spécialisée
-    if any(word in prompt_lower for word in ['prédiction', 'prévoir', 'futur', 'modèle', 'prédire', 'broli', 'données', 'analyse', 'mayor', 'moyen', 'terme', 'produit', 'nombre', 'information', 'donner', 'present', 'stock', 'inventaire', 'consommation', 'rupture', 'alerte', 'état', 'couche', 'softcare', 'softcaire', 'lait', 'mayor', 'parle', 'papier', 'optimisation', 'recommandation', 'gestion', 'vente', 'achat', 'commande', 'approvisionnement']):
-        return get_chatbot_response(prompt)
+    if routing.has('stock'):
+        return get_response_cache().get_or_compute(
+            prompt,
+            lambda: get_chatbot_response(prompt),
+            snapshot_version=get_forecast_snapshot_version(),
+            model="regles",
+            should_cache=is_cacheable_response
+        )
     
     # Questions générales - utiliser GROQ directement
-    elif any(word in prompt_lower for word in ['cameroun', 'france', 'afrique', 'monde', 'géographie', 'histoire', 'math', 'calcul', 'climat', 'superficie', 'population', 'culture', 'politique', 'économie', 'sport', 'science', 'technologie', 'connais', 'sais', 'savoir', 'bonjour', 'salut', 'aide', 'help', 'comment', 'pourquoi', 'quand', 'où', 'qui', 'quoi']):
+    elif routing.has('general'):
         print(f"DEBUG: Question reconnue comme question générale: {prompt}")
         try:
             return get_groq_response(prompt)
@@ -4504,109 +5118,30 @@ Je peux analyser vos données de stock et fournir des recommandations personnali
     
     # Pour TOUTES les autres questions, utiliser l'API GROQ pour une vraie réponse intelligente
     else:
-        # Vérifier d'abord si la clé API GROQ est présente
+        # Sans clé API GROQ (ou Groq injoignable), la chaîne répond avec le
+        # serveur local puis le modèle de réponse hors ligne
         groq_api_key = session_state.get('groq_api_key', os.getenv("GROQ_API_KEY", ""))
-        if not groq_api_key or groq_api_key.strip() == '':
-            return f"""🧠 **Vision IA**
-
-Je comprends votre question : "{prompt}"
-
-**🔑 CLÉ API REQUISE :**
-Veuillez d'abord configurer votre clé API GROQ dans la sidebar pour obtenir des réponses intelligentes à toutes vos questions.
-
-**📊 EN ATTENDANT :**
-Je peux analyser vos données de stock et fournir des recommandations personnalisées.
-
-**❓ Questions que je peux traiter :**
-• Analyse de vos données de stock
-• Recommandations d'optimisation
-• Prédictions de consommation
-• Alertes de rupture de stock
-• Conseils de gestion d'inventaire
-• Et bien plus encore avec l'API GROQ !"""
         
         try:
-            # Construire le contexte avec TOUTES les données disponibles
-            context = f"""Vous êtes un assistant IA spécialisé dans la gestion de stock et d'inventaire, mais vous pouvez aussi répondre à toutes les questions générales.
-
-QUESTION DE L'UTILISATEUR: {prompt}
-
-DONNÉES SPÉCIFIQUES DE L'APPLICATION DISPONIBLES:"""
-            
-            # Utiliser DIRECTEMENT les données du dashboard (plus simple et efficace)
-            dashboard_data = session_state.get('dashboard_data', {})
-            product_stocks = session_state.get('product_stocks', {})
-            predictions_data = session_state.get('predictions_data', {})
-            
-            if dashboard_data:
-                # Utiliser toutes les données du dashboard (structure correcte)
-                context += f"""
-📊 DONNÉES COMPLÈTES DU DASHBOARD:
-- Stock actuel: {dashboard_data.get('current_stock', 'N/A')} unités
-- Consommation totale (30j): {dashboard_data.get('total_consumption', 'N/A')} unités
-- Consommation moyenne: {dashboard_data.get('avg_daily_consumption', 'N/A')} unités/jour
-- Jours jusqu'à rupture: {dashboard_data.get('days_to_rupture', 'N/A')} jours
-- Stock minimum: {dashboard_data.get('stock_min', 'N/A')} unités
-- Stock maximum: {dashboard_data.get('stock_max', 'N/A')} unités
-- Confiance prédiction: {dashboard_data.get('confidence', 0) * 100:.1f}%
-- Volatilité: {dashboard_data.get('volatility', 'N/A')}
-- Tendance: {dashboard_data.get('trend_direction', 'N/A')}
-- Efficacité stock: {dashboard_data.get('stock_efficiency', 'N/A')}%
-- Incertitude moyenne: {dashboard_data.get('avg_uncertainty', 'N/A')}
-"""
-            
-            # Ajouter les données des produits si disponibles
-            if product_stocks:
-                context += f"""
-🏷️ PRODUITS ET STOCKS:
-- Nombre total de produits: {len(product_stocks)} produits différents
-- Liste des produits: {', '.join(list(product_stocks.keys())[:10])}{'...' if len(product_stocks) > 10 else ''}
-
-📦 DÉTAILS DES STOCKS PAR PRODUIT:"""
-                for product_name, product_data in list(product_stocks.items())[:8]:  # Top 8 produits
-                    context += f"""
-- {product_name}:
-  • Stock actuel: {product_data.get('estimated_current_stock', 0):.1f} unités
-  • Jours jusqu'à rupture: {product_data.get('days_to_rupture', 0):.1f} jours
-  • Statut: {product_data.get('stock_status', 'N/A')}
-  • Consommation récente: {product_data.get('recent_consumption', 0):.1f} unités/jour
-  • Transactions: {product_data.get('transactions_count', 0)} enregistrements"""
-            
-            # Ajouter les données de prédictions si disponibles
-            if predictions_data:
-                context += f"""
-
-🔮 PRÉDICTIONS DISPONIBLES:
-- Période de prédiction: {predictions_data.get('period', 'N/A')}
-- Modèles utilisés: {predictions_data.get('models_used', 'N/A')}
-- Prédictions moyennes: {np.mean(predictions_data.get('predictions', [0])):.1f} unités/jour
-- Incertitude moyenne: {np.mean(predictions_data.get('uncertainties', [0])):.1f} unités
-- Performance du modèle: {predictions_data.get('model_performance', {})}
-"""
-            
-            if not dashboard_data and not product_stocks and not predictions_data:
-                context += "\nAucune donnée du dashboard n'est disponible pour le moment. Visitez d'abord les autres onglets pour charger des données."
-            
-            context += """
-
-INSTRUCTIONS:
-1. Répondez d'abord à la question de l'utilisateur de manière complète et précise
-2. Si la question concerne le stock/inventaire/produits, utilisez les données spécifiques disponibles pour enrichir votre réponse
-3. Si c'est une question générale, répondez normalement en utilisant vos connaissances
-4. Si l'utilisateur demande des informations sur les produits, utilisez les données spécifiques de l'application
-5. Soyez conversationnel et engageant
-6. N'hésitez pas à donner des exemples concrets basés sur les données disponibles
-
-RÉPONSE:"""
-            
             # Utiliser l'API GROQ pour une vraie réponse intelligente
-            client = Groq(api_key=groq_api_key)
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": context}],
-                model=session_state.get('groq_model', 'llama-3.3-70b-versatile'),
-                temperature=0.7,
-                max_tokens=1024
-            ).choices[0].message.content
+            groq_model = session_state.get('groq_model', 'llama-3.3-70b-versatile')
+            # Contexte sans historique : entrée distincte de celles du chat Vision IA
+            cache_model = f"{groq_model}:sans-historique"
+            cache = get_response_cache()
+            response = cache.get(prompt, get_forecast_snapshot_version(), cache_model)
+            if response is None:
+                # Contexte ciblé (produits pertinents, prévisions résumées) sous budget de tokens
+                llm_messages, _ = build_chat_messages(prompt)
+                response, backend = get_backend_chain(groq_api_key).complete(
+                    llm_messages,
+                    models=[groq_model],
+                    temperature=0.7,
+                    max_tokens=1024
+                )
+                if backend == "groq":
+                    cache.put(prompt, response, get_forecast_snapshot_version(), cache_model)
+                elif not groq_api_key or groq_api_key.strip() == '':
+                    response += "\n\n🔑 Configurez votre clé API GROQ dans la sidebar pour des réponses complètes."
             
             return response
             
@@ -4637,251 +5172,12 @@ Je peux analyser vos données de stock et fournir des recommandations personnali
 
 
 def analyze_specific_product(prompt, dashboard_data, product_stocks):
-    """Analyse spécifique d'un produit en utilisant les données réelles du dashboard"""
-    
-    # RÉPONSE DIRECTE AVEC LES DONNÉES EXACTES DE VOTRE DASHBOARD
-    # D'après ce que vous avez montré dans votre message :
-    return f"""🔍 **DONNÉES EXACTES DE VOTRE DASHBOARD :**
-
-**📊 INFORMATIONS STOCK :**
-• **Stock actuel** : 80 unités (VALEUR RÉELLE DU DASHBOARD - CRITIQUE)
-• **Consommation 30j** : 2220 unités (VALEUR RÉELLE DU DASHBOARD)
-• **Moyenne/jour** : 74.0 unités (2220 ÷ 30)
-• **Jours avant rupture** : 1.08 jours (80 ÷ 74.0)
-
-**📈 MÉTRIQUES DE PRÉDICTION :**
-• **Confiance prédiction** : 85.8%
-• **Stabilité** : 93.4%
-• **Score confiance** : 70.4%
-• **Volatilité** : 4.9
-• **Efficacité stock** : 3.6%
-• **Tendance** : hausse (+7.3%)
-
-**🎯 STOCK RECOMMANDÉ :**
-• **Stock minimum** : 1905 unités
-• **Stock recommandé** : 2377 unités
-• **Stock maximum** : 2535 unités
-
-**🚨 SITUATION CRITIQUE :**
-• **Rupture de stock imminente** dans 1.1 jour
-• **Déficit actuel** : 2297 unités (2377 - 80)
-• **Réapprovisionnement URGENT** requis
-
-**📈 ANALYSE PRÉDICTIVE 30 JOURS :**
-• **Consommation RÉELLE 30j** : 2220 unités (addition des valeurs sur la période)
-• **Moyenne calculée** : 2220 ÷ 30 = 74.0 unités/jour
-• **Jours avant rupture** : 80 ÷ 74.0 = 1.08 jours
-• **Stock optimal recommandé** : 2377 unités
-• **Marge de sécurité** : 158 unités (2535 - 2377)
-
-**💡 RECOMMANDATIONS IMMÉDIATES :**
-1. **URGENCE** : Commandez 2297 unités immédiatement
-2. **Surveillance** : Vérifiez le stock toutes les heures
-3. **Planification** : Mettez en place des alertes automatiques
-4. **Analyse** : Étudiez les causes de cette consommation élevée
-
-**⚠️ RISQUES IDENTIFIÉS :**
-• Rupture de stock dans 1.1 jour
-• Impact sur la continuité du service
-• Perte de revenus potentielle
-• Satisfaction client compromise
-
-**🔍 PRODUITS DISPONIBLES :**
-{', '.join(list(product_stocks.keys())[:5]) if product_stocks else 'Aucun produit trouvé'}
-
-**📋 RÉPONSE DIRECTE À VOTRE QUESTION :**
-**"Je veux le stock de ce produit"**
-→ **STOCK ACTUEL : 80 UNITÉS** (données exactes de votre dashboard)
-→ **SITUATION : CRITIQUE** - Rupture dans 1.08 jours
-→ **ACTION URGENTE** : Réapprovisionner immédiatement"""
-    
-    # Détecter si c'est une demande de prédiction
-    prompt_lower = prompt.lower()
-    is_prediction_request = any(word in prompt_lower for word in ['prédiction', 'prévoir', 'futur', 'analyse'])
-    
-    # Vérifier si on a des données spécifiques sur les produits
-    if product_stocks:
-        # Chercher le produit spécifique demandé (couche softcare T4, lait broli, etc.)
-        product_found = None
-        for product_name, product_data in product_stocks.items():
-            if any(word in product_name.lower() for word in ['couche', 'softcare', 'softcqre', 't4', 'lait', 'broli']):
-                product_found = (product_name, product_data)
-                break
-        
-        if product_found:
-            product_name, product_data = product_found
-            return f"""{debug_info}
-
-🔍 **ANALYSE SPÉCIFIQUE : {product_name.upper()}**
-
-**🚨 SITUATION CRITIQUE DÉTECTÉE :**
-• **Stock actuel** : {current_stock} unités (CRITIQUE)
-• **Jours avant rupture** : {days_to_rupture} jour seulement
-• **Statut** : URGENCE - Réapprovisionnement immédiat requis
-
-**📊 DONNÉES DU DASHBOARD (RÉELLES) :**
-• **Consommation 30j** : {total_consumption} unités
-• **Consommation moyenne** : {avg_daily} unités/jour
-• **Stock minimum recommandé** : {stock_min} unités
-• **Stock recommandé** : {recommended_stock} unités
-• **Stock maximum** : {stock_max} unités
-
-**📈 MÉTRIQUES DE PRÉDICTION :**
-• **Confiance prédiction** : {confidence_pct:.1f}%
-• **Score confiance** : {confidence_score:.1f}%
-• **Stabilité** : {stability}%
-• **Volatilité** : {volatility}
-• **Efficacité stock** : {stock_efficiency}%
-• **Tendance** : {trend} (+{trend_pct}%)
-
-**📈 ANALYSE PRÉDICTIVE SUR 30 JOURS :**
-• **Consommation prévue** : {avg_daily} unités/jour sur 30 jours
-• **Besoin total 30j** : {avg_daily * 30:.0f} unités
-• **Déficit actuel** : {recommended_stock - current_stock} unités
-• **Temps de réapprovisionnement** : Critique ({days_to_rupture} jour seulement)
-• **Prédiction 30j** : {avg_daily * 30:.0f} unités nécessaires
-• **Stock optimal 30j** : {recommended_stock} unités recommandées
-• **Marge de sécurité** : {stock_max - recommended_stock} unités
-
-**🚨 ALERTES ACTIVES :**
-• **Rupture de Stock Imminente** : Stock épuisé dans {days_to_rupture} jour
-• **Stock insuffisant** : {current_stock} unités seulement
-• **Réapprovisionnement urgent** requis
-
-**💡 RECOMMANDATIONS IMMÉDIATES :**
-1. **URGENCE** : Commandez immédiatement {recommended_stock - current_stock} unités
-2. **Surveillance** : Vérifiez le stock toutes les heures
-3. **Planification** : Mettez en place un système d'alerte automatique
-4. **Analyse** : Étudiez les causes de cette consommation élevée ({avg_daily} unités/jour)
-
-**⚠️ RISQUES IDENTIFIÉS :**
-• Rupture de stock dans {days_to_rupture} jour
-• Impact sur la continuité du service
-• Perte de revenus potentielle
-• Satisfaction client compromise"""
-        else:
-            if is_prediction_request:
-                return f"""{debug_info}
-
-🔮 **ANALYSE DES PRÉDICTIONS : COUCHE SOFTCARE**
-
-**🚨 SITUATION CRITIQUE DÉTECTÉE :**
-• **Stock actuel** : {current_stock} unités (CRITIQUE)
-• **Jours avant rupture** : {days_to_rupture} jour seulement
-• **Statut** : URGENCE - Réapprovisionnement immédiat requis
-
-**📊 DONNÉES DU DASHBOARD (RÉELLES) :**
-• **Consommation 30j** : {total_consumption} unités
-• **Consommation moyenne** : {avg_daily} unités/jour
-• **Stock minimum recommandé** : {stock_min} unités
-• **Stock recommandé** : {recommended_stock} unités
-• **Stock maximum** : {stock_max} unités
-
-**🔮 PRÉDICTIONS ET TENDANCES :**
-• **Confiance prédiction** : {confidence_pct}% (Très élevée)
-• **Score confiance** : {confidence_score}%
-• **Stabilité** : {stability}% (Excellente)
-• **Volatilité** : {volatility} (Faible)
-• **Efficacité stock** : {stock_efficiency}%
-• **Tendance** : {trend} (+{trend_pct}% de croissance)
-
-**📈 ANALYSE PRÉDICTIVE SUR 30 JOURS :**
-• **Consommation prévue** : {avg_daily} unités/jour sur 30 jours
-• **Besoin total 30j** : {avg_daily * 30:.0f} unités
-• **Déficit actuel** : {recommended_stock - current_stock} unités
-• **Temps de réapprovisionnement** : Critique ({days_to_rupture} jour seulement)
-• **Prédiction 30j** : {avg_daily * 30:.0f} unités nécessaires
-• **Stock optimal 30j** : {recommended_stock} unités recommandées
-• **Marge de sécurité** : {stock_max - recommended_stock} unités
-
-**🚨 ALERTES ACTIVES :**
-• **Rupture de Stock Imminente** : Stock épuisé dans {days_to_rupture} jour
-• **Stock insuffisant** : {current_stock} unités seulement
-• **Réapprovisionnement urgent** requis
-
-**💡 RECOMMANDATIONS IMMÉDIATES :**
-1. **URGENCE** : Commandez immédiatement {recommended_stock - current_stock} unités
-2. **Surveillance** : Vérifiez le stock toutes les heures
-3. **Planification** : Mettez en place un système d'alerte automatique
-4. **Analyse** : Étudiez les causes de cette consommation élevée ({avg_daily} unités/jour)
-
-**⚠️ RISQUES IDENTIFIÉS :**
-• Rupture de stock dans {days_to_rupture} jour
-• Impact sur la continuité du service
-• Perte de revenus potentielle
-• Satisfaction client compromise
-
-**🏷️ PRODUITS DISPONIBLES :**
-{', '.join(list(product_stocks.keys())[:10])}{'...' if len(product_stocks) > 10 else ''}"""
-            else:
-                return f"""🔍 **ANALYSE SPÉCIFIQUE : PRODUIT DEMANDÉ**
-
-**🚨 SITUATION CRITIQUE DÉTECTÉE :**
-• **Stock actuel** : {current_stock} unités (CRITIQUE)
-• **Jours avant rupture** : {days_to_rupture} jour seulement
-• **Statut** : URGENCE - Réapprovisionnement immédiat requis
-
-**📊 DONNÉES DU DASHBOARD (RÉELLES) :**
-• **Consommation 30j** : {total_consumption} unités
-• **Consommation moyenne** : {avg_daily} unités/jour
-• **Stock minimum recommandé** : {stock_min} unités
-• **Stock recommandé** : {recommended_stock} unités
-• **Stock maximum** : {stock_max} unités
-
-**📈 MÉTRIQUES DE PRÉDICTION :**
-• **Confiance prédiction** : {confidence_pct}%
-• **Score confiance** : {confidence_score}%
-• **Stabilité** : {stability}%
-• **Volatilité** : {volatility}
-• **Efficacité stock** : {stock_efficiency}%
-• **Tendance** : {trend} (+{trend_pct}%)
-
-**🚨 ALERTES ACTIVES :**
-• **Rupture de Stock Imminente** : Stock épuisé dans {days_to_rupture} jour
-• **Stock insuffisant** : {current_stock} unités seulement
-• **Réapprovisionnement urgent** requis
-
-**💡 RECOMMANDATIONS IMMÉDIATES :**
-1. **URGENCE** : Commandez immédiatement {recommended_stock - current_stock} unités
-2. **Surveillance** : Vérifiez le stock toutes les heures
-3. **Planification** : Mettez en place un système d'alerte automatique
-4. **Analyse** : Étudiez les causes de cette consommation élevée ({avg_daily} unités/jour)
-
-**⚠️ RISQUES IDENTIFIÉS :**
-• Rupture de stock dans {days_to_rupture} jour
-• Impact sur la continuité du service
-• Perte de revenus potentielle
-• Satisfaction client compromise
-
-**🏷️ PRODUITS DISPONIBLES :**
-{', '.join(list(product_stocks.keys())[:10])}{'...' if len(product_stocks) > 10 else ''}"""
-    else:
-        return f"""🔍 **ANALYSE SPÉCIFIQUE : DONNÉES LIMITÉES**
-
-**⚠️ DONNÉES DE PRODUITS NON DISPONIBLES :**
-Les données spécifiques par produit ne sont pas disponibles.
-
-**📊 DONNÉES GLOBALES DU DASHBOARD :**
-• Stock total actuel : {current_stock:.0f} unités
-• Consommation totale (30j) : {total_consumption:.0f} unités
-• Consommation moyenne : {avg_daily:.1f} unités/jour
-• Jours jusqu'à rupture : {days_to_rupture:.1f} jours
-• Confiance prédiction : {confidence_pct:.1f}%
-• Tendance : {trend} ({trend_pct:.1f}%)
-• Volatilité : {volatility:.1f}
-• Stabilité : {stability:.1f}%
-• Efficacité stock : {stock_efficiency:.1f}%
-
-**🚨 ALERTES :**
-• Statut global : {alert_message}
-• Stock minimum : {stock_min:.0f} unités
-• Stock recommandé : {recommended_stock:.0f} unités
-• Stock maximum : {stock_max:.0f} unités
-
-**💡 RECOMMANDATIONS :**
-• Chargez d'abord les données détaillées des produits
-• Utilisez les données globales pour l'analyse générale
-• Planifiez le réapprovisionnement selon les tendances globales"""
+    """Analyse spécifique d'un produit à partir de la base de faits calculée"""
+    database = load_chatbot_database()
+    match = get_product_index(database).find_in_text(prompt) if database else None
+    if match:
+        return analyze_specific_product_with_database(match[0], prompt)
+    return get_global_stock_summary()
 
 def analyze_stock_data_smart(prompt, session_state):
     """Analyse intelligente des données de stock en utilisant DIRECTEMENT les données du dashboard"""
@@ -4892,7 +5188,8 @@ def analyze_stock_data_smart(prompt, session_state):
     
     # Vérifier si l'utilisateur demande une analyse d'un produit spécifique
     prompt_lower = prompt.lower()
-    if any(word in prompt_lower for word in ['couche', 'softcare', 'softcqre', 'lait', 'broli', 'produit spécifique', 'prédiction', 'prévoir']):
+    routing = route_intents(prompt)
+    if routing.has('produit_specifique'):
         return analyze_specific_product(prompt, dashboard_data, product_stocks)
     
     # Vérifier si on a des données
@@ -4933,7 +5230,7 @@ Je pourrai vous fournir :
     # Vérifier si on a des données de produits spécifiques
     if product_stocks and len(product_stocks) > 0:
         # Répondre aux questions spécifiques sur les produits
-        if any(word in prompt_lower for word in ['produit', 'nombre', 'combien', 'différent', 'information', 'donner', 'stock', 'present']):
+        if routing.has('liste_produits'):
             total_products = len(product_stocks)
             product_list = list(product_stocks.keys())
             
@@ -4965,7 +5262,7 @@ Posez : "Quel est le stock de chaque produit ?" pour voir tous les détails
             return response
         
         # Répondre aux questions sur les stocks spécifiques
-        elif any(word in prompt_lower for word in ['stock', 'chaque', 'détail']):
+        elif routing.has('detail_stocks'):
             response = f"""📦 **STOCKS DÉTAILLÉS PAR PRODUIT**
 
 **🏷️ RÉSUMÉ :**
@@ -5027,7 +5324,7 @@ Posez des questions spécifiques sur vos données de stock !
     # Vérifier si on a des données de produits spécifiques
     if product_stocks and len(product_stocks) > 0:
         # Répondre aux questions spécifiques sur les produits
-        if any(word in prompt_lower for word in ['produit', 'nombre', 'combien', 'différent', 'information', 'donner', 'stock', 'present']):
+        if routing.has('liste_produits'):
             total_products = len(product_stocks)
             product_list = list(product_stocks.keys())
             
@@ -5059,7 +5356,7 @@ Posez : "Quel est le stock de chaque produit ?" pour voir tous les détails
             return response
         
         # Répondre aux questions sur les stocks spécifiques
-        elif any(word in prompt_lower for word in ['stock', 'chaque', 'détail']):
+        elif routing.has('detail_stocks'):
             response = f"""📦 **STOCKS DÉTAILLÉS PAR PRODUIT**
 
 **🏷️ RÉSUMÉ :**
@@ -0,0 +1,331 @@
+# =============================================================================
+# 🧪 BACKTESTING À ORIGINES GLISSANTES (PLIS PARALLÈLES, CACHE PAR VERSION)
+# =============================================================================
+"""
+Évaluation réelle des modèles sur l'historique de chaque dataset.
+
+- origines glissantes : les dernières origines de la série journalière sont
+  regroupées en plis consécutifs ; pour chaque origine, prévision des
+  `horizon` jours suivants avec les features connues à cette date
+- plis exécutés dans un pool de processus (un thread de calcul par processus),
+  chaque processus charge les modèles une seule fois
+- cache sur disque par pli et par rapport, indexé par la version des données
+  (signature du fichier) et des modèles (signature de chaque fichier)
+- métriques par modèle et par pas d'horizon : MAE, RMSE, MAPE, biais, R²,
+  plus la latence mesurée d'une prévision (predict sur `horizon` lignes)
+
+`fit_models` (optionnel, par ex. `training.FoldRefit`) réentraîne les
+modèles sur l'historique antérieur à chaque pli : métriques hors
+échantillon. Sans lui, les modèles déjà entraînés sont évalués sur des
+origines de leur propre fenêtre d'entraînement : métriques dans
+l'échantillon, optimistes (`BacktestReport.out_of_sample` faux).
+
+Ligne de l'ensemble : combinaison servie (`weights`, stacking.EnsembleWeights)
+sous le nom `ENSEMBLE_NAME` ; sans poids, moyenne simple des modèles sous le
+nom `MEAN_ENSEMBLE_NAME`, pour ne pas la confondre avec l'ensemble servi.
+
+Utilisation : `python backtesting.py data/parleG_clean.csv models`
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forecast_features import origin_features
+from model_artifacts import load_model_file, model_paths as folder_model_paths
+from stock_data import file_signature, load_daily_history
+
+BACKTEST_VERSION = 1
+DEFAULT_HORIZON = 30
+DEFAULT_FOLDS = 6
+DEFAULT_FOLD_SIZE = 14
+MIN_HISTORY_DAYS = 30
+CACHE_DIR_NAME = "backtests"
+LATENCY_REPEATS = 7
+
+ENSEMBLE_NAME = "ensemble"
+MEAN_ENSEMBLE_NAME = "moyenne_simple"
+
+
+def fold_origins(n_days, horizon=DEFAULT_HORIZON, n_folds=DEFAULT_FOLDS, fold_size=DEFAULT_FOLD_SIZE,
+                 min_history=MIN_HISTORY_DAYS):
+    """
+    Positions des origines de chaque pli, du plus ancien au plus récent.
+    La dernière origine laisse `horizon` jours réels pour la comparaison.
+    """
+    last = n_days - 1 - horizon
+    folds = []
+    for fold in range(n_folds):
+        stop = last - (n_folds - 1 - fold) * fold_size + 1
+        start = stop - fold_size
+        if start < min_history:
+            continue
+        folds.append(np.arange(start, stop))
+    return folds
+
+
+# -----------------------------------------------------------------------------
+# Exécution d'un pli (dans un processus du pool ou en local)
+# -----------------------------------------------------------------------------
+
+_WORKER_MODELS = {}
+_WORKER_LOCK = threading.Lock()
+
+
+def _limit_threads():
+    """Un thread de calcul par processus : les plis sont déjà parallèles"""
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = "1"
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def load_model_files(model_paths):
+    """Modèles {nom: objet} chargés une fois par processus et par version de fichier"""
+    models = {}
+    for name, path in model_paths.items():
+        key = (name, file_signature(path))
+        with _WORKER_LOCK:
+            if key not in _WORKER_MODELS:
+                model = load_model_file(path)
+                for attribute in ("n_jobs", "nthread"):
+                    if hasattr(model, attribute):
+                        setattr(model, attribute, 1)
+                _WORKER_MODELS[key] = model
+            models[name] = _WORKER_MODELS[key]
+    return models
+
+
+def evaluate_fold(data_path, model_paths, origins, horizon, fit_models=None):
+    """
+    Prévisions de chaque modèle pour les origines d'un pli.
+    Retourne {'origins', 'actuals' (origines, horizon), 'predictions' {modèle: (origines, horizon)}}
+    """
+    daily = load_daily_history(data_path)
+    origins = np.asarray(origins, dtype=int)
+    if fit_models is not None:
+        models = fit_models(daily.iloc[:origins[0] + 1])
+    else:
+        models = load_model_files(model_paths)
+
+    features, actuals = origin_features(daily, origins, horizon)
+    predictions = {}
+    for name, model in models.items():
+        try:
+            predictions[name] = np.asarray(model.predict(features), dtype=float).reshape(len(origins), horizon)
+        except Exception as e:
+            print(f"⚠️ Backtest : modèle {name} ignoré ({e})")
+    return {'origins': origins, 'actuals': actuals, 'predictions': predictions}
+
+
+def _fold_key(data_signature, model_signatures, origins, horizon, fit_models):
+    parts = (BACKTEST_VERSION, data_signature, model_signatures, int(origins[0]), int(origins[-1]), horizon,
+             getattr(fit_models, "cache_key", None) or getattr(fit_models, "__qualname__", None))
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+
+
+# -----------------------------------------------------------------------------
+# Métriques
+# -----------------------------------------------------------------------------
+
+def _metrics(errors, actuals):
+    valid = ~np.isnan(actuals)
+    errors, actuals = errors[valid], actuals[valid]
+    if not errors.size:
+        return {'mae': np.nan, 'rmse': np.nan, 'mape': np.nan, 'bias': np.nan, 'r2': np.nan, 'n': 0}
+    positive = actuals > 0
+    variance = np.sum((actuals - actuals.mean()) ** 2)
+    return {
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        # MAPE sur les jours avec demande (les jours à 0 sont nombreux)
+        'mape': float(np.mean(np.abs(errors[positive]) / actuals[positive]) * 100) if positive.any() else np.nan,
+        'bias': float(np.mean(errors)),
+        'r2': float(1 - np.sum(errors ** 2) / variance) if variance > 0 else np.nan,
+        'n': int(errors.size)
+    }
+
+
+def backtest_metrics(predictions, actuals):
+    """
+    (métriques par modèle et pas d'horizon, métriques globales par modèle)
+    `predictions` : {modèle: (origines, horizon)} ; erreur = prévu - réel (biais > 0 = surestimation)
+    """
+    rows, summary = [], {}
+    for name, values in predictions.items():
+        errors = values - actuals
+        for step in range(actuals.shape[1]):
+            rows.append({'model': name, 'horizon': step + 1, **_metrics(errors[:, step], actuals[:, step])})
+        summary[name] = _metrics(errors.ravel(), actuals.ravel())
+    return pd.DataFrame(rows), pd.DataFrame(summary).T
+
+
+class BacktestReport:
+    """Résultats d'un backtest : métriques par horizon, résumé par modèle, latences"""
+
+    def __init__(self, per_horizon, summary, n_folds, n_origins, horizon, cached_folds=0, elapsed=0.0,
+                 predictions=None, actuals=None, out_of_sample=False):
+        self.per_horizon = per_horizon
+        self.summary = summary
+        self.n_folds = n_folds
+        self.n_origins = n_origins
+        self.horizon = horizon
+        self.cached_folds = cached_folds
+        self.elapsed = elapsed
+        self.created_at = pd.Timestamp.now().isoformat()
+        # Prévisions de chaque modèle et valeurs réelles (origines, horizon), pour le stacking
+        self.predictions = predictions or {}
+        self.actuals = actuals
+        # Vrai si les modèles ont été réentraînés avant chaque pli (prévisions hors échantillon)
+        self.out_of_sample = out_of_sample
+
+    @property
+    def models(self):
+        return [name for name in self.summary.index if name not in (ENSEMBLE_NAME, MEAN_ENSEMBLE_NAME)]
+
+    def horizon_table(self, metric='mae'):
+        """Tableau (pas d'horizon × modèle) d'une métrique"""
+        return self.per_horizon.pivot(index='horizon', columns='model', values=metric)
+
+
+def measure_latency(models, features, repeats=LATENCY_REPEATS):
+    """Latence médiane (ms) d'un predict sur une prévision complète"""
+    latencies = {}
+    for name, model in models.items():
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            try:
+                model.predict(features)
+            except Exception:
+                break
+            timings.append(time.perf_counter() - start)
+        if timings:
+            latencies[name] = float(np.median(timings) * 1000)
+    return latencies
+
+
+def run_backtest(data_path, model_paths, horizon=DEFAULT_HORIZON, n_folds=DEFAULT_FOLDS, fold_size=DEFAULT_FOLD_SIZE,
+                 max_workers=None, cache_dir=None, fit_models=None, measure=True, weights=None):
+    """
+    Backtest complet d'un dataset.
+
+    - `model_paths` : {nom: chemin du fichier modèle}
+    - `cache_dir` : répertoire du cache par pli (désactivé si None)
+    - `max_workers` : processus du pool (1 = exécution locale)
+    - `weights` : poids de l'ensemble servi (ligne `ensemble`) ; sans poids,
+      ligne `moyenne_simple`
+    """
+    start = time.perf_counter()
+    daily = load_daily_history(data_path)
+    folds = fold_origins(len(daily), horizon, n_folds, fold_size)
+    if not folds:
+        raise ValueError("Historique trop court pour le backtest")
+
+    data_signature = file_signature(data_path)[1:]
+    model_signatures = tuple(sorted((name, file_signature(path)[1:]) for name, path in model_paths.items()))
+    keys = [_fold_key(data_signature, model_signatures, origins, horizon, fit_models) for origins in folds]
+
+    results = [None] * len(folds)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        for index, key in enumerate(keys):
+            path = os.path.join(cache_dir, f"fold_{key}.joblib")
+            if os.path.exists(path):
+                try:
+                    results[index] = joblib.load(path)
+                except Exception:
+                    results[index] = None
+    cached_folds = sum(result is not None for result in results)
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    workers = min(len(pending), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_limit_threads) as pool:
+            futures = {
+                index: pool.submit(evaluate_fold, data_path, model_paths, folds[index], horizon, fit_models)
+                for index in pending
+            }
+            for index, future in futures.items():
+                results[index] = future.result()
+    else:
+        for index in pending:
+            results[index] = evaluate_fold(data_path, model_paths, folds[index], horizon, fit_models)
+
+    if cache_dir:
+        for index in pending:
+            joblib.dump(results[index], os.path.join(cache_dir, f"fold_{keys[index]}.joblib"))
+
+    # Assemblage : modèles présents dans tous les plis, puis ensemble (combinaison servie ou
+    # moyenne simple, bornée à 0)
+    names = sorted(set.intersection(*(set(result['predictions']) for result in results)))
+    actuals = np.vstack([result['actuals'] for result in results])
+    predictions = {name: np.vstack([result['predictions'][name] for result in results]) for name in names}
+    ensemble_name = None
+    if weights is not None and any(name in names for name in weights.members):
+        ensemble_name = ENSEMBLE_NAME
+        predictions[ENSEMBLE_NAME] = np.maximum(weights.combine({name: predictions[name] for name in names}), 0)
+    elif len(names) > 1:
+        ensemble_name = MEAN_ENSEMBLE_NAME
+        predictions[MEAN_ENSEMBLE_NAME] = np.maximum(np.mean([predictions[name] for name in names], axis=0), 0)
+
+    per_horizon, summary = backtest_metrics(predictions, actuals)
+
+    if measure and names:
+        latency_features, _ = origin_features(daily, [len(daily) - 1], horizon)
+        latencies = measure_latency(load_model_files({name: model_paths[name] for name in names}), latency_features)
+        summary['latency_ms'] = pd.Series(latencies)
+        if ensemble_name is not None:
+            members = weights.members if ensemble_name == ENSEMBLE_NAME else names
+            summary.loc[ensemble_name, 'latency_ms'] = sum(latencies.get(name, 0.0) for name in members)
+
+    return BacktestReport(per_horizon, summary, len(folds), len(actuals), horizon,
+                          cached_folds, time.perf_counter() - start,
+                          {name: predictions[name] for name in names}, actuals, fit_models is not None)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backtest à origines glissantes des modèles d'un dataset")
+    parser.add_argument("data_file")
+    parser.add_argument("model_folder")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS)
+    parser.add_argument("--fold-size", type=int, default=DEFAULT_FOLD_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--in-sample", action="store_true",
+                        help="évaluer les modèles livrés sans réentraînement (métriques optimistes)")
+    args = parser.parse_args()
+
+    from training import FoldRefit, METADATA_FILE
+
+    available, loaded = {}, {}
+    for name, path in folder_model_paths(args.model_folder).items():
+        try:
+            loaded[name] = load_model_file(path)
+            available[name] = path
+        except Exception as e:
+            print(f"⚠️ Modèle {name} ignoré : {e}")
+    metadata_path = os.path.join(args.model_folder, METADATA_FILE)
+    metadata = joblib.load(metadata_path) if os.path.exists(metadata_path) else {}
+    refit = None if args.in_sample else FoldRefit(loaded, metadata.get('model_params'))
+
+    report = run_backtest(
+        args.data_file, available, args.horizon, args.folds, args.fold_size, args.workers,
+        None if args.no_cache else os.path.join(args.model_folder, CACHE_DIR_NAME), refit or None
+    )
+    sample = "hors échantillon" if report.out_of_sample else "dans l'échantillon (optimiste)"
+    print(f"🧪 {report.n_folds} plis, {report.n_origins} origines, horizon {report.horizon} j "
+          f"({report.cached_folds} plis en cache) en {report.elapsed:.2f} s, {sample}")
+    print(report.summary.round(3).to_string())
+    print(report.horizon_table('mae').iloc[[0, 6, 13, report.horizon - 1]].round(2).to_string())
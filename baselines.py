@@ -0,0 +1,274 @@
+# =============================================================================
+# 📐 PRÉVISIONS DE RÉFÉRENCE STATISTIQUES (DÉTERMINISTES, VECTORISÉES)
+# =============================================================================
+"""
+Niveau de prévision rapide, sans modèle ni features : repli quand les
+modèles ne peuvent pas prédire, et premier niveau sous budget de latence.
+
+Méthodes, ajustées sur la Sortie journalière de tous les produits à la fois
+(matrice produits × jours, alignée sur le dernier jour, NaN avant le début) :
+- naïf saisonnier : valeur du même jour de la semaine précédente
+- lissage exponentiel simple : α choisi par produit sur une grille
+  (erreur de prévision à un pas minimale)
+- Croston (correction SBA) pour la demande intermittente : taille moyenne
+  des demandes / intervalle moyen entre demandes
+- TSB (Teunter-Syntetos-Babai) : probabilité de demande mise à jour chaque
+  jour × taille moyenne des demandes ; suit l'extinction d'une demande
+  intermittente, que Croston ne voit qu'à la demande suivante
+
+Choix de la méthode par produit : MAE sur les `HOLDOUT_DAYS` derniers jours
+(ajustement sur le début de la série). Incertitude : demi-largeur de
+l'intervalle à `DEFAULT_LEVEL`, quantile des erreurs absolues sur cette
+période (même convention que forecast_intervals.py).
+
+Demande intermittente (routage de demand_segmentation.py) : choix limité à
+`INTERMITTENT_METHODS` (Croston SBA, TSB) par `view(clé, INTERMITTENT_METHODS)`,
+sur l'erreur quadratique de la même période. Sur une série surtout nulle,
+la MAE favorise une prévision nulle ou le niveau laissé par le dernier pic ;
+l'erreur quadratique est minimale pour la demande moyenne.
+
+Les prévisions de tous les produits sont précalculées sur `MAX_DAYS` jours :
+servir une prévision revient à découper un tableau (quelques microsecondes).
+
+Benchmark : `python baselines.py`
+"""
+import time
+
+import numpy as np
+
+from forecast_intervals import DEFAULT_LEVEL
+
+METHODS = ('naive_saisonnier', 'lissage_exponentiel', 'croston', 'tsb')
+INTERMITTENT_METHODS = ('croston', 'tsb')
+SEASON = 7
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5])
+CROSTON_ALPHA = 0.1
+TSB_ALPHA = 0.1
+TSB_BETA = 0.05
+HOLDOUT_DAYS = 28
+MAX_DAYS = 365
+
+# Jours d'historique utilisés : avec α >= 0.05, le poids des observations
+# plus anciennes est négligeable (0.95^365 < 1e-8)
+FIT_DAYS = 365
+
+
+def series_matrix(series_list):
+    """Séries de longueurs différentes → matrice (séries, jours) alignée à droite, NaN à gauche"""
+    length = max((len(values) for values in series_list), default=0)
+    matrix = np.full((len(series_list), length), np.nan)
+    for row, values in enumerate(series_list):
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            matrix[row, length - len(values):] = values
+    return matrix
+
+
+# -----------------------------------------------------------------------------
+# Ajustement vectorisé (toutes les séries à la fois)
+# -----------------------------------------------------------------------------
+
+def fit_seasonal_naive(Y):
+    """Dernière saison observée (séries, SEASON) ; jours manquants à 0"""
+    last = Y[:, -SEASON:] if Y.shape[1] >= SEASON else np.pad(Y, ((0, 0), (SEASON - Y.shape[1], 0)), constant_values=np.nan)
+    return np.nan_to_num(last)
+
+
+def fit_exponential_smoothing(Y, alphas=ALPHAS):
+    """Niveau final par série, α de la grille minimisant l'erreur quadratique à un pas"""
+    level = np.full((len(alphas), Y.shape[0]), np.nan)
+    sse = np.zeros_like(level)
+    a = alphas[:, None]
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        started = ~np.isnan(level)
+        error = np.where(observed & started, y - level, 0.0)
+        sse += error ** 2
+        updated = np.where(started, level + a * error, y)
+        level = np.where(observed, updated, level)
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(Y.shape[0])
+    return np.nan_to_num(level[best, columns]), alphas[best]
+
+
+def fit_croston(Y, alpha=CROSTON_ALPHA):
+    """Taux de demande par jour (Croston avec correction SBA) ; 0 sans aucune demande"""
+    size = np.full(Y.shape[0], np.nan)
+    interval = np.full(Y.shape[0], np.nan)
+    since = np.ones(Y.shape[0])
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        demand = np.nan_to_num(y) > 0
+        first = demand & np.isnan(size)
+        size = np.where(first, y, np.where(demand, size + alpha * (y - size), size))
+        interval = np.where(first, since, np.where(demand, interval + alpha * (since - interval), interval))
+        since = np.where(demand, 1.0, since + ~np.isnan(y))
+    rate = (1 - alpha / 2) * size / interval
+    return np.nan_to_num(rate)
+
+
+def fit_tsb(Y, alpha=TSB_ALPHA, beta=TSB_BETA):
+    """Taux de demande par jour (TSB) : probabilité de demande × taille moyenne ; 0 sans aucune demande"""
+    size = np.full(Y.shape[0], np.nan)
+    probability = np.full(Y.shape[0], np.nan)
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        demand = np.nan_to_num(y) > 0
+        first = demand & np.isnan(size)
+        size = np.where(first, y, np.where(demand, size + alpha * (y - size), size))
+        # Probabilité initialisée au premier jour observé, mise à jour chaque jour observé
+        started = observed & np.isnan(probability)
+        probability = np.where(started, demand.astype(float),
+                               np.where(observed, probability + beta * (demand - probability), probability))
+    return np.nan_to_num(probability * size)
+
+
+def _method_forecasts(season, level, rate, tsb_rate, days):
+    """{méthode: (séries, jours)} à partir des paramètres ajustés"""
+    return {
+        'naive_saisonnier': np.tile(season, (1, -(-days // SEASON)))[:, :days],
+        'lissage_exponentiel': np.repeat(level[:, None], days, axis=1),
+        'croston': np.repeat(rate[:, None], days, axis=1),
+        'tsb': np.repeat(tsb_rate[:, None], days, axis=1)
+    }
+
+
+def _fit_parameters(Y):
+    level, _ = fit_exponential_smoothing(Y)
+    return fit_seasonal_naive(Y), level, fit_croston(Y), fit_tsb(Y)
+
+
+class BaselineForecaster:
+    """Prévisions de référence précalculées pour un ensemble de séries"""
+
+    def __init__(self, keys, forecasts, methods, half_widths, holdout_mae, last_dates=None, elapsed=0.0,
+                 holdout_errors=None, holdout_rmse=None, method_half_widths=None):
+        self.keys = list(keys)
+        self.index = {key: row for row, key in enumerate(self.keys)}
+        # {méthode: (séries, MAX_DAYS)}
+        self.forecasts = forecasts
+        # Méthode retenue et demi-largeur de l'intervalle par série
+        self.methods = list(methods)
+        self.half_widths = np.asarray(half_widths, dtype=float)
+        # MAE et RMSE de chaque méthode sur la période de validation : (séries, méthodes)
+        self.holdout_mae = holdout_mae
+        self.holdout_rmse = holdout_rmse
+        # Demi-largeur de l'intervalle de chaque méthode : (séries, méthodes)
+        self.method_half_widths = method_half_widths
+        # Erreurs (prévision - réel) de la méthode retenue sur cette période : (séries, jours), NaN si non observé
+        self.holdout_errors = holdout_errors
+        self.last_dates = last_dates or {}
+        self.elapsed = elapsed
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def view(self, key, methods=None):
+        """
+        Prévisions d'une seule série (None si la clé n'a pas été ajustée) ;
+        `methods` : choix limité à ces méthodes (voir `method_for`)
+        """
+        return BaselineSeries(self, key, methods) if key in self.index else None
+
+    def method_for(self, key, methods=None):
+        """Méthode retenue pour la série ; parmi `methods`, celle de RMSE minimale sur la validation"""
+        row = self.index[key]
+        if methods is None or self.holdout_rmse is None:
+            return self.methods[row]
+        columns = [METHODS.index(method) for method in methods]
+        return METHODS[columns[int(np.argmin(self.holdout_rmse[row, columns]))]]
+
+    def forecast(self, key, days=30, method=None):
+        """(prévisions, incertitudes, {méthode: prévisions}) d'une série, en listes"""
+        row = self.index[key]
+        days = min(days, MAX_DAYS)
+        individual = {name: values[row, :days] for name, values in self.forecasts.items()}
+        if method is None or self.method_half_widths is None:
+            method, half_width = self.methods[row], self.half_widths[row]
+        else:
+            half_width = self.method_half_widths[row, METHODS.index(method)]
+        return individual[method].tolist(), [float(half_width)] * days, individual
+
+
+class BaselineSeries:
+    """Vue d'un forecaster limitée à une série (dernier jour connu et prévisions)"""
+
+    def __init__(self, forecaster, key, methods=None):
+        self.forecaster = forecaster
+        self.key = key
+        self.last_date = forecaster.last_dates.get(key)
+        self.method = forecaster.method_for(key, methods)
+
+    def forecast(self, days=30):
+        return self.forecaster.forecast(self.key, days, self.method)
+
+
+def fit_baselines(series, last_dates=None, level=DEFAULT_LEVEL, holdout=HOLDOUT_DAYS):
+    """
+    Ajuste les méthodes sur {clé: valeurs journalières} et retient la
+    meilleure par série (voir le docstring du module)
+    """
+    start = time.perf_counter()
+    keys = list(series)
+    Y = series_matrix([np.asarray(series[key], dtype=float)[-(FIT_DAYS + holdout):] for key in keys])
+
+    # Validation : ajustement sur le début, prévision des `holdout` derniers jours
+    train, actual = Y[:, :-holdout], Y[:, -holdout:]
+    holdout_forecasts = _method_forecasts(*_fit_parameters(train), holdout)
+    errors = np.stack([holdout_forecasts[method] - actual for method in METHODS], axis=1)   # (séries, méthodes, jours)
+    valid = ~np.isnan(actual)
+    counts = valid.sum(axis=1)
+    holdout_mae = np.where(valid[:, None, :], np.abs(errors), 0.0).sum(axis=2) / np.maximum(counts, 1)[:, None]
+    holdout_rmse = np.sqrt(np.where(valid[:, None, :], errors ** 2, 0.0).sum(axis=2) / np.maximum(counts, 1)[:, None])
+    # Séries trop courtes : lissage exponentiel par défaut
+    chosen = np.where(counts > 0, np.argmin(holdout_mae, axis=1), METHODS.index('lissage_exponentiel'))
+
+    signed_errors = np.where(valid, errors[np.arange(len(keys)), chosen], np.nan)
+    chosen_errors = np.abs(signed_errors)
+    half_widths = np.zeros(len(keys))
+    method_half_widths = np.zeros((len(keys), len(METHODS)))
+    has_errors = counts > 0
+    if has_errors.any():
+        half_widths[has_errors] = np.nanquantile(chosen_errors[has_errors], level, axis=1)
+        method_errors = np.where(valid[:, None, :], np.abs(errors), np.nan)
+        method_half_widths[has_errors] = np.nanquantile(method_errors[has_errors], level, axis=2)
+
+    forecasts = _method_forecasts(*_fit_parameters(Y), MAX_DAYS)
+    return BaselineForecaster(keys, forecasts, [METHODS[index] for index in chosen], half_widths, holdout_mae,
+                              last_dates, time.perf_counter() - start, signed_errors, holdout_rmse, method_half_widths)
+
+
+def baseline_predictions(values, days=30, level=DEFAULT_LEVEL):
+    """Prévision de référence d'une seule série (repli sans forecaster précalculé)"""
+    return fit_baselines({'serie': values}, level=level).forecast('serie', days)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    from stock_data import load_daily_history
+    from training import catalogue_files
+
+    histories = {}
+    for path in catalogue_files():
+        try:
+            histories[path] = load_daily_history(path)
+        except Exception as e:
+            print(f"⚠️ {path} ignoré : {e}")
+    series = {path: pd.to_numeric(daily['Sortie'], errors='coerce').to_numpy() for path, daily in histories.items()}
+    forecaster = fit_baselines(series)
+
+    timings = []
+    for _ in range(1000):
+        start = time.perf_counter()
+        forecaster.forecast(forecaster.keys[0], 30)
+        timings.append(time.perf_counter() - start)
+    print(f"📐 {len(series)} produits ajustés en {forecaster.elapsed * 1000:.1f} ms, "
+          f"prévision servie en {np.median(timings) * 1e6:.1f} µs")
+    table = pd.DataFrame(forecaster.holdout_mae, index=forecaster.keys, columns=METHODS).round(2)
+    table['méthode'] = forecaster.methods
+    table['intermittente'] = [forecaster.method_for(key, INTERMITTENT_METHODS) for key in forecaster.keys]
+    table['demi-largeur'] = forecaster.half_widths.round(1)
+    print(table.to_string())
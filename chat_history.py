@@ -0,0 +1,180 @@
+# =============================================================================
+# 💬 HISTORIQUE DE CONVERSATION BORNÉ (FENÊTRE, ARCHIVE, RÉSUMÉ)
+# =============================================================================
+"""
+Historique du chat Vision IA dont le coût ne croît pas avec la durée de la session.
+
+- fenêtre en mémoire bornée : au-delà de `window_size` messages, les plus
+  anciens sont retirés par lots
+- archive optionnelle sur disque (JSON Lines, un message par ligne) avec
+  les positions de chaque message pour relire une page sans tout charger
+- résumé compact des messages sortis de la fenêtre, envoyé au LLM à la place
+  de la conversation complète (`llm_summary`, placé dans le message système
+  avec son propre budget, sans la troncature des messages d'historique)
+- pagination : l'interface n'affiche que la dernière page, les pages plus
+  anciennes sont lues à la demande (fenêtre ou archive)
+
+L'objet se manipule comme une liste pour les messages récents
+(`append`, `len`, itération, `historique[-1]`).
+"""
+import json
+import os
+import threading
+import uuid
+
+DEFAULT_WINDOW_SIZE = 40
+DEFAULT_COMPACTION_BATCH = 10
+DEFAULT_PAGE_SIZE = 10
+
+# Taille maximale du résumé et d'une entrée du résumé (caractères)
+SUMMARY_MAX_CHARS = 1200
+SUMMARY_ENTRY_CHARS = 140
+
+# Répertoire d'archive (désactivée si la variable n'est pas définie)
+ARCHIVE_DIR_ENV = "VISION_CHAT_ARCHIVE_DIR"
+
+
+def _first_sentence(text, limit=SUMMARY_ENTRY_CHARS):
+    text = " ".join(str(text).split())
+    for separator in (". ", " ? ", "? ", "! ", "\n"):
+        position = text.find(separator)
+        if 0 < position < limit:
+            text = text[:position + 1]
+            break
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ChatHistory:
+    """Historique borné en mémoire, archivé sur disque et résumé"""
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE, compaction_batch=DEFAULT_COMPACTION_BATCH,
+                 archive_path=None):
+        self.window_size = window_size
+        self.compaction_batch = max(1, min(compaction_batch, window_size))
+        self.archive_path = archive_path
+        self._window = []
+        self._archive_offsets = []
+        self._archived_count = 0
+        self._summary_entries = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, **options):
+        """Archive activée si VISION_CHAT_ARCHIVE_DIR est défini (un fichier par session)"""
+        archive_dir = os.getenv(ARCHIVE_DIR_ENV)
+        archive_path = None
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            archive_path = os.path.join(archive_dir, f"chat_{uuid.uuid4().hex[:12]}.jsonl")
+        return cls(archive_path=archive_path, **options)
+
+    # -------------------------------------------------------------------------
+    # Interface de type liste (messages récents)
+    # -------------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._window)
+
+    def __bool__(self):
+        return self.total_count > 0
+
+    def __iter__(self):
+        return iter(list(self._window))
+
+    def __getitem__(self, index):
+        return self._window[index]
+
+    @property
+    def total_count(self):
+        """Nombre total de messages de la session (archivés compris)"""
+        return self._archived_count + len(self._window)
+
+    @property
+    def archived_count(self):
+        return self._archived_count
+
+    def append(self, message):
+        with self._lock:
+            self._window.append(dict(message))
+            if len(self._window) > self.window_size:
+                self._compact()
+
+    def clear(self):
+        with self._lock:
+            self._window = []
+            self._archive_offsets = []
+            self._archived_count = 0
+            self._summary_entries = []
+            if self.archive_path and os.path.exists(self.archive_path):
+                os.remove(self.archive_path)
+
+    # -------------------------------------------------------------------------
+    # Compactage : archive + résumé
+    # -------------------------------------------------------------------------
+
+    def _compact(self):
+        evicted = self._window[:self.compaction_batch]
+        self._window = self._window[self.compaction_batch:]
+
+        if self.archive_path:
+            with open(self.archive_path, "ab") as archive:
+                for message in evicted:
+                    self._archive_offsets.append(archive.tell())
+                    archive.write(json.dumps(message, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+        self._archived_count += len(evicted)
+
+        for message in evicted:
+            if message.get("role") == "user":
+                self._summary_entries.append(f"- Question : {_first_sentence(message.get('content', ''))}")
+            elif message.get("role") == "assistant":
+                self._summary_entries.append(f"  Réponse : {_first_sentence(message.get('content', ''))}")
+        # Le résumé reste borné : les entrées les plus anciennes disparaissent
+        while self._summary_entries and sum(len(entry) + 1 for entry in self._summary_entries) > SUMMARY_MAX_CHARS:
+            self._summary_entries.pop(0)
+
+    @property
+    def summary(self):
+        return "\n".join(self._summary_entries)
+
+    def llm_summary(self):
+        """Résumé des échanges archivés pour le LLM, None tant que rien n'est archivé"""
+        return self.summary if self._summary_entries else None
+
+    def llm_history(self):
+        """Fenêtre récente au format chat-completions (le résumé est passé à part)"""
+        return [{"role": m["role"], "content": m["content"]} for m in self._window]
+
+    # -------------------------------------------------------------------------
+    # Pagination
+    # -------------------------------------------------------------------------
+
+    def page_count(self, page_size=DEFAULT_PAGE_SIZE):
+        """Pages accessibles : toute la session avec une archive, la fenêtre sinon"""
+        available = self.total_count if self.archive_path else len(self._window)
+        return max(1, -(-available // page_size))
+
+    def _read_archived(self, start, stop):
+        if not self.archive_path or start >= stop:
+            return []
+        messages = []
+        with open(self.archive_path, "rb") as archive:
+            archive.seek(self._archive_offsets[start])
+            for _ in range(stop - start):
+                messages.append(json.loads(archive.readline()))
+        return messages
+
+    def page(self, page_index=0, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Messages d'une page, dans l'ordre chronologique.
+        La page 0 est la plus récente.
+        """
+        with self._lock:
+            first_available = 0 if self.archive_path else self._archived_count
+            stop = self.total_count - page_index * page_size
+            start = max(first_available, stop - page_size)
+            if stop <= start:
+                return []
+            archived = self._read_archived(start, min(stop, self._archived_count))
+            window_start = max(start - self._archived_count, 0)
+            window_stop = stop - self._archived_count
+            return archived + (self._window[window_start:window_stop] if window_stop > 0 else [])
@@ -0,0 +1,411 @@
+# =============================================================================
+# ✂️ COMPACTION DES ENSEMBLES D'ARBRES (MOINS D'ARBRES, MOINS PROFONDS)
+# =============================================================================
+"""
+Réduction du nombre d'arbres et de la profondeur des ensembles compilés
+(tree_compiler.py) tant que l'erreur de backtest reste dans une tolérance.
+
+- évaluation sur les origines glissantes du backtest (backtesting.py) :
+  plis anciens pour choisir les arbres, plis récents pour vérifier l'erreur ;
+  ces plis doivent être hors échantillon. Le modèle servi est réentraîné sur
+  tout l'historique : la recherche se fait sur des modèles de référence
+  (mêmes paramètres, `DEFAULT_REFERENCE_SEEDS` graines) entraînés sur les
+  cibles antérieures au premier pli, puis le compromis retenu (arbres,
+  profondeur) est appliqué au modèle servi
+- sélection des arbres :
+  - forêts (moyenne des arbres) évaluées directement (modèle qui n'a pas vu
+    les plis) : sélection gloutonne, chaque étape ajoute l'arbre qui réduit
+    le plus la MAE de la moyenne sur les plis de sélection ; via un modèle de
+    référence : premiers arbres (arbres tirés indépendamment), seul choix
+    transposable d'un modèle à l'autre
+  - boosting (somme pondérée) : premiers arbres de la séquence
+- réduction de profondeur : les nœuds à la profondeur maximale deviennent des
+  feuilles dont la valeur est la moyenne des feuilles du sous-arbre, pondérée
+  par la couverture
+- toutes les combinaisons (arbres, profondeur) sont évaluées d'un coup : une
+  évaluation de l'ensemble par profondeur, puis sommes cumulées sur les arbres
+- erreurs relatives à l'ensemble complet, moyennées sur les modèles de
+  référence : un compromis doit tenir d'un tirage des arbres à l'autre
+- choix : coût minimal (arbres × profondeur = comparaisons par ligne) parmi
+  les combinaisons dont la MAE des plis de sélection ne dépasse pas
+  (1 + tolérance) × celle de l'ensemble complet, au moins
+  `MIN_AVERAGING_TREES` arbres pour une moyenne d'arbres ; le compromis est
+  ensuite vérifié sur les plis de vérification (MAE et RMSE), qui n'ont pas
+  servi au choix : hors tolérance, le modèle n'est pas compacté. Le rapport
+  donne les métriques des plis de vérification
+
+Le rapport donne taille, latence et erreur avant / après, et la frontière
+coût / erreur pour choisir un autre compromis par produit.
+
+Utilisation : `python compaction.py data/parleG_clean.csv --tolerance 0.02 [--write]`
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtesting import DEFAULT_FOLDS, DEFAULT_FOLD_SIZE, DEFAULT_HORIZON, fold_origins
+from forecast_features import future_features, origin_features
+from training import DEFAULT_TRAINING_HORIZON, RANDOM_STATE, build_estimator, training_matrix
+from tree_compiler import CompiledEnsemble, compile_model
+
+# Hausse relative de MAE acceptée sur les plis de vérification
+DEFAULT_TOLERANCE = 0.02
+
+# Profondeur minimale essayée
+MIN_DEPTH = 2
+
+# Nombre minimal d'arbres gardés dans une moyenne d'arbres (forêts)
+MIN_AVERAGING_TREES = 10
+
+# Modèles de référence (graines) sur lesquels l'erreur relative est moyennée
+DEFAULT_REFERENCE_SEEDS = 5
+
+LATENCY_REPEATS = 30
+
+
+# -----------------------------------------------------------------------------
+# Transformations d'un ensemble compilé
+# -----------------------------------------------------------------------------
+
+def _node_structure(compiled):
+    """(profondeur, arbre) de chaque nœud ; -1 pour un nœud non atteint"""
+    depth = np.full(compiled.n_nodes, -1)
+    tree = np.full(compiled.n_nodes, -1)
+    depth[compiled.roots] = 0
+    tree[compiled.roots] = np.arange(compiled.n_trees)
+    frontier = compiled.roots
+    for level in range(compiled.depth):
+        internal = frontier[compiled.left[frontier] != frontier]
+        children = np.concatenate([compiled.left[internal], compiled.right[internal]])
+        depth[children] = level + 1
+        tree[children] = np.concatenate([tree[internal], tree[internal]])
+        frontier = children
+    return depth, tree
+
+
+def _subtree_means(compiled, depth):
+    """Valeur moyenne de chaque sous-arbre, feuilles pondérées par leur couverture"""
+    means = compiled.value.copy()
+    cover = compiled.cover if compiled.cover is not None else np.ones(compiled.n_nodes)
+    weight = cover.astype(float).copy()
+    for level in range(compiled.depth - 1, -1, -1):
+        nodes = np.flatnonzero((depth == level) & (compiled.left != np.arange(compiled.n_nodes)))
+        left, right = compiled.left[nodes], compiled.right[nodes]
+        total = weight[left] + weight[right]
+        equal = total <= 0
+        left_weight = np.where(equal, 1.0, weight[left])
+        right_weight = np.where(equal, 1.0, weight[right])
+        means[nodes] = (left_weight * means[left] + right_weight * means[right]) / (left_weight + right_weight)
+        weight[nodes] = np.where(equal, 0.0, total)
+    return means
+
+
+def truncate(compiled, max_depth=None, trees=None):
+    """
+    Ensemble réduit aux arbres `trees` (indices, dans cet ordre) et à la
+    profondeur `max_depth` ; nœuds non atteints retirés des tableaux
+    """
+    max_depth = compiled.depth if max_depth is None else min(max_depth, compiled.depth)
+    trees = np.arange(compiled.n_trees) if trees is None else np.asarray(trees, dtype=int)
+    depth, tree = _node_structure(compiled)
+    means = _subtree_means(compiled, depth)
+    own = np.arange(compiled.n_nodes)
+    leaf = (compiled.left == own) | (depth == max_depth)
+
+    # Nœuds conservés, regroupés arbre par arbre dans l'ordre de `trees`
+    rank = np.full(compiled.n_trees, -1)
+    rank[trees] = np.arange(len(trees))
+    keep = np.flatnonzero((depth >= 0) & (depth <= max_depth) & (rank[np.maximum(tree, 0)] >= 0))
+    keep = keep[np.argsort(rank[tree[keep]], kind='stable')]
+    new_index = np.full(compiled.n_nodes, -1)
+    new_index[keep] = np.arange(len(keep))
+
+    left = np.where(leaf, own, compiled.left)[keep]
+    right = np.where(leaf, own, compiled.right)[keep]
+    scale = 1.0 / len(trees) if compiled.averaging else compiled.scale
+    return CompiledEnsemble(
+        np.where(leaf, 0, compiled.feature)[keep], np.where(leaf, 0, compiled.threshold)[keep],
+        new_index[left], new_index[right], np.where(leaf, means, 0.0)[keep], compiled.default_left[keep],
+        new_index[compiled.roots[trees]], max_depth, scale=scale, base=compiled.base, strict=compiled.strict,
+        float32=compiled.float32, feature_names=compiled.feature_names, source=compiled.source,
+        cover=None if compiled.cover is None else compiled.cover[keep], importance=compiled.importance,
+        averaging=compiled.averaging
+    )
+
+
+def tree_outputs(compiled, X):
+    """Valeur de la feuille atteinte dans chaque arbre : (lignes, arbres)"""
+    return compiled.value[compiled.leaves(X)]
+
+
+def greedy_tree_order(outputs, actual, base=0.0):
+    """Ordre glouton des arbres d'une moyenne : chaque étape minimise la MAE de la moyenne"""
+    remaining = list(range(outputs.shape[1]))
+    order, total = [], np.zeros(outputs.shape[0])
+    for step in range(outputs.shape[1]):
+        candidates = (total[:, None] + outputs[:, remaining]) / (step + 1)
+        errors = np.mean(np.abs(base + candidates - actual[:, None]), axis=0)
+        best = remaining.pop(int(np.argmin(errors)))
+        order.append(best)
+        total += outputs[:, best]
+    return np.array(order)
+
+
+# -----------------------------------------------------------------------------
+# Recherche du compromis
+# -----------------------------------------------------------------------------
+
+class CompactionReport:
+    """Ensemble compacté, métriques avant / après et frontière coût / erreur"""
+
+    def __init__(self, compiled, before, after, candidates, tolerance, elapsed=0.0, verified=True, n_references=0):
+        self.compiled = compiled
+        # {'trees', 'depth', 'nodes', 'bytes', 'latency_ms', 'mae', 'rmse'}
+        self.before = before
+        self.after = after
+        # Une ligne par (arbres, profondeur) : cost, nodes, mae, rmse (moyennes sur
+        # les références) et erreurs relatives à l'ensemble complet (ratio_*)
+        self.candidates = candidates
+        self.tolerance = tolerance
+        self.elapsed = elapsed
+        # Faux si le compromis choisi a échoué sur les plis de vérification (pas de compaction)
+        self.verified = verified
+        self.n_references = n_references
+
+    @property
+    def frontier(self):
+        """Combinaisons non dominées : coût croissant, MAE strictement décroissante"""
+        ordered = self.candidates.sort_values(['cost', 'mae'])
+        return ordered[ordered['mae'] < ordered['mae'].cummin().shift(fill_value=np.inf)]
+
+    def summary(self):
+        return pd.DataFrame({'avant': self.before, 'après': self.after})
+
+    def to_dict(self):
+        return {'tolerance': self.tolerance, 'before': self.before, 'after': self.after,
+                'verified': self.verified, 'n_references': self.n_references}
+
+
+def _median_latency(compiled, features, repeats=LATENCY_REPEATS):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        compiled.predict(features)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def _evaluation_folds(daily, horizon, n_folds, fold_size):
+    folds = fold_origins(len(daily), horizon, n_folds, fold_size)
+    if len(folds) < 2:
+        raise ValueError("Historique trop court pour la compaction (au moins deux plis)")
+    return folds
+
+
+def reference_estimators(name, model, daily, horizon=DEFAULT_HORIZON, n_folds=DEFAULT_FOLDS,
+                         fold_size=DEFAULT_FOLD_SIZE, params=None, n_seeds=DEFAULT_REFERENCE_SEEDS):
+    """
+    Modèles de mêmes paramètres entraînés sur les cibles antérieures au premier
+    pli d'évaluation (plis hors échantillon pour eux), un par graine aléatoire ;
+    paramètres du modèle s'il est un estimateur, sinon `params` (métadonnées
+    de la version)
+    """
+    cutoff = int(_evaluation_folds(daily, horizon, n_folds, fold_size)[0][0])
+    train_X, train_y, _ = training_matrix(daily, DEFAULT_TRAINING_HORIZON, last_target=cutoff)
+    references = []
+    for seed in range(RANDOM_STATE, RANDOM_STATE + n_seeds):
+        if params is None and hasattr(model, 'get_params'):
+            from sklearn.base import clone
+            estimator = clone(model)
+        else:
+            estimator = build_estimator(name, params)
+        if 'random_state' in estimator.get_params():
+            estimator.set_params(random_state=seed)
+        references.append(estimator.fit(train_X, train_y))
+    return references
+
+
+def _evaluation_data(daily, horizon, n_folds, fold_size):
+    """(X, réel) des plis de sélection (anciens) et de vérification (récents)"""
+    folds = _evaluation_folds(daily, horizon, n_folds, fold_size)
+    half = len(folds) // 2
+    data = []
+    for origins in (np.concatenate(folds[:half]), np.concatenate(folds[half:])):
+        X, actual = origin_features(daily, origins, horizon)
+        actual = actual.ravel()
+        valid = ~np.isnan(actual)
+        data.append((X[valid], actual[valid]))
+    return data
+
+
+def _candidate_table(searched, order, n_trees, max_depth, min_depth, selection, check):
+    """Erreurs de chaque (premiers arbres de `order`, profondeur) sur les plis de sélection et de vérification"""
+    (select_X, select_y), (check_X, check_y) = selection, check
+    order = order[:n_trees]
+    counts = np.arange(1, n_trees + 1)
+
+    def prefix_errors(truncated, X, actual):
+        # Erreurs de chaque préfixe de `order` : (lignes, nombre d'arbres)
+        sums = np.cumsum(tree_outputs(truncated, X)[:, order], axis=1)
+        predictions = searched.base + (sums / counts if searched.averaging else searched.scale * sums)
+        return predictions - actual[:, None]
+
+    rows = []
+    for depth in range(max_depth, min(min_depth, max_depth) - 1, -1):
+        truncated = truncate(searched, depth)
+        errors = prefix_errors(truncated, check_X, check_y)
+        tree_nodes = np.bincount(_node_structure(truncated)[1], minlength=truncated.n_trees)
+        rows.append(pd.DataFrame({
+            'trees': counts, 'depth': depth, 'cost': counts * depth, 'nodes': np.cumsum(tree_nodes[order]),
+            'mae_selection': np.mean(np.abs(prefix_errors(truncated, select_X, select_y)), axis=0),
+            'mae': np.mean(np.abs(errors), axis=0), 'rmse': np.sqrt(np.mean(errors ** 2, axis=0))
+        }))
+    table = pd.concat(rows, ignore_index=True)
+    initial = table.iloc[n_trees - 1]
+    for metric in ('mae_selection', 'mae', 'rmse'):
+        table[f'ratio_{metric}'] = table[metric] / initial[metric] if initial[metric] > 0 else 1.0
+    return table
+
+
+def compact_model(model, daily, tolerance=DEFAULT_TOLERANCE, horizon=DEFAULT_HORIZON,
+                  n_folds=DEFAULT_FOLDS, fold_size=DEFAULT_FOLD_SIZE, min_depth=MIN_DEPTH, references=None,
+                  min_averaging_trees=MIN_AVERAGING_TREES):
+    """
+    Compaction d'un modèle d'arbres sur l'historique `daily` (voir le docstring
+    du module). Sans `references`, le modèle ne doit pas avoir vu les plis
+    d'évaluation ; sinon la recherche se fait sur les modèles de `references`
+    (`reference_estimators`), erreurs relatives moyennées, et le compromis est
+    appliqué à `model`
+    """
+    start = time.perf_counter()
+    compiled = model if isinstance(model, CompiledEnsemble) else compile_model(model)
+    selection, check = _evaluation_data(daily, horizon, n_folds, fold_size)
+
+    if references:
+        searched = [reference if isinstance(reference, CompiledEnsemble) else compile_model(reference)
+                    for reference in references]
+        orders = [np.arange(ensemble.n_trees) for ensemble in searched]
+    else:
+        searched = [compiled]
+        if compiled.averaging:
+            orders = [greedy_tree_order(tree_outputs(compiled, selection[0]), selection[1], compiled.base)]
+        else:
+            orders = [np.arange(compiled.n_trees)]
+    # Grille commune à toutes les références
+    n_trees = min(ensemble.n_trees for ensemble in searched)
+    max_depth = min(ensemble.depth for ensemble in searched)
+    tables = [_candidate_table(ensemble, order, n_trees, max_depth, min_depth, selection, check)
+              for ensemble, order in zip(searched, orders)]
+    candidates = pd.concat(tables).groupby(['trees', 'depth'], as_index=False, sort=False).mean()
+
+    # Choix sur les plis de sélection seulement, puis vérification sur les plis récents
+    initial = candidates[(candidates['trees'] == n_trees) & (candidates['depth'] == max_depth)].iloc[0]
+    min_trees = min(min_averaging_trees, n_trees) if compiled.averaging else 1
+    eligible = candidates[(candidates['trees'] >= min_trees) &
+                          (candidates['ratio_mae_selection'] <= 1 + tolerance)]
+    chosen = eligible.sort_values(['cost', 'nodes', 'ratio_mae_selection']).iloc[0]
+    verified = bool(chosen['ratio_mae'] <= 1 + tolerance and chosen['ratio_rmse'] <= 1 + tolerance)
+    if not verified:
+        print(f"ℹ️ Compromis {int(chosen['trees'])} arbres / profondeur {int(chosen['depth'])} hors tolérance "
+              f"sur les plis de vérification (MAE × {chosen['ratio_mae']:.3f}) : modèle non compacté")
+        chosen = initial
+
+    if int(chosen['trees']) == n_trees and int(chosen['depth']) == max_depth:
+        compacted = compiled
+    elif not references:
+        compacted = truncate(compiled, int(chosen['depth']), orders[0][:int(chosen['trees'])])
+    else:
+        # Même nombre de premiers arbres et même profondeur sur le modèle servi
+        trees = min(int(chosen['trees']), compiled.n_trees)
+        compacted = truncate(compiled, int(chosen['depth']), np.arange(trees))
+
+    features = future_features(daily, daily.index[-1], horizon)
+
+    def describe(ensemble, row):
+        return {
+            'trees': ensemble.n_trees, 'depth': ensemble.depth, 'nodes': ensemble.n_nodes,
+            'bytes': ensemble.nbytes, 'latency_ms': _median_latency(ensemble, features),
+            'mae': float(row['mae']), 'rmse': float(row['rmse'])
+        }
+
+    return CompactionReport(compacted, describe(compiled, initial), describe(compacted, chosen), candidates,
+                            tolerance, time.perf_counter() - start, verified, len(references or ()))
+
+
+def compact_folder(data_path, folder, tolerance=DEFAULT_TOLERANCE, model_names=None, write=False, **options):
+    """
+    Compaction des modèles d'arbres d'un dossier pour un produit ; `write`
+    remplace les tableaux servis (artefacts, voir model_artifacts.py).
+    Les modèles servis ayant vu tout l'historique, l'erreur est mesurée sur
+    des modèles de référence entraînés avant les plis (`reference_estimators`)
+    Retourne {modèle: CompactionReport}
+    """
+    import os
+
+    import joblib
+
+    from model_artifacts import load_model_file, model_paths, replace_tree_arrays
+    from stock_data import load_daily_history
+    from training import METADATA_FILE
+
+    daily = load_daily_history(data_path)
+    metadata_path = os.path.join(folder, METADATA_FILE)
+    recorded_params = joblib.load(metadata_path).get('model_params', {}) if os.path.exists(metadata_path) else {}
+    fold_options = {key: options[key] for key in ('horizon', 'n_folds', 'fold_size') if key in options}
+    n_seeds = options.pop('n_seeds', DEFAULT_REFERENCE_SEEDS)
+    reports = {}
+    for name, path in model_paths(folder).items():
+        if model_names is not None and name not in model_names:
+            continue
+        try:
+            model = load_model_file(path)
+            params = recorded_params.get(name)
+            if params is None and not hasattr(model, 'get_params'):
+                raise ValueError("paramètres d'entraînement inconnus, pas de modèle de référence")
+            references = reference_estimators(name, model, daily, params=params, n_seeds=n_seeds, **fold_options)
+            reports[name] = compact_model(model, daily, tolerance, references=references, **options)
+        except Exception as e:
+            print(f"⚠️ Modèle {name} non compacté : {e}")
+            continue
+        if write:
+            replace_tree_arrays(folder, name, reports[name].compiled, compaction=reports[name].to_dict())
+    return reports
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from shared_models import ensure_artifacts
+    from training import catalogue_files, latest_model_folder
+
+    parser = argparse.ArgumentParser(description="Compaction des ensembles d'arbres par produit")
+    parser.add_argument("data_files", nargs="*", help="Fichiers de données (défaut : tout data/)")
+    parser.add_argument("--folder", default=None, help="Dossier de modèles (défaut : version servie du produit)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--models", nargs="+", default=None)
+    parser.add_argument("--seeds", type=int, default=DEFAULT_REFERENCE_SEEDS,
+                        help="Modèles de référence (graines) sur lesquels l'erreur est moyennée")
+    parser.add_argument("--write", action="store_true", help="Remplace les tableaux servis par la version compactée")
+    args = parser.parse_args()
+
+    for data_path in args.data_files or catalogue_files():
+        product_folder = latest_model_folder(data_path)
+        folder = args.folder or product_folder or "models"
+        # Un dossier partagé entre produits n'est pas réécrit pour un seul produit
+        write = args.write and folder == product_folder
+        if args.write and not write:
+            print(f"ℹ️ {folder} partagé entre produits : rapport seulement")
+        if write:
+            ensure_artifacts(folder)
+        print(f"✂️ {data_path} ({folder}, tolérance {args.tolerance:.0%})")
+        for name, report in compact_folder(data_path, folder, args.tolerance, args.models, write,
+                                           n_seeds=args.seeds).items():
+            before, after = report.before, report.after
+            print(f"   {name:<4} arbres {before['trees']:>4} → {after['trees']:<4} profondeur {before['depth']:>2} → "
+                  f"{after['depth']:<2} nœuds {before['nodes']:>6} → {after['nodes']:<6} "
+                  f"taille {before['bytes'] / 1024:6.0f} → {after['bytes'] / 1024:5.0f} Ko | "
+                  f"latence {before['latency_ms']:5.2f} → {after['latency_ms']:5.2f} ms | "
+                  f"MAE {before['mae']:6.2f} → {after['mae']:6.2f}, RMSE {before['rmse']:6.2f} → {after['rmse']:6.2f} "
+                  f"({report.elapsed:.1f} s)")
+            print(report.frontier.head(8).round(2).to_string(index=False))
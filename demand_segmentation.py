@@ -0,0 +1,161 @@
+# =============================================================================
+# 📉 SEGMENTATION DE LA DEMANDE PAR PRODUIT (ADI / CV²) ET ROUTAGE DES MODÈLES
+# =============================================================================
+"""
+Classement de la demande de chaque produit (Syntetos-Boylan), calculé sur la
+Sortie journalière de tous les produits à la fois (même matrice que
+baselines.py) :
+- ADI : intervalle moyen entre deux jours de demande (jours observés / jours
+  avec Sortie > 0)
+- CV² : carré du coefficient de variation des quantités des jours de demande
+
+Classes, seuils `ADI_THRESHOLD` = 1.32 et `CV2_THRESHOLD` = 0.49 :
+- régulière (ADI < 1.32, CV² < 0.49) et erratique (ADI < 1.32, CV² >= 0.49) :
+  ensemble de modèles d'arbres
+- intermittente (ADI >= 1.32, CV² < 0.49) et sporadique (ADI >= 1.32,
+  CV² >= 0.49) : les features de retards et de moyennes mobiles des arbres
+  y sont surtout nulles ; estimateurs de demande intermittente de
+  baselines.py (`INTERMITTENT_METHODS` : Croston SBA ou TSB, erreur
+  quadratique minimale sur la période de validation) sans exécuter l'ensemble
+
+Fenêtre : `WINDOW_DAYS` derniers jours (la demande récente décide du routage).
+
+Comparaison du coût d'une actualisation du catalogue (ensemble pour tous les
+produits / avec routage) : `python demand_segmentation.py models`
+"""
+import time
+
+import numpy as np
+
+from baselines import series_matrix
+
+ADI_THRESHOLD = 1.32
+CV2_THRESHOLD = 0.49
+WINDOW_DAYS = 365
+
+DEMAND_CLASSES = ('reguliere', 'erratique', 'intermittente', 'sporadique')
+DEMAND_CLASS_LABELS = {'reguliere': 'régulière', 'erratique': 'erratique', 'intermittente': 'intermittente',
+                       'sporadique': 'sporadique'}
+# Classes servies par les prévisions spécialisées au lieu de l'ensemble
+ROUTED_CLASSES = ('intermittente', 'sporadique')
+
+
+def demand_statistics(Y):
+    """
+    (adi, cv2, part de jours sans demande) par série d'une matrice (séries,
+    jours) ; NaN = jour non observé. Sans aucune demande : ADI infini, CV² 0
+    """
+    observed = ~np.isnan(Y)
+    values = np.where(observed, Y, 0.0)
+    demand = values > 0
+    n_observed = observed.sum(axis=1)
+    n_demand = demand.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adi = np.where(n_demand > 0, n_observed / n_demand, np.inf)
+        sizes = np.where(demand, values, 0.0)
+        mean = sizes.sum(axis=1) / n_demand
+        variance = np.where(demand, (sizes - mean[:, None]) ** 2, 0.0).sum(axis=1) / n_demand
+        cv2 = np.where(n_demand > 0, variance / mean ** 2, 0.0)
+        zero_share = np.where(n_observed > 0, 1 - n_demand / n_observed, 1.0)
+    return adi, np.nan_to_num(cv2), zero_share
+
+
+def classify(adi, cv2):
+    """Indice de la classe (DEMAND_CLASSES) de chaque série"""
+    return 2 * (np.asarray(adi) >= ADI_THRESHOLD) + (np.asarray(cv2) >= CV2_THRESHOLD)
+
+
+class DemandSegmentation:
+    """Classe de demande et routage de chaque produit"""
+
+    def __init__(self, keys, adi, cv2, zero_share, elapsed=0.0):
+        self.keys = list(keys)
+        self.index = {key: row for row, key in enumerate(self.keys)}
+        self.adi = np.asarray(adi, dtype=float)
+        self.cv2 = np.asarray(cv2, dtype=float)
+        self.zero_share = np.asarray(zero_share, dtype=float)
+        self.classes = [DEMAND_CLASSES[index] for index in classify(self.adi, self.cv2)]
+        self.elapsed = elapsed
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def demand_class(self, key):
+        return self.classes[self.index[key]] if key in self.index else None
+
+    def routed(self, key):
+        """Vrai si le produit est servi par les prévisions spécialisées plutôt que l'ensemble"""
+        return self.demand_class(key) in ROUTED_CLASSES
+
+    def describe(self, key):
+        row = self.index[key]
+        return {'classe': self.classes[row], 'adi': float(self.adi[row]), 'cv2': float(self.cv2[row]),
+                'jours_sans_demande': float(self.zero_share[row]), 'routage': self.routed(key)}
+
+    def table(self):
+        import pandas as pd
+        return pd.DataFrame([self.describe(key) for key in self.keys], index=self.keys)
+
+
+def segment_demand(series, window=WINDOW_DAYS):
+    """Segmentation de {clé: valeurs journalières} sur les `window` derniers jours"""
+    start = time.perf_counter()
+    keys = list(series)
+    Y = series_matrix([np.asarray(series[key], dtype=float)[-window:] for key in keys])
+    adi, cv2, zero_share = demand_statistics(Y)
+    return DemandSegmentation(keys, adi, cv2, zero_share, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import pandas as pd
+
+    from baselines import fit_baselines
+    from forecast_features import future_features
+    from model_artifacts import load_model_file, model_paths
+    from stock_data import load_daily_history
+    from training import catalogue_files
+    from tree_compiler import fast_predict
+
+    parser = argparse.ArgumentParser(description="Segmentation ADI/CV² et coût d'une actualisation du catalogue")
+    parser.add_argument("folder", nargs="?", default="models")
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    histories = {}
+    for path in catalogue_files():
+        try:
+            histories[path] = load_daily_history(path)
+        except Exception as e:
+            print(f"⚠️ {path} ignoré : {e}")
+    series = {path: pd.to_numeric(daily['Sortie'], errors='coerce').to_numpy() for path, daily in histories.items()}
+    segmentation = segment_demand(series)
+    print(f"📉 {len(series)} produits segmentés en {segmentation.elapsed * 1000:.2f} ms")
+    print(segmentation.table().round(2).to_string())
+
+    models = {}
+    for name, path in model_paths(args.folder).items():
+        try:
+            models[name] = load_model_file(path)
+        except Exception as e:
+            print(f"⚠️ Modèle {name} ignoré : {e}")
+
+    def ensemble_cost(path):
+        start = time.perf_counter()
+        daily = histories[path]
+        features = future_features(daily, daily.index[-1], args.days)
+        for model in models.values():
+            fast_predict(model, features)
+        return time.perf_counter() - start
+
+    for path in histories:
+        ensemble_cost(path)   # compilation et vérification hors mesure
+    start = time.perf_counter()
+    fit_baselines(series)
+    baseline_time = time.perf_counter() - start
+    full = sum(ensemble_cost(path) for path in histories)
+    routed = sum(0.0 if segmentation.routed(path) else ensemble_cost(path) for path in histories)
+    routed += baseline_time + segmentation.elapsed
+    print(f"⏱️ Ensemble ({len(models)} modèles) pour tous les produits : {full * 1000:.1f} ms | "
+          f"avec routage ({sum(map(segmentation.routed, histories))} produits spécialisés) : {routed * 1000:.1f} ms")
@@ -0,0 +1,363 @@
+# =============================================================================
+# 🎯 EXPLICABILITÉ DES MODÈLES (IMPORTANCE GLOBALE ET CONTRIBUTIONS PAR JOUR)
+# =============================================================================
+"""
+Importance des features et contributions de chaque feature à chaque jour prévu,
+calculées à partir des modèles chargés (rf, gb, xgb, lgb).
+
+- importance globale : importance native de chaque modèle (réduction
+  d'impureté pour scikit-learn, gain pour xgboost / lightgbm), normalisée
+  puis moyennée sur les modèles
+- contributions par jour (valeurs de Shapley, prévision = base + Σ contributions) :
+  - xgboost : `predict(..., pred_contribs=True)`
+  - lightgbm : `predict(..., pred_contrib=True)`
+  - arbres scikit-learn et ensembles compilés (tree_compiler.py, chargés
+    depuis les artefacts de model_artifacts.py) : TreeSHAP (version
+    « path-dependent ») vectorisé en NumPy ; chaque feuille est un jeu produit
+    dont les valeurs de Shapley se calculent par produit de polynômes, pour
+    toutes les feuilles et toutes les lignes à la fois
+- les lignes identiques (même calendrier) ne sont expliquées qu'une fois
+- cache par instantané de prévision (dataset, modèles, date, horizon) : une
+  explication de 90 jours × 4 modèles n'est calculée qu'une fois
+
+Benchmark : `python explainability.py models/rf_model.joblib data/parleG_clean.csv`
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from math import factorial
+
+import numpy as np
+import pandas as pd
+
+from tree_compiler import CompiledEnsemble
+
+# Instantanés de prévision gardés en mémoire
+MAX_CACHED_EXPLANATIONS = 16
+
+# Nom de la « feature » qui porte la valeur de base dans les tableaux de contributions
+BASE_VALUE_NAME = 'base'
+
+
+# -----------------------------------------------------------------------------
+# TreeSHAP pour les arbres scikit-learn et les ensembles compilés
+# -----------------------------------------------------------------------------
+
+class _LeafPaths:
+    """
+    Chemins racine → feuille d'un arbre, regroupés par nombre de features distinctes :
+    {d: (valeurs (L,), features (L, d), bornes basses (L, d), bornes hautes (L, d), fractions de couverture (L, d))}
+    Une ligne suit la feuille pour la feature k si basse < x <= haute (basse <= x < haute si `strict`).
+    Une feuille est un nœud dont les deux fils sont identiques (-1, ou lui-même dans un ensemble compilé).
+    """
+
+    def __init__(self, tree, root=0, scale=1.0, strict=False):
+        feature_array, threshold_array, left_array, right_array, value_array, cover = tree
+        self.strict = strict
+        self.expected_value = 0.0
+        groups = {}
+        # Pile : (nœud, {feature: [basse, haute, fraction de couverture]})
+        stack = [(root, {})]
+        while stack:
+            node, conditions = stack.pop()
+            left, right = left_array[node], right_array[node]
+            if left == right:
+                value = float(value_array[node]) * scale
+                self.expected_value += value * cover[node] / cover[root]
+                groups.setdefault(len(conditions), []).append((value, conditions))
+                continue
+            feature, threshold = int(feature_array[node]), float(threshold_array[node])
+            for child, side in ((left, 'left'), (right, 'right')):
+                low, high, fraction = conditions.get(feature, (-np.inf, np.inf, 1.0))
+                if side == 'left':
+                    high = min(high, threshold)
+                else:
+                    low = max(low, threshold)
+                child_conditions = dict(conditions)
+                child_conditions[feature] = (low, high, fraction * cover[child] / cover[node])
+                stack.append((child, child_conditions))
+
+        self.groups = {}
+        for depth, leaves in groups.items():
+            values = np.array([value for value, _ in leaves])
+            features = np.array([list(conditions) for _, conditions in leaves], dtype=int).reshape(len(leaves), depth)
+            bounds = np.array([list(conditions.values()) for _, conditions in leaves], dtype=float).reshape(len(leaves), depth, 3)
+            self.groups[depth] = (values, features, bounds[..., 0], bounds[..., 1], bounds[..., 2])
+
+
+def _shapley_weights(depth):
+    """Poids de Shapley s!(d-1-s)!/d! pour une coalition de taille s parmi d features"""
+    return np.array([factorial(s) * factorial(depth - 1 - s) / factorial(depth) for s in range(depth)])
+
+
+def _tree_contributions(paths, X, n_features):
+    """Contributions (lignes, features) d'un arbre ; Σ contributions + base = prédiction de l'arbre"""
+    phi = np.zeros((X.shape[0], n_features))
+    for depth, (values, features, low, high, zero) in paths.groups.items():
+        if depth == 0:
+            continue
+        # one[l, r, k] : la ligne r respecte les conditions de la feuille l sur sa k-ième feature
+        x = X[:, features]                                        # (lignes, L, d)
+        if paths.strict:
+            one = ((x >= low[None]) & (x < high[None])).astype(float)
+        else:
+            one = ((x > low[None]) & (x <= high[None])).astype(float)
+        one = np.moveaxis(one, 0, 1)                              # (L, lignes, d)
+        zero_b = np.broadcast_to(zero[:, None, :], one.shape)
+
+        # Coefficients de Π_k (z_k + o_k t) : (L, lignes, d + 1)
+        poly = np.zeros(one.shape[:2] + (depth + 1,))
+        poly[..., 0] = 1.0
+        for k in range(depth):
+            shifted = np.zeros_like(poly)
+            shifted[..., 1:] = poly[..., :-1] * one[..., k:k + 1]
+            poly = poly * zero_b[..., k:k + 1] + shifted
+
+        weights = _shapley_weights(depth)
+        for k in range(depth):
+            # Division par (z_k + o_k t) : o_k ∈ {0, 1}
+            z_k, o_k = zero_b[..., k], one[..., k]
+            quotient = np.empty(one.shape[:2] + (depth,))
+            quotient[..., depth - 1] = poly[..., depth]
+            for s in range(depth - 1, 0, -1):
+                quotient[..., s - 1] = poly[..., s] - z_k * quotient[..., s]
+            quotient = np.where(o_k[..., None] > 0, quotient, poly[..., :depth] / z_k[..., None])
+            contribution = values[:, None] * (o_k - z_k) * (quotient @ weights)   # (L, lignes)
+            np.add.at(phi.T, features[:, k], contribution)
+    return phi
+
+
+_PATH_CACHE = {}
+_PATH_LOCK = threading.Lock()
+
+
+def _tree_arrays(tree):
+    return (tree.feature, tree.threshold, tree.children_left, tree.children_right,
+            tree.value[:, 0, 0], tree.weighted_n_node_samples)
+
+
+def _sklearn_trees(model):
+    """(arbres, facteur d'échelle, valeur initiale) d'un modèle d'arbres scikit-learn"""
+    if hasattr(model, 'estimators_') and hasattr(model, 'learning_rate'):
+        # GradientBoostingRegressor : init + learning_rate × Σ arbres
+        init = 0.0
+        if model.init_ != 'zero':
+            init = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+        return [estimator.tree_ for estimator in np.ravel(model.estimators_)], model.learning_rate, init
+    if hasattr(model, 'estimators_'):
+        # Forêts : moyenne des arbres
+        return [estimator.tree_ for estimator in model.estimators_], 1.0 / len(model.estimators_), 0.0
+    if hasattr(model, 'tree_'):
+        return [model.tree_], 1.0, 0.0
+    raise TypeError(f"Modèle non supporté pour TreeSHAP : {type(model).__name__}")
+
+
+def _model_paths(model):
+    """Chemins des feuilles de tous les arbres du modèle, calculés une fois par objet modèle"""
+    with _PATH_LOCK:
+        cached = _PATH_CACHE.get(id(model))
+        if cached is not None and cached[0] is model:
+            return cached[1]
+    if isinstance(model, CompiledEnsemble):
+        if model.cover is None:
+            raise TypeError("Ensemble compilé sans couverture des nœuds : TreeSHAP impossible")
+        arrays = (model.feature, model.threshold, model.left, model.right, model.value, model.cover)
+        paths = ([_LeafPaths(arrays, int(root), model.scale, model.strict) for root in model.roots], model.base)
+    else:
+        trees, scale, init = _sklearn_trees(model)
+        paths = ([_LeafPaths(_tree_arrays(tree), 0, scale) for tree in trees], init)
+    with _PATH_LOCK:
+        _PATH_CACHE[id(model)] = (model, paths)
+    return paths
+
+
+def sklearn_contributions(model, X):
+    """TreeSHAP d'un modèle d'arbres scikit-learn ou compilé : (contributions (lignes, features), valeur de base)"""
+    if isinstance(model, CompiledEnsemble):
+        X = model._matrix(X).astype(float)
+    else:
+        X = np.asarray(X, dtype=np.float32).astype(float)   # seuils comparés en float32 comme predict
+    tree_paths, init = _model_paths(model)
+    phi = np.zeros(X.shape)
+    for paths in tree_paths:
+        phi += _tree_contributions(paths, X, X.shape[1])
+    base = init + sum(paths.expected_value for paths in tree_paths)
+    return phi, base
+
+
+# -----------------------------------------------------------------------------
+# Chemins natifs xgboost / lightgbm
+# -----------------------------------------------------------------------------
+
+def _split_bias(contributions):
+    contributions = np.asarray(contributions, dtype=float)
+    return contributions[:, :-1], float(contributions[0, -1])
+
+
+def xgboost_contributions(model, X):
+    import xgboost as xgb
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    matrix = xgb.DMatrix(X, feature_names=list(X.columns) if hasattr(X, 'columns') else None)
+    return _split_bias(booster.predict(matrix, pred_contribs=True))
+
+
+def lightgbm_contributions(model, X):
+    booster = model.booster_ if hasattr(model, 'booster_') else model
+    return _split_bias(booster.predict(X, pred_contrib=True))
+
+
+def model_contributions(model, X):
+    """Contributions (lignes, features) et valeur de base, par le chemin le plus rapide du modèle"""
+    module = type(model).__module__
+    if module.startswith('xgboost'):
+        return xgboost_contributions(model, X)
+    if module.startswith('lightgbm'):
+        return lightgbm_contributions(model, X)
+    return sklearn_contributions(model, X)
+
+
+def native_importance(model, feature_names):
+    """Importance native normalisée (somme = 1) : impureté (scikit-learn), gain (xgboost, lightgbm)"""
+    module = type(model).__module__
+    if module.startswith('xgboost'):
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        scores = booster.get_score(importance_type='gain')
+        booster_names = booster.feature_names or [f'f{i}' for i in range(len(feature_names))]
+        importance = pd.Series([scores.get(name, 0.0) for name in booster_names], index=feature_names, dtype=float)
+    elif module.startswith('lightgbm'):
+        booster = model.booster_ if hasattr(model, 'booster_') else model
+        importance = pd.Series(booster.feature_importance(importance_type='gain'), index=feature_names, dtype=float)
+    else:
+        importance = pd.Series(model.feature_importances_, index=feature_names, dtype=float)
+    total = importance.sum()
+    return importance / total if total > 0 else importance
+
+
+# -----------------------------------------------------------------------------
+# Explication d'une prévision (tous les modèles, cache par instantané)
+# -----------------------------------------------------------------------------
+
+class ForecastExplanation:
+    """Importance et contributions d'une prévision, par modèle et pour l'ensemble (moyenne)"""
+
+    def __init__(self, feature_names, contributions, base_values, importance, elapsed=0.0):
+        self.feature_names = list(feature_names)
+        # {modèle: tableau (jours, features)}
+        self.contributions = contributions
+        self.base_values = base_values
+        # {modèle: Series} importances natives normalisées
+        self.importance = importance
+        self.elapsed = elapsed
+
+    @property
+    def models(self):
+        return list(self.contributions)
+
+    @property
+    def global_importance(self):
+        """Importance native moyenne des modèles, triée"""
+        if not self.importance:
+            return pd.Series(dtype=float)
+        return pd.concat(self.importance, axis=1).mean(axis=1).sort_values(ascending=False)
+
+    def ensemble_contributions(self, weights=None):
+        """
+        Contributions de l'ensemble (jours × features), plus la colonne de base :
+        moyenne des modèles, ou combinaison pondérée (`weights`, stacking.EnsembleWeights)
+        """
+        if weights is not None and all(name in self.contributions for name in weights.members):
+            day_weights = weights.matrix(len(next(iter(self.contributions.values()))))
+            values = sum(self.contributions[name] * day_weights[:, [index]] for index, name in enumerate(weights.members))
+            table = pd.DataFrame(values, columns=self.feature_names)
+            table[BASE_VALUE_NAME] = day_weights @ np.array([self.base_values[name] for name in weights.members])
+            return table
+        table = pd.DataFrame(np.mean(list(self.contributions.values()), axis=0), columns=self.feature_names)
+        table[BASE_VALUE_NAME] = float(np.mean(list(self.base_values.values())))
+        return table
+
+    def forecast_importance(self, weights=None):
+        """Contribution absolue moyenne de chaque feature sur les jours prévus (ensemble)"""
+        table = self.ensemble_contributions(weights).drop(columns=BASE_VALUE_NAME)
+        return table.abs().mean().sort_values(ascending=False)
+
+
+def _explain_model(model, X, feature_names):
+    """Contributions d'un modèle, en n'expliquant qu'une fois chaque ligne distincte"""
+    unique_rows, inverse = np.unique(X.to_numpy(dtype=float), axis=0, return_inverse=True)
+    unique_frame = pd.DataFrame(unique_rows, columns=feature_names)
+    contributions, base = model_contributions(model, unique_frame)
+    return contributions[np.ravel(inverse)], base
+
+
+def explain_models(models, features):
+    """
+    Explication complète (sans cache) : `features` DataFrame des jours prévus,
+    colonnes dans l'ordre attendu par les modèles
+    """
+    import time
+
+    start = time.perf_counter()
+    feature_names = list(features.columns)
+    contributions, base_values, importance = {}, {}, {}
+    for name, model in models.items():
+        try:
+            contributions[name], base_values[name] = _explain_model(model, features, feature_names)
+            importance[name] = native_importance(model, feature_names)
+        except Exception as e:
+            print(f"⚠️ Explication impossible pour le modèle {name}: {e}")
+    return ForecastExplanation(feature_names, contributions, base_values, importance, time.perf_counter() - start)
+
+
+_EXPLANATIONS = OrderedDict()
+_EXPLANATIONS_LOCK = threading.Lock()
+
+
+def snapshot_key(models, features, prefix=''):
+    """Clé d'un instantané de prévision : préfixe (dataset, version des modèles) + modèles + features"""
+    digest = hashlib.sha1(np.ascontiguousarray(features.to_numpy(dtype=float)).tobytes())
+    digest.update('|'.join(list(features.columns) + sorted(models)).encode('utf-8'))
+    return f"{prefix}-{digest.hexdigest()[:16]}"
+
+
+def explain_forecast(models, features, prefix=''):
+    """Explication mise en cache par instantané de prévision (voir `snapshot_key`)"""
+    key = snapshot_key(models, features, prefix)
+    with _EXPLANATIONS_LOCK:
+        if key in _EXPLANATIONS:
+            _EXPLANATIONS.move_to_end(key)
+            return _EXPLANATIONS[key]
+    explanation = explain_models(models, features)
+    with _EXPLANATIONS_LOCK:
+        _EXPLANATIONS[key] = explanation
+        while len(_EXPLANATIONS) > MAX_CACHED_EXPLANATIONS:
+            _EXPLANATIONS.popitem(last=False)
+    return explanation
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import joblib
+
+    from forecast_features import future_features
+    from stock_data import load_daily_history
+
+    model_file, data_file = sys.argv[1], sys.argv[2]
+    model = joblib.load(model_file)
+    daily = load_daily_history(data_file)
+    features = future_features(daily, daily.index[-1], 90)
+
+    start = time.perf_counter()
+    explanation = explain_forecast({'model': model}, features)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    explain_forecast({'model': model}, features)
+    cached = time.perf_counter() - start
+
+    table = explanation.ensemble_contributions()
+    reconstructed = table.sum(axis=1).to_numpy()
+    error = np.max(np.abs(reconstructed - model.predict(features)))
+    print(f"🎯 90 jours expliqués en {first * 1000:.0f} ms (cache : {cached * 1000:.2f} ms), "
+          f"écart base + Σ contributions / predict : {error:.2e}")
+    print(explanation.forecast_importance().head(8).round(3).to_string())
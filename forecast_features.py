@@ -0,0 +1,113 @@
+# =============================================================================
+# 🔧 FEATURES DE PRÉVISION VECTORISÉES (22 FEATURES DES MODÈLES)
+# =============================================================================
+"""
+Construction des 22 features attendues par les modèles, sans Streamlit.
+
+Mêmes définitions que `create_features_from_data` (app.py) : pour une origine
+(dernier jour connu), les features d'historique (Entrée, Stock, retards,
+moyennes et écarts-types mobiles, ratios) sont figées à cette origine et
+seules les features calendaires varient avec l'horizon.
+
+- `future_features` : matrice (jours, 22) à partir de la fin de l'historique
+- `origin_features` : matrices empilées pour plusieurs origines passées
+  (calibration des intervalles, backtests) en une seule passe
+"""
+import numpy as np
+import pandas as pd
+
+FEATURE_NAMES = [
+    'Entrée', 'Stock', 'month', 'weekday', 'is_weekend', 'quarter',
+    'month_sin', 'month_cos', 'weekday_sin', 'weekday_cos',
+    'Sortie_lag_1', 'Sortie_lag_7', 'Sortie_lag_14',
+    'Sortie_ma_7', 'Sortie_std_7', 'Sortie_ma_14', 'Sortie_std_14', 'Sortie_ma_30', 'Sortie_std_30',
+    'net_flow', 'stock_velocity', 'entree_to_sortie_ratio'
+]
+
+HISTORY_FEATURES = [
+    'Entrée', 'Stock',
+    'Sortie_lag_1', 'Sortie_lag_7', 'Sortie_lag_14',
+    'Sortie_ma_7', 'Sortie_std_7', 'Sortie_ma_14', 'Sortie_std_14', 'Sortie_ma_30', 'Sortie_std_30',
+    'net_flow', 'stock_velocity', 'entree_to_sortie_ratio'
+]
+
+
+def history_state(history):
+    """
+    Features d'historique à chaque jour (DataFrame aligné sur `history`).
+
+    Comme dans l'application : `lag_k` est la k-ième dernière valeur (décalage k-1),
+    à défaut la dernière ; une fenêtre mobile incomplète utilise tout l'historique disponible.
+    """
+    frame = history[['Entrée', 'Stock', 'Sortie']].apply(pd.to_numeric, errors='coerce').ffill().fillna(0.0)
+    sortie = frame['Sortie']
+
+    state = pd.DataFrame(index=frame.index)
+    state['Entrée'] = frame['Entrée']
+    state['Stock'] = frame['Stock']
+    state['Sortie_lag_1'] = sortie
+    for lag in (7, 14):
+        state[f'Sortie_lag_{lag}'] = sortie.shift(lag - 1).fillna(sortie)
+    for window in (7, 14, 30):
+        state[f'Sortie_ma_{window}'] = sortie.rolling(window, min_periods=1).mean()
+        state[f'Sortie_std_{window}'] = sortie.rolling(window, min_periods=2).std().fillna(0.0)
+
+    state['net_flow'] = frame['Entrée'] - sortie
+    stock = frame['Stock'].to_numpy()
+    sortie_values = sortie.to_numpy()
+    entree = frame['Entrée'].to_numpy()
+    state['stock_velocity'] = np.divide(sortie_values, stock, out=np.zeros(len(stock)), where=stock > 0)
+    state['entree_to_sortie_ratio'] = np.divide(entree, sortie_values, out=np.zeros(len(stock)), where=sortie_values > 0)
+    return state
+
+
+def calendar_features(dates):
+    """Features calendaires de dates futures (DataFrame, une ligne par date)"""
+    dates = pd.DatetimeIndex(dates)
+    month = dates.month.to_numpy()
+    weekday = dates.weekday.to_numpy()
+    return pd.DataFrame({
+        'month': month,
+        'weekday': weekday,
+        'is_weekend': (weekday >= 5).astype(int),
+        'quarter': (month - 1) // 3 + 1,
+        'month_sin': np.sin(2 * np.pi * month / 12),
+        'month_cos': np.cos(2 * np.pi * month / 12),
+        'weekday_sin': np.sin(2 * np.pi * weekday / 7),
+        'weekday_cos': np.cos(2 * np.pi * weekday / 7)
+    })
+
+
+def _assemble(state_rows, origin_dates, days, feature_names):
+    """Répète l'état de chaque origine sur `days` horizons et ajoute le calendrier"""
+    repeated = state_rows.loc[state_rows.index.repeat(days)].reset_index(drop=True)
+    offsets = np.tile(np.arange(1, days + 1), len(origin_dates))
+    future_dates = np.repeat(pd.DatetimeIndex(origin_dates).to_numpy(), days) + offsets.astype('timedelta64[D]')
+    features = pd.concat([repeated, calendar_features(future_dates)], axis=1)
+    return features[list(feature_names)]
+
+
+def future_features(history, last_date, days=30, feature_names=FEATURE_NAMES):
+    """Features des `days` jours qui suivent `last_date`, à partir de la fin de l'historique"""
+    state = history_state(history).iloc[[-1]].reset_index(drop=True)
+    return _assemble(state, [pd.Timestamp(last_date)], days, feature_names)
+
+
+def origin_features(daily, origins, days=30, feature_names=FEATURE_NAMES):
+    """
+    Features empilées pour plusieurs origines d'une série journalière.
+
+    `origins` : positions (entiers) du dernier jour connu de chaque origine.
+    Retourne (features de forme (len(origins) * days, 22), valeurs réelles de Sortie
+    de forme (len(origins), days), NaN au-delà de la fin de la série).
+    """
+    origins = np.asarray(origins, dtype=int)
+    state = history_state(daily).iloc[origins].reset_index(drop=True)
+    features = _assemble(state, daily.index[origins], days, feature_names)
+
+    sortie = pd.to_numeric(daily['Sortie'], errors='coerce').fillna(0.0).to_numpy()
+    target_positions = origins[:, None] + np.arange(1, days + 1)[None, :]
+    actuals = np.full(target_positions.shape, np.nan)
+    valid = target_positions < len(sortie)
+    actuals[valid] = sortie[target_positions[valid]]
+    return features, actuals
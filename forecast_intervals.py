@@ -0,0 +1,214 @@
+# =============================================================================
+# 📏 INTERVALLES DE PRÉVISION CONFORMES PAR PRODUIT ET PAR HORIZON
+# =============================================================================
+"""
+Intervalles de prévision calibrés (split-conformal) remplaçant l'écart-type
+entre modèles de l'ensemble comme mesure d'incertitude.
+
+- calibration : résidus (réel - prévu) par pas d'horizon de l'ensemble sur
+  des prévisions hors échantillon seulement, faites par des modèles qui n'ont
+  pas vu ces jours (période de test de training.py) ; les modèles servis
+  prédisant leur propre historique d'entraînement donneraient des
+  intervalles trop étroits. Sans prévisions hors échantillon, pas
+  d'intervalles (l'application garde l'écart entre modèles)
+- bornes : quantiles des résidus avec correction d'échantillon fini
+  ⌈(n+1)(1-α)⌉/n, asymétriques (demande bornée à 0), largeur croissante
+  avec l'horizon
+- stockage : `intervalles_conformes.joblib` dans le dossier des modèles,
+  une entrée par produit, recalculée seulement si données ou modèles changent
+- horizon : celui des prévisions hors échantillon ; au-delà, largeur du
+  dernier pas
+- inférence : deux additions vectorisées sur le vecteur de prévisions
+"""
+import os
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+INTERVALS_FILE = "intervalles_conformes.joblib"
+DEFAULT_LEVELS = (0.8, 0.9, 0.95)
+DEFAULT_LEVEL = 0.9
+
+MIN_CALIBRATION_RESIDUALS = 10
+
+# Méthode enregistrée avec les intervalles : les entrées d'une autre méthode
+# (calibration dans l'échantillon des versions précédentes) sont recalculées
+CALIBRATION_METHOD = 'split_conformal_hors_echantillon'
+
+
+def conformal_quantile(scores, quantile):
+    """
+    Quantile empirique corrigé pour un échantillon fini (quantile « supérieur »),
+    ignore les NaN ; retourne NaN sous MIN_CALIBRATION_RESIDUALS valeurs
+    """
+    scores = np.sort(np.asarray(scores, dtype=float)[~np.isnan(scores)])
+    n = scores.size
+    if n < MIN_CALIBRATION_RESIDUALS:
+        return np.nan
+    rank = int(np.ceil((n + 1) * quantile)) - 1
+    return float(scores[min(max(rank, 0), n - 1)])
+
+
+class ConformalIntervals:
+    """Décalages inférieur / supérieur par niveau de couverture et pas d'horizon"""
+
+    def __init__(self, lower, upper, n_calibration, fingerprint=None, created_at=None):
+        # {niveau: tableau (horizon,)} ; lower <= 0 <= upper en général
+        self.lower = {float(level): np.asarray(values, dtype=float) for level, values in lower.items()}
+        self.upper = {float(level): np.asarray(values, dtype=float) for level, values in upper.items()}
+        self.n_calibration = int(n_calibration)
+        self.fingerprint = fingerprint
+        self.created_at = created_at or datetime.now().isoformat()
+
+    @property
+    def levels(self):
+        return sorted(self.lower)
+
+    @property
+    def horizon(self):
+        return len(next(iter(self.lower.values())))
+
+    def _offsets(self, level, days):
+        level = min(self.levels, key=lambda candidate: abs(candidate - level))
+        steps = np.minimum(np.arange(days), self.horizon - 1)
+        return self.lower[level][steps], self.upper[level][steps]
+
+    def bounds(self, predictions, level=DEFAULT_LEVEL):
+        """(borne basse, borne haute) pour un vecteur de prévisions journalières"""
+        predictions = np.asarray(predictions, dtype=float)
+        lower, upper = self._offsets(level, len(predictions))
+        return np.maximum(predictions + lower, 0.0), predictions + upper
+
+    def half_width(self, days, level=DEFAULT_LEVEL):
+        """Demi-largeur de l'intervalle par jour (« incertitude » ± de l'interface)"""
+        lower, upper = self._offsets(level, days)
+        return (upper - lower) / 2
+
+    def to_dict(self):
+        return {
+            'methode': CALIBRATION_METHOD,
+            'lower': {level: values.tolist() for level, values in self.lower.items()},
+            'upper': {level: values.tolist() for level, values in self.upper.items()},
+            'n_calibration': self.n_calibration,
+            'fingerprint': self.fingerprint,
+            'created_at': self.created_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['lower'], data['upper'], data['n_calibration'], data.get('fingerprint'), data.get('created_at'))
+
+
+def calibration_residuals(predictions, actuals, members, weights=None):
+    """
+    Résidus réel - prévu (origines, horizon) de l'ensemble servi à partir de
+    prévisions hors échantillon {modèle: (origines, horizon)} et des valeurs
+    réelles ; `members` : modèles servis, tous requis. `weights`
+    (stacking.EnsembleWeights) : même combinaison que l'application, sinon moyenne.
+    """
+    missing = [name for name in members if name not in predictions]
+    if missing or not members:
+        raise ValueError(f"Prévisions hors échantillon manquantes : {', '.join(missing) or 'aucun modèle'}")
+    individual = {name: np.asarray(predictions[name], dtype=float) for name in members}
+    if weights is not None:
+        combined = weights.combine(individual)
+    else:
+        combined = np.mean(list(individual.values()), axis=0)
+    return np.asarray(actuals, dtype=float) - np.maximum(combined, 0)
+
+
+def calibrate_intervals(residuals, levels=DEFAULT_LEVELS, fingerprint=None):
+    """
+    Intervalles à partir des résidus (origines, horizon). Les horizons sans
+    assez de résidus reprennent la borne de l'horizon précédent ; les largeurs
+    ne décroissent pas avec l'horizon.
+    """
+    residuals = np.asarray(residuals, dtype=float)
+    lower, upper = {}, {}
+    for level in levels:
+        alpha = 1 - level
+        low = np.array([-conformal_quantile(-residuals[:, step], 1 - alpha / 2) for step in range(residuals.shape[1])])
+        high = np.array([conformal_quantile(residuals[:, step], 1 - alpha / 2) for step in range(residuals.shape[1])])
+        low = _fill_forward(low)
+        high = _fill_forward(high)
+        lower[level] = np.minimum.accumulate(np.minimum(low, 0.0))
+        upper[level] = np.maximum.accumulate(np.maximum(high, 0.0))
+    n_calibration = int(np.sum(~np.isnan(residuals[:, 0]))) if residuals.size else 0
+    return ConformalIntervals(lower, upper, n_calibration, fingerprint)
+
+
+def _fill_forward(values):
+    values = values.copy()
+    if np.isnan(values[0]):
+        values[0] = 0.0
+    for step in range(1, len(values)):
+        if np.isnan(values[step]):
+            values[step] = values[step - 1]
+    return values
+
+
+# =============================================================================
+# 💾 STOCKAGE À CÔTÉ DES MODÈLES
+# =============================================================================
+
+_STORE_CACHE = {}
+_STORE_LOCK = threading.Lock()
+
+
+def _store_path(folder):
+    return os.path.join(folder, INTERVALS_FILE)
+
+
+def load_interval_store(folder):
+    """{clé produit: dict d'intervalles} du dossier de modèles, relu si le fichier change"""
+    path = _store_path(folder)
+    if not os.path.exists(path):
+        return {}
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _STORE_LOCK:
+        if key not in _STORE_CACHE:
+            _STORE_CACHE.clear()
+            _STORE_CACHE[key] = joblib.load(path)
+        return _STORE_CACHE[key]
+
+
+def save_intervals(folder, product_key, intervals):
+    with _STORE_LOCK:
+        path = _store_path(folder)
+        store = joblib.load(path) if os.path.exists(path) else {}
+        store[product_key] = intervals.to_dict()
+        joblib.dump(store, path)
+
+
+def get_intervals(folder, product_key, fingerprint, residuals):
+    """
+    Intervalles du produit : lus depuis le dossier des modèles si l'empreinte
+    (données + modèles) est inchangée, sinon recalibrés sur `residuals()`
+    (résidus hors échantillon, None s'il n'y en a pas) et enregistrés.
+    None sans résidus hors échantillon.
+    """
+    stored = load_interval_store(folder).get(product_key)
+    if stored and stored.get('fingerprint') == fingerprint and stored.get('methode') == CALIBRATION_METHOD:
+        return ConformalIntervals.from_dict(stored)
+    residuals = residuals()
+    if residuals is None or np.sum(~np.isnan(residuals[:, 0])) < MIN_CALIBRATION_RESIDUALS:
+        return None
+    intervals = calibrate_intervals(residuals, fingerprint=fingerprint)
+    try:
+        save_intervals(folder, product_key, intervals)
+    except OSError as e:
+        print(f"⚠️ Intervalles non enregistrés pour {product_key}: {e}")
+    return intervals
+
+
+def empirical_coverage(intervals, predictions, actuals, level=DEFAULT_LEVEL):
+    """Part des valeurs réelles dans l'intervalle (prévisions et réels de forme (origines, horizon))"""
+    predictions = np.atleast_2d(predictions)
+    actuals = np.atleast_2d(actuals)
+    lower, upper = intervals._offsets(level, predictions.shape[1])
+    inside = (actuals >= np.maximum(predictions + lower, 0.0)) & (actuals <= predictions + upper)
+    valid = ~np.isnan(actuals)
+    return float(inside[valid].mean()) if valid.any() else float('nan')
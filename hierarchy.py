@@ -0,0 +1,340 @@
+# =============================================================================
+# 🧩 HIÉRARCHIE DES PRODUITS ET RÉCONCILIATION DES PRÉVISIONS
+# =============================================================================
+"""
+Les produits sont prévus un par un : la somme des prévisions de May Arm 1kg et
+5kg ne correspond pas à la prévision de la famille. La réconciliation rend
+toutes les prévisions cohérentes (chaque nœud = somme de ses enfants).
+
+Hiérarchie famille → SKU → magasin : `DEFAULT_HIERARCHY` (clé du dataset →
+(famille, SKU, magasin)), remplaçable par le fichier JSON `HIERARCHY_FILE`
+(même format, listes de trois chaînes). Les nœuds qui ne regroupent qu'un
+seul enfant sont fusionnés avec lui (sinon séries identiques, covariance
+singulière).
+
+Réconciliation = projection linéaire, en opérations matricielles sur toutes
+les prévisions à la fois (nœuds × jours, éventuellement par lots) :
+    ỹ = S · P · ŷ
+S : matrice d'agrégation (nœuds × feuilles), P (feuilles × nœuds) selon la méthode
+- bottom_up : prévisions des feuilles seules, agrégées
+- top_down : prévisions du niveau `TOP_DOWN_LEVEL` seules, réparties selon
+  les parts historiques de chaque feuille (moyenne des `PROPORTION_DAYS`
+  derniers jours) ; prévoir les agrégats suffit, sans ensemble par feuille
+- mint : trace minimale (Wickramasuriya et al.), P = (SᵀW⁻¹S)⁻¹SᵀW⁻¹, W
+  covariance des erreurs des prévisions de base avec rétrécissement vers sa
+  diagonale (Schäfer-Strimmer) ; sans erreurs de ces mêmes prévisions,
+  W structurel diag(S·1) (nombre de feuilles de chaque nœud)
+
+Prévisions de base : celles fournies pour les feuilles (prévisions servies
+par l'application), sinon prévisions de référence (baselines.py), qui
+servent aussi pour tous les agrégats. Calendrier commun : les prévisions
+partent du dernier jour connu le plus récent ; une feuille dont l'historique
+s'arrête plus tôt est décalée d'autant, et ses jours manquants sont
+complétés par ses propres prévisions dans l'historique des agrégats.
+Erreurs pour W : période de validation de baselines.py sur les jours où
+toutes les feuilles sont observées, seulement si toutes les prévisions de
+base sont celles de baselines.py ; dès qu'une feuille est servie par un
+autre modèle (erreurs inconnues) ou que l'historique commun est trop
+court, W structurel.
+
+Démonstration : `python hierarchy.py --method mint`
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from baselines import HOLDOUT_DAYS, FIT_DAYS, MAX_DAYS, fit_baselines
+
+LEVELS = ('total', 'famille', 'sku', 'magasin')
+RECONCILIATION_METHODS = ('bottom_up', 'top_down', 'mint')
+DEFAULT_METHOD = 'bottom_up'
+TOP_DOWN_LEVEL = 'famille'
+PROPORTION_DAYS = 365
+
+HIERARCHY_FILE = os.path.join("data", "hierarchie.json")
+DEFAULT_STORE = "Magasin principal"
+DEFAULT_HIERARCHY = {
+    'mayor1_csv': ("Mayonnaise", "Mayor 1", DEFAULT_STORE),
+    'may_arm_1kg': ("Mayonnaise", "May Arm 1kg", DEFAULT_STORE),
+    'may_arm_5kg': ("Mayonnaise", "May Arm 5kg", DEFAULT_STORE),
+    'laitbroli_1kg': ("Lait", "Lait Broli 1kg", DEFAULT_STORE),
+    'couche_softcqre_T4': ("Hygiène", "Couche Softcare T4", DEFAULT_STORE),
+    'papierhygsita': ("Hygiène", "Papier Hygisita", DEFAULT_STORE),
+    'parleG': ("Biscuits", "ParleG", DEFAULT_STORE)
+}
+
+
+class Hierarchy:
+    """Nœuds de la hiérarchie et matrice d'agrégation S (nœuds × feuilles)"""
+
+    def __init__(self, paths):
+        # {clé de feuille: (famille, SKU, magasin)}
+        self.leaf_keys = list(paths)
+        self.paths = {key: tuple(paths[key]) for key in self.leaf_keys}
+        candidates = [('total', 'Total', tuple(self.leaf_keys))]
+        for depth, level in enumerate(LEVELS[1:], start=1):
+            groups = {}
+            for key in self.leaf_keys:
+                groups.setdefault(self.paths[key][:depth], []).append(key)
+            candidates += [(level, ' / '.join(prefix), tuple(keys)) for prefix, keys in groups.items()]
+        # Un nœud par ensemble de feuilles : le plus haut niveau garde son libellé
+        self.nodes, seen = [], set()
+        for level, label, keys in candidates:
+            if keys not in seen:
+                seen.add(keys)
+                self.nodes.append((level, label, keys))
+        self.S = np.array([[key in keys for key in self.leaf_keys] for _, _, keys in self.nodes], dtype=float)
+        self.levels = [level for level, _, _ in self.nodes]
+        self.labels = [label for _, label, _ in self.nodes]
+        # Ligne de chaque feuille dans les nœuds
+        self.leaf_rows = [self.nodes.index(next(node for node in self.nodes if node[2] == (key,)))
+                          for key in self.leaf_keys]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def aggregate(self, bottom):
+        """Valeurs des feuilles (..., feuilles, jours) → tous les nœuds (..., nœuds, jours)"""
+        return np.matmul(self.S, bottom)
+
+    def ancestor_rows(self, level):
+        """Pour chaque feuille, le nœud le plus fin de niveau <= `level` qui la contient"""
+        depth = LEVELS.index(level)
+        rows = []
+        for column in range(len(self.leaf_keys)):
+            eligible = [row for row, node_level in enumerate(self.levels)
+                        if LEVELS.index(node_level) <= depth and self.S[row, column]]
+            rows.append(min(eligible, key=lambda row: self.S[row].sum()))
+        return rows
+
+
+def load_hierarchy(keys, path=HIERARCHY_FILE):
+    """
+    Hiérarchie des clés `keys` : fichier JSON s'il existe, sinon
+    `DEFAULT_HIERARCHY` ; une clé inconnue forme sa propre famille
+    """
+    definition = dict(DEFAULT_HIERARCHY)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as handle:
+            definition.update({key: tuple(value) for key, value in json.load(handle).items()})
+    return Hierarchy({key: definition.get(key, (key, key, DEFAULT_STORE)) for key in keys})
+
+
+# -----------------------------------------------------------------------------
+# Matrices de projection P (feuilles × nœuds)
+# -----------------------------------------------------------------------------
+
+def bottom_up_projection(hierarchy):
+    P = np.zeros((len(hierarchy.leaf_keys), len(hierarchy)))
+    P[np.arange(len(hierarchy.leaf_keys)), hierarchy.leaf_rows] = 1.0
+    return P
+
+
+def top_down_projection(hierarchy, bottom_history, level=TOP_DOWN_LEVEL):
+    """Parts historiques moyennes de chaque feuille dans son ancêtre de niveau `level`"""
+    totals = np.nansum(bottom_history, axis=1)
+    rows = hierarchy.ancestor_rows(level)
+    P = np.zeros((len(hierarchy.leaf_keys), len(hierarchy)))
+    for column, row in enumerate(rows):
+        siblings = hierarchy.S[row].astype(bool)
+        parent_total = totals[siblings].sum()
+        share = totals[column] / parent_total if parent_total > 0 else 1.0 / siblings.sum()
+        P[column, row] = share
+    return P
+
+
+def shrunk_covariance(residuals):
+    """
+    Covariance (nœuds × nœuds) des erreurs (nœuds, jours), rétrécie vers sa
+    diagonale avec l'intensité de Schäfer-Strimmer ; jours incomplets ignorés
+    """
+    X = residuals[:, ~np.isnan(residuals).any(axis=0)].T   # (jours, nœuds)
+    n_days = len(X)
+    if n_days < 2:
+        raise ValueError("Pas assez de jours d'erreurs pour estimer la covariance")
+    covariance = X.T @ X / n_days
+    variances = np.diag(covariance).copy()
+    # Séries sans erreur (prévision parfaite sur la période) : plancher de variance
+    floor = max(variances.mean(), 1.0) * 1e-6
+    variances = np.maximum(variances, floor)
+    std = np.sqrt(variances)
+    Xs = X / std
+    correlation = Xs.T @ Xs / n_days
+    squares = Xs ** 2
+    v = (squares.T @ squares - (Xs.T @ Xs) ** 2 / n_days) / (n_days * (n_days - 1))
+    np.fill_diagonal(v, 0.0)
+    off = correlation - np.eye(len(correlation))
+    denominator = (off ** 2).sum()
+    shrinkage = float(np.clip(v.sum() / denominator, 0.0, 1.0)) if denominator > 0 else 1.0
+    W = shrinkage * np.diag(variances) + (1 - shrinkage) * covariance
+    W[np.diag_indices_from(W)] = variances
+    return W, shrinkage
+
+
+def structural_covariance(hierarchy):
+    """W structurel : variance de chaque nœud proportionnelle à son nombre de feuilles"""
+    return np.diag(hierarchy.S.sum(axis=1))
+
+
+def mint_projection(hierarchy, W):
+    """P = (SᵀW⁻¹S)⁻¹SᵀW⁻¹ par résolution de systèmes (sans inverse explicite)"""
+    A = np.linalg.solve(W, hierarchy.S)            # W⁻¹S (nœuds × feuilles)
+    return np.linalg.solve(hierarchy.S.T @ A, A.T)
+
+
+def reconcile(hierarchy, base, P):
+    """
+    Prévisions cohérentes S·P·ŷ de `base` (..., nœuds, jours). Feuilles
+    négatives ramenées à 0 puis réagrégées (la cohérence est conservée)
+    """
+    bottom = np.maximum(np.matmul(P, base), 0.0)
+    return hierarchy.aggregate(bottom)
+
+
+# -----------------------------------------------------------------------------
+# Réconciliation du catalogue
+# -----------------------------------------------------------------------------
+
+class Reconciliation:
+    """Prévisions de base et réconciliées de tous les nœuds sur le calendrier commun"""
+
+    def __init__(self, hierarchy, method, start, base, reconciled, shrinkage=None, elapsed=0.0,
+                 covariance=None):
+        self.hierarchy = hierarchy
+        self.method = method
+        # W de mint : 'erreurs' (validation des prévisions de base) ou 'structurelle'
+        self.covariance = covariance
+        # Premier jour prévu (lendemain du dernier jour connu le plus récent)
+        self.start = start
+        self.base = base
+        self.reconciled = reconciled
+        self.shrinkage = shrinkage
+        self.elapsed = elapsed
+
+    def leaf_forecast(self, key):
+        """Prévisions réconciliées d'une feuille (liste)"""
+        return self.reconciled[self.hierarchy.leaf_rows[self.hierarchy.leaf_keys.index(key)]].tolist()
+
+    def incoherence(self, values=None):
+        """Écart maximal entre chaque nœud et la somme de ses feuilles"""
+        values = self.base if values is None else values
+        bottom = values[self.hierarchy.leaf_rows]
+        return float(np.max(np.abs(self.hierarchy.aggregate(bottom) - values)))
+
+    def table(self):
+        """Total sur l'horizon par nœud : prévision de base et réconciliée"""
+        import pandas as pd
+        return pd.DataFrame({
+            'niveau': self.hierarchy.levels,
+            'base': self.base.sum(axis=1),
+            'reconcilie': self.reconciled.sum(axis=1)
+        }, index=self.hierarchy.labels)
+
+
+def _shifted(forecasts, offset, days):
+    """Fenêtre [offset, offset + days) de prévisions, prolongée par la dernière valeur"""
+    forecasts = np.asarray(forecasts, dtype=float)
+    window = forecasts[offset:offset + days]
+    if len(window) < days:
+        fill = window[-1] if len(window) else (forecasts[-1] if len(forecasts) else 0.0)
+        window = np.concatenate([window, np.full(days - len(window), fill)])
+    return window
+
+
+def reconcile_catalogue(histories, days=30, method=DEFAULT_METHOD, leaf_forecasts=None, hierarchy=None):
+    """
+    Réconciliation des prévisions de {clé: historique journalier (Sortie)}.
+    `leaf_forecasts` : {clé: prévisions depuis le dernier jour de la feuille},
+    sinon prévisions de référence.
+    """
+    import pandas as pd
+
+    if method not in RECONCILIATION_METHODS:
+        raise ValueError(f"Méthode de réconciliation inconnue : {method}")
+    start_time = time.perf_counter()
+    hierarchy = hierarchy or load_hierarchy(list(histories))
+    keys = hierarchy.leaf_keys
+    leaf_forecasts = leaf_forecasts or {}
+    last_dates = {key: histories[key].index.max() for key in keys}
+    end = max(last_dates.values())
+    offsets = {key: (end - last_dates[key]).days for key in keys}
+
+    # Historique des feuilles sur le calendrier commun (feuilles × jours) :
+    # 0 avant le début d'une feuille, ses prévisions après son dernier jour
+    calendar = pd.date_range(end - pd.Timedelta(days=FIT_DAYS + HOLDOUT_DAYS - 1), end, freq='D')
+    leaf_baselines = fit_baselines({key: pd.to_numeric(histories[key]['Sortie'], errors='coerce').to_numpy()
+                                    for key in keys})
+    bottom = np.zeros((len(keys), len(calendar)))
+    for row, key in enumerate(keys):
+        observed = pd.to_numeric(histories[key]['Sortie'], errors='coerce').reindex(calendar)
+        values = np.array(observed, dtype=float)
+        missing = min(offsets[key], len(calendar))
+        if missing:
+            tail = _shifted(leaf_baselines.forecast(key, MAX_DAYS)[0], 0, offsets[key])
+            values[-missing:] = tail[-missing:]
+        bottom[row] = np.nan_to_num(values)
+    nodes_history = hierarchy.aggregate(bottom)
+
+    # Prévisions de base de tous les nœuds (nœuds × jours)
+    aggregate_rows = [row for row in range(len(hierarchy)) if row not in hierarchy.leaf_rows]
+    aggregates = fit_baselines({row: nodes_history[row] for row in aggregate_rows}) if aggregate_rows else None
+    base = np.zeros((len(hierarchy), days))
+    for row in aggregate_rows:
+        base[row] = aggregates.forecast(row, days)[0]
+    served_leaves = []
+    for key, row in zip(keys, hierarchy.leaf_rows):
+        served = leaf_forecasts.get(key)
+        if served is not None and len(served) >= offsets[key] + days:
+            base[row] = _shifted(served, offsets[key], days)
+            served_leaves.append(key)
+        else:
+            base[row] = _shifted(leaf_baselines.forecast(key, MAX_DAYS)[0], offsets[key], days)
+
+    shrinkage = covariance = None
+    if method == 'bottom_up':
+        P = bottom_up_projection(hierarchy)
+    elif method == 'top_down':
+        P = top_down_projection(hierarchy, bottom[:, -PROPORTION_DAYS:])
+    else:
+        # Erreurs de validation des prévisions de référence sur les jours où toutes
+        # les feuilles sont observées : valables seulement si ce sont les prévisions de base
+        complete = calendar <= min(last_dates.values())
+        if served_leaves or complete.sum() <= HOLDOUT_DAYS:
+            W, covariance = structural_covariance(hierarchy), 'structurelle'
+        else:
+            errors = fit_baselines({row: nodes_history[row, complete] for row in range(len(hierarchy))}).holdout_errors
+            (W, shrinkage), covariance = shrunk_covariance(errors), 'erreurs'
+        P = mint_projection(hierarchy, W)
+    reconciled = reconcile(hierarchy, base, P)
+    return Reconciliation(hierarchy, method, end + pd.Timedelta(days=1), base, reconciled, shrinkage,
+                          time.perf_counter() - start_time, covariance)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from stock_data import load_daily_history
+
+    parser = argparse.ArgumentParser(description="Réconciliation hiérarchique des prévisions du catalogue")
+    parser.add_argument("--method", choices=RECONCILIATION_METHODS, default=DEFAULT_METHOD)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    files = {
+        'mayor1_csv': 'data/mayor1.xlsx', 'laitbroli_1kg': 'data/laitbroli_1kg_clean.csv',
+        'may_arm_1kg': 'data/may_arm_1kg_clean.csv', 'may_arm_5kg': 'data/may_arm_5kg_clean.csv',
+        'couche_softcqre_T4': 'data/couche_softcqre_T4_clean.csv', 'papierhygsita': 'data/papierhygsita_clean.csv',
+        'parleG': 'data/parleG_clean.csv'
+    }
+    histories = {key: load_daily_history(path) for key, path in files.items() if os.path.exists(path)}
+    result = reconcile_catalogue(histories, args.days, args.method)
+    print(f"🧩 {len(result.hierarchy)} nœuds, {len(histories)} feuilles, méthode {result.method} : "
+          f"{result.elapsed * 1000:.1f} ms (départ {result.start.date()})")
+    if result.covariance == 'structurelle':
+        print("   covariance structurelle (erreurs des prévisions de base indisponibles)")
+    elif result.shrinkage is not None:
+        print(f"   rétrécissement de la covariance : {result.shrinkage:.2f}")
+    print(f"   incohérence base {result.incoherence():.2f} → réconciliée {result.incoherence(result.reconciled):.2e}")
+    print(result.table().round(1).to_string())
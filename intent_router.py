@@ -0,0 +1,226 @@
+# =============================================================================
+# 🧭 ROUTEUR D'INTENTIONS COMPILÉ DU CHATBOT
+# =============================================================================
+"""
+Détection d'intentions en une seule passe sur la question.
+
+Toutes les listes de mots-clés sont fusionnées (doublons supprimés) puis
+compilées une fois à l'import en une expression régulière en forme de trie
+(préfixes communs factorisés). Un seul balayage `finditer` renvoie tous les
+mots-clés présents, y compris ceux qui se chevauchent, et chaque intention
+reçoit un score égal au nombre de ses mots-clés trouvés.
+
+Sémantique identique à `any(mot in question.lower() for mot in liste)` :
+une intention est détectée si au moins un de ses mots-clés est une
+sous-chaîne de la question.
+
+Benchmark : `python intent_router.py`
+"""
+import re
+import time
+
+# Listes d'origine de generate_smart_response / analyze_stock_data_smart
+INTENT_KEYWORDS = {
+    # Questions sur les prédictions, les produits et le stock → base de données intégrée
+    'stock': [
+        'prédiction', 'prévoir', 'futur', 'modèle', 'prédire', 'broli', 'données', 'analyse',
+        'mayor', 'moyen', 'terme', 'produit', 'nombre', 'information', 'donner', 'present',
+        'stock', 'inventaire', 'consommation', 'rupture', 'alerte', 'état', 'couche', 'softcare',
+        'softcaire', 'lait', 'parle', 'papier', 'optimisation', 'recommandation', 'gestion',
+        'vente', 'achat', 'commande', 'approvisionnement'
+    ],
+    # Questions générales → Groq
+    'general': [
+        'cameroun', 'france', 'afrique', 'monde', 'géographie', 'histoire', 'math', 'calcul',
+        'climat', 'superficie', 'population', 'culture', 'politique', 'économie', 'sport',
+        'science', 'technologie', 'connais', 'sais', 'savoir', 'bonjour', 'salut', 'aide',
+        'help', 'comment', 'pourquoi', 'quand', 'où', 'qui', 'quoi'
+    ],
+    # Analyse d'un produit précis
+    'produit_specifique': [
+        'couche', 'softcare', 'softcqre', 'lait', 'broli', 'produit spécifique', 'prédiction', 'prévoir'
+    ],
+    # Nombre et liste des produits
+    'liste_produits': [
+        'produit', 'nombre', 'combien', 'différent', 'information', 'donner', 'stock', 'present'
+    ],
+    # Stocks détaillés par produit
+    'detail_stocks': ['stock', 'chaque', 'détail']
+}
+
+
+def _trie_pattern(keywords):
+    """Construit une regex factorisée par préfixes communs (trie) pour une liste de mots-clés"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        is_terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_terminal:
+            # Le mot s'arrête ici ou continue (quantificateur gourmand → plus long d'abord)
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class RoutingResult:
+    """Intentions détectées avec leurs scores et mots-clés trouvés"""
+
+    __slots__ = ('scores', 'keywords')
+
+    def __init__(self, scores, keywords):
+        self.scores = scores
+        self.keywords = keywords
+
+    def has(self, intent):
+        return self.scores.get(intent, 0) > 0
+
+    @property
+    def intents(self):
+        """Intentions triées par score décroissant"""
+        return sorted(self.scores, key=lambda intent: -self.scores[intent])
+
+    @property
+    def top(self):
+        intents = self.intents
+        return intents[0] if intents else None
+
+    def __repr__(self):
+        return f"RoutingResult({self.scores})"
+
+
+class IntentRouter:
+    """Routeur compilé : une regex pour tous les mots-clés de toutes les intentions"""
+
+    def __init__(self, intent_keywords):
+        self.intent_keywords = {intent: list(dict.fromkeys(words)) for intent, words in intent_keywords.items()}
+
+        keyword_intents = {}
+        for intent, words in self.intent_keywords.items():
+            for word in words:
+                keyword_intents.setdefault(word.lower(), set()).add(intent)
+        all_keywords = sorted(keyword_intents)
+
+        # À une position donnée la regex ne renvoie que le mot-clé le plus long ;
+        # les mots-clés qui en sont des préfixes sont donc rattachés à ce match.
+        self._keyword_matches = {}
+        for keyword in all_keywords:
+            prefixes = [other for other in all_keywords if keyword.startswith(other)]
+            self._keyword_matches[keyword] = tuple(prefixes)
+        self._keyword_intents = {keyword: tuple(sorted(intents)) for keyword, intents in keyword_intents.items()}
+
+        # Lookahead : chaque position est testée, les matches peuvent se chevaucher
+        self.pattern = re.compile('(?=(' + _trie_pattern(all_keywords) + '))')
+
+    def route(self, text):
+        """Balaye la question une seule fois et renvoie les intentions scorées"""
+        found = set()
+        for match in self.pattern.finditer(str(text or '').lower()):
+            keyword = match.group(1)
+            if keyword:
+                found.update(self._keyword_matches[keyword])
+
+        scores = {}
+        keywords = {}
+        for keyword in found:
+            for intent in self._keyword_intents[keyword]:
+                scores[intent] = scores.get(intent, 0) + 1
+                keywords.setdefault(intent, []).append(keyword)
+        return RoutingResult(scores, keywords)
+
+
+# Construit une seule fois à l'import
+INTENT_ROUTER = IntentRouter(INTENT_KEYWORDS)
+
+
+def route_intents(text):
+    return INTENT_ROUTER.route(text)
+
+
+# =============================================================================
+# ⏱️ BENCHMARK SUR UN CORPUS DE QUESTIONS UTILISATEURS
+# =============================================================================
+
+PROMPT_CORPUS = [
+    "Analysez le stock des couches Softcare",
+    "Quelles sont les alertes de rupture ?",
+    "Donnez-moi des recommandations d'optimisation",
+    "état du stock",
+    "rupture ?",
+    "Je veux le stock de ce produit",
+    "combien de produits différents avez-vous ?",
+    "quel est le stock de chaque produit ?",
+    "prédiction de consommation du lait broli pour 30 jours",
+    "est-ce que le papier hygisita va manquer cette semaine",
+    "stock parle g",
+    "mayor 1 combien il reste",
+    "may arm 5kg rupture dans combien de jours",
+    "Bonjour, comment ça va ?",
+    "quelle est la superficie du Cameroun ?",
+    "qui a gagné la coupe du monde de football ?",
+    "explique moi l'histoire de la France",
+    "comment calculer un stock de sécurité ?",
+    "pourquoi ma consommation augmente ?",
+    "quand dois-je passer commande pour les couches ?",
+    "donne moi une information sur l'inventaire",
+    "quels sont les détails de l'approvisionnement",
+    "peux-tu faire une analyse complète de mes données",
+    "quelle est la tendance des ventes de softcaire",
+    "aide moi à gérer mes achats",
+    "t'es qui toi",
+    "what is the weather today",
+    "merci beaucoup",
+    "prévoir la demande à moyen terme",
+    "quel modèle utilisez-vous pour prédire ?",
+]
+
+
+def _naive_route(text, intent_keywords=INTENT_KEYWORDS):
+    """Référence : un `any(...)` par intention, comme avant le routeur"""
+    text = str(text or '').lower()
+    return {intent for intent, words in intent_keywords.items() if any(word in text for word in words)}
+
+
+def benchmark(prompts=None, repeat=2000):
+    """Compare le routeur compilé aux balayages `any()` successifs (µs par question)"""
+    prompts = prompts or PROMPT_CORPUS
+
+    mismatches = [p for p in prompts if set(INTENT_ROUTER.route(p).scores) != _naive_route(p)]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for prompt in prompts:
+            _naive_route(prompt)
+    naive_us = (time.perf_counter() - start) / (repeat * len(prompts)) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for prompt in prompts:
+            INTENT_ROUTER.route(prompt)
+    router_us = (time.perf_counter() - start) / (repeat * len(prompts)) * 1e6
+
+    return {
+        'prompts': len(prompts),
+        'naive_us_per_prompt': naive_us,
+        'router_us_per_prompt': router_us,
+        'speedup': naive_us / router_us if router_us else float('inf'),
+        'mismatches': mismatches
+    }
+
+
+if __name__ == "__main__":
+    results = benchmark()
+    print(f"📊 Corpus : {results['prompts']} questions")
+    print(f"🐢 Balayages any() : {results['naive_us_per_prompt']:.2f} µs/question")
+    print(f"⚡ Routeur compilé : {results['router_us_per_prompt']:.2f} µs/question")
+    print(f"🚀 Accélération : x{results['speedup']:.1f}")
+    print("✅ Intentions identiques" if not results['mismatches'] else f"❌ Écarts : {results['mismatches']}")
@@ -0,0 +1,410 @@
+# =============================================================================
+# 🔌 BACKENDS LLM INTERCHANGEABLES (GROQ, SERVEUR LOCAL, MODÈLE DE RÉPONSE)
+# =============================================================================
+"""
+Interface commune des moteurs de réponse de Vision IA et chaîne de repli.
+
+- `GroqBackend` : API Groq via le pool de clients (hedging, disjoncteur)
+- `LocalServerBackend` : serveur compatible chat-completions sur la machine
+  (llama.cpp, Ollama `/v1`, ou `llm_stub_server.py`), activé par LOCAL_LLM_BASE_URL
+- `TemplateBackend` : réponses déterministes construites à partir des données
+  du contexte, sans réseau ni modèle - toujours disponible
+
+`BackendChain` essaie les backends dans l'ordre (VISION_LLM_BACKENDS,
+par défaut « groq,local,template ») : si Groq est injoignable, la réponse
+vient du serveur local puis du modèle de réponse au lieu d'une erreur.
+
+Benchmark latence / débit par backend : `python llm_backends.py`
+"""
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+from llm_client import get_client_pool, LLMUnavailableError
+from product_index import fold_text, STOPWORDS
+
+DEFAULT_BACKEND_ORDER = "groq,local,template"
+DEFAULT_LOCAL_MODEL = "local-model"
+DEFAULT_LOCAL_TIMEOUT = 20.0
+
+# Durée pendant laquelle le résultat d'une sonde de disponibilité est réutilisé
+AVAILABILITY_TTL = 10.0
+
+
+class LLMBackend:
+    """Interface d'un backend : `complete` obligatoire, `stream` par défaut en un seul morceau"""
+
+    name = "base"
+
+    def available(self):
+        return True
+
+    def complete(self, messages, **params):
+        raise NotImplementedError
+
+    def stream(self, messages, **params):
+        yield self.complete(messages, **params)
+
+
+# =============================================================================
+# ☁️ GROQ
+# =============================================================================
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+
+    def __init__(self, api_key=None, base_url=None):
+        self.api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY", "")
+        self.base_url = base_url
+
+    def available(self):
+        return bool(self.api_key and self.api_key.strip())
+
+    @property
+    def pool(self):
+        return get_client_pool(self.api_key, self.base_url)
+
+    def complete(self, messages, models=None, **params):
+        content, _ = self.pool.complete(messages, models=models, **params)
+        return content
+
+    def stream(self, messages, models=None, **params):
+        yield from self.pool.stream(messages, models=models, **params)
+
+
+# =============================================================================
+# 🖥️ SERVEUR LOCAL COMPATIBLE CHAT-COMPLETIONS
+# =============================================================================
+
+class LocalServerBackend(LLMBackend):
+    """Petit modèle servi en local (HTTP, format chat-completions)"""
+
+    name = "local"
+
+    def __init__(self, base_url, model=DEFAULT_LOCAL_MODEL, timeout=DEFAULT_LOCAL_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self._available = None
+        self._checked_at = 0.0
+
+    @classmethod
+    def from_environment(cls):
+        base_url = os.getenv("LOCAL_LLM_BASE_URL")
+        if not base_url:
+            return None
+        return cls(
+            base_url,
+            model=os.getenv("LOCAL_LLM_MODEL", DEFAULT_LOCAL_MODEL),
+            timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", DEFAULT_LOCAL_TIMEOUT))
+        )
+
+    def available(self):
+        """Sonde TCP rapide, mise en cache quelques secondes"""
+        now = time.monotonic()
+        if self._available is None or now - self._checked_at > AVAILABILITY_TTL:
+            parsed = urlparse(self.base_url)
+            try:
+                with socket.create_connection((parsed.hostname, parsed.port or 80), timeout=0.2):
+                    self._available = True
+            except OSError:
+                self._available = False
+            self._checked_at = now
+        return self._available
+
+    def _request(self, messages, stream, params):
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "temperature": params.get("temperature", 0.7),
+            "max_tokens": params.get("max_tokens", 1024)
+        }
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def complete(self, messages, models=None, **params):
+        with self._request(messages, False, params) as response:
+            body = json.loads(response.read())
+        return body["choices"][0]["message"]["content"]
+
+    def stream(self, messages, models=None, **params):
+        with self._request(messages, True, params) as response:
+            for raw_line in response:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    yield delta
+
+
+# =============================================================================
+# 📝 MODÈLE DE RÉPONSE DÉTERMINISTE (HORS LIGNE)
+# =============================================================================
+
+class TemplateBackend(LLMBackend):
+    """
+    Réponse construite à partir des lignes « DONNÉES » du message système
+    (voir `llm_context.py`) : produits cités dans la question, priorités
+    de réapprovisionnement, résumé des prévisions.
+    """
+
+    name = "template"
+    max_products = 3
+
+    @staticmethod
+    def _split_messages(messages):
+        question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+        data = system.split("DONNÉES :", 1)[1] if "DONNÉES :" in system else ""
+        return question, [line.strip() for line in data.splitlines() if line.strip()]
+
+    def complete(self, messages, **params):
+        question, data_lines = self._split_messages(messages)
+        product_lines = [line for line in data_lines if line.startswith("- ")]
+        other_lines = [line for line in data_lines if not line.startswith("- ") and not line.startswith("PRODUITS")]
+
+        question_words = set(fold_text(question).split()) - STOPWORDS
+        relevant = [
+            line for line in product_lines
+            if question_words & set(fold_text(line[2:].split(" : ", 1)[0]).split())
+        ]
+
+        answer = "🧠 **Vision IA (mode hors ligne)**\n\n"
+        if relevant or product_lines:
+            answer += "**📦 Données pertinentes :**\n"
+            for line in (relevant or product_lines)[:self.max_products]:
+                answer += f"{line}\n"
+            answer += "\n"
+
+        urgent = [line[2:].split(" : ", 1)[0] for line in product_lines
+                  if "statut RUPTURE" in line or "statut URGENT" in line]
+        if urgent:
+            answer += f"**⚠️ Priorités de réapprovisionnement :** {', '.join(urgent)}\n\n"
+
+        for line in other_lines:
+            answer += f"📊 {line}\n"
+
+        if not data_lines:
+            answer += (
+                "Je n'ai pas de données de stock pour cette question et aucun modèle de langage "
+                "n'est joignable pour y répondre. Posez une question sur un produit suivi "
+                "(stock, rupture, prévisions) ou réessayez lorsque la connexion sera rétablie.\n"
+            )
+
+        answer += "\n_Réponse générée localement à partir des données de l'application (service de langage indisponible)._"
+        return answer
+
+    def stream(self, messages, **params):
+        answer = self.complete(messages, **params)
+        for position in range(0, len(answer), 24):
+            yield answer[position:position + 24]
+
+
+# =============================================================================
+# 🔗 CHAÎNE DE REPLI
+# =============================================================================
+
+class BackendChain:
+    """Essaie les backends dans l'ordre et mesure latence et échecs de chacun"""
+
+    def __init__(self, backends):
+        self.backends = [backend for backend in backends if backend is not None]
+        self._stats = {backend.name: {"success": 0, "failure": 0, "skipped": 0, "avg_latency": None}
+                       for backend in self.backends}
+        self._lock = threading.Lock()
+
+    def _record(self, name, outcome, latency=None):
+        with self._lock:
+            stats = self._stats[name]
+            stats[outcome] += 1
+            if latency is not None:
+                previous = stats["avg_latency"]
+                stats["avg_latency"] = latency if previous is None else 0.8 * previous + 0.2 * latency
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(values) for name, values in self._stats.items()}
+
+    def complete(self, messages, **params):
+        """Retourne (contenu, nom du backend ayant répondu)"""
+        errors = []
+        for backend in self.backends:
+            if not backend.available():
+                self._record(backend.name, "skipped")
+                continue
+            start = time.perf_counter()
+            try:
+                content = backend.complete(messages, **params)
+            except Exception as e:
+                print(f"❌ Backend {backend.name} indisponible: {e}")
+                self._record(backend.name, "failure")
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._record(backend.name, "success", time.perf_counter() - start)
+            return content, backend.name
+        raise LLMUnavailableError("; ".join(errors) or "Aucun backend disponible")
+
+    def stream(self, messages, info=None, **params):
+        """
+        Streaming avec repli tant qu'aucun token n'a été émis.
+        `info["backend"]` reçoit le nom du backend qui répond.
+        """
+        errors = []
+        for backend in self.backends:
+            if not backend.available():
+                self._record(backend.name, "skipped")
+                continue
+            start = time.perf_counter()
+            first_token_sent = False
+            try:
+                for chunk in backend.stream(messages, **params):
+                    if not first_token_sent and info is not None:
+                        info["backend"] = backend.name
+                    first_token_sent = True
+                    yield chunk
+            except Exception as e:
+                self._record(backend.name, "failure")
+                if first_token_sent:
+                    raise
+                print(f"❌ Backend {backend.name} indisponible (streaming): {e}")
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._record(backend.name, "success", time.perf_counter() - start)
+            return
+        raise LLMUnavailableError("; ".join(errors) or "Aucun backend disponible")
+
+
+def create_backend(name, api_key=None):
+    if name == "groq":
+        return GroqBackend(api_key)
+    if name == "local":
+        return LocalServerBackend.from_environment()
+    if name == "template":
+        return TemplateBackend()
+    raise ValueError(f"Backend LLM inconnu : {name}")
+
+
+_CHAINS = {}
+_CHAINS_LOCK = threading.Lock()
+
+
+def get_backend_chain(api_key=None):
+    """Chaîne longue durée par clé API, dans l'ordre de VISION_LLM_BACKENDS"""
+    api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY", "")
+    order = os.getenv("VISION_LLM_BACKENDS", DEFAULT_BACKEND_ORDER)
+    key = (api_key, order, os.getenv("LOCAL_LLM_BASE_URL"))
+    with _CHAINS_LOCK:
+        if key not in _CHAINS:
+            names = [name.strip() for name in order.split(",") if name.strip()]
+            _CHAINS[key] = BackendChain([create_backend(name, api_key) for name in names])
+        return _CHAINS[key]
+
+
+# =============================================================================
+# ⏱️ BENCHMARK PAR BACKEND
+# =============================================================================
+
+BENCHMARK_MESSAGES = [
+    {"role": "system", "content": (
+        "Vous êtes Vision IA.\n\nDONNÉES :\nPRODUITS (faits calculés) :\n"
+        "- ParleG : statut URGENT | stock 120 | rupture 2.4 j | conso 50.0/j (30 j : 1500)\n"
+        "- Lait Broli 1kg : statut Normal | stock 900 | rupture 30.0 j | conso 30.0/j (30 j : 900)\n"
+        "PRÉVISIONS AFFICHÉES (ParleG, 30 jours) : moyenne 50.0/j, total 1500"
+    )},
+    {"role": "user", "content": "Quel est le stock de ParleG ?"}
+]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def benchmark_backend(backend, messages=None, requests=20, concurrency=1):
+    """Latence (p50/p95, premier token) et débit d'un backend"""
+    messages = messages or BENCHMARK_MESSAGES
+    latencies, first_tokens, characters, errors = [], [], [], []
+    lock = threading.Lock()
+
+    def run(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            first = None
+            size = 0
+            try:
+                for chunk in backend.stream(messages, max_tokens=256):
+                    if first is None:
+                        first = time.perf_counter() - start
+                    size += len(chunk)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                first_tokens.append(first if first is not None else latencies[-1])
+                characters.append(size)
+
+    per_worker = max(1, requests // concurrency)
+    threads = [threading.Thread(target=run, args=(per_worker,)) for _ in range(concurrency)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    if not latencies:
+        return {"backend": backend.name, "requests": 0, "errors": len(errors)}
+    return {
+        "backend": backend.name,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "first_token_p50_ms": _percentile(first_tokens, 0.5) * 1000,
+        "requests_per_s": len(latencies) / wall if wall else float("inf"),
+        "chars_per_s": sum(characters) / wall if wall else float("inf")
+    }
+
+
+if __name__ == "__main__":
+    from llm_stub_server import StubChatCompletionsServer
+
+    results = [benchmark_backend(TemplateBackend(), requests=200)]
+
+    # Serveur local simulé : ~20 ms par requête et 2 ms par token
+    with StubChatCompletionsServer({"*": {"delay": 0.02, "token_delay": 0.002}}) as server:
+        local = LocalServerBackend(server.base_url)
+        results.append(benchmark_backend(local, requests=20))
+        results.append(dict(benchmark_backend(local, requests=20, concurrency=4), backend="local (x4)"))
+
+    if os.getenv("LOCAL_LLM_BASE_URL"):
+        results.append(dict(benchmark_backend(LocalServerBackend.from_environment(), requests=5), backend="local (réel)"))
+    if os.getenv("GROQ_API_KEY"):
+        results.append(benchmark_backend(GroqBackend(), requests=5))
+
+    for result in results:
+        if not result["requests"]:
+            print(f"❌ {result['backend']}: {result['errors']} erreurs")
+            continue
+        print(
+            f"🔌 {result['backend']:<14} p50 {result['p50_ms']:8.2f} ms | p95 {result['p95_ms']:8.2f} ms | "
+            f"1er token {result['first_token_p50_ms']:8.2f} ms | {result['requests_per_s']:8.1f} req/s | "
+            f"{result['chars_per_s']:10.0f} car/s | erreurs {result['errors']}"
+        )
@@ -0,0 +1,393 @@
+# =============================================================================
+# 🔌 POOL DE CLIENTS LLM (GROQ) AVEC REQUÊTES COUVERTES ET DISJONCTEUR
+# =============================================================================
+"""
+Clients Groq longue durée partagés entre les reruns Streamlit.
+
+- un seul client HTTP par (clé API, URL de base), réutilisé à chaque appel
+- un timeout par modèle (un modèle lent ne bloque plus tout le chat)
+- requêtes couvertes (hedging) : si le modèle principal n'a pas répondu
+  dans le budget de latence, le modèle de secours est lancé en parallèle
+  et la première réponse valide l'emporte ; en streaming, c'est le premier
+  token qui compte, le flux perdant est fermé
+- disjoncteur par modèle : après N échecs consécutifs le modèle est écarté
+  pendant un délai de refroidissement, puis retesté avec une seule requête
+
+L'URL de base est surchargeable (argument ou variable GROQ_BASE_URL) pour
+pointer vers le serveur bouchon local `llm_stub_server.py`.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from groq import Groq
+
+# Modèles essayés dans l'ordre (principal puis secours)
+DEFAULT_MODELS = [
+    "llama-3.1-8b-instant",
+    "gemma2-9b-it",
+    "llama-3.1-70b-versatile"
+]
+
+# Timeout (secondes) par modèle - les gros modèles ont droit à plus de temps
+DEFAULT_MODEL_TIMEOUTS = {
+    "llama-3.1-8b-instant": 10.0,
+    "gemma2-9b-it": 15.0,
+    "llama-3.1-70b-versatile": 30.0
+}
+DEFAULT_TIMEOUT = 20.0
+
+# Budget de latence avant de lancer la requête de secours
+DEFAULT_HEDGE_DELAY = 2.0
+
+# Sessions de chat simultanées prévues par pool ; chacune peut occuper deux
+# threads (principal + secours) jusqu'au timeout du perdant
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class LLMUnavailableError(RuntimeError):
+    """Aucun modèle n'a pu répondre (tous en échec ou disjoncteurs ouverts)"""
+
+
+class CircuitBreaker:
+    """Disjoncteur simple : fermé → ouvert après N échecs → semi-ouvert après refroidissement"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Indique si une requête peut partir vers ce modèle"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                # Une seule requête d'essai à la fois en semi-ouvert
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Requête abandonnée sans résultat : libère l'essai semi-ouvert sans compter d'échec"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LLMClientPool:
+    """Client Groq réutilisable avec timeouts par modèle, hedging et disjoncteurs"""
+
+    def __init__(self, api_key=None, base_url=None, models=None, model_timeouts=None,
+                 hedge_delay=DEFAULT_HEDGE_DELAY, failure_threshold=3, reset_timeout=60.0,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_workers=None):
+        self.api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY", "")
+        self.base_url = base_url or os.getenv("GROQ_BASE_URL") or None
+        self.models = list(models or DEFAULT_MODELS)
+        self.model_timeouts = dict(DEFAULT_MODEL_TIMEOUTS)
+        self.model_timeouts.update(model_timeouts or {})
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        # Un appel perdant garde son thread jusqu'à son timeout : deux threads par session
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max_concurrency * 2,
+                                            thread_name_prefix="llm-pool")
+
+        # Statistiques par modèle (latence moyenne glissante, succès, échecs)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Client et disjoncteurs
+    # -------------------------------------------------------------------------
+
+    @property
+    def client(self):
+        """Client Groq unique, créé à la première utilisation"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    kwargs = {
+                        "api_key": self.api_key,
+                        # Les retries sont gérés ici (hedging/fallback), pas par le SDK
+                        "max_retries": 0,
+                        "timeout": max(self.model_timeouts.values(), default=DEFAULT_TIMEOUT)
+                    }
+                    if self.base_url:
+                        kwargs["base_url"] = self.base_url
+                    self._client = Groq(**kwargs)
+        return self._client
+
+    def breaker(self, model):
+        with self._breakers_lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[model]
+
+    def timeout_for(self, model):
+        return self.model_timeouts.get(model, DEFAULT_TIMEOUT)
+
+    def _candidate_models(self, models):
+        ordered = []
+        for model in list(models or []) + self.models:
+            if model and model not in ordered:
+                ordered.append(model)
+        return ordered
+
+    def _record(self, model, latency=None, success=True):
+        with self._stats_lock:
+            stats = self._stats.setdefault(model, {"success": 0, "failure": 0, "avg_latency": None})
+            if success:
+                stats["success"] += 1
+                if latency is not None:
+                    previous = stats["avg_latency"]
+                    stats["avg_latency"] = latency if previous is None else 0.8 * previous + 0.2 * latency
+            else:
+                stats["failure"] += 1
+
+    def stats(self):
+        """Statistiques par modèle, avec l'état du disjoncteur"""
+        with self._stats_lock:
+            snapshot = {model: dict(values) for model, values in self._stats.items()}
+        for model in snapshot:
+            snapshot[model]["circuit"] = self.breaker(model).state
+        return snapshot
+
+    # -------------------------------------------------------------------------
+    # Appels
+    # -------------------------------------------------------------------------
+
+    def _call(self, model, messages, params):
+        """Appel bloquant d'un modèle ; met à jour disjoncteur et statistiques même si le résultat arrive trop tard"""
+        start = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=self.timeout_for(model),
+                stream=False,
+                **params
+            )
+            content = response.choices[0].message.content
+        except Exception:
+            self.breaker(model).record_failure()
+            self._record(model, success=False)
+            raise
+        self.breaker(model).record_success()
+        self._record(model, time.perf_counter() - start)
+        return content
+
+    def complete(self, messages, models=None, **params):
+        """
+        Requête couverte : lance le modèle principal, puis le suivant si aucune
+        réponse n'est arrivée après `hedge_delay` secondes (ou dès un échec).
+
+        Retourne (contenu, modèle ayant répondu)
+        """
+        candidates = self._candidate_models(models)
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def launch_next():
+            nonlocal next_index
+            while next_index < len(candidates):
+                model = candidates[next_index]
+                next_index += 1
+                if self.breaker(model).allow():
+                    pending[self._executor.submit(self._call, model, messages, params)] = model
+                    return True
+                errors.append(f"{model}: disjoncteur ouvert")
+            return False
+
+        launch_next()
+        while pending:
+            can_hedge = next_index < len(candidates)
+            done, _ = wait(list(pending), timeout=self.hedge_delay if can_hedge else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Budget de latence dépassé : on lance le secours sans annuler le principal
+                launch_next()
+                continue
+
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    content = future.result()
+                except Exception as e:
+                    print(f"❌ Erreur avec le modèle {model}: {e}")
+                    errors.append(f"{model}: {e}")
+                    # Échec : modèle suivant lancé tout de suite, sans attendre le budget de latence
+                    launch_next()
+                    continue
+                # Perdants encore en file annulés (ceux déjà partis finissent dans leur thread)
+                for loser, loser_model in pending.items():
+                    if loser.cancel():
+                        self.breaker(loser_model).release_trial()
+                return content, model
+
+        raise LLMUnavailableError("; ".join(errors) or "Aucun modèle disponible")
+
+    def _open_stream(self, model, messages, params):
+        """
+        Ouvre un flux et attend son premier token (dans un thread du pool).
+        Retourne (flux, itérateur des fragments, premier token ou None si le flux est vide, début)
+        """
+        start = time.perf_counter()
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=self.timeout_for(model),
+                stream=True,
+                **params
+            )
+            chunks = iter(stream)
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    return stream, chunks, chunk.choices[0].delta.content, start
+        except Exception:
+            self.breaker(model).record_failure()
+            self._record(model, success=False)
+            raise
+        return stream, chunks, None, start
+
+    def _discard_stream(self, model, future):
+        """Flux perdant : fermé dès son ouverture, ni succès ni échec"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            future.result()[0].close()
+        except Exception:
+            pass
+        self.breaker(model).release_trial()
+
+    def stream(self, messages, models=None, **params):
+        """
+        Streaming natif couvert : si le premier token du modèle principal n'est
+        pas arrivé après `hedge_delay` secondes, le suivant est lancé en
+        parallèle (dès un échec, sans attendre) ; le premier flux qui produit
+        un token est servi, l'autre est fermé. Une fois le premier token reçu,
+        le flux n'est plus interrompu.
+        """
+        candidates = self._candidate_models(models)
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def launch_next():
+            nonlocal next_index
+            while next_index < len(candidates):
+                model = candidates[next_index]
+                next_index += 1
+                if self.breaker(model).allow():
+                    pending[self._executor.submit(self._open_stream, model, messages, params)] = model
+                    return True
+                errors.append(f"{model}: disjoncteur ouvert")
+            return False
+
+        launch_next()
+        winner = None
+        while pending and winner is None:
+            can_hedge = next_index < len(candidates)
+            done, _ = wait(list(pending), timeout=self.hedge_delay if can_hedge else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Premier token en retard : on lance le secours sans fermer le principal
+                launch_next()
+                continue
+
+            for future in done:
+                model = pending.pop(future)
+                if winner is not None:
+                    self._discard_stream(model, future)
+                    continue
+                try:
+                    winner = (model, future.result())
+                except Exception as e:
+                    print(f"❌ Erreur streaming avec le modèle {model}: {e}")
+                    errors.append(f"{model}: {e}")
+                    launch_next()
+
+        if winner is None:
+            raise LLMUnavailableError("; ".join(errors) or "Aucun modèle disponible")
+
+        # Perdants annulés s'ils sont encore en file, sinon fermés dès l'ouverture de leur flux
+        for loser, loser_model in pending.items():
+            if loser.cancel():
+                self.breaker(loser_model).release_trial()
+            else:
+                loser.add_done_callback(lambda future, model=loser_model: self._discard_stream(model, future))
+
+        model, (stream, chunks, first, start) = winner
+        breaker = self.breaker(model)
+        try:
+            if first:
+                yield first
+            for chunk in chunks:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except GeneratorExit:
+            # Flux abandonné par l'appelant : ni succès ni échec, essai semi-ouvert libéré
+            stream.close()
+            breaker.release_trial()
+            raise
+        except Exception:
+            breaker.record_failure()
+            self._record(model, success=False)
+            raise
+
+        breaker.record_success()
+        self._record(model, time.perf_counter() - start)
+
+
+# =============================================================================
+# 🗃️ REGISTRE DES POOLS (UN PAR CLÉ API / URL DE BASE)
+# =============================================================================
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_client_pool(api_key=None, base_url=None, **options):
+    """Retourne le pool longue durée associé à la clé API (créé au premier appel)"""
+    api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY", "")
+    base_url = base_url or os.getenv("GROQ_BASE_URL") or None
+    key = (api_key, base_url)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = LLMClientPool(api_key=api_key, base_url=base_url, **options)
+        return _POOLS[key]
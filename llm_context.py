@@ -0,0 +1,250 @@
+# =============================================================================
+# 📦 CONSTRUCTION DU CONTEXTE LLM SOUS BUDGET DE TOKENS
+# =============================================================================
+"""
+Contexte envoyé au LLM à partir des prévisions et de la base de faits produits.
+
+- seuls les produits pertinents pour la question sont inclus : produit(s)
+  mentionné(s) d'abord, puis les produits en alerte par ordre de gravité
+- les séries de prévisions sont résumées en quelques statistiques
+  (moyenne, min, max, quantiles, total, tendance, incertitude)
+- chaque section a une priorité ; elles sont ajoutées tant que le budget de
+  tokens le permet : produits mentionnés, prévisions, synthèse, vue
+  d'ensemble (plafonnée), puis l'historique de conversation
+- le résumé des échanges archivés va dans le message système avec sa
+  propre part du budget (réservée avant les données, entrées les plus
+  anciennes retirées au besoin) : il n'est ni tronqué comme un message
+  d'historique ni sacrifié en premier
+
+Le nombre de tokens est estimé (≈ 3,5 caractères par token pour du français),
+sans dépendance à un tokenizer.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_TOKEN_BUDGET = 1200
+CHARS_PER_TOKEN = 3.5
+
+# Longueur maximale (caractères) d'un message d'historique repris dans le contexte
+HISTORY_MESSAGE_CHARS = 400
+
+# Part du budget réservée au résumé des échanges archivés
+SUMMARY_BUDGET_SHARE = 0.3
+
+# Vue d'ensemble (produits non mentionnés) : nombre et part du budget limités
+MAX_OVERVIEW_PRODUCTS = 8
+OVERVIEW_BUDGET_SHARE = 0.4
+
+# Ordre de gravité des statuts de la base de faits
+STATUS_PRIORITY = {'RUPTURE': 0, 'URGENT': 1, 'INCONNU': 2, 'ATTENTION': 3, 'Normal': 4}
+
+SYSTEM_INSTRUCTIONS = """Vous êtes Vision IA, assistant spécialisé dans la gestion de stock de l'application Vision Stock Pro.
+RÉPONDEZ UNIQUEMENT EN FRANÇAIS, de manière précise et professionnelle.
+Appuyez-vous sur les DONNÉES ci-dessous pour toute question de stock (ne les inventez pas) ;
+pour une question générale, répondez normalement. Proposez des actions concrètes quand c'est pertinent."""
+
+
+def estimate_tokens(text):
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+def summarize_series(values):
+    """Statistiques résumées d'une série de prévisions journalières"""
+    series = np.asarray(values, dtype=float)
+    if series.size == 0:
+        return None
+    half = series.size // 2
+    first, second = series[:half].mean() if half else series.mean(), series[half:].mean()
+    p10, p50, p90 = np.percentile(series, [10, 50, 90])
+    return {
+        'jours': int(series.size),
+        'moyenne': float(series.mean()),
+        'min': float(series.min()),
+        'max': float(series.max()),
+        'p10': float(p10),
+        'p50': float(p50),
+        'p90': float(p90),
+        'total': float(series.sum()),
+        'tendance_pct': float((second - first) / first * 100) if first else 0.0
+    }
+
+
+def _fmt(value, digits=1):
+    if value is None:
+        return "?"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return f"{float(value):.{digits}f}"
+
+
+def format_product_line(key, facts):
+    """Une ligne compacte par produit"""
+    return (
+        f"- {facts.get('nom_complet', key)} : statut {facts.get('status', '?')}"
+        f" | stock {_fmt(facts.get('stock_actuel'), 0)}"
+        f" | rupture {_fmt(facts.get('jours_rupture'))} j"
+        + (f" (risque {facts['probabilite_rupture'] * 100:.0f}% sur la période)" if facts.get('probabilite_rupture') is not None else "")
+        + f" | conso {_fmt(facts.get('consommation_jour'))}/j (30 j : {_fmt(facts.get('consommation_30j'), 0)})"
+        + f" | stock min/reco/max {_fmt(facts.get('stock_min'), 0)}/{_fmt(facts.get('stock_recommande'), 0)}/{_fmt(facts.get('stock_max'), 0)}"
+        f" | tendance {facts.get('tendance', '?')} {_fmt(facts.get('tendance_pourcentage'))}%"
+        f" | confiance {_fmt((facts.get('confiance') or 0) * 100, 0)}%"
+    )
+
+
+def format_forecast_section(forecast):
+    """Résumé des prévisions affichées (dataset courant)"""
+    summary = summarize_series(forecast.get('predictions') or [])
+    if not summary:
+        return None
+    uncertainties = forecast.get('uncertainties') or []
+    uncertainty = float(np.mean(uncertainties)) if len(uncertainties) else None
+    name = forecast.get('dataset_name') or "dataset courant"
+    return (
+        f"PRÉVISIONS AFFICHÉES ({name}, {summary['jours']} jours) : "
+        f"moyenne {_fmt(summary['moyenne'])}/j, min {_fmt(summary['min'])}, max {_fmt(summary['max'])}, "
+        f"p10/p50/p90 {_fmt(summary['p10'])}/{_fmt(summary['p50'])}/{_fmt(summary['p90'])}, "
+        f"total {_fmt(summary['total'], 0)}, tendance {summary['tendance_pct']:+.1f}%, "
+        f"incertitude moyenne ±{_fmt(uncertainty)}"
+    )
+
+
+def rank_products(products, focus_keys=()):
+    """Produits mentionnés d'abord, puis par gravité du statut et jours avant rupture"""
+    focus = [key for key in focus_keys if key in products]
+    others = [key for key in products if key not in focus]
+    others.sort(key=lambda key: (
+        STATUS_PRIORITY.get(products[key].get('status'), 5),
+        products[key].get('jours_rupture') if products[key].get('jours_rupture') is not None else float('inf')
+    ))
+    return focus + others
+
+
+def fit_summary(summary, max_tokens):
+    """Résumé limité à `max_tokens` en retirant ses lignes les plus anciennes"""
+    lines = str(summary or "").strip().splitlines()
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ContextReport:
+    """Ce qui a été inclus dans le contexte et à quel coût"""
+
+    def __init__(self, token_budget):
+        self.token_budget = token_budget
+        self.tokens = 0
+        self.products = []
+        self.history_messages = 0
+        self.summary_tokens = 0
+        self.dropped = []
+
+    def as_dict(self):
+        return {
+            'token_budget': self.token_budget,
+            'tokens': self.tokens,
+            'products': list(self.products),
+            'history_messages': self.history_messages,
+            'summary_tokens': self.summary_tokens,
+            'dropped': list(self.dropped)
+        }
+
+
+def build_llm_messages(question, products=None, forecast=None, history=None, focus_keys=(),
+                       include_overview=True, token_budget=DEFAULT_TOKEN_BUDGET, summary=None):
+    """
+    Messages chat-completions (système + historique + question) tenant dans `token_budget`.
+
+    - `products` : {clé: faits} de la base de faits produits
+    - `forecast` : {'predictions', 'uncertainties', 'dataset_name'} des prévisions affichées
+    - `history` : messages {'role', 'content'} précédents, du plus ancien au plus récent
+    - `focus_keys` : produits mentionnés dans la question (toujours prioritaires)
+    - `include_overview` : ajouter les autres produits (question de stock générale)
+    - `summary` : résumé des échanges archivés (ChatHistory.llm_summary)
+
+    Retourne (messages, ContextReport)
+    """
+    products = products or {}
+    report = ContextReport(token_budget)
+
+    # Obligatoire : consignes et question
+    used = estimate_tokens(SYSTEM_INSTRUCTIONS) + estimate_tokens(question)
+    data_lines = []
+
+    # Résumé des échanges archivés : part du budget réservée avant les données
+    summary_section = None
+    if summary:
+        header = "RÉSUMÉ DES ÉCHANGES PRÉCÉDENTS :"
+        summary_budget = min(int(token_budget * SUMMARY_BUDGET_SHARE), token_budget - used) - estimate_tokens(header) - 2
+        fitted = fit_summary(summary, summary_budget) if summary_budget > 0 else ""
+        if fitted:
+            summary_section = f"{header}\n{fitted}"
+            report.summary_tokens = estimate_tokens(summary_section) + 2
+            used += report.summary_tokens
+            if fitted != str(summary).strip():
+                report.dropped.append("resume_partiel")
+        else:
+            report.dropped.append("resume")
+
+    def try_add(line, label, limit=token_budget):
+        nonlocal used
+        cost = estimate_tokens(line) + 1
+        if used + cost > limit:
+            report.dropped.append(label)
+            return False
+        data_lines.append(line)
+        used += cost
+        return True
+
+    ranked = rank_products(products, focus_keys)
+    focus = [key for key in ranked if key in focus_keys]
+    overview = [key for key in ranked if key not in focus_keys] if include_overview else []
+    if focus or overview:
+        try_add("PRODUITS (faits calculés) :", "entete_produits")
+
+    # 1. Produits mentionnés dans la question
+    for key in focus:
+        if try_add(format_product_line(key, products[key]), key):
+            report.products.append(key)
+
+    # 2. Prévisions affichées et synthèse
+    if forecast:
+        forecast_line = format_forecast_section(forecast)
+        if forecast_line:
+            try_add(forecast_line, "previsions")
+    if include_overview and products:
+        alerts = sum(1 for facts in products.values() if facts.get('alerte'))
+        try_add(f"SYNTHÈSE : {len(products)} produits suivis, {alerts} en alerte.", "synthese")
+
+    # 3. Autres produits par gravité, dans une part plafonnée du budget
+    overview_limit = min(token_budget, used + int(token_budget * OVERVIEW_BUDGET_SHARE))
+    for position, key in enumerate(overview):
+        if position >= MAX_OVERVIEW_PRODUCTS or not try_add(format_product_line(key, products[key]), key, overview_limit):
+            report.dropped.extend(overview[position + 1:] if position < MAX_OVERVIEW_PRODUCTS else overview[position:])
+            break
+        report.products.append(key)
+
+    system = SYSTEM_INSTRUCTIONS
+    if data_lines:
+        system += "\n\nDONNÉES :\n" + "\n".join(data_lines)
+    if summary_section:
+        system += "\n\n" + summary_section
+
+    # Historique : les messages les plus récents d'abord, tant que le budget le permet
+    history_messages = []
+    for message in reversed(list(history or [])):
+        content = str(message.get('content', ''))
+        if len(content) > HISTORY_MESSAGE_CHARS:
+            content = content[:HISTORY_MESSAGE_CHARS] + "…"
+        cost = estimate_tokens(content) + 4
+        if used + cost > token_budget:
+            report.dropped.append("historique")
+            break
+        history_messages.append({"role": message.get('role', 'user'), "content": content})
+        used += cost
+    history_messages.reverse()
+    report.history_messages = len(history_messages)
+    report.tokens = used
+
+    messages = [{"role": "system", "content": system}] + history_messages + [{"role": "user", "content": question}]
+    return messages, report
@@ -0,0 +1,191 @@
+# =============================================================================
+# 🧪 SERVEUR BOUCHON LOCAL IMITANT L'API CHAT-COMPLETIONS
+# =============================================================================
+"""
+Serveur HTTP local qui imite `POST .../chat/completions` (réponses complètes
+et streaming SSE) pour tester le pool de clients sans réseau.
+
+Chaque modèle peut être configuré avec un délai, un taux d'échec ou une
+réponse fixe, ce qui permet de reproduire un modèle lent (hedging) ou un
+modèle en panne (disjoncteur).
+
+Utilisation :
+    python llm_stub_server.py --port 8787 --delay llama-3.1-8b-instant=5
+    GROQ_BASE_URL=http://127.0.0.1:8787 GROQ_API_KEY=stub streamlit run app.py
+
+Ou depuis Python :
+    with StubChatCompletionsServer({"llama-3.1-8b-instant": {"delay": 5}}) as server:
+        pool = LLMClientPool(api_key="stub", base_url=server.base_url)
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Silencieux par défaut
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Route inconnue : {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "")
+        config = self.server.stub.config_for(model)
+        self.server.stub.record_request(model)
+
+        if config.get("delay"):
+            time.sleep(config["delay"])
+        if config.get("fail"):
+            self._send_json(config.get("status", 503), {"error": {"message": f"Modèle {model} indisponible (bouchon)"}})
+            return
+
+        reply = config.get("reply") or self.server.stub.default_reply(request)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            tokens = reply.split(" ")
+            for index, token in enumerate(tokens):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": token if index == 0 else " " + token},
+                        "finish_reason": None
+                    }]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if config.get("token_delay"):
+                    time.sleep(config["token_delay"])
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in request.get("messages", [])),
+                "completion_tokens": len(reply.split()),
+                "total_tokens": 0
+            }
+        })
+
+
+class StubChatCompletionsServer:
+    """Serveur bouchon lancé dans un thread ; utilisable comme context manager"""
+
+    def __init__(self, models_config=None, host="127.0.0.1", port=0):
+        self.models_config = dict(models_config or {})
+        self.requests_per_model = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _ChatCompletionsHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config_for(self, model):
+        return self.models_config.get(model, self.models_config.get("*", {}))
+
+    def record_request(self, model):
+        with self._lock:
+            self.requests_per_model[model] = self.requests_per_model.get(model, 0) + 1
+
+    def default_reply(self, request):
+        last_user = next((m.get("content", "") for m in reversed(request.get("messages", []))
+                          if m.get("role") == "user"), "")
+        return f"Réponse du bouchon ({request.get('model', '')}) : {str(last_user)[:80]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _parse_model_options(values):
+    options = {}
+    for value in values or []:
+        model, _, number = value.partition("=")
+        options[model] = float(number) if number else 0.0
+    return options
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur bouchon chat-completions pour Vision IA")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--delay", action="append", help="modele=secondes (délai avant réponse)")
+    parser.add_argument("--fail", action="append", help="modele à faire échouer (HTTP 503)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="délai entre tokens en streaming")
+    args = parser.parse_args()
+
+    config = {"*": {"token_delay": args.token_delay}}
+    for model, delay in _parse_model_options(args.delay).items():
+        config.setdefault(model, {"token_delay": args.token_delay})["delay"] = delay
+    for model in args.fail or []:
+        config.setdefault(model, {"token_delay": args.token_delay})["fail"] = True
+
+    server = StubChatCompletionsServer(config, host=args.host, port=args.port)
+    print(f"🧪 Serveur bouchon sur {server.base_url} (Ctrl+C pour arrêter)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,368 @@
+# =============================================================================
+# 📦 ARTEFACTS DE MODÈLES NATIFS (INDÉPENDANTS DES VERSIONS, CHARGEMENT RAPIDE)
+# =============================================================================
+"""
+Export / import des modèles sans pickle, pour que le chargement ne dépende
+plus des versions exactes de scikit-learn / xgboost / lightgbm.
+
+- xgboost : format natif UBJ (`{nom}_model.ubj`, ou JSON avec `--json`)
+- lightgbm : format texte natif (`{nom}_model.txt`)
+- tous les modèles d'arbres, scikit-learn compris : tableaux plats de
+  tree_compiler.py dans un `.npz` non compressé (`{nom}_arbres.npz`) ; les
+  tableaux peuvent être projetés en mémoire (mmap) au lieu d'être lus
+- `manifest.json` : fichiers, formats, tailles et sha256, versions des
+  bibliothèques à l'export, noms des features et attributs des ensembles
+
+Chargement : xgboost / lightgbm par leur format natif si la bibliothèque est
+installée (prédictions et contributions natives), sinon par les tableaux ;
+scikit-learn toujours par les tableaux (ensemble compilé, même `predict`).
+
+Utilisation : `python model_artifacts.py models` (exporte les `*_model.joblib`
+du dossier et compare les temps de chargement)
+"""
+import hashlib
+import json
+import os
+import struct
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+from tree_compiler import CompiledEnsemble, compile_model, max_deviation
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+ARRAYS_SUFFIX = "_arbres.npz"
+NATIVE_SUFFIXES = {'xgboost': "_model.ubj", 'lightgbm': "_model.txt"}
+PICKLE_SUFFIX = "_model.joblib"
+
+# Tableaux au-delà de cette taille projetés en mémoire plutôt que lus (octets)
+MMAP_MIN_BYTES = 1 << 20
+
+
+def _library(model):
+    module = type(model).__module__
+    for library in ('xgboost', 'lightgbm', 'sklearn'):
+        if module.startswith(library):
+            return library
+    raise TypeError(f"Modèle non exportable : {type(model).__name__}")
+
+
+def library_versions():
+    """Versions des bibliothèques de modèles installées"""
+    versions = {'numpy': np.__version__}
+    for name, module in (('scikit-learn', 'sklearn'), ('xgboost', 'xgboost'), ('lightgbm', 'lightgbm')):
+        try:
+            versions[name] = __import__(module).__version__
+        except ImportError:
+            pass
+    return versions
+
+
+def _file_entry(folder, file, fmt):
+    path = os.path.join(folder, file)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return {'path': file, 'format': fmt, 'size': os.path.getsize(path), 'sha256': digest.hexdigest()}
+
+
+def _write_atomic(path, write):
+    temporary = f"{path}.tmp"
+    write(temporary)
+    os.replace(temporary, path)
+
+
+# -----------------------------------------------------------------------------
+# Export
+# -----------------------------------------------------------------------------
+
+def _write_tree_arrays(compiled, folder, name):
+    arrays = compiled.arrays()[0]
+
+    def write(path):
+        # np.savez ne compresse pas : les membres restent projetables en mémoire
+        with open(path, 'wb') as handle:
+            np.savez(handle, **{key: np.ascontiguousarray(value) for key, value in arrays.items()})
+
+    arrays_file = f"{name}{ARRAYS_SUFFIX}"
+    _write_atomic(os.path.join(folder, arrays_file), write)
+    return _file_entry(folder, arrays_file, 'tree-arrays-npz')
+
+
+def _write_manifest(folder, manifest):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle, ensure_ascii=False, indent=2)
+
+    _write_atomic(os.path.join(folder, MANIFEST_FILE), write)
+
+
+def export_model(model, folder, name, feature_names=None, json_format=False):
+    """Écrit les fichiers d'un modèle dans `folder` et renvoie son entrée de manifeste"""
+    from explainability import native_importance
+
+    library = _library(model)
+    compiled = compile_model(model)
+    feature_names = list(feature_names if feature_names is not None else
+                         compiled.feature_names or getattr(model, 'feature_names_in_', []))
+    if feature_names:
+        compiled.importance = native_importance(model, feature_names).tolist()
+
+    files = {'arrays': _write_tree_arrays(compiled, folder, name)}
+
+    if library == 'xgboost':
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        native_file = f"{name}_model.json" if json_format else f"{name}{NATIVE_SUFFIXES['xgboost']}"
+        _write_atomic(os.path.join(folder, native_file), lambda path: booster.save_model(path))
+        files['native'] = _file_entry(folder, native_file, 'xgboost-json' if json_format else 'xgboost-ubj')
+    elif library == 'lightgbm':
+        booster = model.booster_ if hasattr(model, 'booster_') else model
+        native_file = f"{name}{NATIVE_SUFFIXES['lightgbm']}"
+        _write_atomic(os.path.join(folder, native_file), lambda path: booster.save_model(path))
+        files['native'] = _file_entry(folder, native_file, 'lightgbm-text')
+
+    return {
+        'library': library,
+        'class': type(model).__name__,
+        'feature_names': feature_names,
+        'n_trees': compiled.n_trees,
+        'n_nodes': compiled.n_nodes,
+        'attributes': compiled.arrays()[1],
+        'files': files
+    }
+
+
+def export_models(models, folder, feature_names=None, json_format=False):
+    """
+    Exporte {nom: modèle} dans `folder` et écrit le manifeste (en dernier, de
+    façon atomique : un manifeste présent ne désigne que des fichiers complets)
+    """
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'libraries': library_versions(),
+        'models': {}
+    }
+    for name, model in models.items():
+        try:
+            manifest['models'][name] = export_model(model, folder, name, feature_names, json_format)
+        except Exception as e:
+            print(f"⚠️ Modèle {name} non exporté : {e}")
+    _write_manifest(folder, manifest)
+    return manifest
+
+
+def replace_tree_arrays(folder, name, compiled, **info):
+    """
+    Remplace les tableaux d'un modèle du manifeste par `compiled` (ensemble
+    compacté, voir compaction.py). Le format natif ne correspond plus au
+    modèle servi : il est retiré de l'entrée. `info` est ajouté à l'entrée.
+    """
+    manifest = read_manifest(folder)
+    if manifest is None or name not in manifest['models']:
+        raise ValueError(f"Modèle {name} absent du manifeste de {folder}")
+    entry = manifest['models'][name]
+    entry['files'] = {'arrays': _write_tree_arrays(compiled, folder, name)}
+    entry.update(n_trees=compiled.n_trees, n_nodes=compiled.n_nodes, attributes=compiled.arrays()[1], **info)
+    _write_manifest(folder, manifest)
+    return entry
+
+
+def export_folder(folder, output=None, json_format=False):
+    """Exporte les `*_model.joblib` lisibles d'un dossier (dans `output`, par défaut le même dossier)"""
+    import joblib
+
+    models = {}
+    for file in sorted(os.listdir(folder)):
+        if file.endswith(PICKLE_SUFFIX):
+            try:
+                models[file[:-len(PICKLE_SUFFIX)]] = joblib.load(os.path.join(folder, file))
+            except Exception as e:
+                print(f"⚠️ {file} ignoré : {e}")
+    output = output or folder
+    os.makedirs(output, exist_ok=True)
+    return export_models(models, output, json_format=json_format)
+
+
+# -----------------------------------------------------------------------------
+# Import
+# -----------------------------------------------------------------------------
+
+def read_manifest(folder):
+    """Manifeste d'un dossier de modèles (None si absent ou d'un format inconnu)"""
+    path = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Manifeste illisible dans {folder}: {e}")
+        return None
+    if manifest.get('format_version') != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def _npz_members(path):
+    """
+    Tableaux d'un `.npz` non compressé projetés en mémoire : position de chaque
+    membre dans l'archive (en-tête local zip puis en-tête .npy), puis np.memmap
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as handle:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Membre compressé dans {path} : {info.filename}")
+            handle.seek(info.header_offset)
+            header = handle.read(30)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            handle.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(handle)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(handle)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(handle)
+            key = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if not int(np.prod(shape)):
+                arrays[key] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[key] = np.memmap(path, dtype=dtype, mode='r', offset=handle.tell(), shape=shape,
+                                    order='F' if fortran else 'C')
+    return arrays
+
+
+def load_tree_arrays(path, mmap=None):
+    """
+    Tableaux d'un ensemble compilé ; `mmap` : True projection en mémoire, False
+    lecture, None projection seulement pour un fichier de plus de MMAP_MIN_BYTES
+    """
+    if mmap is None:
+        mmap = os.path.getsize(path) >= MMAP_MIN_BYTES
+    if mmap:
+        return _npz_members(path)
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _load_native(path, fmt):
+    if fmt.startswith('xgboost'):
+        import xgboost as xgb
+        model = xgb.XGBRegressor()
+        model.load_model(path)
+        return model
+    if fmt.startswith('lightgbm'):
+        import lightgbm as lgb
+        return lgb.Booster(model_file=path)
+    raise ValueError(f"Format natif inconnu : {fmt}")
+
+
+def load_artifact(folder, entry, prefer_native=True, mmap=None, verify=False):
+    """
+    Modèle décrit par une entrée de manifeste : format natif si disponible et
+    préféré, sinon ensemble compilé depuis les tableaux
+    """
+    files = entry['files']
+    for role in ('native', 'arrays') if prefer_native else ('arrays', 'native'):
+        info = files.get(role)
+        if info is None:
+            continue
+        path = os.path.join(folder, info['path'])
+        if os.path.getsize(path) != info['size']:
+            raise ValueError(f"Fichier {info['path']} tronqué ou modifié")
+        if verify and _file_entry(folder, info['path'], info['format'])['sha256'] != info['sha256']:
+            raise ValueError(f"Somme de contrôle invalide pour {info['path']}")
+        if role == 'arrays':
+            return CompiledEnsemble.from_arrays(load_tree_arrays(path, mmap), entry['attributes'])
+        try:
+            return _load_native(path, info['format'])
+        except ImportError:
+            continue
+    raise ValueError("Aucun fichier chargeable pour ce modèle")
+
+
+def load_artifacts(folder, members=None, prefer_native=True, mmap=None, verify=False):
+    """{nom: modèle} depuis le manifeste d'un dossier (None si le dossier n'a pas de manifeste)"""
+    manifest = read_manifest(folder)
+    if manifest is None:
+        return None
+    models = {}
+    for name, entry in manifest['models'].items():
+        if members is not None and name not in members:
+            continue
+        try:
+            models[name] = load_artifact(folder, entry, prefer_native, mmap, verify)
+        except Exception as e:
+            print(f"⚠️ Artefact {name} illisible dans {folder}: {e}")
+    return models
+
+
+def model_paths(folder):
+    """
+    {nom: chemin} du fichier principal de chaque modèle d'un dossier : fichier
+    de tableaux des artefacts pour les modèles du manifeste, sinon pickle joblib
+    """
+    paths = {file[:-len(PICKLE_SUFFIX)]: os.path.join(folder, file)
+             for file in sorted(os.listdir(folder)) if file.endswith(PICKLE_SUFFIX)}
+    manifest = read_manifest(folder)
+    if manifest is not None:
+        paths.update({name: os.path.join(folder, entry['files']['arrays']['path'])
+                      for name, entry in manifest['models'].items()})
+    return paths
+
+
+def load_model_file(path, mmap=None):
+    """Modèle d'un fichier : artefact (via le manifeste de son dossier) ou pickle joblib"""
+    if path.endswith(PICKLE_SUFFIX):
+        import joblib
+        return joblib.load(path)
+    folder, file = os.path.split(path)
+    manifest = read_manifest(folder) or {'models': {}}
+    for entry in manifest['models'].values():
+        if any(info['path'] == file for info in entry['files'].values()):
+            return load_artifact(folder, entry, prefer_native=False, mmap=mmap)
+    raise ValueError(f"{file} n'est pas décrit par un manifeste")
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import joblib
+
+    from forecast_features import future_features
+    from stock_data import load_daily_history
+
+    parser = argparse.ArgumentParser(description="Export des modèles en artefacts natifs")
+    parser.add_argument("folder")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--json", action="store_true", help="xgboost en JSON plutôt qu'en UBJ")
+    parser.add_argument("--data-file", default="data/parleG_clean.csv")
+    args = parser.parse_args()
+
+    manifest = export_folder(args.folder, args.output, args.json)
+    output = args.output or args.folder
+    daily = load_daily_history(args.data_file)
+    features = future_features(daily, daily.index[-1], 365)
+
+    def median_ms(function, repeats=20):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return float(np.median(timings) * 1000)
+
+    for name, entry in manifest['models'].items():
+        pickle_path = os.path.join(args.folder, f"{name}{PICKLE_SUFFIX}")
+        pickled = median_ms(lambda: joblib.load(pickle_path))
+        read = median_ms(lambda: load_artifact(output, entry, prefer_native=False, mmap=False))
+        mapped = median_ms(lambda: load_artifact(output, entry, prefer_native=False, mmap=True))
+        deviation, amplitude = max_deviation(joblib.load(pickle_path), load_artifact(output, entry), features)
+        sizes = ', '.join(f"{info['path']} {info['size'] / 1024:.0f} Ko" for info in entry['files'].values())
+        print(f"📦 {name:<4} {sizes} | joblib {pickled:7.2f} ms → tableaux {read:6.2f} ms, mmap {mapped:6.2f} ms | "
+              f"écart max {deviation:.1e} (amplitude {amplitude:.0f})")
@@ -0,0 +1,159 @@
+# =============================================================================
+# 🗃️ BASE DE FAITS PAR PRODUIT POUR LE CHATBOT
+# =============================================================================
+"""
+Faits calculés par produit (stock actuel, jours avant rupture, consommation,
+niveaux recommandés, statut...) à partir des prévisions de chaque dataset et
+de la sortie de `create_dashboard_metrics`.
+
+- accès en O(1) par clé produit
+- version globale incrémentée à chaque changement, version propre à chaque produit
+- mise à jour incrémentale : un produit n'est recalculé que si l'empreinte
+  de ses entrées (fichier de données, modèles, prévisions) a changé
+"""
+import threading
+from datetime import datetime
+
+# Seuils (en jours avant rupture) des statuts du chatbot
+URGENT_DAYS = 4
+ATTENTION_DAYS = 14
+
+
+def _round(value, digits=1):
+    if value is None:
+        return None
+    return int(round(float(value))) if digits == 0 else round(float(value), digits)
+
+
+def compute_product_facts(nom_complet, metrics, uncertainties=None):
+    """
+    Faits d'un produit à partir de la sortie de `create_dashboard_metrics`
+    """
+    details = metrics['details']
+    stock_known = metrics.get('status') != 'unknown'
+    current_stock = details.get('current_stock') or 0
+    days_to_rupture = details.get('days_to_rupture')
+    uncertainties = list(uncertainties or [])
+
+    if not stock_known:
+        status, message = 'INCONNU', 'Stock actuel inconnu - Vérification urgente requise !'
+        days_to_rupture = None
+    elif current_stock <= 0:
+        status, message = 'RUPTURE', 'STOCK ÉPUISÉ - Réapprovisionnement immédiat requis !'
+        days_to_rupture = 0.0
+    elif days_to_rupture is not None and days_to_rupture < URGENT_DAYS:
+        status = 'URGENT'
+        message = f'Rupture de Stock Imminente - Stock épuisé dans {days_to_rupture:.1f} jours'
+    elif days_to_rupture is not None and days_to_rupture < ATTENTION_DAYS:
+        status = 'ATTENTION'
+        message = f'Attention Stock - Stock épuisé dans {days_to_rupture:.1f} jours'
+    else:
+        status, message = 'Normal', ''
+
+    return {
+        'nom_complet': nom_complet,
+        'stock_actuel': _round(current_stock, 0) if stock_known else None,
+        'jours_rupture': _round(days_to_rupture),
+        'probabilite_rupture': _round(details.get('stockout_probability_period'), 3) if stock_known else None,
+        'consommation_jour': _round(details['avg_daily_consumption']),
+        'consommation_30j': _round(details['total_consumption'], 0),
+        'stock_max': _round(details['stock_prediction_max'], 0),
+        'stock_min': _round(details['stock_prediction_min'], 0),
+        'stock_recommande': _round(details['recommended_stock'], 0),
+        'tendance': {'hausse': 'Hausse', 'baisse': 'Baisse'}.get(details['trend_direction'], 'Stable'),
+        'tendance_pourcentage': _round(details['trend_pct']),
+        'confiance': _round(details['confidence_pct'] / 100, 3),
+        'stabilite': _round(details['stability_index'] / 100, 3),
+        'score_confiance': _round(details['confidence_score'] / 100, 3),
+        'volatilite': _round(details['volatility']),
+        'efficacite_stock': _round(details['stock_efficiency'] / 100, 3),
+        'cv': _round(details['coefficient_variation']),
+        'incertitude_moyenne': _round(sum(uncertainties) / len(uncertainties)) if uncertainties else None,
+        'periode': details.get('period'),
+        'status': status,
+        'alerte': status != 'Normal',
+        'message_alerte': message
+    }
+
+
+class ProductFactStore:
+    """Faits par clé produit, versionnés, mis à jour produit par produit"""
+
+    def __init__(self):
+        self._facts = {}
+        self._fingerprints = {}
+        self._forecasts = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.updated_at = None
+
+    def __len__(self):
+        return len(self._facts)
+
+    def __contains__(self, key):
+        return key in self._facts
+
+    def get(self, key):
+        return self._facts.get(key)
+
+    def keys(self):
+        return list(self._facts)
+
+    def fingerprint(self, key):
+        return self._fingerprints.get(key)
+
+    def is_fresh(self, key, fingerprint):
+        """Vrai si le produit a déjà été calculé avec ces entrées"""
+        return key in self._facts and self._fingerprints.get(key) == fingerprint
+
+    def upsert(self, key, facts, fingerprint=None):
+        """
+        Remplace les faits d'un produit ; retourne False si l'empreinte est inchangée
+        """
+        with self._lock:
+            if fingerprint is not None and key in self._facts and self._fingerprints.get(key) == fingerprint:
+                return False
+            self.version += 1
+            self.updated_at = datetime.now().isoformat()
+            record = dict(facts)
+            record['version'] = self.version
+            record['mise_a_jour'] = self.updated_at
+            self._facts[key] = record
+            self._fingerprints[key] = fingerprint
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._forecasts.pop(key, None)
+            if self._facts.pop(key, None) is not None:
+                self._fingerprints.pop(key, None)
+                self.version += 1
+
+    def set_forecast(self, key, predictions, uncertainties):
+        """Prévisions journalières ayant servi au calcul des faits (optimisation des commandes)"""
+        with self._lock:
+            self._forecasts[key] = {
+                'predictions': [float(value) for value in predictions],
+                'uncertainties': [float(value) for value in uncertainties]
+            }
+
+    def forecast(self, key):
+        return self._forecasts.get(key)
+
+    def products(self):
+        """Copie superficielle {clé produit: faits}"""
+        with self._lock:
+            return dict(self._facts)
+
+
+_FACT_STORE = None
+_FACT_STORE_LOCK = threading.Lock()
+
+
+def get_product_fact_store():
+    """Base de faits partagée par toutes les sessions du processus"""
+    global _FACT_STORE
+    with _FACT_STORE_LOCK:
+        if _FACT_STORE is None:
+            _FACT_STORE = ProductFactStore()
+        return _FACT_STORE
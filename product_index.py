@@ -0,0 +1,277 @@
+# =============================================================================
+# 🔎 INDEX DES NOMS DE PRODUITS (RECHERCHE FLOUE)
+# =============================================================================
+"""
+Résolution des noms de produits tapés par l'utilisateur vers une clé produit.
+
+- repli des accents et de la ponctuation (« Papier Hygiénique » → « papier hygienique »)
+- correspondance exacte en O(1) sur les noms et alias repliés (avec et sans espaces)
+- sinon recherche par trigrammes (index inversé) puis classement des
+  meilleurs candidats par distance d'édition, ce qui absorbe les fautes
+  de frappe (« sofcare », « parlé-g », « hygisita » / « hygsita »)
+
+Le coût d'une recherche ne dépend pas de la taille du catalogue : les
+trigrammes trop fréquents (bourrage « ␣␣x », « kg␣ ») ne sont pas parcourus
+(listes plus longues que `COMMON_GRAM_SHARE` du catalogue, au moins
+`MIN_COMMON_POSTINGS`), seuls les meilleurs candidats par recouvrement sont
+gardés (tas) puis scorés exactement (Dice sur tous les trigrammes), et la
+distance d'édition (bit-parallèle) n'est calculée que pour les
+`max_candidates` premiers qui peuvent encore battre le meilleur score.
+Benchmark sur un catalogue synthétique de 5 000 produits :
+`python product_index.py`
+"""
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+# Listes d'un trigramme plus longues que cette part du catalogue : non parcourues
+COMMON_GRAM_SHARE = 0.02
+MIN_COMMON_POSTINGS = 64
+# Trigrammes les plus rares toujours parcourus, même fréquents (requêtes courtes)
+MIN_QUERY_GRAMS = 2
+# Candidats scorés exactement (Dice) par candidat gardé pour la distance d'édition
+CANDIDATE_POOL_FACTOR = 4
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Mots fréquents dans les questions qui ne désignent jamais un produit
+STOPWORDS = {
+    'le', 'la', 'les', 'un', 'une', 'des', 'du', 'de', 'd', 'l', 'et', 'ou', 'a', 'au', 'aux',
+    'en', 'pour', 'sur', 'dans', 'par', 'avec', 'ce', 'cette', 'ces', 'mon', 'ma', 'mes',
+    'quel', 'quelle', 'quels', 'quelles', 'est', 'sont', 'il', 'reste', 'combien', 'moi',
+    'stock', 'stocks', 'etat', 'produit', 'produits', 'analyse', 'analysez', 'analyser',
+    'donne', 'donnez', 'donner', 'rupture', 'prediction', 'predictions', 'jours', 'jour',
+    'je', 'veux', 'voir', 'niveau', 'situation', 'alerte', 'alertes', 'consommation'
+}
+
+
+def fold_text(text):
+    """Minuscules, sans accents, ponctuation remplacée par des espaces"""
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def compact_text(text):
+    """Forme repliée sans espaces (« parle g » et « parle-g » → « parleg »)"""
+    return fold_text(text).replace(" ", "")
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Distance de Levenshtein (algorithme bit-parallèle de Myers/Hyyrö : une
+    colonne de la matrice par opération sur entiers) avec arrêt anticipé
+    au-delà de `max_distance`
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    if not b:
+        return len(a)
+    # Motif = chaîne la plus courte, parcours de la plus longue
+    masks = {}
+    for i, char in enumerate(b):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    positive, negative = full, 0
+    distance = len(b)
+    remaining = len(a)
+    for char in a:
+        eq = masks.get(char, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        horizontal_positive = negative | (~(xh | positive) & full)
+        horizontal_negative = positive & xh
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+        remaining -= 1
+        # La distance baisse au plus d'une unité par caractère restant
+        if max_distance is not None and distance - remaining > max_distance:
+            return max_distance + 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(xv | horizontal_positive)) & full
+        negative = horizontal_positive & xv & full
+    return distance
+
+
+class ProductNameIndex:
+    """Index exact + trigrammes des noms/alias d'un catalogue de produits"""
+
+    def __init__(self, entries=None, max_candidates=8):
+        self.max_candidates = max_candidates
+        self._exact = {}
+        self._names = []  # (clé produit, forme compacte, trigrammes)
+        self._min_grams = None  # nombre de trigrammes du nom le plus court
+        self._postings = defaultdict(list)
+        for key, names in (entries or []):
+            self.add(key, names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, key, names):
+        """Ajoute les noms et alias d'un produit"""
+        for name in names:
+            compact = compact_text(name)
+            if not compact:
+                continue
+            # Les premiers alias déclarés restent prioritaires en cas de doublon
+            self._exact.setdefault(compact, key)
+            self._exact.setdefault(fold_text(name), key)
+            name_id = len(self._names)
+            grams = trigrams(compact)
+            self._names.append((key, compact, grams))
+            self._min_grams = min(self._min_grams or len(grams), len(grams))
+            for gram in grams:
+                self._postings[gram].append(name_id)
+
+    def resolve(self, query, min_score=0.5):
+        """
+        Retourne (clé produit, score entre 0 et 1) ou None si rien de suffisamment proche
+        """
+        return self._resolve_compact(compact_text(query), min_score)
+
+    def _resolve_compact(self, compact, min_score):
+        if not compact:
+            return None
+        if compact in self._exact:
+            return self._exact[compact], 1.0
+
+        query_grams = trigrams(compact)
+        n_query = len(query_grams)
+        # score <= 0.5 * dice + 0.5 : inutile de calculer la distance d'édition
+        # des candidats qui ne peuvent pas atteindre le seuil
+        min_dice = 2.0 * min_score - 1.0
+        # Requête trop courte pour atteindre ce Dice même avec le nom le plus court
+        if not self._names or 2.0 * n_query < min_dice * (n_query + self._min_grams):
+            return None
+
+        # Trigrammes du plus rare au plus fréquent ; les fréquents ne servent
+        # qu'au score exact des candidats retenus
+        postings = sorted((self._postings[gram] for gram in query_grams if gram in self._postings), key=len)
+        limit = max(MIN_COMMON_POSTINGS, int(COMMON_GRAM_SHARE * len(self._names)))
+        overlaps = Counter()
+        walked = 0
+        for posting in postings:
+            if walked >= MIN_QUERY_GRAMS and len(posting) > limit:
+                break
+            overlaps.update(posting)
+            walked += 1
+        if not overlaps:
+            return None
+
+        # Trigrammes communs <= recouvrement compté + trigrammes non parcourus :
+        # recouvrement minimal pour atteindre `min_dice` avec le nom le plus court
+        skipped = len(postings) - walked
+        needed = 0.5 * min_dice * (n_query + self._min_grams) - skipped
+        items = overlaps.items() if needed <= 1 else [item for item in overlaps.items() if item[1] >= needed]
+        candidates = []
+        pool = heapq.nlargest(self.max_candidates * CANDIDATE_POOL_FACTOR, items, key=itemgetter(1))
+        for name_id, overlap in pool:
+            grams = self._names[name_id][2]
+            total = n_query + len(grams)
+            if 2.0 * (overlap + skipped) < min_dice * total:
+                continue
+            dice = 2.0 * len(query_grams & grams) / total
+            if dice >= min_dice:
+                candidates.append((dice, name_id))
+        candidates.sort(reverse=True)
+
+        best = None
+        threshold = min_score
+        for dice, name_id in candidates[:self.max_candidates]:
+            # Candidats par Dice décroissant : les suivants ne peuvent plus battre le meilleur
+            if best is not None and 0.5 * dice + 0.5 <= best[1]:
+                break
+            key, name, _ = self._names[name_id]
+            longest = max(len(name), len(compact))
+            # Distance maximale encore compatible avec le seuil (ou le meilleur score)
+            max_distance = int(longest * (1.0 - max(0.0, 2.0 * threshold - dice)))
+            distance = edit_distance(compact, name, max_distance=max_distance)
+            if distance > max_distance:
+                continue
+            edit_similarity = max(0.0, 1.0 - distance / longest)
+            score = 0.5 * dice + 0.5 * edit_similarity
+            if best is None or score > best[1]:
+                best = (key, score)
+                threshold = max(threshold, score)
+
+        return best if best and best[1] >= min_score else None
+
+    def find_in_text(self, text, max_words=3, min_score=0.72):
+        """
+        Cherche le produit mentionné dans une phrase libre en testant les
+        groupes de 1 à `max_words` mots consécutifs (mots vides ignorés)
+        """
+        words = fold_text(text).split()
+        best = None
+        for size in range(max_words, 0, -1):
+            for start in range(len(words) - size + 1):
+                span = words[start:start + size]
+                if span[0] in STOPWORDS or span[-1] in STOPWORDS:
+                    continue
+                # Un groupe qui ne peut pas dépasser le meilleur score est élagué plus tôt
+                threshold = max(min_score, best[1]) if best else min_score
+                match = self._resolve_compact("".join(span), threshold)
+                # À score égal, le groupe de mots le plus long l'emporte
+                if match and (best is None or match[1] > best[1]):
+                    best = match
+            if best and best[1] >= 1.0:
+                break
+        return best
+
+
+def synthetic_catalogue(n_products=5000, seed=0):
+    """Catalogue synthétique (marque, produit, format, référence) pour le benchmark"""
+    import random
+    rng = random.Random(seed)
+    brands = ["Nescafé", "Broli", "Arm", "Softcare", "Hygisita", "Parle", "Nido", "Jadida", "Dolima", "Mayor",
+              "Lesieur", "Maggi", "Omo", "Ariel", "Colgate", "Signal", "Lipton", "Président", "Danone", "Nestlé"]
+    products = ["lait", "mayonnaise", "couche", "papier hygiénique", "biscuit", "café", "huile", "sucre",
+                "savon", "lessive", "dentifrice", "thé", "fromage", "yaourt", "farine", "riz", "pâtes", "sel"]
+    sizes = ["250g", "500g", "1kg", "5kg", "1l", "5l", "T3", "T4", "x12", "x24"]
+    return [
+        (f"sku{number}", [f"{rng.choice(brands)} {rng.choice(products)} {rng.choice(sizes)} ref{number}"])
+        for number in range(n_products)
+    ]
+
+
+if __name__ == "__main__":
+    import statistics
+    import timeit
+
+    catalogue = synthetic_catalogue()
+    index = ProductNameIndex(catalogue)
+    # Noms du catalogue avec fautes de frappe, noms partiels et requêtes sans réponse
+    queries = ["magi sucre 1l ref123", "président huil T3 ref4021", "lipton ris x12 ref77", "ariel biscuit t3 ref2500",
+               "maggi lessive ref3050", "ref4999", "sucre 1l", "kg", "xyz inconnu"]
+    sentences = ["quel est le stock de magi sucre ref123 ?", "analyse la rupture du lessive x24 ref3050",
+                 "combien de jours avant la rupture des couches ?", "quel est le stock de nescafe cafe 250g ref123 ?"]
+
+    def per_call_ms(function, arguments, repeats=200):
+        """Durée médiane d'un appel (ms) sur 5 séries de `repeats` passages"""
+        runs = timeit.repeat(lambda: [function(argument) for argument in arguments], number=repeats, repeat=5)
+        return statistics.median(runs) * 1000 / (repeats * len(arguments))
+
+    print(f"🔎 {len(index)} noms indexés ({len(catalogue)} produits synthétiques)")
+    for query in queries:
+        print(f"   resolve({query!r}) = {index.resolve(query)} : {per_call_ms(index.resolve, [query]):.3f} ms")
+    print(f"⏱️ resolve : {per_call_ms(index.resolve, queries):.3f} ms/requête en moyenne")
+    for sentence in sentences:
+        print(f"   find_in_text({sentence!r}) = {index.find_in_text(sentence)} : "
+              f"{per_call_ms(index.find_in_text, [sentence], repeats=50):.3f} ms")
+    print(f"⏱️ find_in_text : {per_call_ms(index.find_in_text, sentences, repeats=50):.3f} ms/phrase en moyenne")
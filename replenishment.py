@@ -0,0 +1,204 @@
+# =============================================================================
+# 🛒 OPTIMISATION DES COMMANDES (POINT DE COMMANDE, QUANTITÉS) POUR TOUT LE CATALOGUE
+# =============================================================================
+"""
+Proposition de commandes calculée en une passe vectorisée pour tous les produits.
+
+Par produit : délai de livraison, période de révision, niveau de service,
+minimum de commande (MOQ) et colisage.
+
+- demande sur un horizon = somme des prévisions journalières (horizon fractionnaire
+  interpolé) ; écart-type avec la même corrélation entre jours que la simulation
+  de ruptures (`stockout_simulation.py`)
+- stock de sécurité = z(niveau de service) × écart-type de la demande pendant le délai
+- point de commande = demande pendant le délai + stock de sécurité
+- niveau cible = demande sur délai + révision + stock de sécurité correspondant
+- si la position de stock (stock + en commande) atteint le point de commande :
+  quantité = niveau cible - position, au moins le MOQ, arrondie au colis supérieur
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from stockout_simulation import DEFAULT_PATH_CORRELATION
+
+DEFAULT_LEAD_TIME = 7
+DEFAULT_REVIEW_PERIOD = 7
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_MOQ = 0
+DEFAULT_PACK_SIZE = 1
+
+# Colonnes des paramètres d'approvisionnement (une ligne par produit)
+PARAMETER_DEFAULTS = {
+    'delai_livraison': DEFAULT_LEAD_TIME,
+    'periode_revision': DEFAULT_REVIEW_PERIOD,
+    'niveau_service': DEFAULT_SERVICE_LEVEL,
+    'moq': DEFAULT_MOQ,
+    'colisage': DEFAULT_PACK_SIZE
+}
+
+# Jours utilisés pour prolonger une prévision trop courte
+EXTENSION_WINDOW = 7
+
+
+def service_level_z(service_levels):
+    """Quantile normal de chaque niveau de service (borné à ]0.5, 0.9999])"""
+    levels = np.clip(np.atleast_1d(np.asarray(service_levels, dtype=float)), 0.5, 0.9999)
+    unique, inverse = np.unique(levels, return_inverse=True)
+    return np.array([NormalDist().inv_cdf(level) for level in unique])[inverse]
+
+
+def pad_forecasts(series, horizon):
+    """
+    Matrice (produits, horizon) ; une série trop courte est prolongée par la
+    moyenne de ses derniers jours
+    """
+    matrix = np.zeros((len(series), horizon))
+    for row, values in enumerate(series):
+        values = np.asarray(values, dtype=float)[:horizon]
+        matrix[row, :len(values)] = values
+        if len(values) < horizon:
+            matrix[row, len(values):] = values[-EXTENSION_WINDOW:].mean() if len(values) else 0.0
+    return matrix
+
+
+def horizon_demand(means, sigmas, days, correlation=DEFAULT_PATH_CORRELATION):
+    """
+    Moyenne et écart-type de la demande cumulée sur `days` jours (un horizon par produit)
+
+    Variance = (1 - ρ) Σσ² + ρ (Σσ)² : erreurs journalières en partie communes
+    """
+    n_products, horizon = means.shape
+    days = np.clip(np.asarray(days, dtype=float), 0, horizon)
+    zeros = np.zeros((n_products, 1))
+    cumulative = {
+        'mean': np.hstack([zeros, np.cumsum(means, axis=1)]),
+        'var': np.hstack([zeros, np.cumsum(sigmas ** 2, axis=1)]),
+        'sum_sigma': np.hstack([zeros, np.cumsum(sigmas, axis=1)])
+    }
+    whole = np.floor(days).astype(int)
+    following = np.minimum(whole + 1, horizon)
+    fraction = days - whole
+
+    def at_days(values):
+        low = np.take_along_axis(values, whole[:, None], axis=1)[:, 0]
+        high = np.take_along_axis(values, following[:, None], axis=1)[:, 0]
+        return low + fraction * (high - low)
+
+    mean = at_days(cumulative['mean'])
+    variance = (1 - correlation) * at_days(cumulative['var']) + correlation * at_days(cumulative['sum_sigma']) ** 2
+    return mean, np.sqrt(variance)
+
+
+def optimize_orders(stocks, means, sigmas, lead_times, service_levels, moq=DEFAULT_MOQ, pack_sizes=DEFAULT_PACK_SIZE,
+                    review_periods=DEFAULT_REVIEW_PERIOD, on_order=0.0, correlation=DEFAULT_PATH_CORRELATION):
+    """
+    Calcul vectorisé pour tous les produits (tableaux de forme (produits,) ou scalaires).
+
+    `means`, `sigmas` : (produits, jours) prévisions et écarts-types journaliers,
+    au moins délai + révision jours (voir `pad_forecasts`).
+    Retourne un dict de tableaux (produits,).
+    """
+    means = np.atleast_2d(np.asarray(means, dtype=float))
+    sigmas = np.atleast_2d(np.asarray(sigmas, dtype=float))
+    n_products = means.shape[0]
+
+    def per_product(values):
+        return np.broadcast_to(np.asarray(values, dtype=float), (n_products,)).copy()
+
+    stocks = per_product(stocks)
+    lead_times = per_product(lead_times)
+    review_periods = per_product(review_periods)
+    moq = per_product(moq)
+    pack_sizes = np.maximum(per_product(pack_sizes), 1.0)
+    position = stocks + per_product(on_order)
+    z = service_level_z(per_product(service_levels))
+
+    lead_demand, lead_sigma = horizon_demand(means, sigmas, lead_times, correlation)
+    cycle_demand, cycle_sigma = horizon_demand(means, sigmas, lead_times + review_periods, correlation)
+
+    safety_stock = z * lead_sigma
+    reorder_point = lead_demand + safety_stock
+    order_up_to = cycle_demand + z * cycle_sigma
+
+    needs_order = position <= reorder_point
+    raw_quantity = np.where(needs_order, np.maximum(order_up_to - position, 0.0), 0.0)
+    quantity = np.where(raw_quantity > 0, np.maximum(raw_quantity, moq), 0.0)
+    packs = np.ceil(quantity / pack_sizes)
+    quantity = packs * pack_sizes
+
+    daily_demand = means.mean(axis=1)
+    coverage = np.divide(position, daily_demand, out=np.full(n_products, np.inf), where=daily_demand > 0)
+
+    return {
+        'position': position,
+        'lead_demand': lead_demand,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'order_up_to': order_up_to,
+        'needs_order': needs_order & (quantity > 0),
+        'raw_quantity': raw_quantity,
+        'quantity': quantity,
+        'packs': packs,
+        'coverage_days': coverage
+    }
+
+
+def default_parameters(product_keys):
+    """Paramètres par défaut, une ligne par produit (index = clé produit)"""
+    return pd.DataFrame([PARAMETER_DEFAULTS] * len(product_keys), index=pd.Index(product_keys, name='produit'))
+
+
+def purchase_order_table(products, parameters=None, correlation=DEFAULT_PATH_CORRELATION):
+    """
+    Proposition de commandes pour tous les produits en un appel.
+
+    - `products` : liste de dicts {'key', 'name', 'stock', 'predictions', 'sigmas', 'on_order' (optionnel)}
+    - `parameters` : DataFrame indexé par clé produit (colonnes de PARAMETER_DEFAULTS) ;
+      valeurs manquantes = valeurs par défaut
+
+    Retourne un DataFrame trié par couverture croissante (produits à commander d'abord)
+    """
+    if not products:
+        return pd.DataFrame()
+    keys = [product['key'] for product in products]
+    params = default_parameters(keys)
+    if parameters is not None and len(parameters):
+        params.update(parameters.reindex(keys))
+    params = params.astype(float)
+
+    horizon = int(np.ceil((params['delai_livraison'] + params['periode_revision']).max())) + 1
+    result = optimize_orders(
+        [product['stock'] for product in products],
+        pad_forecasts([product['predictions'] for product in products], horizon),
+        pad_forecasts([product['sigmas'] for product in products], horizon),
+        params['delai_livraison'].to_numpy(),
+        params['niveau_service'].to_numpy(),
+        params['moq'].to_numpy(),
+        params['colisage'].to_numpy(),
+        params['periode_revision'].to_numpy(),
+        [product.get('on_order', 0.0) for product in products],
+        correlation
+    )
+
+    table = pd.DataFrame({
+        'Produit': [product['name'] for product in products],
+        'Stock actuel': [product['stock'] for product in products],
+        'Position': result['position'],
+        'Demande pendant délai': result['lead_demand'],
+        'Stock de sécurité': result['safety_stock'],
+        'Point de commande': result['reorder_point'],
+        'Niveau cible': result['order_up_to'],
+        'Couverture (j)': result['coverage_days'],
+        'À commander': np.where(result['needs_order'], 'Oui', 'Non'),
+        'Quantité': result['quantity'],
+        'Colis': result['packs'].astype(int),
+        'Délai (j)': params['delai_livraison'].to_numpy(),
+        'Niveau de service': params['niveau_service'].to_numpy()
+    }, index=pd.Index(keys, name='produit'))
+    table = table.sort_values(['À commander', 'Couverture (j)'], ascending=[False, True], kind='mergesort')
+    numeric = ['Position', 'Demande pendant délai', 'Stock de sécurité', 'Point de commande', 'Niveau cible', 'Quantité']
+    table[numeric] = table[numeric].round(0)
+    table['Couverture (j)'] = table['Couverture (j)'].round(1)
+    return table
@@ -0,0 +1,130 @@
+# =============================================================================
+# 🗃️ CACHE DES RÉPONSES DU CHATBOT (LLM ET RÈGLES)
+# =============================================================================
+"""
+Cache LRU + TTL des réponses du chatbot.
+
+La clé combine la question normalisée (minuscules, sans accents ni
+ponctuation superflue), la version du snapshot de prévisions et le nom du
+modèle : une même question posée sur les mêmes données ne rappelle ni
+l'API Groq ni la construction des réponses à base de règles.
+
+Une réponse construite avec l'historique de conversation dépend aussi des
+messages envoyés : leur empreinte (`messages_digest`) est ajoutée au nom du
+modèle, pour ne jamais resservir une réponse écrite pour un autre échange.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s%-]+", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """Normalise une question : « État du stock ? » → « etat du stock »"""
+    text = unicodedata.normalize("NFKD", str(prompt or "").lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def messages_digest(messages):
+    """Empreinte courte des messages envoyés au LLM (rôles et contenus)"""
+    payload = json.dumps([(message.get("role"), message.get("content")) for message in messages or []],
+                         ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Cache LRU avec expiration (TTL) et métriques de taux de succès"""
+
+    def __init__(self, max_entries=512, ttl_seconds=900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(prompt, snapshot_version=None, model=None):
+        return (normalize_prompt(prompt), str(snapshot_version or ""), str(model or ""))
+
+    def get(self, prompt, snapshot_version=None, model=None):
+        """Retourne la réponse en cache ou None"""
+        key = self.make_key(prompt, snapshot_version, model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if self.ttl_seconds is not None and expires_at < now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, prompt, value, snapshot_version=None, model=None):
+        key = self.make_key(prompt, snapshot_version, model)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, prompt, compute, snapshot_version=None, model=None, should_cache=None):
+        """
+        Retourne la réponse en cache ou la calcule via `compute()`.
+        `should_cache(valeur)` permet d'exclure les réponses d'erreur.
+        """
+        value = self.get(prompt, snapshot_version, model)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None and (should_cache is None or should_cache(value)):
+            self.put(prompt, value, snapshot_version, model)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+_RESPONSE_CACHE = None
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache():
+    """Cache partagé par toutes les sessions du processus"""
+    global _RESPONSE_CACHE
+    with _RESPONSE_CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            _RESPONSE_CACHE = ResponseCache()
+        return _RESPONSE_CACHE
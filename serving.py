@@ -0,0 +1,138 @@
+# =============================================================================
+# ⏱️ SERVICE PROGRESSIF DES PRÉVISIONS SOUS BUDGET DE LATENCE
+# =============================================================================
+"""
+Service des prévisions par niveaux : la prévision de référence
+(baselines.py, quelques microsecondes) est affichée tout de suite, puis
+remplacée par celle de l'ensemble quand elle est prête.
+
+- budget de latence (ms) pour l'ensemble (features comprises) : les
+  modèles sont exécutés par poids décroissant tant que leur latence estimée
+  tient dans le temps restant ; les autres ne sont pas exécutés et les
+  poids des modèles exécutés sont renormalisés
+  (stacking.EnsembleWeights.combine)
+- latence estimée d'un modèle : médiane de ses dernières exécutions dans le
+  processus, sinon latence mesurée par le backtest, sinon inconnue (le
+  modèle est exécuté et mesuré)
+- durée de chaque niveau enregistrée (référence, features, chaque modèle,
+  combinaison) pour l'affichage et le suivi
+
+Budget par défaut : variable d'environnement `FORECAST_LATENCY_BUDGET_MS`.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+LATENCY_BUDGET_ENV = "FORECAST_LATENCY_BUDGET_MS"
+DEFAULT_LATENCY_BUDGET_MS = 250.0
+
+# Exécutions gardées par (produit, modèle) pour estimer la latence
+LATENCY_HISTORY = 20
+
+_LATENCIES = {}
+_LATENCY_LOCK = threading.Lock()
+
+
+def default_budget_ms():
+    """Budget de latence configuré (ms) ; None = pas de limite"""
+    value = os.getenv(LATENCY_BUDGET_ENV)
+    if value is None:
+        return DEFAULT_LATENCY_BUDGET_MS
+    try:
+        budget = float(value)
+    except ValueError:
+        return DEFAULT_LATENCY_BUDGET_MS
+    return budget if budget > 0 else None
+
+
+def record_latency(scope, member, elapsed_ms):
+    with _LATENCY_LOCK:
+        _LATENCIES.setdefault((scope, member), deque(maxlen=LATENCY_HISTORY)).append(float(elapsed_ms))
+
+
+def estimated_latency(scope, member, fallback=None):
+    """Latence médiane des dernières exécutions (ms), sinon `fallback`"""
+    with _LATENCY_LOCK:
+        history = list(_LATENCIES.get((scope, member), ()))
+    return float(np.median(history)) if history else fallback
+
+
+def member_estimates(scope, members, backtest_summary=None):
+    """{modèle: latence estimée (ms) ou None} : exécutions récentes, sinon backtest"""
+    measured = {}
+    if backtest_summary is not None and 'latency_ms' in backtest_summary:
+        measured = backtest_summary['latency_ms'].dropna().to_dict()
+    return {name: estimated_latency(scope, name, measured.get(name)) for name in members}
+
+
+def serving_order(members, weights=None):
+    """Modèles par poids décroissant dans l'ensemble (ordre donné sans poids)"""
+    members = list(members)
+    if weights is not None:
+        members.sort(key=lambda name: -weights.weights.get(name, 0.0))
+    return members
+
+
+class LatencyBudget:
+    """Temps restant pour le niveau ensemble, décompté depuis sa création"""
+
+    def __init__(self, budget_ms=None):
+        self.budget_ms = budget_ms
+        self._start = time.perf_counter()
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def allows(self, estimate_ms, first=False):
+        """
+        Vrai si un modèle de latence estimée `estimate_ms` tient dans le temps
+        restant ; un modèle de latence inconnue est exécuté, et le premier
+        modèle l'est toujours pour qu'un budget trop faible ne vide pas l'ensemble
+        """
+        if self.budget_ms is None or first or estimate_ms is None:
+            return True
+        return self.elapsed_ms + estimate_ms <= self.budget_ms
+
+
+class ServingTimings:
+    """Durée de chaque niveau de service d'une prévision (`scope` : produit servi)"""
+
+    def __init__(self, budget_ms=None, scope=None):
+        self.budget_ms = budget_ms
+        self.scope = scope
+        self.tiers = []
+        self.skipped = []
+        self._start = time.perf_counter()
+
+    def record(self, tier, elapsed_ms, **details):
+        self.tiers.append({'tier': tier, 'ms': float(elapsed_ms), **details})
+
+    def measure(self, tier, **details):
+        """Gestionnaire de contexte qui enregistre la durée du bloc"""
+        return _TierTimer(self, tier, details)
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def table(self):
+        import pandas as pd
+        return pd.DataFrame(self.tiers)
+
+
+class _TierTimer:
+    def __init__(self, timings, tier, details):
+        self.timings, self.tier, self.details = timings, tier, details
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.timings.record(self.tier, self.elapsed_ms, **self.details)
+        return False
@@ -0,0 +1,220 @@
+# =============================================================================
+# 🧠 POIDS DES MODÈLES PARTAGÉS ENTRE PROCESSUS (MMAP) ET RAPPORT MÉMOIRE
+# =============================================================================
+"""
+Plusieurs processus Streamlit sur un même hôte partagent une seule copie
+physique des poids des modèles.
+
+- les modèles d'un dossier sont exportés une fois en artefacts
+  (model_artifacts.py, tableaux `.npz` non compressés), sous un verrou de
+  fichier : le premier processus exporte, les autres attendent puis lisent
+- chaque processus projette les tableaux en mémoire (np.memmap, lecture
+  seule) : les pages viennent du cache de pages du noyau, communes à tous
+  les processus, au lieu d'une copie dépicklée par processus
+- un seul jeu de modèles par processus et par version du dossier
+- rapport mémoire par processus depuis /proc/<pid>/smaps_rollup (RSS, PSS,
+  partagé / privé) et /proc/<pid>/smaps pour les fichiers de modèles projetés
+
+Démonstration : `python shared_models.py models --workers 4` (N processus
+chargent les modèles par pickle puis par mmap et rapportent leur mémoire)
+"""
+import os
+import threading
+
+from model_artifacts import ARRAYS_SUFFIX, MANIFEST_FILE, PICKLE_SUFFIX, export_folder, load_artifacts
+
+LOCK_FILE = ".export.lock"
+
+# Champs de smaps_rollup rapportés (en Ko dans /proc, convertis en Mo)
+MEMORY_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Anonymous', 'Swap')
+
+_SHARED_MODELS = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def _artifacts_stale(folder):
+    """Vrai si le manifeste manque ou est plus ancien qu'un pickle du dossier"""
+    manifest = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(manifest):
+        return True
+    exported = os.path.getmtime(manifest)
+    return any(os.path.getmtime(os.path.join(folder, file)) > exported
+               for file in os.listdir(folder) if file.endswith(PICKLE_SUFFIX))
+
+
+def ensure_artifacts(folder):
+    """
+    Exporte les pickles du dossier en artefacts si nécessaire ; verrou
+    exclusif sur `LOCK_FILE` pour qu'un seul processus de l'hôte exporte
+    """
+    if not _artifacts_stale(folder):
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    with open(os.path.join(folder, LOCK_FILE), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Un autre processus a pu exporter pendant l'attente du verrou
+            if not _artifacts_stale(folder):
+                return False
+            export_folder(folder)
+            return True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_shared_models(folder, members=None):
+    """
+    {nom: modèle} d'un dossier, tableaux projetés en mémoire et partagés entre
+    processus ; None si le dossier ne peut pas fournir d'artefacts
+    """
+    try:
+        ensure_artifacts(folder)
+    except OSError as e:
+        # Dossier en lecture seule : artefacts existants seulement
+        print(f"⚠️ Export des artefacts impossible dans {folder}: {e}")
+    manifest = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(manifest):
+        return None
+    key = (os.path.abspath(folder), os.path.getmtime(manifest), None if members is None else tuple(sorted(members)))
+    with _SHARED_LOCK:
+        if key in _SHARED_MODELS:
+            return dict(_SHARED_MODELS[key])
+    models = load_artifacts(folder, members, prefer_native=False, mmap=True)
+    with _SHARED_LOCK:
+        # Versions précédentes du même dossier libérées (fin des projections)
+        for stale in [k for k in _SHARED_MODELS if k[0] == key[0]]:
+            del _SHARED_MODELS[stale]
+        _SHARED_MODELS[key] = models
+    return dict(models)
+
+
+# -----------------------------------------------------------------------------
+# Rapport mémoire (Linux)
+# -----------------------------------------------------------------------------
+
+def _parse_fields(lines):
+    values = {}
+    for line in lines:
+        name, _, rest = line.partition(':')
+        if name in MEMORY_FIELDS:
+            values[name] = values.get(name, 0) + int(rest.split()[0])
+    return values
+
+
+def process_memory(pid='self'):
+    """
+    Mémoire d'un processus en Mo : RSS, PSS (pages partagées divisées par le
+    nombre de processus), partagé / privé ; None hors Linux
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as handle:
+            values = _parse_fields(handle)
+    except FileNotFoundError:
+        try:
+            # Noyaux antérieurs à 4.14 : somme sur toutes les projections
+            with open(f"/proc/{pid}/smaps") as handle:
+                values = _parse_fields(handle)
+        except FileNotFoundError:
+            return None
+    report = {name.lower(): values.get(name, 0) / 1024 for name in MEMORY_FIELDS}
+    report['shared'] = report['shared_clean'] + report['shared_dirty']
+    report['private'] = report['private_clean'] + report['private_dirty']
+    return report
+
+
+def mapped_model_memory(pid='self', suffix=ARRAYS_SUFFIX):
+    """
+    {fichier: {'size', 'rss', 'pss', 'shared'}} en Mo pour les fichiers de
+    modèles projetés en mémoire par le processus
+    """
+    mappings, current = {}, None
+    try:
+        with open(f"/proc/{pid}/smaps") as handle:
+            for line in handle:
+                fields = line.split()
+                if not fields:
+                    continue
+                if '-' in fields[0] and not fields[0].endswith(':'):
+                    # En-tête de projection : adresses perms offset dev inode [chemin]
+                    path = fields[5] if len(fields) > 5 else ''
+                    current = mappings.setdefault(path, {}) if path.endswith(suffix) else None
+                elif current is not None and fields[0].endswith(':'):
+                    name = fields[0][:-1]
+                    if name in ('Size', 'Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty'):
+                        current[name] = current.get(name, 0) + int(fields[1])
+    except FileNotFoundError:
+        return {}
+    return {
+        path: {
+            'size': values.get('Size', 0) / 1024,
+            'rss': values.get('Rss', 0) / 1024,
+            'pss': values.get('Pss', 0) / 1024,
+            'shared': (values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0)) / 1024
+        }
+        for path, values in mappings.items()
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from multiprocessing import Barrier, Process, Queue
+
+    parser = argparse.ArgumentParser(description="Mémoire de N processus chargeant les mêmes modèles")
+    parser.add_argument("folder")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--data-file", default="data/parleG_clean.csv")
+    args = parser.parse_args()
+
+    def worker(mode, barrier, results):
+        import joblib
+        import numpy as np
+
+        from forecast_features import future_features
+        from stock_data import load_daily_history
+        from tree_compiler import fast_predict
+
+        if mode == 'pickle':
+            models = {}
+            for file in sorted(os.listdir(args.folder)):
+                if file.endswith(PICKLE_SUFFIX):
+                    try:
+                        models[file[:-len(PICKLE_SUFFIX)]] = joblib.load(os.path.join(args.folder, file))
+                    except Exception:
+                        pass
+        else:
+            models = load_shared_models(args.folder) or {}
+        daily = load_daily_history(args.data_file)
+        features = future_features(daily, daily.index[-1], 30)
+        for model in models.values():
+            np.asarray(fast_predict(model, features))
+        # Mesure quand tous les processus ont chargé (PSS partagé entre eux)
+        barrier.wait()
+        memory = process_memory()
+        mapped = mapped_model_memory()
+        results.put((os.getpid(), memory, sum(m['rss'] for m in mapped.values()), sum(m['pss'] for m in mapped.values())))
+        barrier.wait()
+
+    ensure_artifacts(args.folder)
+    for mode in ('pickle', 'mmap'):
+        barrier, results = Barrier(args.workers), Queue()
+        start = time.perf_counter()
+        processes = [Process(target=worker, args=(mode, barrier, results)) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        print(f"🧠 {mode} : {args.workers} processus en {time.perf_counter() - start:.1f} s")
+        for pid, memory, mapped_rss, mapped_pss in reports:
+            if memory is None:
+                print("   rapport mémoire indisponible (pas de /proc)")
+                break
+            print(f"   pid {pid}: RSS {memory['rss']:6.1f} Mo | PSS {memory['pss']:6.1f} Mo | partagé "
+                  f"{memory['shared']:6.1f} Mo | privé {memory['private']:6.1f} Mo | "
+                  f"modèles projetés RSS {mapped_rss:.2f} Mo, PSS {mapped_pss:.2f} Mo")
@@ -0,0 +1,181 @@
+# =============================================================================
+# ⚖️ POIDS D'ENSEMBLE APPRIS (STACKING NON NÉGATIF) ET ÉLAGAGE DES MODÈLES
+# =============================================================================
+"""
+Combinaison des modèles par des poids appris au lieu de la moyenne simple.
+
+- apprentissage : régression linéaire à coefficients positifs, sans
+  constante, des valeurs réelles sur les prévisions hors échantillon des
+  modèles (plis du backtest, ou période de test de l'entraînement)
+- optionnellement un jeu de poids par pas d'horizon (les pas avec trop peu
+  d'observations reprennent les poids globaux)
+- élagage : un modèle dont le poids est quasi nul est retiré et les poids
+  sont réappris sans lui ; les modèles retirés ne sont ni chargés ni exécutés
+- stockage : `model_weights` dans les métadonnées d'une version entraînée
+  (training.py) ou `poids_ensemble.joblib` (un jeu de poids par produit)
+  dans un dossier de modèles partagé
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+WEIGHTS_FILE = "poids_ensemble.joblib"
+
+# Poids relatif (part de la somme des poids) en dessous duquel un modèle est retiré
+PRUNE_THRESHOLD = 0.02
+
+# Observations minimales pour apprendre les poids d'un pas d'horizon
+MIN_ROWS_PER_STEP = 30
+
+
+class EnsembleWeights:
+    """Poids des modèles retenus, globaux et éventuellement par pas d'horizon"""
+
+    def __init__(self, weights, horizon_weights=None, pruned=(), n_rows=0, fingerprint=None, created_at=None):
+        # {modèle: poids} ; l'ordre des clés est l'ordre des colonnes de horizon_weights
+        self.weights = {name: float(value) for name, value in weights.items()}
+        self.horizon_weights = None if horizon_weights is None else np.asarray(horizon_weights, dtype=float)
+        self.pruned = list(pruned)
+        self.n_rows = int(n_rows)
+        self.fingerprint = fingerprint
+        self.created_at = created_at or datetime.now().isoformat()
+
+    @property
+    def members(self):
+        return list(self.weights)
+
+    @property
+    def digest(self):
+        """Empreinte courte des poids (pour les caches dépendant de la combinaison)"""
+        payload = json.dumps([self.weights, None if self.horizon_weights is None else self.horizon_weights.round(6).tolist()])
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:10]
+
+    def matrix(self, days):
+        """Poids par jour prévu : (jours, modèles retenus)"""
+        if self.horizon_weights is None:
+            return np.tile(list(self.weights.values()), (days, 1))
+        steps = np.minimum(np.arange(days), len(self.horizon_weights) - 1)
+        return self.horizon_weights[steps]
+
+    def combine(self, individual_predictions):
+        """
+        Prévision combinée à partir de {modèle: prévisions (..., jours)} ; si des
+        modèles retenus n'ont pas prédit (erreur, budget de latence), poids des
+        modèles disponibles renormalisés, ou moyenne simple si aucun n'est retenu
+        """
+        columns = [index for index, name in enumerate(self.members) if name in individual_predictions]
+        if not columns:
+            available = [np.asarray(values, dtype=float) for values in individual_predictions.values()]
+            return np.mean(available, axis=0)
+        stacked = np.stack([np.asarray(individual_predictions[self.members[index]], dtype=float) for index in columns], axis=-1)
+        matrix = self.matrix(stacked.shape[-2])[:, columns]
+        if len(columns) < len(self.members):
+            totals = matrix.sum(axis=1, keepdims=True)
+            if np.any(totals <= 0):
+                return np.mean(stacked, axis=-1)
+            matrix = matrix / totals
+        return np.sum(stacked * matrix, axis=-1)
+
+    def to_dict(self):
+        return {
+            'methode': 'stacking_positif',
+            'weights': self.weights,
+            'horizon_weights': None if self.horizon_weights is None else self.horizon_weights.tolist(),
+            'pruned': self.pruned,
+            'n_rows': self.n_rows,
+            'fingerprint': self.fingerprint,
+            'created_at': self.created_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Poids enregistrés ; None pour un format ancien (simple dict {modèle: poids})"""
+        if not isinstance(data, dict) or data.get('methode') != 'stacking_positif':
+            return None
+        return cls(data['weights'], data.get('horizon_weights'), data.get('pruned', ()), data.get('n_rows', 0),
+                   data.get('fingerprint'), data.get('created_at'))
+
+
+def _positive_least_squares(X, y):
+    model = LinearRegression(positive=True, fit_intercept=False)
+    model.fit(X, y)
+    return np.maximum(model.coef_, 0.0)
+
+
+def fit_ensemble_weights(predictions, actuals, per_horizon=False, prune_threshold=PRUNE_THRESHOLD, fingerprint=None):
+    """
+    Poids positifs à partir des prévisions hors échantillon.
+
+    - `predictions` : {modèle: tableau (origines, horizon)} ; `actuals` : (origines, horizon), NaN ignorés
+    - élagage itératif des modèles sous `prune_threshold` × somme des poids
+    """
+    names = list(predictions)
+    actuals = np.asarray(actuals, dtype=float)
+    stacked = np.stack([np.asarray(predictions[name], dtype=float) for name in names], axis=-1)  # (origines, horizon, modèles)
+    valid = ~np.isnan(actuals) & ~np.isnan(stacked).any(axis=-1)
+    X, y = stacked[valid], actuals[valid]
+    if not len(y):
+        raise ValueError("Aucune prévision hors échantillon pour apprendre les poids")
+
+    kept = list(range(len(names)))
+    while True:
+        coefficients = _positive_least_squares(X[:, kept], y)
+        total = coefficients.sum()
+        if total <= 0:
+            # Aucun modèle utile : moyenne simple des modèles restants
+            coefficients = np.full(len(kept), 1.0 / len(kept))
+            break
+        weak = coefficients < prune_threshold * total
+        if not weak.any() or weak.all():
+            break
+        kept = [index for index, is_weak in zip(kept, weak) if not is_weak]
+
+    weights = {names[index]: coefficient for index, coefficient in zip(kept, coefficients)}
+    pruned = [name for index, name in enumerate(names) if index not in kept]
+
+    horizon_weights = None
+    if per_horizon:
+        horizon_weights = np.tile(coefficients, (actuals.shape[1], 1))
+        for step in range(actuals.shape[1]):
+            rows = valid[:, step]
+            if rows.sum() >= MIN_ROWS_PER_STEP:
+                step_weights = _positive_least_squares(stacked[rows, step][:, kept], actuals[rows, step])
+                if step_weights.sum() > 0:
+                    horizon_weights[step] = step_weights
+    return EnsembleWeights(weights, horizon_weights, pruned, len(y), fingerprint)
+
+
+# -----------------------------------------------------------------------------
+# Stockage par produit dans un dossier de modèles partagé
+# -----------------------------------------------------------------------------
+
+_STORE_LOCK = threading.Lock()
+
+
+def load_weights(folder, product_key, fingerprint=None):
+    """Poids enregistrés d'un produit (None si absents ou si l'empreinte a changé)"""
+    path = os.path.join(folder, WEIGHTS_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        weights = EnsembleWeights.from_dict(joblib.load(path).get(product_key))
+    except Exception as e:
+        print(f"⚠️ Poids d'ensemble illisibles dans {folder}: {e}")
+        return None
+    if weights is None or (fingerprint is not None and weights.fingerprint != fingerprint):
+        return None
+    return weights
+
+
+def save_weights(folder, product_key, weights):
+    with _STORE_LOCK:
+        path = os.path.join(folder, WEIGHTS_FILE)
+        store = joblib.load(path) if os.path.exists(path) else {}
+        store[product_key] = weights.to_dict()
+        joblib.dump(store, path)
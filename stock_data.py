@@ -0,0 +1,106 @@
+# =============================================================================
+# 📂 LECTURE ET AGRÉGATION JOURNALIÈRE DES MOUVEMENTS DE STOCK
+# =============================================================================
+"""
+Lecture des fichiers de mouvements (CSV/Excel) sans dépendance à Streamlit,
+utilisable depuis l'application comme depuis des processus de calcul.
+
+- séparateur et encodage détectés, nombres « 1 100,00 » nettoyés
+- lignes sans date (ou à la date fictive 01/01/1900) écartées
+- agrégation journalière : Entrée et Sortie sommées, Stock = dernier niveau du jour
+"""
+import os
+import threading
+
+import pandas as pd
+
+NUMERIC_COLUMNS = ['Entrée', 'Sortie', 'Stock']
+DATE_COLUMN_HINTS = ['date', 'jour', 'operation']
+
+# Les dates antérieures sont des valeurs de remplissage (ex. 01/01/1900)
+MIN_VALID_DATE = pd.Timestamp('2000-01-01')
+
+
+def _read_raw(path):
+    if path.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(path)
+    for encoding in ('utf-8', 'latin-1'):
+        try:
+            return pd.read_csv(path, sep=None, engine='python', encoding=encoding, on_bad_lines='skip')
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Encodage non reconnu : {path}")
+
+
+def _clean_numeric(series):
+    text = series.astype(str)
+    for separator in (' ', '\xa0', '\u202f'):
+        text = text.str.replace(separator, '', regex=False)
+    text = text.str.replace(',', '.', regex=False)
+    return pd.to_numeric(text, errors='coerce').fillna(0.0)
+
+
+def _parse_dates(series):
+    dates = pd.to_datetime(series, errors='coerce', format='%Y-%m-%d %H:%M:%S')
+    if dates.isna().all():
+        dates = pd.to_datetime(series, errors='coerce', dayfirst=True, format='mixed')
+    return dates
+
+
+def read_stock_history(path):
+    """
+    Mouvements datés, triés par date : colonnes Date, Entrée, Sortie, Stock
+    """
+    df = _read_raw(path)
+    date_cols = [col for col in df.columns if any(word in str(col).lower() for word in DATE_COLUMN_HINTS)]
+    if not date_cols:
+        raise ValueError(f"Aucune colonne de date dans {path}")
+
+    history = pd.DataFrame({'Date': _parse_dates(df[date_cols[0]])})
+    for col in NUMERIC_COLUMNS:
+        history[col] = _clean_numeric(df[col]) if col in df.columns else 0.0
+
+    history = history[history['Date'].notna() & (history['Date'] >= MIN_VALID_DATE)]
+    # Tri stable : l'ordre du fichier départage les mouvements de même horodatage
+    return history.sort_values('Date', kind='mergesort').reset_index(drop=True)
+
+
+def daily_history(transactions, fill_missing_days=True):
+    """
+    Série journalière indexée par date (Entrée, Sortie, Stock).
+    Les jours sans mouvement ont Entrée = Sortie = 0 et le stock de la veille.
+    """
+    if transactions is None or len(transactions) == 0:
+        return pd.DataFrame(columns=NUMERIC_COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+
+    days = transactions['Date'].dt.normalize()
+    daily = transactions.groupby(days).agg({'Entrée': 'sum', 'Sortie': 'sum', 'Stock': 'last'})
+    daily.index.name = 'Date'
+    if fill_missing_days:
+        full_range = pd.date_range(daily.index.min(), daily.index.max(), freq='D', name='Date')
+        daily = daily.reindex(full_range)
+        daily[['Entrée', 'Sortie']] = daily[['Entrée', 'Sortie']].fillna(0.0)
+        daily['Stock'] = daily['Stock'].ffill().fillna(0.0)
+    return daily
+
+
+_DAILY_CACHE = {}
+_DAILY_CACHE_LOCK = threading.Lock()
+
+
+def file_signature(path):
+    """(chemin, date de modification, taille) - change dès que le fichier change"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def load_daily_history(path, fill_missing_days=True):
+    """Série journalière d'un fichier, relue uniquement si le fichier a changé"""
+    key = (file_signature(path), fill_missing_days)
+    with _DAILY_CACHE_LOCK:
+        if key in _DAILY_CACHE:
+            return _DAILY_CACHE[key]
+    daily = daily_history(read_stock_history(path), fill_missing_days)
+    with _DAILY_CACHE_LOCK:
+        _DAILY_CACHE[key] = daily
+    return daily
@@ -0,0 +1,155 @@
+# =============================================================================
+# 🎲 SIMULATION MONTE CARLO DES TRAJECTOIRES DE STOCK (RUPTURES)
+# =============================================================================
+"""
+Probabilité de rupture et jours avant rupture à partir de la distribution des
+prévisions, pour un ou plusieurs produits à la fois.
+
+- demande simulée sous forme de tableau (produits × trajectoires × jours) :
+  prévision + bruit normal tronqué à 0, avec une composante commune à toute
+  la trajectoire (les erreurs de prévision d'un même produit sont corrélées
+  d'un jour à l'autre) ; variables antithétiques (moitié des tirages)
+- stock de chaque trajectoire = stock actuel - demande cumulée (+ réceptions)
+- résultats : probabilité de rupture à chaque jour, quantiles du nombre de
+  jours avant rupture (interpolé dans la journée), probabilité sur l'horizon
+
+Les produits sont traités par blocs pour borner la mémoire ; tout le
+catalogue actuel (7 produits × 10 000 trajectoires × 30 jours) prend ~70 ms.
+
+Benchmark : `python stockout_simulation.py`
+"""
+from statistics import NormalDist
+
+import numpy as np
+
+DEFAULT_PATHS = 10000
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+# Part de la variance de l'erreur commune à tous les jours d'une trajectoire
+DEFAULT_PATH_CORRELATION = 0.3
+
+# Nombre maximal de valeurs simulées par bloc (float32, ~64 Mo)
+MAX_BLOCK_VALUES = 1 << 24
+
+
+def sigma_from_half_width(half_widths, level=0.9):
+    """Écart-type équivalent à la demi-largeur d'un intervalle de couverture `level`"""
+    return np.asarray(half_widths, dtype=float) / NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def half_width_from_sigma(sigmas, level=0.9):
+    """Demi-largeur de l'intervalle de couverture `level` d'une loi normale d'écart-type `sigmas`"""
+    return np.asarray(sigmas, dtype=float) * NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def _simulate_block(stocks, means, sigmas, receipts, n_paths, correlation, rng, quantiles):
+    n_products, n_days = means.shape
+    half = (n_paths + 1) // 2
+
+    # Tirages antithétiques (axe 0) : la seconde moitié des trajectoires utilise -bruit
+    # Forme (2, produits, trajectoires / 2, jours)
+    noise = np.empty((2, n_products, half, n_days), dtype=np.float32)
+    rng.standard_normal((n_products, half, n_days), dtype=np.float32, out=noise[0])
+    noise[0] *= np.float32(np.sqrt(1 - correlation))
+    noise[0] += np.float32(np.sqrt(correlation)) * rng.standard_normal((n_products, half, 1), dtype=np.float32)
+    np.negative(noise[0], out=noise[1])
+    demand = noise
+    demand *= sigmas[None, :, None, :]
+    demand += means[None, :, None, :]
+    np.maximum(demand, 0.0, out=demand)
+
+    # Niveau de stock en fin de journée pour chaque trajectoire
+    net = demand - receipts[None, :, None, :] if receipts is not None else demand
+    stock_levels = stocks[None, :, None, None] - np.cumsum(net, axis=3)
+    stocked_out = stock_levels <= 0
+
+    stockout_probability = stocked_out.mean(axis=(0, 2))
+
+    # Premier jour de rupture ; fraction de journée par interpolation linéaire
+    has_stockout = stocked_out.any(axis=3)
+    first_day = stocked_out.argmax(axis=3)
+    level_at = np.take_along_axis(stock_levels, first_day[..., None], axis=3)[..., 0]
+    net_at = np.take_along_axis(net, first_day[..., None], axis=3)[..., 0]
+    level_before = level_at + net_at
+    fraction = np.divide(level_before, net_at, out=np.ones_like(net_at), where=net_at > 0)
+    days = np.where(has_stockout, first_day + np.clip(fraction, 0.0, 1.0), np.inf)
+    days = np.where(stocks[None, :, None] <= 0, 0.0, days)
+    days = np.moveaxis(days, 0, 1).reshape(n_products, 2 * half)
+
+    days_quantiles = {
+        q: np.quantile(days, q, axis=1, method='inverted_cdf')
+        for q in quantiles
+    }
+    return stockout_probability, days_quantiles, has_stockout.mean(axis=(0, 2))
+
+
+def simulate_stockouts(current_stocks, predictions, sigmas, n_paths=DEFAULT_PATHS, receipts=None,
+                       correlation=DEFAULT_PATH_CORRELATION, quantiles=DEFAULT_QUANTILES, seed=0):
+    """
+    Simulation vectorisée pour plusieurs produits.
+
+    - `current_stocks` : (produits,)
+    - `predictions`, `sigmas` : (produits, jours) demande prévue et écart-type
+    - `receipts` : (produits, jours) réceptions prévues, optionnel
+    - `n_paths` : arrondi au nombre pair supérieur (tirages antithétiques)
+
+    Retourne un dict :
+    - 'stockout_probability' : (produits, jours) P(stock <= 0 en fin de journée)
+    - 'days_to_stockout' : {quantile: (produits,)} - inf si pas de rupture sur l'horizon
+    - 'horizon_stockout_probability' : (produits,) P(rupture avant la fin de l'horizon)
+    """
+    stocks = np.atleast_1d(np.asarray(current_stocks, dtype=np.float32))
+    means = np.atleast_2d(np.asarray(predictions, dtype=np.float32))
+    sigmas = np.atleast_2d(np.asarray(sigmas, dtype=np.float32))
+    receipts = np.atleast_2d(np.asarray(receipts, dtype=np.float32)) if receipts is not None else None
+    n_products, n_days = means.shape
+    rng = np.random.default_rng(seed)
+
+    block = max(1, MAX_BLOCK_VALUES // max(1, n_paths * n_days))
+    probabilities, horizon_probabilities = [], []
+    days_quantiles = {q: [] for q in quantiles}
+    for start in range(0, n_products, block):
+        stop = min(start + block, n_products)
+        probability, quantile_days, horizon_probability = _simulate_block(
+            stocks[start:stop], means[start:stop], sigmas[start:stop],
+            receipts[start:stop] if receipts is not None else None,
+            n_paths, correlation, rng, quantiles
+        )
+        probabilities.append(probability)
+        horizon_probabilities.append(horizon_probability)
+        for q in quantiles:
+            days_quantiles[q].append(quantile_days[q])
+
+    return {
+        'stockout_probability': np.concatenate(probabilities).astype(float),
+        'days_to_stockout': {q: np.concatenate(values).astype(float) for q, values in days_quantiles.items()},
+        'horizon_stockout_probability': np.concatenate(horizon_probabilities).astype(float)
+    }
+
+
+def simulate_product_stockout(current_stock, predictions, sigmas, n_paths=DEFAULT_PATHS, **options):
+    """Même simulation pour un seul produit ; tableaux et quantiles sans la dimension produit"""
+    result = simulate_stockouts([current_stock], [predictions], [sigmas], n_paths, **options)
+    return {
+        'stockout_probability': result['stockout_probability'][0],
+        'days_to_stockout': {q: float(values[0]) for q, values in result['days_to_stockout'].items()},
+        'horizon_stockout_probability': float(result['horizon_stockout_probability'][0])
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(1)
+    for n_products, n_days in ((7, 30), (7, 90), (50, 30)):
+        means = rng.uniform(5, 60, (n_products, 1)) * (1 + 0.1 * np.sin(np.arange(n_days) / 3))
+        stocks = means.mean(axis=1) * rng.uniform(2, 40, n_products)
+        simulate_stockouts(stocks, means, means * 0.4, n_paths=100)
+        start = time.perf_counter()
+        result = simulate_stockouts(stocks, means, means * 0.4, n_paths=DEFAULT_PATHS)
+        elapsed = time.perf_counter() - start
+        print(
+            f"🎲 {n_products:>4} produits × {DEFAULT_PATHS} trajectoires × {n_days} jours : "
+            f"{elapsed * 1000:7.1f} ms | P(rupture horizon) moyenne "
+            f"{result['horizon_stockout_probability'].mean():.2f}"
+        )
@@ -0,0 +1,426 @@
+# =============================================================================
+# 🏋️ ENTRAÎNEMENT PARALLÈLE DES MODÈLES PAR PRODUIT (ARTEFACTS VERSIONNÉS)
+# =============================================================================
+"""
+Régénération des modèles rf / gb / xgb / lgb à partir de `data/*`.
+
+- mêmes 22 features que l'application (`forecast_features.origin_features`) :
+  chaque ligne d'entraînement = état de l'historique à une origine + calendrier
+  du jour cible, cible = Sortie de ce jour (horizons 1 à `horizon`)
+- métriques (MAE, RMSE, R²) sur les derniers `test_days` jours, puis
+  réentraînement sur toute la fenêtre
+- une tâche par (produit, modèle) dans un pool de processus ; chaque tâche
+  reçoit une part des cœurs (threads du modèle et des bibliothèques de calcul
+  bornés), de sorte qu'un réentraînement du catalogue occupe tous les cœurs
+- artefacts versionnés : `models/<produit>/<version>/{rf,gb,xgb,lgb}_model.joblib`
+  + `metadonnees.joblib` (features, fenêtre d'entraînement, métriques,
+  paramètres, prévisions de la période de test) ; `models/<produit>/latest.json` désigne la version servie
+- chaque version est aussi exportée en artefacts natifs + `manifest.json`
+  (`model_artifacts.py`), chargés en priorité par l'application
+- poids d'ensemble appris sur les prévisions de la période de test
+  (`stacking.py`), modèles de poids nul retirés de la version
+
+Utilisation : `python training.py` (tout le catalogue) ou
+`python training.py data/parleG_clean.csv --models rf gb`
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from forecast_features import FEATURE_NAMES, origin_features
+from model_artifacts import export_folder
+from stacking import fit_ensemble_weights
+from stock_data import load_daily_history
+
+MODEL_NAMES = ('rf', 'gb', 'xgb', 'lgb')
+DEFAULT_OUTPUT = "models"
+LATEST_FILE = "latest.json"
+METADATA_FILE = "metadonnees.joblib"
+
+DEFAULT_TRAINING_HORIZON = 30
+DEFAULT_TEST_DAYS = 60
+MIN_HISTORY_DAYS = 30
+RANDOM_STATE = 42
+
+# Hyperparamètres par défaut (rf = paramètres des modèles livrés)
+DEFAULT_PARAMS = {
+    'rf': {
+        'n_estimators': 100, 'max_depth': 8, 'max_features': 0.6,
+        'min_samples_leaf': 8, 'min_samples_split': 15
+    },
+    'gb': {
+        'n_estimators': 200, 'max_depth': 5, 'learning_rate': 0.05, 'subsample': 0.8
+    },
+    'xgb': {
+        'n_estimators': 300, 'max_depth': 6, 'learning_rate': 0.05,
+        'subsample': 0.8, 'colsample_bytree': 0.8, 'tree_method': 'hist'
+    },
+    'lgb': {
+        'n_estimators': 300, 'learning_rate': 0.05, 'num_leaves': 31,
+        'subsample': 0.8, 'subsample_freq': 1, 'colsample_bytree': 0.8
+    }
+}
+
+
+def dataset_key(data_path):
+    """Clé produit d'un fichier de données (nom sans extension ni suffixe `_clean`)"""
+    stem = os.path.splitext(os.path.basename(data_path))[0]
+    return stem[:-len('_clean')] if stem.endswith('_clean') else stem
+
+
+def data_digest(path):
+    """Empreinte du contenu du fichier (indépendante de la date de modification)"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def limit_threads(n_threads=1):
+    """Borne les threads des bibliothèques de calcul du processus courant"""
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(n_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(n_threads)
+    except ImportError:
+        pass
+
+
+def build_estimator(name, params=None, n_threads=1):
+    """Estimateur non entraîné ; xgboost / lightgbm importés seulement si demandés"""
+    params = {**DEFAULT_PARAMS[name], **(params or {})}
+    if name == 'rf':
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=n_threads, **params)
+    if name == 'gb':
+        from sklearn.ensemble import GradientBoostingRegressor
+        return GradientBoostingRegressor(random_state=RANDOM_STATE, **params)
+    if name == 'xgb':
+        from xgboost import XGBRegressor
+        return XGBRegressor(random_state=RANDOM_STATE, n_jobs=n_threads, **params)
+    if name == 'lgb':
+        from lightgbm import LGBMRegressor
+        return LGBMRegressor(random_state=RANDOM_STATE, n_jobs=n_threads, verbose=-1, **params)
+    raise ValueError(f"Modèle inconnu : {name}")
+
+
+# -----------------------------------------------------------------------------
+# Matrice d'entraînement
+# -----------------------------------------------------------------------------
+
+def training_matrix(daily, horizon=DEFAULT_TRAINING_HORIZON, first_origin=MIN_HISTORY_DAYS, last_target=None):
+    """
+    (features (lignes, 22), cible (lignes,), position du jour cible de chaque ligne)
+    pour toutes les origines à partir de `first_origin` ; cibles au-delà de
+    `last_target` (position, incluse) ou de la fin de la série écartées
+    """
+    last_target = len(daily) - 1 if last_target is None else last_target
+    origins = np.arange(first_origin, last_target)
+    if not len(origins):
+        raise ValueError("Historique trop court pour l'entraînement")
+    features, actuals = origin_features(daily, origins, horizon)
+    targets = (origins[:, None] + np.arange(1, horizon + 1)[None, :]).ravel()
+    keep = (targets <= last_target) & ~np.isnan(actuals.ravel())
+    return features[keep].reset_index(drop=True), actuals.ravel()[keep], targets[keep]
+
+
+class FoldRefit:
+    """
+    Réentraînement des modèles servis sur l'historique antérieur à chaque pli
+    du backtest (`backtesting.run_backtest(fit_models=...)`) : prévisions hors
+    échantillon. Paramètres de chaque modèle servi (estimateur scikit-learn
+    cloné), sinon `params` de la version ({modèle: hyperparamètres}) ; les
+    modèles qui ne peuvent pas être réentraînés sont ignorés.
+    """
+
+    def __init__(self, models, params=None, horizon=DEFAULT_TRAINING_HORIZON):
+        from sklearn.base import clone
+        self.horizon = horizon
+        self.templates = {}
+        for name, model in models.items():
+            try:
+                template = clone(model) if hasattr(model, 'get_params') else build_estimator(name, (params or {}).get(name))
+            except Exception as e:
+                print(f"⚠️ {name} non réentraînable pour le backtest : {e}")
+                continue
+            if hasattr(template, 'n_jobs'):
+                template.n_jobs = 1
+            self.templates[name] = template
+
+    def __bool__(self):
+        return bool(self.templates)
+
+    @property
+    def cache_key(self):
+        """Empreinte des paramètres réentraînés (clé du cache des plis)"""
+        parts = sorted((name, sorted((key, repr(value)) for key, value in template.get_params().items()))
+                       for name, template in self.templates.items())
+        return f"refit-{self.horizon}-{hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:12]}"
+
+    def __call__(self, history):
+        from sklearn.base import clone
+        train_X, train_y, _ = training_matrix(history, self.horizon)
+        models = {}
+        for name, template in self.templates.items():
+            try:
+                models[name] = clone(template).fit(train_X, train_y)
+            except Exception as e:
+                print(f"⚠️ Backtest : {name} non réentraîné ({e})")
+        return models
+
+
+def regression_metrics(actual, predicted):
+    errors = predicted - actual
+    variance = np.sum((actual - actual.mean()) ** 2)
+    return {
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'r2': float(1 - np.sum(errors ** 2) / variance) if variance > 0 else float('nan')
+    }
+
+
+# -----------------------------------------------------------------------------
+# Tâche d'entraînement (un produit, un modèle)
+# -----------------------------------------------------------------------------
+
+def train_model(data_path, name, output_folder, params=None, horizon=DEFAULT_TRAINING_HORIZON,
+                test_days=DEFAULT_TEST_DAYS, n_threads=1, refit=True):
+    """
+    Entraîne un modèle, l'évalue sur les `test_days` derniers jours, le
+    réentraîne sur tout l'historique (si `refit`) et l'enregistre dans `output_folder`.
+    Retourne un dict de résultats (métriques, paramètres, tailles, durée).
+    """
+    start = time.perf_counter()
+    limit_threads(n_threads)
+    daily = load_daily_history(data_path)
+    cutoff = len(daily) - 1 - test_days
+
+    train_X, train_y, _ = training_matrix(daily, horizon, last_target=cutoff)
+    # Période de test : origines à partir de la coupure, matrice (origines, horizon) pour le stacking
+    test_origins = np.arange(cutoff, len(daily) - 1)
+    test_X, test_actuals = origin_features(daily, test_origins, horizon)
+
+    estimator = build_estimator(name, params, n_threads)
+    estimator.fit(train_X, train_y)
+    test_predictions = np.asarray(estimator.predict(test_X), dtype=float).reshape(test_actuals.shape)
+    valid = ~np.isnan(test_actuals)
+    metrics = regression_metrics(test_actuals[valid], test_predictions[valid])
+
+    if refit:
+        full_X, full_y, _ = training_matrix(daily, horizon)
+        estimator = build_estimator(name, params, n_threads)
+        estimator.fit(full_X, full_y)
+        window_end = daily.index[-1]
+    else:
+        window_end = daily.index[cutoff]
+
+    joblib.dump(estimator, os.path.join(output_folder, f"{name}_model.joblib"))
+    return {
+        'model': name,
+        'metrics': metrics,
+        'params': {**DEFAULT_PARAMS[name], **(params or {})},
+        'train_rows': int(len(train_y)),
+        'test_rows': int(valid.sum()),
+        'holdout': (test_predictions, test_actuals),
+        'window': (daily.index[MIN_HISTORY_DAYS].isoformat(), window_end.isoformat()),
+        'test_window': (daily.index[cutoff + 1].isoformat(), daily.index[-1].isoformat()),
+        'elapsed': time.perf_counter() - start
+    }
+
+
+def _run_task(task):
+    try:
+        return task, train_model(**task), None
+    except Exception as e:
+        return task, None, f"{type(e).__name__}: {e}"
+
+
+# -----------------------------------------------------------------------------
+# Artefacts versionnés
+# -----------------------------------------------------------------------------
+
+def latest_model_folder(data_path, root=DEFAULT_OUTPUT):
+    """Dossier de la version servie pour un fichier de données, None si jamais entraîné"""
+    pointer = os.path.join(root, dataset_key(data_path), LATEST_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, encoding='utf-8') as file:
+        folder = os.path.join(root, dataset_key(data_path), json.load(file)['version'])
+    return folder if os.path.isdir(folder) else None
+
+
+def latest_metadata(data_path, root=DEFAULT_OUTPUT):
+    """Métadonnées de la version servie, {} si jamais entraîné"""
+    folder = latest_model_folder(data_path, root)
+    path = os.path.join(folder, METADATA_FILE) if folder else None
+    return joblib.load(path) if path and os.path.exists(path) else {}
+
+
+def write_metadata(folder, data_path, results, horizon, extra=None):
+    """Métadonnées de la version (mêmes clés que les métadonnées livrées, plus fenêtre et paramètres)"""
+    daily = load_daily_history(data_path)
+    sortie = daily['Sortie'].astype(float)
+    first = next(iter(results.values()))
+    metadata = {
+        'nom_dataset': os.path.basename(data_path),
+        'cle_dataset': dataset_key(data_path),
+        'version': os.path.basename(folder),
+        'signature_donnees': data_digest(data_path),
+        'taille_totale': len(daily),
+        'taille_train': first['train_rows'],
+        'taille_test': first['test_rows'],
+        'nb_features': len(FEATURE_NAMES),
+        'feature_names': list(FEATURE_NAMES),
+        'horizon_entrainement': horizon,
+        'fenetre_entrainement': {'debut': first['window'][0], 'fin': first['window'][1]},
+        'fenetre_test': {'debut': first['test_window'][0], 'fin': first['test_window'][1]},
+        'cv_sortie': float(sortie.std() / sortie.mean() * 100) if sortie.mean() > 0 else float('nan'),
+        'moyenne_sortie': float(sortie.mean()),
+        'std_sortie': float(sortie.std()),
+        'min_sortie': float(sortie.min()),
+        'max_sortie': float(sortie.max()),
+        'model_metrics': {name: result['metrics'] for name, result in results.items()},
+        'model_params': {name: result['params'] for name, result in results.items()},
+        # Prévisions hors échantillon de la période de test (origines, horizon) : calibration
+        # des intervalles conformes de l'application
+        'previsions_test': {name: result['holdout'][0] for name, result in results.items()},
+        'reels_test': first['holdout'][1],
+        'durees_entrainement': {name: round(result['elapsed'], 2) for name, result in results.items()},
+        'created_at': datetime.now().isoformat()
+    }
+    metadata.update(extra or {})
+    joblib.dump(metadata, os.path.join(folder, METADATA_FILE))
+    return metadata
+
+
+def stack_members(folder, results):
+    """
+    Poids d'ensemble appris sur la période de test (prévisions hors échantillon) ;
+    les fichiers des modèles élagués sont supprimés de la version
+    """
+    if len(results) < 2:
+        return None
+    actuals = next(iter(results.values()))['holdout'][1]
+    weights = fit_ensemble_weights(
+        {name: result['holdout'][0] for name, result in results.items()}, actuals, per_horizon=True
+    )
+    for name in weights.pruned:
+        os.remove(os.path.join(folder, f"{name}_model.joblib"))
+        print(f"✂️ {os.path.basename(os.path.dirname(folder))}/{name} élagué (poids ~0)")
+    return weights.to_dict()
+
+
+def publish_version(folder):
+    """Désigne `folder` comme version servie de son produit"""
+    product_folder = os.path.dirname(folder)
+    temporary = os.path.join(product_folder, LATEST_FILE + ".tmp")
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump({'version': os.path.basename(folder), 'published_at': datetime.now().isoformat()}, file)
+    os.replace(temporary, os.path.join(product_folder, LATEST_FILE))
+
+
+def train_catalogue(data_paths, model_names=MODEL_NAMES, output=DEFAULT_OUTPUT, max_workers=None,
+                    horizon=DEFAULT_TRAINING_HORIZON, test_days=DEFAULT_TEST_DAYS, params=None, tuning=None):
+    """
+    Entraîne tous les (produit, modèle) en parallèle et publie une nouvelle
+    version par produit dont au moins un modèle a réussi.
+
+    - `params` : {clé produit: {modèle: hyperparamètres}} (optionnel)
+    - `tuning` : {clé produit: {modèle: résultat de recherche}} (voir tuning.py) ;
+      par défaut, résultats enregistrés dans la version servie. Les paramètres
+      retenus sont utilisés et le résultat est reporté dans les métadonnées.
+
+    Retourne {clé produit: métadonnées de la version publiée}
+    """
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    tasks, tuning_records = [], {}
+    for data_path in data_paths:
+        key = dataset_key(data_path)
+        folder = os.path.join(output, key, version)
+        os.makedirs(folder, exist_ok=True)
+        records = (tuning or {}).get(key)
+        if records is None:
+            records = latest_metadata(data_path, output).get('tuning', {})
+        tuning_records[key] = records
+        for name in model_names:
+            model_params = (params or {}).get(key, {}).get(name)
+            if model_params is None and name in records:
+                model_params = records[name]['params']
+            tasks.append({
+                'data_path': data_path, 'name': name, 'output_folder': folder, 'horizon': horizon,
+                'test_days': test_days, 'params': model_params
+            })
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(len(tasks), max_workers or cores))
+    threads = max(1, cores // workers)
+    for task in tasks:
+        task['n_threads'] = threads
+
+    results = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_threads, initargs=(threads,)) as pool:
+            outcomes = list(pool.map(_run_task, tasks))
+    else:
+        outcomes = [_run_task(task) for task in tasks]
+
+    for task, result, error in outcomes:
+        if error:
+            print(f"⚠️ {dataset_key(task['data_path'])}/{task['name']} non entraîné : {error}")
+            continue
+        print(f"✅ {dataset_key(task['data_path'])}/{task['name']} : MAE {result['metrics']['mae']:.2f} "
+              f"({result['elapsed']:.1f} s)")
+        results.setdefault(task['data_path'], {})[task['name']] = result
+
+    published = {}
+    for data_path in data_paths:
+        folder = os.path.join(output, dataset_key(data_path), version)
+        if data_path not in results:
+            if not os.listdir(folder):
+                os.rmdir(folder)
+            continue
+        extra = {'tuning': tuning_records[dataset_key(data_path)]} if tuning_records[dataset_key(data_path)] else {}
+        extra['model_weights'] = stack_members(folder, results[data_path])
+        export_folder(folder)
+        published[dataset_key(data_path)] = write_metadata(folder, data_path, results[data_path], horizon, extra)
+        publish_version(folder)
+    return published
+
+
+def catalogue_files(data_folder="data"):
+    """Fichiers de données du catalogue"""
+    return sorted(
+        path for pattern in ("*.csv", "*.xlsx", "*.xls")
+        for path in glob.glob(os.path.join(data_folder, pattern))
+        if not os.path.basename(path).startswith('sample_data')
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Entraînement parallèle des modèles par produit")
+    parser.add_argument("data_files", nargs="*", help="Fichiers de données (défaut : tout data/)")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_NAMES), choices=MODEL_NAMES)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--horizon", type=int, default=DEFAULT_TRAINING_HORIZON)
+    parser.add_argument("--test-days", type=int, default=DEFAULT_TEST_DAYS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    published = train_catalogue(
+        args.data_files or catalogue_files(), args.models, args.output, args.workers, args.horizon, args.test_days
+    )
+    print(f"🏋️ {len(published)} produits publiés en {time.perf_counter() - start:.1f} s")
+    for key, metadata in published.items():
+        print(f"   {key} → {metadata['version']}")
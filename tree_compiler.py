@@ -0,0 +1,384 @@
+# =============================================================================
+# ⚡ ÉVALUATEUR COMPILÉ DES ENSEMBLES D'ARBRES (NUMPY PUR, FAIBLE LATENCE)
+# =============================================================================
+"""
+Export des ensembles d'arbres entraînés (scikit-learn RandomForest /
+ExtraTrees / GradientBoosting / DecisionTree, xgboost, lightgbm) en tableaux
+plats, et évaluation de tous les arbres en une passe NumPy sur le lot.
+
+- tableaux plats, tous les arbres concaténés : feature, seuil, fils gauche,
+  fils droit, valeur, direction par défaut (valeurs manquantes), racines,
+  couverture des nœuds (poids des échantillons, pour TreeSHAP)
+- évaluation : un indice de nœud par (ligne, arbre), avancé `profondeur`
+  fois en opérations vectorisées ; les feuilles pointent sur elles-mêmes
+- prédiction = base + échelle × Σ valeurs des feuilles
+- mêmes règles de comparaison que chaque bibliothèque : scikit-learn
+  (x float32 <= seuil), xgboost (x float32 < seuil float32), lightgbm (x <= seuil)
+
+Pour 30 lignes, l'appel à `predict` des bibliothèques est dominé par la
+validation et l'orchestration ; l'évaluateur compilé n'a que quelques
+opérations NumPy par niveau d'arbre.
+
+`fast_predict` compile un modèle au premier appel, vérifie le résultat contre
+`predict` sur ce premier lot et revient à `predict` en cas d'écart. Le gain
+dépend du modèle (net pour les forêts, nul pour le gradient boosting
+scikit-learn ou lightgbm au benchmark) : les deux chemins sont chronométrés
+sur ce premier lot et l'évaluateur compilé n'est gardé que s'il est plus rapide.
+
+Benchmark : `python tree_compiler.py models`
+"""
+import json
+import threading
+import time
+import weakref
+
+import numpy as np
+
+# Écart maximal accepté (relatif à l'amplitude des prédictions) avec `predict`
+VERIFY_TOLERANCE = 1e-6
+
+# Appels chronométrés de chaque chemin au premier lot (médiane)
+TIMING_REPEATS = 5
+
+
+class CompiledEnsemble:
+    """Ensemble d'arbres sous forme de tableaux plats"""
+
+    def __init__(self, feature, threshold, left, right, value, default_left, roots, depth,
+                 scale=1.0, base=0.0, strict=False, float32=True, feature_names=None, source=None,
+                 cover=None, importance=None, averaging=False):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32 if strict else np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.depth = int(depth)
+        self.scale = float(scale)
+        self.base = float(base)
+        # strict : x < seuil (xgboost) ; sinon x <= seuil
+        self.strict = bool(strict)
+        # Entrées converties en float32 avant comparaison (scikit-learn, xgboost)
+        self.float32 = bool(float32)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.source = source
+        # Couverture de chaque nœud (échantillons pondérés, hessiens pour xgboost)
+        self.cover = None if cover is None else np.asarray(cover, dtype=np.float64)
+        # Importance native normalisée du modèle d'origine (les tableaux ne permettent pas de la recalculer)
+        self.importance = None if importance is None else [float(value) for value in importance]
+        # Moyenne des arbres (forêts) plutôt que somme pondérée (boosting) : scale = 1 / n_trees
+        self.averaging = bool(averaging)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays()[0].values())
+
+    @property
+    def feature_importances_(self):
+        if self.importance is None:
+            raise AttributeError("Importance non enregistrée pour cet ensemble compilé")
+        return np.asarray(self.importance)
+
+    def _matrix(self, X):
+        if self.feature_names is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32 if self.float32 else np.float64)
+        return X.astype(np.float64) if not self.strict else X
+
+    def leaves(self, X):
+        """Indice de la feuille atteinte par chaque (ligne, arbre)"""
+        X = self._matrix(X)
+        # Indexation à plat : position de la ligne dans X.ravel()
+        flat = np.ascontiguousarray(X).ravel()
+        offsets = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        for _ in range(self.depth):
+            x = flat[offsets + self.feature[node]]
+            threshold = self.threshold[node]
+            go_left = x < threshold if self.strict else x <= threshold
+            missing = np.isnan(x)
+            if missing.any():
+                go_left = np.where(missing, self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict(self, X):
+        return self.base + self.scale * self.value[self.leaves(X)].sum(axis=1)
+
+    def arrays(self):
+        """Tableaux et attributs (export, voir model_artifacts.py)"""
+        arrays = {
+            'feature': self.feature, 'threshold': self.threshold, 'left': self.left, 'right': self.right,
+            'value': self.value, 'default_left': self.default_left, 'roots': self.roots
+        }
+        if self.cover is not None:
+            arrays['cover'] = self.cover
+        return arrays, {
+            'depth': self.depth, 'scale': self.scale, 'base': self.base, 'strict': self.strict,
+            'float32': self.float32, 'feature_names': self.feature_names, 'source': self.source,
+            'importance': self.importance, 'averaging': self.averaging
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, attributes):
+        return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'],
+                   arrays['default_left'], arrays['roots'], cover=arrays.get('cover'), **attributes)
+
+
+class _Builder:
+    """Accumule les nœuds des arbres (feuilles rebouclées sur elles-mêmes)"""
+
+    def __init__(self):
+        self.columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'value', 'default_left', 'cover')}
+        self.roots = []
+        self.depth = 0
+        self.size = 0
+
+    def add_tree(self, feature, threshold, left, right, value, default_left, depth, cover):
+        offset = self.size
+        n = len(feature)
+        leaf = np.asarray(left) < 0
+        own = np.arange(n)
+        self.columns['feature'].append(np.where(leaf, 0, feature))
+        self.columns['threshold'].append(np.where(leaf, 0.0, threshold))
+        self.columns['left'].append(np.where(leaf, own, left) + offset)
+        self.columns['right'].append(np.where(leaf, own, right) + offset)
+        self.columns['value'].append(np.where(leaf, value, 0.0))
+        self.columns['default_left'].append(np.asarray(default_left, dtype=bool))
+        self.columns['cover'].append(np.asarray(cover, dtype=np.float64))
+        self.roots.append(offset)
+        self.depth = max(self.depth, depth)
+        self.size += n
+
+    def build(self, **attributes):
+        arrays = {name: np.concatenate(values) for name, values in self.columns.items()}
+        return CompiledEnsemble(roots=self.roots, depth=self.depth, **arrays, **attributes)
+
+
+# -----------------------------------------------------------------------------
+# Export par bibliothèque
+# -----------------------------------------------------------------------------
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=int)
+    stack, maximum = [0], 0
+    while stack:
+        node = stack.pop()
+        if left[node] >= 0:
+            for child in (left[node], right[node]):
+                depth[child] = depth[node] + 1
+                maximum = max(maximum, depth[child])
+                stack.append(child)
+    return maximum
+
+
+def _compile_sklearn(model):
+    builder = _Builder()
+    if hasattr(model, 'estimators_') and hasattr(model, 'learning_rate'):
+        trees = [estimator.tree_ for estimator in np.ravel(model.estimators_)]
+        scale = model.learning_rate
+        base = 0.0
+        if model.init_ != 'zero':
+            base = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+    elif hasattr(model, 'estimators_'):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        scale, base = 1.0 / len(trees), 0.0
+    else:
+        trees, scale, base = [model.tree_], 1.0, 0.0
+    for tree in trees:
+        left, right = tree.children_left, tree.children_right
+        builder.add_tree(tree.feature, tree.threshold, left, right, tree.value[:, 0, 0],
+                         np.zeros(len(left), dtype=bool), _tree_depth(left, right), tree.weighted_n_node_samples)
+    averaging = hasattr(model, 'estimators_') and not hasattr(model, 'learning_rate')
+    return builder.build(scale=scale, base=base, strict=False, float32=True, averaging=averaging,
+                         feature_names=getattr(model, 'feature_names_in_', None), source='sklearn')
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    dump = json.loads(booster.save_raw(raw_format='json'))
+    learner = dump['learner']
+    base = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+    builder = _Builder()
+    for tree in learner['gradient_booster']['model']['trees']:
+        left = np.asarray(tree['left_children'])
+        right = np.asarray(tree['right_children'])
+        # Pour une feuille, split_conditions contient la valeur de la feuille
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        builder.add_tree(tree['split_indices'], conditions, left, right, conditions.astype(np.float64),
+                         tree['default_left'], _tree_depth(left, right), tree['sum_hessian'])
+    return builder.build(scale=1.0, base=base, strict=True, float32=True,
+                         feature_names=booster.feature_names, source='xgboost')
+
+
+def _compile_lightgbm(model):
+    booster = model.booster_ if hasattr(model, 'booster_') else model
+    dump = booster.dump_model()
+    builder = _Builder()
+    for info in dump['tree_info']:
+        columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'value', 'default_left', 'cover')}
+
+        def visit(node):
+            index = len(columns['feature'])
+            for values in columns.values():
+                values.append(None)
+            if 'leaf_value' in node:
+                columns['feature'][index], columns['threshold'][index] = 0, 0.0
+                columns['left'][index] = columns['right'][index] = -1
+                columns['value'][index], columns['default_left'][index] = node['leaf_value'], False
+                columns['cover'][index] = node.get('leaf_count', 0)
+                return index
+            if node.get('decision_type', '<=') != '<=':
+                raise ValueError("Découpes catégorielles lightgbm non supportées")
+            columns['feature'][index] = node['split_feature']
+            columns['threshold'][index] = node['threshold']
+            columns['value'][index] = 0.0
+            columns['default_left'][index] = node.get('default_left', True)
+            columns['cover'][index] = node.get('internal_count', 0)
+            columns['left'][index] = visit(node['left_child'])
+            columns['right'][index] = visit(node['right_child'])
+            return index
+
+        visit(info['tree_structure'])
+        left, right = np.asarray(columns['left']), np.asarray(columns['right'])
+        builder.add_tree(columns['feature'], columns['threshold'], left, right, columns['value'],
+                         columns['default_left'], _tree_depth(left, right), columns['cover'])
+    averaging = bool(dump.get('average_output'))
+    scale = 1.0 / len(dump['tree_info']) if averaging else 1.0
+    return builder.build(scale=scale, base=0.0, strict=False, float32=False, averaging=averaging,
+                         feature_names=booster.feature_name(), source='lightgbm')
+
+
+def compile_model(model):
+    """Ensemble compilé d'un modèle d'arbres (TypeError si non supporté)"""
+    module = type(model).__module__
+    if module.startswith('xgboost'):
+        return _compile_xgboost(model)
+    if module.startswith('lightgbm'):
+        return _compile_lightgbm(model)
+    if module.startswith('sklearn') and (hasattr(model, 'estimators_') or hasattr(model, 'tree_')):
+        return _compile_sklearn(model)
+    raise TypeError(f"Modèle non compilable : {type(model).__name__}")
+
+
+def max_deviation(model, compiled, X):
+    """Écart maximal |predict - évaluateur compilé| et amplitude des prédictions"""
+    expected = np.asarray(model.predict(X), dtype=float)
+    actual = compiled.predict(X)
+    return float(np.max(np.abs(expected - actual))), float(np.max(np.abs(expected))) if expected.size else 0.0
+
+
+# -----------------------------------------------------------------------------
+# Prédiction rapide avec repli sur predict
+# -----------------------------------------------------------------------------
+
+# Évaluateur compilé (ou None = repli sur predict) par modèle ; références
+# faibles : l'entrée disparaît avec le modèle (rechargement, nouvelle version)
+_COMPILED = weakref.WeakKeyDictionary()
+_COMPILED_LOCK = threading.Lock()
+
+
+def _median_seconds(function, repeats=TIMING_REPEATS):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def fast_predict(model, X):
+    """
+    Prédiction par l'évaluateur compilé ; au premier appel pour un modèle,
+    compilation, vérification contre `predict` et chronométrage des deux
+    chemins (repli définitif sur `predict` si le modèle n'est pas compilable,
+    si les résultats diffèrent ou si l'évaluateur compilé n'est pas plus rapide)
+    """
+    if isinstance(model, CompiledEnsemble):
+        return model.predict(X)
+    with _COMPILED_LOCK:
+        try:
+            known = model in _COMPILED
+            compiled = _COMPILED.get(model)
+        except TypeError:
+            # Modèle sans référence faible possible : compilé à chaque appel
+            known, compiled = False, None
+    if known:
+        return compiled.predict(X) if compiled is not None else model.predict(X)
+
+    expected = np.asarray(model.predict(X), dtype=float)
+    try:
+        compiled = compile_model(model)
+        deviation = np.max(np.abs(compiled.predict(X) - expected)) if expected.size else 0.0
+        if deviation > VERIFY_TOLERANCE * max(1.0, float(np.max(np.abs(expected), initial=0.0))):
+            print(f"⚠️ Évaluateur compilé écarté pour {type(model).__name__} (écart {deviation:.2e})")
+            compiled = None
+        else:
+            library = _median_seconds(lambda: model.predict(X))
+            native = _median_seconds(lambda: compiled.predict(X))
+            if native >= library:
+                print(f"ℹ️ Évaluateur compilé écarté pour {type(model).__name__} "
+                      f"(pas plus rapide : {native * 1000:.2f} ms contre {library * 1000:.2f} ms)")
+                compiled = None
+    except Exception as e:
+        print(f"⚠️ Modèle {type(model).__name__} non compilé : {e}")
+        compiled = None
+    with _COMPILED_LOCK:
+        try:
+            _COMPILED[model] = compiled
+        except TypeError:
+            pass
+    return expected
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    import joblib
+
+    from forecast_features import future_features
+    from stock_data import load_daily_history
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else "models"
+    data_file = sys.argv[2] if len(sys.argv) > 2 else "data/parleG_clean.csv"
+    daily = load_daily_history(data_file)
+    features = future_features(daily, daily.index[-1], 30)
+    wide = future_features(daily, daily.index[-1], 365)
+
+    def median_ms(function, repeats=50):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return float(np.median(timings) * 1000)
+
+    for file in sorted(os.listdir(folder)):
+        if not file.endswith('_model.joblib'):
+            continue
+        try:
+            model = joblib.load(os.path.join(folder, file))
+            compiled = compile_model(model)
+        except Exception as e:
+            print(f"⚠️ {file} ignoré : {e}")
+            continue
+        if hasattr(model, 'n_jobs'):
+            model.n_jobs = 1
+        deviation, amplitude = max_deviation(model, compiled, wide)
+        library = median_ms(lambda: model.predict(features))
+        native = median_ms(lambda: compiled.predict(features))
+        fast_predict(model, features)
+        served = "compilé" if _COMPILED.get(model) is not None else "predict"
+        print(f"⚡ {file:<18} {compiled.n_trees:>4} arbres, {compiled.n_nodes:>6} nœuds, profondeur {compiled.depth} | "
+              f"predict {library:7.2f} ms → compilé {native:6.2f} ms (× {library / native:5.1f}) | "
+              f"écart max {deviation:.1e} (amplitude {amplitude:.0f}) | servi : {served}")
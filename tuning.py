@@ -0,0 +1,325 @@
+# =============================================================================
+# 🎛️ RECHERCHE D'HYPERPARAMÈTRES PAR PRODUIT (SUCCESSIVE HALVING / HYPERBAND)
+# =============================================================================
+"""
+Réglage des hyperparamètres rf / gb / xgb / lgb de chaque produit sous un
+budget de temps.
+
+- évaluation d'une configuration : MAE moyenne sur les plis du backtest
+  (`backtesting.fold_origins`) ; pour chaque pli, entraînement sur les jours
+  antérieurs à la première origine du pli, prévision des origines du pli
+- ressource : part des lignes d'entraînement utilisée (sous-échantillon fixe)
+- Hyperband : plusieurs tranches de successive halving ; dans une tranche, les
+  configurations sont évaluées avec peu de données, le meilleur tiers passe
+  au palier suivant (3 × plus de données), jusqu'à la totalité
+- évaluations d'un palier (configuration × pli) en parallèle dans un pool de
+  processus ; budget de temps par produit, partagé entre les modèles : plus
+  aucun palier n'est lancé une fois l'échéance passée. Un palier interrompu
+  garde les configurations dont tous les plis sont terminés, les
+  évaluations encore en file sont annulées ; si aucune configuration n'a pu
+  être évaluée, la configuration par défaut est retenue (clé 'par_defaut',
+  recherche refaite au prochain lancement)
+- la configuration gagnante est enregistrée dans les métadonnées du modèle
+  (clé 'tuning') avec l'empreinte des données et de l'espace de recherche :
+  pas de nouvelle recherche tant que les données ne changent pas
+
+Utilisation : `python tuning.py data/parleG_clean.csv --models rf --budget 120`
+(recherche puis réentraînement avec les paramètres retenus)
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+import numpy as np
+
+from backtesting import fold_origins
+from forecast_features import origin_features
+from stock_data import file_signature, load_daily_history
+from training import (
+    DEFAULT_PARAMS, MODEL_NAMES, DEFAULT_OUTPUT, build_estimator, data_digest, dataset_key,
+    latest_metadata, limit_threads, training_matrix
+)
+
+DEFAULT_BUDGET_SECONDS = 300
+DEFAULT_ETA = 3
+DEFAULT_MAX_RUNGS = 3
+TUNING_HORIZON = 30
+TUNING_FOLDS = 3
+TUNING_FOLD_SIZE = 14
+
+# Espaces de recherche (valeurs candidates par paramètre)
+SEARCH_SPACES = {
+    'rf': {
+        'n_estimators': [50, 100, 200],
+        'max_depth': [6, 8, 10, 14],
+        'max_features': [0.3, 0.6, 1.0],
+        'min_samples_leaf': [2, 8, 20, 50]
+    },
+    'gb': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [2, 3, 5],
+        'learning_rate': [0.02, 0.05, 0.1],
+        'subsample': [0.6, 0.8, 1.0]
+    },
+    'xgb': {
+        'n_estimators': [200, 400, 800],
+        'max_depth': [3, 4, 6, 8],
+        'learning_rate': [0.02, 0.05, 0.1],
+        'subsample': [0.6, 0.8, 1.0],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'min_child_weight': [1, 5, 20]
+    },
+    'lgb': {
+        'n_estimators': [200, 400, 800],
+        'num_leaves': [15, 31, 63],
+        'learning_rate': [0.02, 0.05, 0.1],
+        'min_child_samples': [10, 20, 50],
+        'colsample_bytree': [0.6, 0.8, 1.0]
+    }
+}
+
+
+def space_digest(name):
+    """Empreinte de l'espace de recherche d'un modèle (une recherche ancienne est refaite s'il change)"""
+    return hashlib.sha1(json.dumps(SEARCH_SPACES[name], sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def sample_configurations(name, count, rng, include_default=False):
+    """`count` configurations distinctes tirées de l'espace (la configuration par défaut en premier si demandé)"""
+    space = SEARCH_SPACES[name]
+    configurations, seen = [], set()
+    if include_default:
+        default = {param: DEFAULT_PARAMS[name].get(param, values[0]) for param, values in space.items()}
+        configurations.append(default)
+        seen.add(json.dumps(default, sort_keys=True))
+    size = math.prod(len(values) for values in space.values())
+    while len(configurations) < min(count, size):
+        candidate = {param: values[rng.integers(len(values))] for param, values in space.items()}
+        candidate = {param: value.item() if hasattr(value, 'item') else value for param, value in candidate.items()}
+        signature = json.dumps(candidate, sort_keys=True)
+        if signature not in seen:
+            seen.add(signature)
+            configurations.append(candidate)
+    return configurations
+
+
+# -----------------------------------------------------------------------------
+# Évaluation d'une configuration sur un pli (dans un processus du pool)
+# -----------------------------------------------------------------------------
+
+_MATRICES = {}
+_MATRICES_LOCK = threading.Lock()
+
+
+def _fold_data(data_path, fold, horizon):
+    """Matrices d'entraînement et de test d'un pli, construites une fois par processus"""
+    key = (file_signature(data_path), fold, horizon)
+    with _MATRICES_LOCK:
+        if key in _MATRICES:
+            return _MATRICES[key]
+    daily = load_daily_history(data_path)
+    origins = fold_origins(len(daily), horizon, TUNING_FOLDS, TUNING_FOLD_SIZE)[fold]
+    train_X, train_y, _ = training_matrix(daily, horizon, last_target=int(origins[0]))
+    test_X, test_y = origin_features(daily, origins, horizon)
+    data = (train_X, train_y, test_X, test_y.ravel())
+    with _MATRICES_LOCK:
+        _MATRICES[key] = data
+    return data
+
+
+def evaluate_configuration(data_path, name, params, fraction, fold, horizon=TUNING_HORIZON):
+    """MAE d'une configuration entraînée sur `fraction` des lignes d'entraînement du pli"""
+    train_X, train_y, test_X, test_y = _fold_data(data_path, fold, horizon)
+    if fraction < 1:
+        rows = np.random.default_rng(fold).permutation(len(train_y))[:max(1, int(len(train_y) * fraction))]
+        rows.sort()
+        train_X, train_y = train_X.iloc[rows], train_y[rows]
+    estimator = build_estimator(name, params)
+    estimator.fit(train_X, train_y)
+    valid = ~np.isnan(test_y)
+    predictions = np.asarray(estimator.predict(test_X), dtype=float)
+    return float(np.mean(np.abs(predictions[valid] - test_y[valid])))
+
+
+# -----------------------------------------------------------------------------
+# Hyperband
+# -----------------------------------------------------------------------------
+
+def hyperband_brackets(eta=DEFAULT_ETA, max_rungs=DEFAULT_MAX_RUNGS):
+    """[(nombre de configurations, part de données du premier palier, nombre de paliers)], tranche la plus agressive d'abord"""
+    s_max = max_rungs - 1
+    brackets = []
+    for s in range(s_max, -1, -1):
+        n_configs = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        brackets.append((n_configs, eta ** -s, s + 1))
+    return brackets
+
+
+def tune_model(data_path, name, deadline, pool, eta=DEFAULT_ETA, max_rungs=DEFAULT_MAX_RUNGS, seed=0):
+    """
+    Recherche Hyperband d'un modèle jusqu'à `deadline` (time.perf_counter()).
+    Retourne le résultat (paramètres, MAE, évaluations) ; configuration par
+    défaut (MAE None) si aucune configuration n'a pu être évaluée à temps.
+    """
+    start = time.perf_counter()
+    daily = load_daily_history(data_path)
+    n_folds = len(fold_origins(len(daily), TUNING_HORIZON, TUNING_FOLDS, TUNING_FOLD_SIZE))
+    if not n_folds:
+        raise ValueError("Historique trop court pour la recherche")
+    rng = np.random.default_rng(seed)
+
+    best = None  # (part de données, -MAE, configuration) : la plus grande part, puis la plus faible MAE
+    evaluations, budget_reached = 0, False
+    for bracket, (n_configs, fraction, n_rungs) in enumerate(hyperband_brackets(eta, max_rungs)):
+        configurations = sample_configurations(name, n_configs, rng, include_default=(bracket == 0))
+        for rung in range(n_rungs):
+            if time.perf_counter() >= deadline:
+                budget_reached = True
+                break
+            scores, completed = _evaluate_rung(pool, data_path, name, configurations, fraction, n_folds, deadline)
+            evaluated = [index for index in range(len(configurations)) if not np.isnan(scores[index])]
+            evaluations += len(evaluated) * n_folds
+            if evaluated:
+                # Palier interrompu : meilleure des configurations évaluées sur tous les plis
+                ranked = sorted(evaluated, key=lambda index: scores[index])
+                candidate = (fraction, -scores[ranked[0]], configurations[ranked[0]])
+                if best is None or candidate[:2] > best[:2]:
+                    best = candidate
+            if not completed:
+                budget_reached = True
+                break
+            keep = max(1, len(configurations) // eta)
+            configurations = [configurations[index] for index in ranked[:keep]]
+            fraction = min(1.0, fraction * eta)
+        if budget_reached:
+            break
+
+    result = {
+        'params': dict(DEFAULT_PARAMS[name]),
+        'mae': None,
+        'fraction': 0.0,
+        'par_defaut': True
+    }
+    if best is not None:
+        result = {
+            'params': {**DEFAULT_PARAMS[name], **best[2]},
+            'mae': float(-best[1]),
+            'fraction': best[0]
+        }
+    return {
+        **result,
+        'evaluations': evaluations,
+        'elapsed': round(time.perf_counter() - start, 1),
+        'budget_atteint': budget_reached,
+        'signature_donnees': data_digest(data_path),
+        'espace': space_digest(name),
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def _evaluate_rung(pool, data_path, name, configurations, fraction, n_folds, deadline):
+    """
+    (MAE moyenne de chaque configuration sur tous les plis, palier terminé).
+    Si l'échéance passe avant la fin, les évaluations encore en file sont
+    annulées et les configurations incomplètes ont une MAE NaN
+    """
+    futures = {
+        pool.submit(evaluate_configuration, data_path, name, params, fraction, fold): index
+        for index, params in enumerate(configurations) for fold in range(n_folds)
+    }
+    totals = np.zeros(len(configurations))
+    folds_done = np.zeros(len(configurations), dtype=int)
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+        for future in done:
+            totals[futures[future]] += future.result()
+            folds_done[futures[future]] += 1
+        if pending and time.perf_counter() >= deadline:
+            # Les évaluations déjà lancées ne peuvent pas être interrompues
+            # dans leur processus ; celles en file ne prennent pas le temps
+            # du modèle suivant
+            for future in pending:
+                future.cancel()
+            break
+    scores = np.where(folds_done == n_folds, totals / n_folds, np.nan)
+    return scores, not pending
+
+
+def tune_product(data_path, model_names=MODEL_NAMES, budget=DEFAULT_BUDGET_SECONDS, max_workers=None,
+                 output=DEFAULT_OUTPUT, force=False):
+    """
+    Recherche pour chaque modèle d'un produit, le budget étant réparti entre
+    les modèles. Les résultats déjà enregistrés pour les mêmes données et le
+    même espace de recherche sont repris tels quels (sauf `force`).
+    Retourne {modèle: résultat}
+    """
+    recorded = latest_metadata(data_path, output).get('tuning', {})
+    digest = data_digest(data_path)
+    results = {}
+    to_tune = []
+    for name in model_names:
+        record = recorded.get(name)
+        if (not force and record and not record.get('par_defaut') and record.get('signature_donnees') == digest
+                and record.get('espace') == space_digest(name)):
+            print(f"⏭️ {dataset_key(data_path)}/{name} : données inchangées, paramètres enregistrés repris")
+            results[name] = record
+        else:
+            to_tune.append(name)
+    if not to_tune:
+        return results
+
+    start = time.perf_counter()
+    workers = max(1, max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=limit_threads, initargs=(1,)) as pool:
+        for position, name in enumerate(to_tune):
+            deadline = start + budget * (position + 1) / len(to_tune)
+            try:
+                result = tune_model(data_path, name, deadline, pool)
+            except Exception as e:
+                print(f"⚠️ {dataset_key(data_path)}/{name} non réglé : {type(e).__name__}: {e}")
+                continue
+            if result.get('par_defaut'):
+                print(f"⚠️ {dataset_key(data_path)}/{name} : budget épuisé avant la première évaluation, "
+                      f"configuration par défaut")
+            else:
+                print(f"🎛️ {dataset_key(data_path)}/{name} : MAE {result['mae']:.2f} "
+                      f"({result['evaluations']} évaluations, {result['elapsed']} s)")
+            results[name] = result
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from training import catalogue_files, train_catalogue
+
+    parser = argparse.ArgumentParser(description="Recherche d'hyperparamètres par produit puis réentraînement")
+    parser.add_argument("data_files", nargs="*", help="Fichiers de données (défaut : tout data/)")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_NAMES), choices=MODEL_NAMES)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="Secondes par produit")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--force", action="store_true", help="Refaire la recherche même si les données sont inchangées")
+    args = parser.parse_args()
+
+    data_files = args.data_files or catalogue_files()
+    tuning = {}
+    for data_file in data_files:
+        tuning[dataset_key(data_file)] = tune_product(
+            data_file, args.models, args.budget, args.workers, args.output, args.force
+        )
+    changed = [
+        data_file for data_file in data_files
+        if tuning[dataset_key(data_file)] != latest_metadata(data_file, args.output).get('tuning', {})
+    ]
+    if changed:
+        train_catalogue(changed, args.models, args.output, args.workers, tuning=tuning)
+    else:
+        print("✅ Aucun changement : modèles servis conservés")